@@ -2,6 +2,7 @@ from soc.bus.sram import SRAM
 from nmigen import Memory, Signal, Module
 from soc.minerva.units.loadstore import BareLoadStoreUnit, CachedLoadStoreUnit
 from soc.minerva.units.fetch import BareFetchUnit, CachedFetchUnit
+from soc.experiment.icache import ICacheFetchUnit
 
 
 class TestSRAMBareLoadStoreUnit(BareLoadStoreUnit):
@@ -42,7 +43,10 @@ class TestSRAMBareLoadStoreUnit(BareLoadStoreUnit):
         return m
 
 
-class TestSRAMBareFetchUnit(BareFetchUnit):
+class TestSRAMFetchUnitMixin:
+    """attaches a read-only SRAM to the ibus of a FetchUnitInterface.
+    mix in ahead of the fetch unit class: see TestSRAMBareFetchUnit
+    """
     def __init__(self, pspec):
         super().__init__(pspec)
         # default: small 32-entry Memory
@@ -51,7 +55,7 @@ class TestSRAMBareFetchUnit(BareFetchUnit):
             depth = pspec.imem_test_depth
         else:
             depth = 32
-        print("TestSRAMBareFetchUnit depth", depth)
+        print(type(self).__name__, "depth", depth)
         self.mem = Memory(width=self.data_wid, depth=depth)
 
     def _get_memory(self):
@@ -72,10 +76,17 @@ class TestSRAMBareFetchUnit(BareFetchUnit):
             print("fanout", fanout, getattr(sram.bus, fanout).shape(),
                   getattr(ibus, fanout).shape())
             comb += getattr(sram.bus, fanout).eq(getattr(ibus, fanout))
-            comb += getattr(sram.bus, fanout).eq(getattr(ibus, fanout))
         for fanin in fanins:
             comb += getattr(ibus, fanin).eq(getattr(sram.bus, fanin))
         # connect address
         comb += sram.bus.adr.eq(ibus.adr)
 
         return m
+
+
+class TestSRAMBareFetchUnit(TestSRAMFetchUnitMixin, BareFetchUnit):
+    pass
+
+
+class TestSRAMICacheFetchUnit(TestSRAMFetchUnitMixin, ICacheFetchUnit):
+    pass
@@ -0,0 +1,182 @@
+"""Content-addressed on-disk cache of converted designs (RTLIL, verilog)
+
+Usage::
+
+    from soc.config.elabcache import cached_convert
+
+    vl = cached_convert(lambda: TestIssuer(pspec), pspec,
+                        name="test_issuer",
+                        ports=lambda dut: dut.external_ports())
+
+build is only called (and the design only elaborated) on a cache miss.
+the key is a hash of the pspec, the arguments, the source of every
+python file in soc, openpower, nmutil and nmigen, and every file in the
+openpower isatables (the CSV and field files that the PowerDecoder is
+built from): any edit to any of them is a miss, so an entry can never
+be stale.
+
+the cache is in ``$SOC_ELAB_CACHE`` (default ``~/.cache/soc-elab``):
+export ``SOC_ELAB_CACHE=off`` to disable it.  only the most recently
+used ``ELAB_CACHE_ENTRIES`` entries are kept.
+
+this caches conversion output (the .il and .v files), not simulations:
+a pysim testbench needs the python Signal objects of a fresh
+elaboration, and the cxxsim engine (nmigen cxxsim branch) does its
+C++ build internally, with no hook for a cache.
+"""
+
+import hashlib
+import importlib
+import os
+import shutil
+
+from nmigen.cli import rtlil, verilog
+
+
+ELAB_CACHE_ENTRIES = 32
+
+_source_hash = None
+
+
+def elab_cache_dir():
+    """Returns the cache directory, or ``None`` if disabled"""
+    path = os.environ.get("SOC_ELAB_CACHE")
+    if path is None:
+        path = os.path.join(os.path.expanduser("~"), ".cache", "soc-elab")
+    if path.lower() in ("", "0", "off", "no"):
+        return None
+    return path
+
+
+def data_dirs():
+    """directories of the (non-python) files that designs are built from:
+    the openpower isatables, read by the PowerDecoder
+    """
+    try:
+        from openpower.decoder.power_enums import find_wiki_dir
+    except ImportError:
+        return []
+    return [find_wiki_dir()]
+
+
+def _hash_tree(h, topdir, suffix=None):
+    """adds the names and contents of all files under topdir (only those
+    ending in suffix, if given) to h
+    """
+    for root, dirs, files in os.walk(topdir):
+        dirs.sort()
+        for fname in sorted(files):
+            if suffix is not None and not fname.endswith(suffix):
+                continue
+            path = os.path.join(root, fname)
+            h.update(os.path.relpath(path, topdir).encode())
+            with open(path, "rb") as f:
+                h.update(f.read())
+
+
+def source_hash():
+    """hash of all python source of the packages a design comes from,
+    and of the files in data_dirs().  computed once per process.
+    """
+    global _source_hash
+    if _source_hash is not None:
+        return _source_hash
+    h = hashlib.sha256()
+    for pkgname in ("soc", "openpower", "nmutil", "nmigen", "amaranth"):
+        try:
+            pkg = importlib.import_module(pkgname)
+        except ImportError:
+            continue
+        for pkgdir in getattr(pkg, "__path__", []):
+            _hash_tree(h, pkgdir, ".py")
+    for datadir in data_dirs():
+        h.update(b"\0data\0")
+        _hash_tree(h, datadir)
+    _source_hash = h.hexdigest()
+    return _source_hash
+
+
+def pspec_key(pspec):
+    """the settings of a pspec (a Mock or plain object), as a string"""
+    if pspec is None:
+        return ""
+    items = sorted((k, v) for k, v in vars(pspec).items()
+                   if not k.startswith("_"))
+    return repr(items)
+
+
+def _yosys_key():
+    # verilog output also depends on the yosys that write_verilog runs
+    yosys = shutil.which(os.environ.get("YOSYS", "yosys"))
+    if yosys is None:
+        return ""
+    st = os.stat(yosys)
+    return "%s:%d:%d" % (yosys, st.st_size, st.st_mtime)
+
+
+def cached_convert(build, pspec=None, name="top", kind="rtlil", ports=None,
+                   key=""):
+    """returns the RTLIL (kind="rtlil") or verilog (kind="verilog") of
+    the design that build() returns.
+
+    * :build: function returning the Elaboratable
+    * :pspec: pspec it was made with (part of the cache key)
+    * :ports: function of the design returning the ports, default
+      dut.ports()
+    * :key: anything else that build depends on, as a string
+    """
+    convert = {"rtlil": rtlil.convert, "verilog": verilog.convert}[kind]
+
+    def do_convert():
+        dut = build()
+        dut_ports = ports(dut) if ports is not None else dut.ports()
+        return convert(dut, ports=dut_ports, name=name)
+
+    cachedir = elab_cache_dir()
+    if cachedir is None:
+        return do_convert()
+
+    h = hashlib.sha256()
+    for part in (kind, name, key, pspec_key(pspec), source_hash()):
+        h.update(part.encode())
+        h.update(b"\0")
+    if kind == "verilog":
+        h.update(_yosys_key().encode())
+    fname = os.path.join(cachedir, "%s-%s.%s" % (name, h.hexdigest()[:32],
+                                                 {"rtlil": "il",
+                                                  "verilog": "v"}[kind]))
+    try:
+        os.utime(fname) # mark as recently used
+        with open(fname) as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    text = do_convert()
+    os.makedirs(cachedir, exist_ok=True)
+    # write then rename, so that parallel test processes never see a
+    # partly-written entry
+    tmpname = "%s.%d.tmp" % (fname, os.getpid())
+    with open(tmpname, "w") as f:
+        f.write(text)
+    os.replace(tmpname, fname)
+    _prune(cachedir)
+    return text
+
+
+def _prune(cachedir):
+    entries = []
+    for fname in os.listdir(cachedir):
+        if fname.endswith(".tmp"):
+            continue
+        path = os.path.join(cachedir, fname)
+        try:
+            entries.append((os.stat(path).st_mtime, path))
+        except FileNotFoundError: # pruned by another process
+            pass
+    entries.sort(reverse=True)
+    for _, path in entries[ELAB_CACHE_ENTRIES:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
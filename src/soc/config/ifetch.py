@@ -7,8 +7,10 @@ as well as larger ones and so on, without needing large amounts
 of unnecessarily-duplicated code
 """
 from soc.experiment.imem import TestMemFetchUnit
-from soc.bus.test.test_minerva import TestSRAMBareFetchUnit
+from soc.bus.test.test_minerva import (TestSRAMBareFetchUnit,
+                                       TestSRAMICacheFetchUnit)
 from soc.minerva.units.fetch import BareFetchUnit
+from soc.experiment.icache import ICacheFetchUnit
 
 
 class ConfigFetchUnit:
@@ -16,7 +18,8 @@ class ConfigFetchUnit:
         fudict = {'testmem': TestMemFetchUnit,
                    'test_bare_wb': TestSRAMBareFetchUnit,
                    'bare_wb': BareFetchUnit,
-                   #'test_cache_wb': TestCacheFetchUnit
+                   'cache_wb': ICacheFetchUnit,
+                   'test_cache_wb': TestSRAMICacheFetchUnit,
                   }
         fukls = fudict[pspec.imem_ifacetype]
         self.fu = fukls(pspec)
@@ -0,0 +1,107 @@
+"""Levelled, per-subsystem logging for simulation runners and models
+
+Usage::
+
+    from soc.config.simlog import get_logger
+    log = get_logger("test_runner")
+
+    log.info("test %s", test.name)           # once per test
+    log.debug("instruction: 0x%x %s", ins, code)  # hot paths
+
+loggers are standard python ``logging`` loggers, named ``soc.<subsystem>``.
+the default level is WARNING, at which nothing that a simulation does on
+every instruction or cycle is printed.  ``SOC_LOG`` sets the levels, a
+default and then any per-subsystem overrides::
+
+    $ SOC_LOG=info python3 ...                  # everything at info
+    $ SOC_LOG=warning,test_runner=debug ...     # one subsystem verbose
+    $ SOC_LOG=debug,dcache=warning ...          # all but one
+
+``SOC_LOG_FORMAT=json`` prints one JSON object per line (time, level,
+subsystem, message) for CI log processing, instead of plain text.
+
+subsystems in use: test_runner, test_core, compunit, dcache, icache,
+l0_cache.
+"""
+
+import json
+import logging
+import os
+import sys
+
+
+_configured = False
+
+
+class JSONFormatter(logging.Formatter):
+    """one JSON object per record"""
+    def format(self, record):
+        return json.dumps({"time": round(record.created, 6),
+                           "level": record.levelname.lower(),
+                           "subsystem": record.name[len("soc."):],
+                           "msg": record.getMessage()})
+
+
+def parse_log_spec(spec):
+    """parses a SOC_LOG value: returns (default level, {subsystem: level})
+    """
+    default = logging.WARNING
+    levels = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = _level(level)
+        else:
+            default = _level(part)
+    return default, levels
+
+
+def _level(name):
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError("SOC_LOG: unknown level %s" % name)
+    return level
+
+
+def log_config(spec=None, fmt=None, stream=None):
+    """(re)configures all soc loggers.  spec and fmt default to the
+    SOC_LOG and SOC_LOG_FORMAT environment variables.
+    """
+    global _configured
+    _configured = True
+    if spec is None:
+        spec = os.environ.get("SOC_LOG", "")
+    if fmt is None:
+        fmt = os.environ.get("SOC_LOG_FORMAT", "text")
+    default, levels = parse_log_spec(spec)
+
+    root = logging.getLogger("soc")
+    root.setLevel(default)
+    root.propagate = False
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+    root.addHandler(handler)
+
+    # subsystems not mentioned follow the default (NOTSET: use parent)
+    for name in list(logging.Logger.manager.loggerDict):
+        if name.startswith("soc."):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+    for name, level in levels.items():
+        logging.getLogger("soc." + name).setLevel(level)
+
+
+def get_logger(subsystem):
+    """returns the logger for a subsystem (configuring from the
+    environment on first use)
+    """
+    if not _configured:
+        log_config()
+    return logging.getLogger("soc." + subsystem)
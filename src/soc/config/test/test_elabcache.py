@@ -0,0 +1,96 @@
+"""test of the on-disk RTLIL cache: a second conversion of the same
+design and pspec does not elaborate, a different pspec does.
+"""
+
+import os
+import tempfile
+import unittest
+
+from nmigen import Elaboratable, Module, Signal
+
+from soc.config.test.test_loadstore import TestMemPspec
+from soc.config import elabcache
+from soc.config.elabcache import cached_convert
+
+
+class Adder(Elaboratable):
+    def __init__(self, pspec):
+        self.a = Signal(pspec.reg_wid)
+        self.b = Signal(pspec.reg_wid)
+        self.o = Signal(pspec.reg_wid)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.d.comb += self.o.eq(self.a + self.b)
+        return m
+
+    def ports(self):
+        return [self.a, self.b, self.o]
+
+
+class TestElabCache(unittest.TestCase):
+
+    def setUp(self):
+        self.env = os.environ.get("SOC_ELAB_CACHE")
+        self.dir = tempfile.TemporaryDirectory()
+        os.environ["SOC_ELAB_CACHE"] = self.dir.name
+        self.built = 0
+
+    def tearDown(self):
+        os.environ.pop("SOC_ELAB_CACHE")
+        if self.env is not None:
+            os.environ["SOC_ELAB_CACHE"] = self.env
+        self.dir.cleanup()
+
+    def convert(self, pspec):
+        def build():
+            self.built += 1
+            return Adder(pspec)
+        return cached_convert(build, pspec, name="adder")
+
+    def test_hit_miss(self):
+        vl1 = self.convert(TestMemPspec(reg_wid=8))
+        vl2 = self.convert(TestMemPspec(reg_wid=8))
+        self.assertEqual(self.built, 1)
+        self.assertEqual(vl1, vl2)
+        self.assertIn("module \\adder", vl1)
+
+        vl3 = self.convert(TestMemPspec(reg_wid=16))
+        self.assertEqual(self.built, 2)
+        self.assertNotEqual(vl1, vl3)
+
+    def test_disabled(self):
+        os.environ["SOC_ELAB_CACHE"] = "off"
+        self.convert(TestMemPspec(reg_wid=8))
+        self.convert(TestMemPspec(reg_wid=8))
+        self.assertEqual(self.built, 2)
+
+    def test_isatables(self):
+        # an edit to a decoder table (not python) changes the key
+        data_dirs = elabcache.data_dirs
+        with tempfile.TemporaryDirectory() as tables:
+            fname = os.path.join(tables, "minor_31.csv")
+            with open(fname, "w") as f:
+                f.write("opcode,unit\n0b0000001010,ALU\n")
+            elabcache.data_dirs = lambda: [tables]
+            try:
+                elabcache._source_hash = None
+                h1 = elabcache.source_hash()
+                with open(fname, "a") as f:
+                    f.write("0b0000001011,ALU\n")
+                elabcache._source_hash = None
+                h2 = elabcache.source_hash()
+            finally:
+                elabcache.data_dirs = data_dirs
+                elabcache._source_hash = None
+        self.assertNotEqual(h1, h2)
+
+    def test_prune(self):
+        for i in range(elabcache.ELAB_CACHE_ENTRIES + 3):
+            self.convert(TestMemPspec(reg_wid=i+1))
+        self.assertEqual(len(os.listdir(self.dir.name)),
+                         elabcache.ELAB_CACHE_ENTRIES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,13 +32,15 @@ def read_from_addr(dut, addr):
     return res
 
 
-def tst_lsmemtype(ifacetype, sram_depth=32):
+def tst_lsmemtype(ifacetype, sram_depth=32, reg_wid=32, jtag_en=None):
     m = Module()
     pspec = TestMemPspec(ldst_ifacetype=ifacetype,
                          imem_ifacetype=ifacetype, addr_wid=64,
-                         mask_wid=4,
-                         reg_wid=32,
+                         mask_wid=reg_wid//8,
+                         reg_wid=reg_wid,
                          imem_test_depth=sram_depth)
+    if jtag_en is not None:
+        pspec.wb_icache_en = jtag_en
     dut = ConfigFetchUnit(pspec).fu
     vl = rtlil.convert(dut, ports=[])  # TODOdut.ports())
     with open("test_fetch_%s.il" % ifacetype, "w") as f:
@@ -53,13 +55,27 @@ def tst_lsmemtype(ifacetype, sram_depth=32):
 
     def process():
 
-        values = [random.randint(0, (1 << 32)-1) for x in range(16)]
+        values = [random.randint(0, (1 << reg_wid)-1) for x in range(16)]
         for addr, val in enumerate(values):
             yield mem._array[addr].eq(val)
         yield Settle()
 
-        for addr, val in enumerate(values):
+        if jtag_en is not None:
+            # wishbone disabled by JTAG: no bus cycle must be started
+            yield jtag_en.eq(0)
+            yield from read_from_addr(dut, 0)
+            for i in range(8):
+                assert not (yield dut.ibus.cyc)
+                yield
+            yield jtag_en.eq(1)
+
+        words_per_row = reg_wid // 32
+        for addr in range(16 * words_per_row):
             x = yield from read_from_addr(dut, addr << 2)
+            # select the word, as TestIssuer does for a 64-bit bus
+            row, word = divmod(addr, words_per_row)
+            x = (x >> (word*32)) & 0xffffffff
+            val = (values[row] >> (word*32)) & 0xffffffff
             print("addr, val", addr, hex(val), hex(x))
             assert x == val
 
@@ -71,3 +87,6 @@ def tst_lsmemtype(ifacetype, sram_depth=32):
 if __name__ == '__main__':
     tst_lsmemtype('test_bare_wb', sram_depth=32768)
     tst_lsmemtype('testmem')
+    tst_lsmemtype('test_cache_wb', sram_depth=64, reg_wid=64)
+    tst_lsmemtype('test_cache_wb', sram_depth=64, reg_wid=64,
+                  jtag_en=Signal(reset=1))
@@ -0,0 +1,53 @@
+"""test of the simulation logging levels and per-subsystem filters"""
+
+import io
+import json
+import unittest
+
+from soc.config.simlog import get_logger, log_config, parse_log_spec
+
+
+class TestSimLog(unittest.TestCase):
+
+    def tearDown(self):
+        log_config() # back to the environment's settings
+
+    def logged(self, spec, fmt="text"):
+        out = io.StringIO()
+        log_config(spec, fmt, out)
+        for name in ("dcache", "test_runner"):
+            log = get_logger(name)
+            log.debug("%s debug", name)
+            log.info("%s info", name)
+            log.warning("%s warning", name)
+        return out.getvalue().splitlines()
+
+    def test_default(self):
+        # hot paths log at debug/info: nothing by default
+        self.assertEqual(self.logged(""),
+                         ["dcache warning", "test_runner warning"])
+
+    def test_filters(self):
+        self.assertEqual(self.logged("info,dcache=error"),
+                         ["test_runner info", "test_runner warning"])
+        self.assertEqual(self.logged("error,test_runner=debug"),
+                         ["test_runner debug", "test_runner info",
+                          "test_runner warning"])
+
+    def test_json(self):
+        lines = self.logged("warning,dcache=info", "json")
+        recs = [json.loads(l) for l in lines]
+        self.assertEqual([(r["subsystem"], r["level"], r["msg"])
+                          for r in recs],
+                         [("dcache", "info", "dcache info"),
+                          ("dcache", "warning", "dcache warning"),
+                          ("test_runner", "warning",
+                           "test_runner warning")])
+
+    def test_bad_level(self):
+        with self.assertRaises(ValueError):
+            parse_log_spec("dcache=loud")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""test of opt-in VCD output: nothing by default, and the ring-buffer
+mode keeping only the last cycles before a failure
+"""
+
+import os
+import tempfile
+import unittest
+
+from nmigen import Module, Signal
+from nmutil.sim_tmp_alternative import Simulator
+from nmutil.util import wrap
+
+from soc.config.waves import write_vcd, parse_vcd_args
+
+
+def counter_sim(n_cycles):
+    m = Module()
+    count = Signal(16)
+    m.d.sync += count.eq(count + 1)
+    sim = Simulator(m)
+    sim.add_clock(1e-6)
+
+    def process():
+        for i in range(n_cycles):
+            yield
+        assert False, "stopped at %d" % (yield count)
+    sim.add_sync_process(wrap(process()))
+    return sim, count
+
+
+class TestWaves(unittest.TestCase):
+
+    def setUp(self):
+        self.env = {k: os.environ.pop(k, None)
+                    for k in ("SOC_VCD", "SOC_VCD_CYCLES")}
+        self.dir = tempfile.TemporaryDirectory()
+        self.vcd = os.path.join(self.dir.name, "test.vcd")
+
+    def tearDown(self):
+        for k, v in self.env.items():
+            os.environ.pop(k, None)
+            if v is not None:
+                os.environ[k] = v
+        self.dir.cleanup()
+
+    def test_disabled(self):
+        sim, count = counter_sim(10)
+        with self.assertRaises(AssertionError):
+            with write_vcd(sim, self.vcd):
+                sim.run()
+        self.assertFalse(os.path.exists(self.vcd))
+
+    def test_ring(self):
+        os.environ["SOC_VCD_CYCLES"] = "8"
+        sim, count = counter_sim(100)
+        with self.assertRaises(AssertionError):
+            with write_vcd(sim, self.vcd, traces=[count]):
+                sim.run()
+        with open(self.vcd) as f:
+            vcd = f.read()
+        # only the last 8 values of count (plus its initial dumpvars)
+        values = [int(l[1:].split()[0], 2) for l in vcd.splitlines()
+                  if l.startswith("b")]
+        self.assertEqual(values, [0] + list(range(93, 101)))
+
+    def test_args(self):
+        argv = parse_vcd_args(["prog", "-v", "--vcd-cycles", "20", "--vcd"])
+        self.assertEqual(argv, ["prog", "-v"])
+        self.assertEqual(os.environ["SOC_VCD_CYCLES"], "20")
+        self.assertEqual(os.environ["SOC_VCD"], "1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+"""Opt-in waveform (VCD/GTKW) output for simulation tests
+
+Usage::
+
+    from soc.config.waves import write_vcd, write_gtkw
+
+    write_gtkw("test.gtkw", "test.vcd", traces, module="top")
+    with write_vcd(sim, "test.vcd"):
+        sim.run()
+
+by default nothing is written: dumping every signal of the core on every
+cycle costs far more than the simulation itself.  to get waveforms,
+export ``SOC_VCD=1`` from the shell, or pass ``--vcd`` to a test that is
+run directly (its ``__main__`` calls :py:func:`parse_vcd_args`)::
+
+    $ SOC_VCD=1 python3 -m pytest src/soc/simple/test/test_core.py
+    $ python3 src/soc/fu/alu/test/test_pipe_caller.py --vcd
+
+ring-buffer mode keeps only the last N cycles, written out when the
+simulation finishes or stops on an exception (assertion failure)::
+
+    $ SOC_VCD_CYCLES=200 python3 -m pytest ...
+    $ python3 src/soc/simple/test/test_core.py --vcd-cycles=200
+
+ring-buffer mode needs pysim (it hooks the engine's value changes);
+under cxxsim the full VCD is written instead.
+"""
+
+import os
+import sys
+import warnings
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from vcd import VCDWriter
+from vcd.gtkw import GTKWSave
+
+from nmigen.hdl.ast import SignalDict
+from nmutil.gtkw import write_gtkw as _write_gtkw
+
+
+def vcd_cycles():
+    """Returns the ring-buffer length, or ``None`` if not in ring mode"""
+    cycles = os.environ.get("SOC_VCD_CYCLES")
+    if not cycles:
+        return None
+    return int(cycles)
+
+
+def vcd_enabled():
+    """Returns ``True`` if waveforms have been asked for"""
+    return (os.environ.get("SOC_VCD", "") not in ("", "0") or
+            vcd_cycles() is not None)
+
+
+def parse_vcd_args(argv=None):
+    """removes --vcd and --vcd-cycles=N (or --vcd-cycles N) from argv
+    (default sys.argv) and enables waveforms to match.  call this before
+    unittest.main(), which would otherwise reject them.
+    """
+    if argv is None:
+        argv = sys.argv
+    args = []
+    i = 1
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--vcd":
+            os.environ["SOC_VCD"] = "1"
+        elif arg.startswith("--vcd-cycles="):
+            os.environ["SOC_VCD_CYCLES"] = str(int(arg.split("=", 1)[1]))
+        elif arg == "--vcd-cycles" and i+1 < len(argv):
+            i += 1
+            os.environ["SOC_VCD_CYCLES"] = str(int(argv[i]))
+        else:
+            args.append(arg)
+        i += 1
+    argv[1:] = args
+    return argv
+
+
+def write_gtkw(*args, **kwargs):
+    """nmutil.gtkw.write_gtkw, only if waveforms are enabled"""
+    if vcd_enabled():
+        _write_gtkw(*args, **kwargs)
+
+
+def write_vcd(sim, vcd_file, gtkw_file=None, traces=(), cycles=None):
+    """drop-in for ``sim.write_vcd(vcd_file, gtkw_file, traces=traces)``
+
+    returns a context manager that writes nothing unless waveforms are
+    enabled.  cycles overrides SOC_VCD_CYCLES (ring-buffer mode).
+    """
+    if cycles is None:
+        if not vcd_enabled():
+            return nullcontext()
+        cycles = vcd_cycles()
+    if cycles is None:
+        return sim.write_vcd(vcd_file, gtkw_file, traces=traces)
+    engine = getattr(sim, "_engine", None)
+    if not hasattr(engine, "_vcd_writers"):
+        warnings.warn("VCD ring-buffer mode needs pysim: writing full VCD")
+        return sim.write_vcd(vcd_file, gtkw_file, traces=traces)
+    ring = VCDRing(sim._fragment, cycles, vcd_file, gtkw_file, traces)
+    return ring.record(engine)
+
+
+class VCDRing:
+    """keeps the value changes of the last N cycles of a simulation
+
+    installed as a VCD writer in the pysim engine, so it sees every value
+    change but writes nothing until the end.  changes are bucketed by
+    rising edge of the domain's clock: as the oldest cycle drops out of
+    the ring its changes are folded into the start values of the window.
+
+    * :fragment: the (prepared) fragment being simulated
+    * :cycles: number of clock cycles to keep
+    * :domain: the clock domain that counts cycles
+    """
+    def __init__(self, fragment, cycles, vcd_file, gtkw_file=None,
+                 traces=(), domain="sync"):
+        self.cycles = cycles
+        self.vcd_file = vcd_file
+        self.gtkw_file = gtkw_file
+        self.traces = list(traces)
+        self.clk = fragment.domains[domain].clk
+        self.names = SignalDict()
+        self.names[self.clk] = ("top",)
+        self._add_names(fragment, ("top",))
+        self.start = SignalDict() # values at the start of the window
+        self.ring = deque([[]])   # per-cycle lists of (time, sig, value)
+
+    def _add_names(self, fragment, path):
+        for domain, sig in fragment.iter_drivers():
+            if sig not in self.names:
+                self.names[sig] = path
+        for i, (sub, name) in enumerate(fragment.subfragments):
+            if name is None:
+                name = "U$%d" % i
+            self._add_names(sub, path + (name,))
+
+    @contextmanager
+    def record(self, engine):
+        engine._vcd_writers.append(self)
+        try:
+            yield
+        finally:
+            engine._vcd_writers.remove(self)
+            self.close(engine.now)
+
+    def update(self, timestamp, signal, value):
+        if signal is self.clk and value:
+            self.ring.append([])
+            if len(self.ring) > self.cycles:
+                for _, sig, val in self.ring.popleft():
+                    self.start[sig] = val
+        self.ring[-1].append((timestamp, signal, value))
+
+    def close(self, timestamp):
+        # all signals seen, in the order seen, so the file is stable
+        signals = SignalDict()
+        for sig in self.start.keys():
+            signals[sig] = True
+        for changes in self.ring:
+            for _, sig, _ in changes:
+                signals[sig] = True
+        t0 = self.ring[0][0][0] if self.ring[0] else timestamp
+
+        vcd_vars = SignalDict()
+        gtkw_names = SignalDict()
+        with open(self.vcd_file, "wt") as f:
+            writer = VCDWriter(f, timescale="1 ps",
+                               comment="last %d cycles" % self.cycles)
+            for sig in signals.keys():
+                scope = self.names.get(sig, ("bench",))
+                name, suffix = sig.name, 0
+                while True:
+                    try:
+                        vcd_vars[sig] = writer.register_var(scope, name,
+                                                "wire", size=len(sig),
+                                                init=sig.reset)
+                        break
+                    except KeyError:
+                        suffix += 1
+                        name = "%s$%d" % (sig.name, suffix)
+                gtkw_names[sig] = ".".join(scope + (name,))
+            # values at the start of the window, then the changes after
+            start = SignalDict(self.start.items())
+            changes = [c for cycle in self.ring for c in cycle]
+            while changes and changes[0][0] == t0:
+                _, sig, val = changes.pop(0)
+                start[sig] = val
+            for sig, val in start.items():
+                writer.change(vcd_vars[sig], int(t0), val)
+            for t, sig, val in changes:
+                writer.change(vcd_vars[sig], int(t), val)
+            writer.close(int(timestamp))
+
+        if self.gtkw_file is None:
+            return
+        with open(self.gtkw_file, "wt") as f:
+            save = GTKWSave(f)
+            save.dumpfile(self.vcd_file)
+            save.treeopen("top")
+            for sig in self.traces:
+                if sig not in gtkw_names:
+                    continue
+                name = gtkw_names[sig]
+                if len(sig) > 1:
+                    name += "[%d:0]" % (len(sig) - 1)
+                save.trace(name)
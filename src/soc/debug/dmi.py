@@ -6,8 +6,10 @@ compatible with microwatt's same interface.
 See constants below for addresses and register formats
 """
 
-from nmigen import Elaboratable, Module, Signal, Cat, Const, Record, Array, Mux
+from nmigen import (Elaboratable, Module, Signal, Cat, Const, Record, Array,
+                    Mux, Memory)
 from nmutil.iocontrol import RecordObject
+from soc.minerva.wishbone import make_wb_layout
 from nmigen.utils import log2_int
 from nmigen.cli import rtlil
 from soc.config.state import CoreState
@@ -26,6 +28,10 @@ class DBGCore:
     CR           = 0b1000 # CR (read only)
     XER          = 0b1001 # XER (read only) - note this is a TEMPORARY hack
     SVSTATE      = 0b1010 # SVSTATE register (read only for now)
+    PMU_IDX      = 0b1011 # PMU counter index
+    PMU_DATA     = 0b1100 # PMU counter (read), PMU control (write)
+    MEM_ADDR     = 0b1101 # Memory window byte address (auto-increments)
+    MEM_DATA     = 0b1110 # Memory window data (64-bit, over wishbone)
 
 
 # CTRL register (direct actions, write 1 to act, read back 0)
@@ -52,6 +58,14 @@ class DBGStat:
     TERM      = 2
 
 
+# PMU_DATA register writes (PMU control)
+# bit     0 : clear all counters (write 1 to act)
+# bit     1 : freeze counters (held until written 0)
+class DBGPMU:
+    CLEAR   = 0
+    FREEZE  = 1
+
+
 class DMIInterface(RecordObject):
     def __init__(self, name=None):
         super().__init__(name=name)
@@ -89,11 +103,35 @@ class DbgCRReg(RecordObject):
 
 
 class CoreDebug(Elaboratable):
-    def __init__(self, LOG_LENGTH=0): # TODO - debug log 512):
-        # Length of log buffer
+    """CoreDebug
+
+    * :LOG_LENGTH: number of instruction log entries (0 for none)
+    * :mem_spec: if given, a DMI memory window (MEM_ADDR/MEM_DATA) is
+      added, as a 64-bit wishbone master (self.wb) laid out by
+      make_wb_layout(mem_spec).  MEM_ADDR is written once, then each
+      write to MEM_DATA goes out as a wishbone write and each read of
+      MEM_DATA as a wishbone read, MEM_ADDR incrementing by 8 as each
+      one starts (the wishbone address is latched then).  writes are
+      posted (acked before the wishbone write is done) so that firmware
+      can be streamed in without a full bus round-trip per word: a
+      write to MEM_ADDR is therefore held off until the bus is idle.  mem_req_o is set while a MEM_DATA request
+      is waiting, and no wishbone transaction is started while
+      mem_hold_i is set (the core draining its store buffer first).
+    """
+    def __init__(self, LOG_LENGTH=0, mem_spec=None): # microwatt log is 512
+        # Length of log buffer (zero for none, otherwise a power of 2)
         self.LOG_LENGTH = LOG_LENGTH
         self.dmi = DMIInterface("dmi")
 
+        # Memory window wishbone master
+        self.mem_en = mem_spec is not None
+        if self.mem_en:
+            assert mem_spec.reg_wid == 64, "DMI memory window is 64-bit"
+            self.wb = Record(make_wb_layout(mem_spec, cti=False),
+                             name="dbg_wb")
+            self.mem_req_o = Signal()
+            self.mem_hold_i = Signal()
+
         # Debug actions
         self.core_stop_o       = Signal()
         self.core_rst_o        = Signal()
@@ -113,8 +151,14 @@ class CoreDebug(Elaboratable):
         # XER register read port
         self.d_xer = DbgReg("d_xer")
 
+        # PMU counter read port, and PMU control
+        self.d_pmu = DbgReg("d_pmu")
+        self.pmu_clear_o = Signal()
+        self.pmu_freeze_o = Signal()
+
         # Core logging data
         self.log_data_i        = Signal(256)
+        self.log_wen_i         = Signal(reset=1) # log entry valid
         self.log_read_addr_i   = Signal(32)
         self.log_read_data_o   = Signal(64)
         self.log_write_addr_o  = Signal(32)
@@ -142,12 +186,22 @@ class CoreDebug(Elaboratable):
         terminated   = Signal()
         do_gspr_rd   = Signal()
         gspr_index   = Signal.like(d_gpr.addr)
+        do_pmu_clear = Signal()
+        pmu_freeze   = Signal()
+        pmu_index    = Signal.like(self.d_pmu.addr)
 
         log_dmi_addr = Signal(32)
         log_dmi_data = Signal(64)
         do_dmi_log_rd = Signal()
         dmi_read_log_data = Signal()
         dmi_read_log_data_1 = Signal()
+        log_dmi_reading = Signal()
+        log_dmi_busy = Signal()
+        mem_addr     = Signal(64)
+        mem_data     = Signal(64)
+        mem_busy     = Signal()  # wishbone transaction in progress
+        mem_free     = Signal()  # wishbone transaction can be started
+        mem_done     = Signal()  # DMI MEM_DATA request has been taken
 
         LOG_INDEX_BITS = log2_int(self.LOG_LENGTH)
 
@@ -162,6 +216,23 @@ class CoreDebug(Elaboratable):
             with m.Case(DBGCore.XER):
                 comb += dmi.ack_o.eq(d_xer.ack)
                 comb += d_xer.req.eq(dmi.req_i)
+            with m.Case(DBGCore.PMU_DATA):
+                with m.If(dmi.we_i):
+                    comb += dmi.ack_o.eq(dmi.req_i)
+                with m.Else():
+                    comb += dmi.ack_o.eq(self.d_pmu.ack)
+                    comb += self.d_pmu.req.eq(dmi.req_i)
+            with m.Case(DBGCore.LOG_DATA):
+                # hold off until the next log dword has been read
+                comb += dmi.ack_o.eq(dmi.req_i & ~log_dmi_busy)
+            with m.Case(DBGCore.MEM_DATA):
+                # writes: acked as soon as the (one) write buffer is free
+                # reads: acked when the wishbone read has completed
+                comb += dmi.ack_o.eq(dmi.req_i &
+                                     (mem_done | (dmi.we_i & mem_free)))
+            with m.Case(DBGCore.MEM_ADDR):
+                # writes: not while a (posted) wishbone write is going on
+                comb += dmi.ack_o.eq(dmi.req_i & ~(dmi.we_i & mem_busy))
             with m.Default():
                 comb += dmi.ack_o.eq(dmi.req_i)
 
@@ -190,6 +261,14 @@ class CoreDebug(Elaboratable):
                 comb += dmi.dout.eq(d_cr.data)
             with m.Case(DBGCore.XER):
                 comb += dmi.dout.eq(d_xer.data)
+            with m.Case(DBGCore.PMU_IDX):
+                comb += dmi.dout.eq(pmu_index)
+            with m.Case(DBGCore.PMU_DATA):
+                comb += dmi.dout.eq(self.d_pmu.data)
+            with m.Case(DBGCore.MEM_ADDR):
+                comb += dmi.dout.eq(mem_addr)
+            with m.Case(DBGCore.MEM_DATA):
+                comb += dmi.dout.eq(mem_data)
 
         # DMI writes
         # Reset the 1-cycle "do" signals
@@ -197,6 +276,16 @@ class CoreDebug(Elaboratable):
         sync += do_reset.eq(0)
         sync += do_icreset.eq(0)
         sync += do_dmi_log_rd.eq(0)
+        sync += do_pmu_clear.eq(0)
+
+        # Increment log_dmi_addr after end of read from DBGCore.LOG_DATA
+        # (a write to LOG_ADDR, below, takes priority)
+        with m.If(dmi_read_log_data_1 & ~dmi_read_log_data):
+            lds = log_dmi_addr[:LOG_INDEX_BITS+2]
+            sync += lds.eq(lds + 1)
+            sync += do_dmi_log_rd.eq(1)
+        comb += log_dmi_busy.eq((dmi_read_log_data_1 & ~dmi_read_log_data) |
+                                do_dmi_log_rd | log_dmi_reading)
 
         # Edge detect on dmi_req_i for 1-shot pulses
         sync += dmi_req_i_1.eq(dmi.req_i)
@@ -226,6 +315,15 @@ class CoreDebug(Elaboratable):
                 with m.Elif(dmi.addr_i == DBGCore.GSPR_IDX):
                     sync += gspr_index.eq(dmi.din)
 
+                # PMU counter index
+                with m.Elif(dmi.addr_i == DBGCore.PMU_IDX):
+                    sync += pmu_index.eq(dmi.din)
+
+                # PMU control
+                with m.Elif(dmi.addr_i == DBGCore.PMU_DATA):
+                    sync += do_pmu_clear.eq(dmi.din[DBGPMU.CLEAR])
+                    sync += pmu_freeze.eq(dmi.din[DBGPMU.FREEZE])
+
                 # Log address
                 with m.Elif(dmi.addr_i == DBGCore.LOG_ADDR):
                     sync += log_dmi_addr.eq(dmi.din)
@@ -234,12 +332,6 @@ class CoreDebug(Elaboratable):
                 # sync += Display("DMI read from " & to_string(dmi_addr))
                 pass
 
-        with m.Elif(dmi_read_log_data_1 & ~dmi_read_log_data):
-            # Increment log_dmi_addr after end of read from DBGCore.LOG_DATA
-            lds = log_dmi_addr[:LOG_INDEX_BITS+2]
-            sync += lds.eq(lds + 1)
-            sync += do_dmi_log_rd.eq(1)
-
         sync += dmi_read_log_data_1.eq(dmi_read_log_data)
         sync += dmi_read_log_data.eq(dmi.req_i &
                                      (dmi.addr_i == DBGCore.LOG_DATA))
@@ -252,99 +344,112 @@ class CoreDebug(Elaboratable):
             sync += terminated.eq(1)
 
         comb += d_gpr.addr.eq(gspr_index)
+        comb += self.d_pmu.addr.eq(pmu_index)
 
         # Core control signals generated by the debug module
         comb += self.core_stop_o.eq(stopping & ~do_step)
         comb += self.core_rst_o.eq(do_reset)
         comb += self.icache_rst_o.eq(do_icreset)
         comb += self.terminated_o.eq(terminated)
-
-        # Logging RAM (none)
+        comb += self.pmu_clear_o.eq(do_pmu_clear)
+        comb += self.pmu_freeze_o.eq(pmu_freeze)
+
+        # Memory window.  one MEM_DATA request (which lasts until req_i
+        # drops) is one wishbone transaction.  a posted write frees the
+        # buffer as it completes, so the next request may start at once
+        if self.mem_en:
+            wb = self.wb
+            mem_req = Signal()
+            wb_done = Signal()
+            comb += mem_req.eq(dmi.req_i & (dmi.addr_i == DBGCore.MEM_DATA))
+            comb += wb_done.eq(mem_busy & (wb.ack | wb.err))
+            comb += self.mem_req_o.eq(mem_req)
+            comb += mem_free.eq((~mem_busy | (wb_done & wb.we)) &
+                                ~self.mem_hold_i)
+            comb += wb.sel.eq(0xff)
+            comb += wb.cyc.eq(mem_busy)
+            comb += wb.stb.eq(mem_busy)
+            # err is treated as ack, a failed read returning dat_r as-is
+            with m.If(wb_done):
+                sync += mem_busy.eq(0)
+                with m.If(~wb.we):
+                    sync += mem_data.eq(wb.dat_r)
+                    sync += mem_done.eq(1)
+            with m.If(~mem_req):
+                sync += mem_done.eq(0)
+            with m.Elif(~mem_done & mem_free):
+                sync += mem_busy.eq(1)
+                sync += wb.adr.eq(mem_addr[3:])
+                sync += mem_addr.eq(mem_addr + 8)
+                sync += wb.we.eq(dmi.we_i)
+                with m.If(dmi.we_i):
+                    sync += wb.dat_w.eq(dmi.din)
+                    sync += mem_done.eq(1) # posted
+            # address (dword aligned), as it is acked (see above).  the
+            # increment is only ever as a MEM_DATA transaction starts
+            with m.If(dmi.req_i & dmi.we_i & ~mem_busy &
+                      (dmi.addr_i == DBGCore.MEM_ADDR)):
+                sync += mem_addr.eq(dmi.din & ~0x7)
+        else:
+            # no memory window: requests are acked with no action
+            comb += mem_done.eq(1)
+            comb += mem_free.eq(1)
+
+        # Logging RAM.  the log is a circular buffer of LOG_LENGTH 256-bit
+        # entries, written whenever log_wen_i is set (by default, every
+        # cycle).  setting the MSB of either read address stops logging.
+        # the DMI reads the log one 64-bit dword at a time: LOG_ADDR is
+        # the entry index << 2 | dword, and is incremented after each read
+        # of LOG_DATA, so the log can be streamed out with repeated reads.
+        # the upper half of LOG_ADDR reads back log_write_addr_o: the
+        # index of the next entry to be written, with bit LOG_INDEX_BITS
+        # set to indicate that a log is present.
 
         if self.LOG_LENGTH == 0:
-            self.log_read_data_o.eq(0)
-            self.log_write_addr_o.eq(0x00000001)
+            comb += self.log_read_data_o.eq(0)
+            comb += self.log_write_addr_o.eq(0x00000001)
+            return m
+
+        assert self.LOG_LENGTH == 1 << LOG_INDEX_BITS, \
+            "LOG_LENGTH must be a power of 2"
+
+        log_array = Memory(width=len(self.log_data_i), depth=self.LOG_LENGTH)
+        m.submodules.log_wr = log_wr = log_array.write_port()
+        m.submodules.log_rd = log_rd = log_array.read_port(transparent=False)
+        log_wr_ptr = Signal(LOG_INDEX_BITS)
+        log_wr_enable = Signal()
+
+        def select_dword(data, addr):
+            return data.word_select(addr[0:2], 64)
+
+        # Use MSB of read addresses to stop the logging
+        comb += log_wr_enable.eq(~(self.log_read_addr_i[31] |
+                                   log_dmi_addr[31]) & self.log_wen_i)
+
+        comb += log_wr.addr.eq(log_wr_ptr)
+        comb += log_wr.data.eq(self.log_data_i)
+        comb += log_wr.en.eq(log_wr_enable)
+        with m.If(log_wr_enable):
+            sync += log_wr_ptr.eq(log_wr_ptr + 1)
+
+        # read port: DMI has priority (for the one cycle of do_dmi_log_rd)
+        with m.If(do_dmi_log_rd):
+            comb += log_rd.addr.eq(log_dmi_addr[2:LOG_INDEX_BITS+2])
+        with m.Else():
+            comb += log_rd.addr.eq(self.log_read_addr_i[2:LOG_INDEX_BITS+2])
+
+        # entry comes out of the read port the cycle after
+        sync += log_dmi_reading.eq(do_dmi_log_rd)
+        with m.If(log_dmi_reading):
+            sync += log_dmi_data.eq(select_dword(log_rd.data, log_dmi_addr))
+        with m.Else():
+            sync += self.log_read_data_o.eq(select_dword(log_rd.data,
+                                                         self.log_read_addr_i))
+
+        comb += self.log_write_addr_o.eq(Cat(log_wr_ptr, Const(1, 1)))
 
         return m
 
-        # TODO: debug logging
-        """
-        maybe_log: with m.If(LOG_LENGTH > 0 generate
-            subtype log_ptr_t is unsigned(LOG_INDEX_BITS - 1 downto 0)
-            type log_array_t is array(0 to LOG_LENGTH - 1) of std_ulogic_vector(255 downto 0)
-            signal log_array    : log_array_t
-            signal log_rd_ptr   : log_ptr_t
-            signal log_wr_ptr   : log_ptr_t
-            signal log_toggle   = Signal()
-            signal log_wr_enable = Signal()
-            signal log_rd_ptr_latched : log_ptr_t
-            signal log_rd       = Signal()_vector(255 downto 0)
-            signal log_dmi_reading = Signal()
-            signal log_dmi_read_done = Signal()
-
-            function select_dword(data = Signal()_vector(255 downto 0)
-                                  addr = Signal()_vector(31 downto 0)) return std_ulogic_vector is
-                variable firstbit : integer
-            begin
-                firstbit := to_integer(unsigned(addr(1 downto 0))) * 64
-                return data(firstbit + 63 downto firstbit)
-            end
-
-            attribute ram_style : string
-            attribute ram_style of log_array : signal is "block"
-            attribute ram_decomp : string
-            attribute ram_decomp of log_array : signal is "power"
-
-        begin
-            # Use MSB of read addresses to stop the logging
-            log_wr_enable.eq(not (self.log_read_addr(31) or log_dmi_addr(31))
-
-            log_ram: process(clk)
-            begin
-                with m.If(rising_edge(clk)):
-                    with m.If(log_wr_enable = '1'):
-                        log_array(to_integer(log_wr_ptr)).eq(self.log_data
-                    end if
-                    log_rd.eq(log_array(to_integer(log_rd_ptr_latched))
-                end if
-            end process
-
-
-            log_buffer: process(clk)
-                variable b : integer
-                variable data = Signal()_vector(255 downto 0)
-            begin
-                with m.If(rising_edge(clk)):
-                    with m.If(rst = '1'):
-                        log_wr_ptr.eq((others => '0')
-                        log_toggle.eq('0'
-                    with m.Elif(log_wr_enable = '1'):
-                        with m.If(log_wr_ptr = to_unsigned(LOG_LENGTH - 1, LOG_INDEX_BITS)):
-                            log_toggle.eq(not log_toggle
-                        end if
-                        log_wr_ptr.eq(log_wr_ptr + 1
-                    end if
-                    with m.If(do_dmi_log_rd = '1'):
-                        log_rd_ptr_latched.eq(unsigned(log_dmi_addr(LOG_INDEX_BITS + 1 downto 2))
-                    else
-                        log_rd_ptr_latched.eq(unsigned(self.log_read_addr(LOG_INDEX_BITS + 1 downto 2))
-                    end if
-                    with m.If(log_dmi_read_done = '1'):
-                        log_dmi_data.eq(select_dword(log_rd, log_dmi_addr)
-                    else
-                        self.log_read_data.eq(select_dword(log_rd, self.log_read_addr)
-                    end if
-                    log_dmi_read_done.eq(log_dmi_reading
-                    log_dmi_reading.eq(do_dmi_log_rd
-                end if
-            end process
-            self.log_write_addr(LOG_INDEX_BITS - 1 downto 0).eq(std_ulogic_vector(log_wr_ptr)
-            self.log_write_addr(LOG_INDEX_BITS).eq('1'
-            self.log_write_addr(31 downto LOG_INDEX_BITS + 1).eq((others => '0')
-        end generate
-
-        """
-
     def __iter__(self):
         yield from self.dmi
         yield self.core_stop_o
@@ -356,11 +461,19 @@ class CoreDebug(Elaboratable):
         yield from self.d_gpr
         yield from self.d_cr
         yield from self.d_xer
+        yield from self.d_pmu
+        yield self.pmu_clear_o
+        yield self.pmu_freeze_o
         yield self.log_data_i
+        yield self.log_wen_i
         yield self.log_read_addr_i
         yield self.log_read_data_o
         yield self.log_write_addr_o
         yield self.terminated_o
+        if self.mem_en:
+            yield from self.wb.fields.values()
+            yield self.mem_req_o
+            yield self.mem_hold_i
 
     def ports(self):
         return list(self)
@@ -60,6 +60,26 @@ def writeread_dmi_addr(dut, dmi_addr, data):
     return (yield from jtag_read_write_reg(dut, DMI_WRRD, 64, data))
 
 
+def dmi_mem_upload(dut, addr, firmware):
+    """uploads firmware through the DMI memory window (CoreDebug mem_spec,
+    issuer_verilog --enable-dmi-mem), rather than over JTAG Wishbone.
+
+    the start address is written once, and the JTAG IR is left at
+    DMI_WRRD: each 64-bit word (two instructions) is then just one DR
+    scan, MEM_ADDR auto-incrementing.
+    """
+    words = []
+    for i in range(0, len(firmware), 2):
+        pair = firmware[i:i+2] + [0]
+        words.append(pair[0] | (pair[1] << 32))
+
+    yield from writeread_dmi_addr(dut, DBGCore.MEM_ADDR, addr)
+    yield from jtag_read_write_reg(dut, DMI_ADDR, 8, DBGCore.MEM_DATA)
+    yield from jtag_set_ir(dut, DMI_WRRD)
+    for val in words:
+        yield from jtag_set_get_dr(dut, 64, val)
+
+
 def jtag_sim(dut, firmware):
     """uploads firmware with the following commands:
     * read IDcode (to check)
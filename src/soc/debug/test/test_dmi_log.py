@@ -0,0 +1,77 @@
+"""test of the CoreDebug instruction trace log, read over DMI
+"""
+
+import unittest
+from nmigen import Module
+from nmigen.back.pysim import Simulator
+from soc.config.waves import write_vcd
+
+from soc.debug.dmi import CoreDebug, DBGCore
+from soc.simple.test.test_runner import set_dmi, get_dmi
+
+
+def log_entry(i):
+    # four distinguishable dwords per entry
+    return sum(((i << 8) | dw) << (dw*64) for dw in range(4))
+
+
+class TestDMILog(unittest.TestCase):
+
+    def test_log(self):
+        m = Module()
+        m.submodules.dbg = dbg = CoreDebug(LOG_LENGTH=8)
+
+        def process():
+            dmi = dbg.dmi
+            yield dbg.log_wen_i.eq(0)
+            addr = yield from get_dmi(dmi, DBGCore.LOG_ADDR)
+            start = (addr >> 32) & 7
+            # log 10 entries, with gaps: the first two are overwritten
+            for i in range(10):
+                yield dbg.log_data_i.eq(log_entry(i))
+                yield dbg.log_wen_i.eq(1)
+                yield
+                yield dbg.log_wen_i.eq(0)
+                yield
+            # stop logging (MSB of the address), then find the write index
+            yield from set_dmi(dmi, DBGCore.LOG_ADDR, 1<<31)
+            addr = yield from get_dmi(dmi, DBGCore.LOG_ADDR)
+            wr_addr = addr >> 32
+            oldest = (start + 10) % 8
+            self.assertEqual(wr_addr, 8 | oldest) # log present, next index
+            # stream out the whole log, oldest first: LOG_ADDR increments
+            yield from set_dmi(dmi, DBGCore.LOG_ADDR, (1<<31) | (oldest<<2))
+            for i in range(2, 10):
+                for dw in range(4):
+                    data = yield from get_dmi(dmi, DBGCore.LOG_DATA)
+                    self.assertEqual(data, (i << 8) | dw,
+                                     "entry %d dword %d" % (i, dw))
+            # nothing was logged while stopped
+            yield dbg.log_wen_i.eq(1)
+            yield
+            yield dbg.log_wen_i.eq(0)
+            addr = yield from get_dmi(dmi, DBGCore.LOG_ADDR)
+            self.assertEqual(addr >> 32, wr_addr)
+            self.assertEqual(addr & 0xffffffff, (1<<31) | (oldest<<2)) # wrap
+            # restart logging
+            yield from set_dmi(dmi, DBGCore.LOG_ADDR, 0)
+            yield dbg.log_data_i.eq(log_entry(10))
+            yield dbg.log_wen_i.eq(1)
+            yield
+            yield dbg.log_wen_i.eq(0)
+            addr = yield from get_dmi(dmi, DBGCore.LOG_ADDR)
+            self.assertEqual(addr >> 32, 8 | ((oldest+1) % 8))
+            yield from set_dmi(dmi, DBGCore.LOG_ADDR,
+                               (1<<31) | (oldest<<2) | 3)
+            data = yield from get_dmi(dmi, DBGCore.LOG_DATA)
+            self.assertEqual(data, (10 << 8) | 3)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(process)
+        with write_vcd(sim, "test_dmi_log.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""test of the CoreDebug DMI memory window, and of the speed of streaming
+(firmware) uploads through it.  also, with a slow (wait-stated) bus, of
+MEM_ADDR being written while a posted write is still going on
+"""
+
+import unittest
+from nmigen import Module, Signal, Memory
+from nmigen.back.pysim import Simulator
+from soc.config.waves import write_vcd
+
+from soc.bus.sram import SRAM
+from soc.debug.dmi import CoreDebug, DBGCore
+from soc.simple.test.test_runner import (set_dmi, get_dmi,
+                                         set_dmi_mem, get_dmi_mem)
+
+
+class MemSpec:
+    addr_wid = 48
+    mask_wid = 8
+    reg_wid = 64
+
+
+class TestDMIMem(unittest.TestCase):
+
+    def setup_mem(self, m, dbg, wait=0):
+        """SRAM on the DMI wishbone, which only sees each request after
+        wait cycles.  returns the Memory
+        """
+        memory = Memory(width=64, depth=64)
+        m.submodules.sram = sram = SRAM(memory=memory, granularity=8)
+        wb, bus = dbg.wb, sram.bus
+        go = Signal()
+        if wait:
+            count = Signal(range(wait+1))
+            with m.If(~wb.cyc | wb.ack):
+                m.d.sync += count.eq(0)
+            with m.Elif(count != wait):
+                m.d.sync += count.eq(count + 1)
+            m.d.comb += go.eq(count == wait)
+        else:
+            m.d.comb += go.eq(1)
+        m.d.comb += [bus.adr.eq(wb.adr),
+                     bus.dat_w.eq(wb.dat_w),
+                     bus.sel.eq(wb.sel),
+                     bus.cyc.eq(wb.cyc & go),
+                     bus.stb.eq(wb.stb & go),
+                     bus.we.eq(wb.we),
+                     wb.dat_r.eq(bus.dat_r),
+                     wb.ack.eq(bus.ack)]
+        return memory
+
+    def test_mem(self):
+        m = Module()
+        m.submodules.dbg = dbg = CoreDebug(mem_spec=MemSpec())
+        memory = self.setup_mem(m, dbg)
+        cycle = Signal(32)
+        m.d.sync += cycle.eq(cycle + 1)
+
+        n_words = 32
+        firmware = [0x0123456789abcdef * (i+1) & ((1<<64)-1)
+                    for i in range(n_words)]
+
+        def process():
+            dmi = dbg.dmi
+            # one word at a time, with full set_dmi handshakes
+            start = yield cycle
+            for i, word in enumerate(firmware):
+                yield from set_dmi(dmi, DBGCore.MEM_ADDR, 0x100 + i*8)
+                yield from set_dmi(dmi, DBGCore.MEM_DATA, ~word)
+            single = (yield cycle) - start
+            self.assertEqual((yield from get_dmi(dmi, DBGCore.MEM_ADDR)),
+                             0x100 + n_words*8)
+            # streamed, address sent once, over the top of the above
+            start = yield cycle
+            yield from set_dmi_mem(dmi, 0x100, firmware)
+            streamed = (yield cycle) - start
+
+            data = yield from get_dmi_mem(dmi, 0x100, n_words)
+            self.assertEqual(data, firmware)
+            for i, word in enumerate(firmware):
+                self.assertEqual((yield memory[0x20+i]), word)
+            # single word read
+            yield from set_dmi(dmi, DBGCore.MEM_ADDR, 0x108)
+            data = yield from get_dmi(dmi, DBGCore.MEM_DATA)
+            self.assertEqual(data, firmware[1])
+
+            # words/second at a 100 MHz DMI clock
+            for name, cycles in (("single", single), ("streamed", streamed)):
+                print("%s: %d words in %d cycles, %.1f Mwords/s @ 100MHz" %
+                      (name, n_words, cycles, n_words*100.0/cycles))
+            self.assertLess(streamed*2, single)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(process)
+        with write_vcd(sim, "test_dmi_mem.vcd"):
+            sim.run()
+
+    def test_mem_addr_busy(self):
+        m = Module()
+        m.submodules.dbg = dbg = CoreDebug(mem_spec=MemSpec())
+        memory = self.setup_mem(m, dbg, wait=4)
+
+        def process():
+            dmi = dbg.dmi
+            # each MEM_ADDR comes while the posted write before it is
+            # still waiting on the bus: it must go to the old address
+            for i, addr in enumerate((0x40, 0x88, 0x10, 0x18)):
+                yield from set_dmi(dmi, DBGCore.MEM_ADDR, addr)
+                yield from set_dmi(dmi, DBGCore.MEM_DATA, 0x1000+i)
+            yield from set_dmi_mem(dmi, 0x60, [0x2000, 0x2001])
+            self.assertEqual((yield from get_dmi(dmi, DBGCore.MEM_ADDR)),
+                             0x70)
+            while (yield dbg.wb.cyc): # the last write is posted
+                yield
+            for addr, word in ((0x40, 0x1000), (0x88, 0x1001),
+                               (0x10, 0x1002), (0x18, 0x1003),
+                               (0x60, 0x2000), (0x68, 0x2001)):
+                self.assertEqual((yield memory[addr//8]), word,
+                                 "addr %x" % addr)
+            # only those words were written
+            for i in range(memory.depth):
+                if i*8 not in (0x40, 0x88, 0x10, 0x18, 0x60, 0x68):
+                    self.assertEqual((yield memory[i]), 0, "addr %x" % (i*8))
+            data = yield from get_dmi_mem(dmi, 0x10, 2)
+            self.assertEqual(data, [0x1002, 0x1003])
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(process)
+        with write_vcd(sim, "test_dmi_mem_addr_busy.vcd"):
+            sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,7 +24,8 @@ sys.setrecursionlimit(1000000)
 
 from enum import Enum, unique
 
-from nmigen import Module, Signal, Elaboratable, Cat, Repl, Array, Const
+from nmigen import (Module, Signal, Elaboratable, Cat, Repl, Array, Const,
+                    Mux)
 from nmutil.util import Display
 
 from copy import deepcopy
@@ -35,6 +36,7 @@ from nmutil.iocontrol import RecordObject
 from nmigen.utils import log2_int
 from soc.experiment.mem_types import (LoadStore1ToDCacheType,
                                      DCacheToLoadStore1Type,
+                                     DCacheEventType,
                                      MMUToDCacheType,
                                      DCacheToMMUType)
 
@@ -58,9 +60,12 @@ from nmigen.cli import rtlil
 from nmutil.sim_tmp_alternative import Simulator
 
 from nmutil.util import wrap
+from soc.config.simlog import get_logger
 
+log = get_logger("dcache")
 
-# TODO: make these parameters of DCache at some point
+
+# Default geometry.  these are parameters of DCache (and DCacheConfig)
 LINE_SIZE = 64    # Line size in bytes
 NUM_LINES = 16    # Number of lines in a set
 NUM_WAYS = 4      # Number of ways
@@ -69,66 +74,6 @@ TLB_NUM_WAYS = 2  # L1 DTLB number of sets
 TLB_LG_PGSZ = 12  # L1 DTLB log_2(page_size)
 LOG_LENGTH = 0    # Non-zero to enable log data collection
 
-# BRAM organisation: We never access more than
-#     -- WB_DATA_BITS at a time so to save
-#     -- resources we make the array only that wide, and
-#     -- use consecutive indices for to make a cache "line"
-#     --
-#     -- ROW_SIZE is the width in bytes of the BRAM
-#     -- (based on WB, so 64-bits)
-ROW_SIZE = WB_DATA_BITS // 8;
-
-# ROW_PER_LINE is the number of row (wishbone
-# transactions) in a line
-ROW_PER_LINE = LINE_SIZE // ROW_SIZE
-
-# BRAM_ROWS is the number of rows in BRAM needed
-# to represent the full dcache
-BRAM_ROWS = NUM_LINES * ROW_PER_LINE
-
-print ("ROW_SIZE", ROW_SIZE)
-print ("ROW_PER_LINE", ROW_PER_LINE)
-print ("BRAM_ROWS", BRAM_ROWS)
-print ("NUM_WAYS", NUM_WAYS)
-
-# Bit fields counts in the address
-
-# REAL_ADDR_BITS is the number of real address
-# bits that we store
-REAL_ADDR_BITS = 56
-
-# ROW_BITS is the number of bits to select a row
-ROW_BITS = log2_int(BRAM_ROWS)
-
-# ROW_LINE_BITS is the number of bits to select
-# a row within a line
-ROW_LINE_BITS = log2_int(ROW_PER_LINE)
-
-# LINE_OFF_BITS is the number of bits for
-# the offset in a cache line
-LINE_OFF_BITS = log2_int(LINE_SIZE)
-
-# ROW_OFF_BITS is the number of bits for
-# the offset in a row
-ROW_OFF_BITS = log2_int(ROW_SIZE)
-
-# INDEX_BITS is the number if bits to
-# select a cache line
-INDEX_BITS = log2_int(NUM_LINES)
-
-# SET_SIZE_BITS is the log base 2 of the set size
-SET_SIZE_BITS = LINE_OFF_BITS + INDEX_BITS
-
-# TAG_BITS is the number of bits of
-# the tag part of the address
-TAG_BITS = REAL_ADDR_BITS - SET_SIZE_BITS
-
-# TAG_WIDTH is the width in bits of each way of the tag RAM
-TAG_WIDTH = TAG_BITS + 7 - ((TAG_BITS + 7) % 8)
-
-# WAY_BITS is the number of bits to select a way
-WAY_BITS = log2_int(NUM_WAYS)
-
 # Example of layout for 32 lines of 64 bytes:
 layout = """\
   ..  tag    |index|  line  |
@@ -140,143 +85,240 @@ layout = """\
   ..         |-----|        | INDEX_BITS    (5)
   .. --------|              | TAG_BITS      (45)
 """
-print (layout)
-print ("Dcache TAG %d IDX %d ROW_BITS %d ROFF %d LOFF %d RLB %d" % \
-            (TAG_BITS, INDEX_BITS, ROW_BITS,
-             ROW_OFF_BITS, LINE_OFF_BITS, ROW_LINE_BITS))
-print ("index @: %d-%d" % (LINE_OFF_BITS, SET_SIZE_BITS))
-print ("row @: %d-%d" % (LINE_OFF_BITS, ROW_OFF_BITS))
-print ("tag @: %d-%d width %d" % (SET_SIZE_BITS, REAL_ADDR_BITS, TAG_WIDTH))
-
-TAG_RAM_WIDTH = TAG_WIDTH * NUM_WAYS
-
-print ("TAG_RAM_WIDTH", TAG_RAM_WIDTH)
-
-def CacheTagArray():
-    return Array(Signal(TAG_RAM_WIDTH, name="cachetag_%d" % x) \
-                        for x in range(NUM_LINES))
-
-def CacheValidBitsArray():
-    return Array(Signal(NUM_WAYS, name="cachevalid_%d" % x) \
-                        for x in range(NUM_LINES))
-
-def RowPerLineValidArray():
-    return Array(Signal(name="rows_valid%d" % x) \
-                        for x in range(ROW_PER_LINE))
-
-# L1 TLB
-TLB_SET_BITS     = log2_int(TLB_SET_SIZE)
-TLB_WAY_BITS     = log2_int(TLB_NUM_WAYS)
-TLB_EA_TAG_BITS  = 64 - (TLB_LG_PGSZ + TLB_SET_BITS)
-TLB_TAG_WAY_BITS = TLB_NUM_WAYS * TLB_EA_TAG_BITS
-TLB_PTE_BITS     = 64
-TLB_PTE_WAY_BITS = TLB_NUM_WAYS * TLB_PTE_BITS;
+
 
 def ispow2(x):
     return (1<<log2_int(x, False)) == x
 
-assert (LINE_SIZE % ROW_SIZE) == 0, "LINE_SIZE not multiple of ROW_SIZE"
-assert ispow2(LINE_SIZE), "LINE_SIZE not power of 2"
-assert ispow2(NUM_LINES), "NUM_LINES not power of 2"
-assert ispow2(ROW_PER_LINE), "ROW_PER_LINE not power of 2"
-assert ROW_BITS == (INDEX_BITS + ROW_LINE_BITS), "geometry bits don't add up"
-assert (LINE_OFF_BITS == ROW_OFF_BITS + ROW_LINE_BITS), \
-        "geometry bits don't add up"
-assert REAL_ADDR_BITS == (TAG_BITS + INDEX_BITS + LINE_OFF_BITS), \
-        "geometry bits don't add up"
-assert REAL_ADDR_BITS == (TAG_BITS + ROW_BITS + ROW_OFF_BITS), \
-         "geometry bits don't add up"
-assert 64 == WB_DATA_BITS, "Can't yet handle wb width that isn't 64-bits"
-assert SET_SIZE_BITS <= TLB_LG_PGSZ, "Set indexed by virtual address"
-
-
-def TLBValidBitsArray():
-    return Array(Signal(TLB_NUM_WAYS, name="tlbvalid%d" % x) \
-                for x in range(TLB_SET_SIZE))
-
-def TLBTagEAArray():
-    return Array(Signal(TLB_EA_TAG_BITS, name="tlbtagea%d" % x) \
-                for x in range (TLB_NUM_WAYS))
-
-def TLBTagsArray():
-    return Array(Signal(TLB_TAG_WAY_BITS, name="tlbtags%d" % x) \
-                for x in range (TLB_SET_SIZE))
-
-def TLBPtesArray():
-    return Array(Signal(TLB_PTE_WAY_BITS, name="tlbptes%d" % x) \
-                for x in range(TLB_SET_SIZE))
-
-def HitWaySet():
-    return Array(Signal(WAY_BITS, name="hitway_%d" % x) \
-                        for x in range(TLB_NUM_WAYS))
-
-# Cache RAM interface
-def CacheRamOut():
-    return Array(Signal(WB_DATA_BITS, name="cache_out%d" % x) \
-                 for x in range(NUM_WAYS))
-
-# PLRU output interface
-def PLRUOut():
-    return Array(Signal(WAY_BITS, name="plru_out%d" % x) \
-                for x in range(NUM_LINES))
-
-# TLB PLRU output interface
-def TLBPLRUOut():
-    return Array(Signal(TLB_WAY_BITS, name="tlbplru_out%d" % x) \
-                for x in range(TLB_SET_SIZE))
-
-# Helper functions to decode incoming requests
-#
-# Return the cache line index (tag index) for an address
-def get_index(addr):
-    return addr[LINE_OFF_BITS:SET_SIZE_BITS]
 
-# Return the cache row index (data memory) for an address
-def get_row(addr):
-    return addr[ROW_OFF_BITS:SET_SIZE_BITS]
+class DCacheConfig:
+    """DCache geometry: the sizes of the cache and of the L1 DTLB
 
-# Return the index of a row within a line
-def get_row_of_line(row):
-    return row[:ROW_BITS][:ROW_LINE_BITS]
+    everything else (bit-field widths of the address, BRAM organisation)
+    is derived from these.  DCache inherits from this class, and the
+    Records and sub-modules used by DCache are handed an instance of it.
 
-# Returns whether this is the last row of a line
-def is_last_row_addr(addr, last):
-    return addr[ROW_OFF_BITS:LINE_OFF_BITS] == last
+    * :line_size:    line size in bytes
+    * :num_lines:    number of lines in a set
+    * :num_ways:     number of ways
+    * :tlb_set_size: L1 DTLB entries per set
+    * :tlb_num_ways: L1 DTLB number of sets
+    * :tlb_lg_pgsz:  L1 DTLB log_2(page_size)
+    """
+    def __init__(self, line_size=LINE_SIZE, num_lines=NUM_LINES,
+                       num_ways=NUM_WAYS, tlb_set_size=TLB_SET_SIZE,
+                       tlb_num_ways=TLB_NUM_WAYS, tlb_lg_pgsz=TLB_LG_PGSZ):
+        self.LINE_SIZE = line_size
+        self.NUM_LINES = num_lines
+        self.NUM_WAYS = num_ways
+        self.TLB_SET_SIZE = tlb_set_size
+        self.TLB_NUM_WAYS = tlb_num_ways
+        self.TLB_LG_PGSZ = tlb_lg_pgsz
+
+        # BRAM organisation: We never access more than
+        #     -- WB_DATA_BITS at a time so to save
+        #     -- resources we make the array only that wide, and
+        #     -- use consecutive indices for to make a cache "line"
+        #     --
+        #     -- ROW_SIZE is the width in bytes of the BRAM
+        #     -- (based on WB, so 64-bits)
+        self.ROW_SIZE = WB_DATA_BITS // 8;
+
+        # ROW_PER_LINE is the number of row (wishbone
+        # transactions) in a line
+        self.ROW_PER_LINE = self.LINE_SIZE // self.ROW_SIZE
+
+        # BRAM_ROWS is the number of rows in BRAM needed
+        # to represent the full dcache
+        self.BRAM_ROWS = self.NUM_LINES * self.ROW_PER_LINE
+
+        log.debug("ROW_SIZE %s", self.ROW_SIZE)
+        log.debug("ROW_PER_LINE %s", self.ROW_PER_LINE)
+        log.debug("BRAM_ROWS %s", self.BRAM_ROWS)
+        log.debug("NUM_WAYS %s", self.NUM_WAYS)
+
+        # Bit fields counts in the address
+
+        # REAL_ADDR_BITS is the number of real address
+        # bits that we store
+        self.REAL_ADDR_BITS = 56
+
+        # ROW_BITS is the number of bits to select a row
+        self.ROW_BITS = log2_int(self.BRAM_ROWS)
+
+        # ROW_LINE_BITS is the number of bits to select
+        # a row within a line
+        self.ROW_LINE_BITS = log2_int(self.ROW_PER_LINE)
+
+        # LINE_OFF_BITS is the number of bits for
+        # the offset in a cache line
+        self.LINE_OFF_BITS = log2_int(self.LINE_SIZE)
+
+        # ROW_OFF_BITS is the number of bits for
+        # the offset in a row
+        self.ROW_OFF_BITS = log2_int(self.ROW_SIZE)
+
+        # INDEX_BITS is the number if bits to
+        # select a cache line
+        self.INDEX_BITS = log2_int(self.NUM_LINES)
+
+        # SET_SIZE_BITS is the log base 2 of the set size
+        self.SET_SIZE_BITS = self.LINE_OFF_BITS + self.INDEX_BITS
+
+        # TAG_BITS is the number of bits of
+        # the tag part of the address
+        self.TAG_BITS = self.REAL_ADDR_BITS - self.SET_SIZE_BITS
+
+        # TAG_WIDTH is the width in bits of each way of the tag RAM
+        self.TAG_WIDTH = self.TAG_BITS + 7 - ((self.TAG_BITS + 7) % 8)
+
+        # WAY_BITS is the number of bits to select a way
+        self.WAY_BITS = log2_int(self.NUM_WAYS)
+
+        log.debug("%s", layout)
+        log.debug("Dcache TAG %d IDX %d ROW_BITS %d ROFF %d LOFF %d RLB %d",
+                  self.TAG_BITS, self.INDEX_BITS, self.ROW_BITS,
+                  self.ROW_OFF_BITS, self.LINE_OFF_BITS, self.ROW_LINE_BITS)
+        log.debug("index @: %d-%d", self.LINE_OFF_BITS, self.SET_SIZE_BITS)
+        log.debug("row @: %d-%d", self.LINE_OFF_BITS, self.ROW_OFF_BITS)
+        log.debug("tag @: %d-%d width %d", self.SET_SIZE_BITS,
+                  self.REAL_ADDR_BITS, self.TAG_WIDTH)
+
+        self.TAG_RAM_WIDTH = self.TAG_WIDTH * self.NUM_WAYS
+
+        log.debug("TAG_RAM_WIDTH %s", self.TAG_RAM_WIDTH)
+
+        # L1 TLB
+        self.TLB_SET_BITS     = log2_int(self.TLB_SET_SIZE)
+        self.TLB_WAY_BITS     = log2_int(self.TLB_NUM_WAYS)
+        self.TLB_EA_TAG_BITS  = 64 - (self.TLB_LG_PGSZ + self.TLB_SET_BITS)
+        self.TLB_TAG_WAY_BITS = self.TLB_NUM_WAYS * self.TLB_EA_TAG_BITS
+        self.TLB_PTE_BITS     = 64
+        self.TLB_PTE_WAY_BITS = self.TLB_NUM_WAYS * self.TLB_PTE_BITS;
+
+        assert (self.LINE_SIZE % self.ROW_SIZE) == 0, \
+                "LINE_SIZE not multiple of ROW_SIZE"
+        assert ispow2(self.LINE_SIZE), "LINE_SIZE not power of 2"
+        assert ispow2(self.NUM_LINES), "NUM_LINES not power of 2"
+        assert ispow2(self.NUM_WAYS), "NUM_WAYS not power of 2"
+        assert ispow2(self.ROW_PER_LINE), "ROW_PER_LINE not power of 2"
+        assert ispow2(self.TLB_SET_SIZE), "TLB_SET_SIZE not power of 2"
+        assert ispow2(self.TLB_NUM_WAYS), "TLB_NUM_WAYS not power of 2"
+        assert self.ROW_BITS == (self.INDEX_BITS + self.ROW_LINE_BITS), \
+                "geometry bits don't add up"
+        assert (self.LINE_OFF_BITS ==
+                self.ROW_OFF_BITS + self.ROW_LINE_BITS), \
+                "geometry bits don't add up"
+        assert self.REAL_ADDR_BITS == (self.TAG_BITS + self.INDEX_BITS +
+                                       self.LINE_OFF_BITS), \
+                "geometry bits don't add up"
+        assert self.REAL_ADDR_BITS == (self.TAG_BITS + self.ROW_BITS +
+                                       self.ROW_OFF_BITS), \
+                 "geometry bits don't add up"
+        assert 64 == WB_DATA_BITS, \
+                "Can't yet handle wb width that isn't 64-bits"
+        assert self.SET_SIZE_BITS <= self.TLB_LG_PGSZ, \
+                "Set indexed by virtual address"
+
+    def CacheTagArray(self):
+        return Array(Signal(self.TAG_RAM_WIDTH, name="cachetag_%d" % x) \
+                            for x in range(self.NUM_LINES))
+
+    def CacheValidBitsArray(self):
+        return Array(Signal(self.NUM_WAYS, name="cachevalid_%d" % x) \
+                            for x in range(self.NUM_LINES))
+
+    def RowPerLineValidArray(self):
+        return Array(Signal(name="rows_valid%d" % x) \
+                            for x in range(self.ROW_PER_LINE))
+
+    def TLBValidBitsArray(self):
+        return Array(Signal(self.TLB_NUM_WAYS, name="tlbvalid%d" % x) \
+                    for x in range(self.TLB_SET_SIZE))
+
+    def TLBTagEAArray(self):
+        return Array(Signal(self.TLB_EA_TAG_BITS, name="tlbtagea%d" % x) \
+                    for x in range (self.TLB_NUM_WAYS))
+
+    def TLBTagsArray(self):
+        return Array(Signal(self.TLB_TAG_WAY_BITS, name="tlbtags%d" % x) \
+                    for x in range (self.TLB_SET_SIZE))
+
+    def TLBPtesArray(self):
+        return Array(Signal(self.TLB_PTE_WAY_BITS, name="tlbptes%d" % x) \
+                    for x in range(self.TLB_SET_SIZE))
+
+    def HitWaySet(self):
+        return Array(Signal(self.WAY_BITS, name="hitway_%d" % x) \
+                            for x in range(self.TLB_NUM_WAYS))
+
+    # Cache RAM interface
+    def CacheRamOut(self):
+        return Array(Signal(WB_DATA_BITS, name="cache_out%d" % x) \
+                     for x in range(self.NUM_WAYS))
+
+    # PLRU output interface
+    def PLRUOut(self):
+        return Array(Signal(self.WAY_BITS, name="plru_out%d" % x) \
+                    for x in range(self.NUM_LINES))
+
+    # TLB PLRU output interface
+    def TLBPLRUOut(self):
+        return Array(Signal(self.TLB_WAY_BITS, name="tlbplru_out%d" % x) \
+                    for x in range(self.TLB_SET_SIZE))
+
+    # Helper functions to decode incoming requests
+    #
+    # Return the cache line index (tag index) for an address
+    def get_index(self, addr):
+        return addr[self.LINE_OFF_BITS:self.SET_SIZE_BITS]
 
-# Returns whether this is the last row of a line
-def is_last_row(row, last):
-    return get_row_of_line(row) == last
+    # Return the cache row index (data memory) for an address
+    def get_row(self, addr):
+        return addr[self.ROW_OFF_BITS:self.SET_SIZE_BITS]
 
-# Return the next row in the current cache line. We use a
-# dedicated function in order to limit the size of the
-# generated adder to be only the bits within a cache line
-# (3 bits with default settings)
-def next_row(row):
-    row_v = row[0:ROW_LINE_BITS] + 1
-    return Cat(row_v[:ROW_LINE_BITS], row[ROW_LINE_BITS:])
+    # Return the index of a row within a line
+    def get_row_of_line(self, row):
+        return row[:self.ROW_BITS][:self.ROW_LINE_BITS]
 
-# Get the tag value from the address
-def get_tag(addr):
-    return addr[SET_SIZE_BITS:REAL_ADDR_BITS]
+    # Returns whether this is the last row of a line
+    def is_last_row_addr(self, addr, last):
+        return addr[self.ROW_OFF_BITS:self.LINE_OFF_BITS] == last
 
-# Read a tag from a tag memory row
-def read_tag(way, tagset):
-    return tagset.word_select(way, TAG_WIDTH)[:TAG_BITS]
+    # Returns whether this is the last row of a line
+    def is_last_row(self, row, last):
+        return self.get_row_of_line(row) == last
 
-# Read a TLB tag from a TLB tag memory row
-def read_tlb_tag(way, tags):
-    return tags.word_select(way, TLB_EA_TAG_BITS)
+    # Return the next row in the current cache line. We use a
+    # dedicated function in order to limit the size of the
+    # generated adder to be only the bits within a cache line
+    # (3 bits with default settings)
+    def next_row(self, row):
+        row_v = row[0:self.ROW_LINE_BITS] + 1
+        return Cat(row_v[:self.ROW_LINE_BITS], row[self.ROW_LINE_BITS:])
 
-# Write a TLB tag to a TLB tag memory row
-def write_tlb_tag(way, tags, tag):
-    return read_tlb_tag(way, tags).eq(tag)
+    # Get the tag value from the address
+    def get_tag(self, addr):
+        return addr[self.SET_SIZE_BITS:self.REAL_ADDR_BITS]
 
-# Read a PTE from a TLB PTE memory row
-def read_tlb_pte(way, ptes):
-    return ptes.word_select(way, TLB_PTE_BITS)
+    # Read a tag from a tag memory row
+    def read_tag(self, way, tagset):
+        return tagset.word_select(way, self.TAG_WIDTH)[:self.TAG_BITS]
 
-def write_tlb_pte(way, ptes, newpte):
-    return read_tlb_pte(way, ptes).eq(newpte)
+    # Read a TLB tag from a TLB tag memory row
+    def read_tlb_tag(self, way, tags):
+        return tags.word_select(way, self.TLB_EA_TAG_BITS)
+
+    # Write a TLB tag to a TLB tag memory row
+    def write_tlb_tag(self, way, tags, tag):
+        return self.read_tlb_tag(way, tags).eq(tag)
+
+    # Read a PTE from a TLB PTE memory row
+    def read_tlb_pte(self, way, ptes):
+        return ptes.word_select(way, self.TLB_PTE_BITS)
+
+    def write_tlb_pte(self, way, ptes, newpte):
+        return self.read_tlb_pte(way, ptes).eq(newpte)
 
 
 # Record for storing permission, attribute, etc. bits from a PTE
@@ -347,47 +389,49 @@ class RegStage0(RecordObject):
 
 
 class MemAccessRequest(RecordObject):
-    def __init__(self, name=None):
+    def __init__(self, cfg, name=None):
         super().__init__(name=name)
         self.op        = Signal(Op)
         self.valid     = Signal()
         self.dcbz      = Signal()
-        self.real_addr = Signal(REAL_ADDR_BITS)
+        self.real_addr = Signal(cfg.REAL_ADDR_BITS)
         self.data      = Signal(64)
         self.byte_sel  = Signal(8)
-        self.hit_way   = Signal(WAY_BITS)
+        self.hit_way   = Signal(cfg.WAY_BITS)
         self.same_tag  = Signal()
         self.mmu_req   = Signal()
+        self.id        = Signal(4)
 
 
 # First stage register, contains state for stage 1 of load hits
 # and for the state machine used by all other operations
 class RegStage1(RecordObject):
-    def __init__(self, name=None):
+    def __init__(self, cfg, name=None):
         super().__init__(name=name)
         # Info about the request
         self.full             = Signal() # have uncompleted request
         self.mmu_req          = Signal() # request is from MMU
-        self.req              = MemAccessRequest(name="reqmem")
+        self.req              = MemAccessRequest(cfg, name="reqmem")
 
         # Cache hit state
-        self.hit_way          = Signal(WAY_BITS)
+        self.hit_way          = Signal(cfg.WAY_BITS)
         self.hit_load_valid   = Signal()
-        self.hit_index        = Signal(INDEX_BITS)
+        self.hit_index        = Signal(cfg.INDEX_BITS)
         self.cache_hit        = Signal()
+        self.hit_id           = Signal(4)
 
         # TLB hit state
         self.tlb_hit          = Signal()
-        self.tlb_hit_way      = Signal(TLB_NUM_WAYS)
-        self.tlb_hit_index    = Signal(TLB_WAY_BITS)
+        self.tlb_hit_way      = Signal(cfg.TLB_NUM_WAYS)
+        self.tlb_hit_index    = Signal(cfg.TLB_WAY_BITS)
 
         # 2-stage data buffer for data forwarded from writes to reads
         self.forward_data1    = Signal(64)
         self.forward_data2    = Signal(64)
         self.forward_sel1     = Signal(8)
         self.forward_valid1   = Signal()
-        self.forward_way1     = Signal(WAY_BITS)
-        self.forward_row1     = Signal(ROW_BITS)
+        self.forward_way1     = Signal(cfg.WAY_BITS)
+        self.forward_row1     = Signal(cfg.ROW_BITS)
         self.use_forward1     = Signal()
         self.forward_sel      = Signal(8)
 
@@ -398,12 +442,12 @@ class RegStage1(RecordObject):
         self.write_tag        = Signal()
         self.slow_valid       = Signal()
         self.wb               = WBMasterOut("wb")
-        self.reload_tag       = Signal(TAG_BITS)
-        self.store_way        = Signal(WAY_BITS)
-        self.store_row        = Signal(ROW_BITS)
-        self.store_index      = Signal(INDEX_BITS)
-        self.end_row_ix       = Signal(ROW_LINE_BITS)
-        self.rows_valid       = RowPerLineValidArray()
+        self.reload_tag       = Signal(cfg.TAG_BITS)
+        self.store_way        = Signal(cfg.WAY_BITS)
+        self.store_row        = Signal(cfg.ROW_BITS)
+        self.store_index      = Signal(cfg.INDEX_BITS)
+        self.end_row_ix       = Signal(cfg.ROW_LINE_BITS)
+        self.rows_valid       = cfg.RowPerLineValidArray()
         self.acks_pending     = Signal(3)
         self.inc_acks         = Signal()
         self.dec_acks         = Signal()
@@ -421,42 +465,61 @@ class RegStage1(RecordObject):
 
 # Reservation information
 class Reservation(RecordObject):
-    def __init__(self):
+    def __init__(self, cfg):
         super().__init__()
         self.valid = Signal()
-        self.addr  = Signal(64-LINE_OFF_BITS)
+        self.addr  = Signal(64-cfg.LINE_OFF_BITS)
+
+
+# Miss Status Holding Register: a load miss waiting for its line to be
+# reloaded.  once its row has arrived it is replayed through stage 0,
+# where it hits.
+class MSHREntry(RecordObject):
+    def __init__(self, cfg, name=None):
+        super().__init__(name=name)
+        self.valid     = Signal()
+        self.issued    = Signal() # reload of the line has been started
+        self.addr      = Signal(64)
+        self.real_addr = Signal(cfg.REAL_ADDR_BITS)
+        self.byte_sel  = Signal(8)
+        self.virt_mode = Signal()
+        self.priv_mode = Signal()
+        self.id        = Signal(4)
 
 
 class DTLBUpdate(Elaboratable):
-    def __init__(self):
+    def __init__(self, cfg):
+        self.cfg = cfg
         self.tlbie    = Signal()
         self.tlbwe    = Signal()
         self.doall    = Signal()
         self.updated  = Signal()
         self.v_updated  = Signal()
         self.tlb_hit    = Signal()
-        self.tlb_req_index = Signal(TLB_SET_BITS)
+        self.tlb_req_index = Signal(cfg.TLB_SET_BITS)
 
-        self.tlb_hit_way     = Signal(TLB_WAY_BITS)
-        self.tlb_tag_way     = Signal(TLB_TAG_WAY_BITS)
-        self.tlb_pte_way     = Signal(TLB_PTE_WAY_BITS)
-        self.repl_way        = Signal(TLB_WAY_BITS)
-        self.eatag           = Signal(TLB_EA_TAG_BITS)
-        self.pte_data        = Signal(TLB_PTE_BITS)
+        self.tlb_hit_way     = Signal(cfg.TLB_WAY_BITS)
+        self.tlb_tag_way     = Signal(cfg.TLB_TAG_WAY_BITS)
+        self.tlb_pte_way     = Signal(cfg.TLB_PTE_WAY_BITS)
+        self.repl_way        = Signal(cfg.TLB_WAY_BITS)
+        self.eatag           = Signal(cfg.TLB_EA_TAG_BITS)
+        self.pte_data        = Signal(cfg.TLB_PTE_BITS)
 
-        self.dv = Signal(TLB_NUM_WAYS) # tlb_way_valids_t
+        self.dv = Signal(cfg.TLB_NUM_WAYS) # tlb_way_valids_t
 
-        self.tb_out = Signal(TLB_TAG_WAY_BITS) # tlb_way_tags_t
-        self.db_out = Signal(TLB_NUM_WAYS)     # tlb_way_valids_t
-        self.pb_out = Signal(TLB_PTE_WAY_BITS) # tlb_way_ptes_t
+        self.tb_out = Signal(cfg.TLB_TAG_WAY_BITS) # tlb_way_tags_t
+        self.db_out = Signal(cfg.TLB_NUM_WAYS)     # tlb_way_valids_t
+        self.pb_out = Signal(cfg.TLB_PTE_WAY_BITS) # tlb_way_ptes_t
 
     def elaborate(self, platform):
         m = Module()
         comb = m.d.comb
         sync = m.d.sync
 
-        tagset   = Signal(TLB_TAG_WAY_BITS)
-        pteset   = Signal(TLB_PTE_WAY_BITS)
+        cfg = self.cfg
+
+        tagset   = Signal(cfg.TLB_TAG_WAY_BITS)
+        pteset   = Signal(cfg.TLB_PTE_WAY_BITS)
 
         tb_out, pb_out, db_out = self.tb_out, self.pb_out, self.db_out
         comb += db_out.eq(self.dv)
@@ -471,11 +534,11 @@ class DTLBUpdate(Elaboratable):
         with m.Elif(self.tlbwe):
 
             comb += tagset.eq(self.tlb_tag_way)
-            comb += write_tlb_tag(self.repl_way, tagset, self.eatag)
+            comb += cfg.write_tlb_tag(self.repl_way, tagset, self.eatag)
             comb += tb_out.eq(tagset)
 
             comb += pteset.eq(self.tlb_pte_way)
-            comb += write_tlb_pte(self.repl_way, pteset, self.pte_data)
+            comb += cfg.write_tlb_pte(self.repl_way, pteset, self.pte_data)
             comb += pb_out.eq(pteset)
 
             comb += db_out.bit_select(self.repl_way, 1).eq(1)
@@ -488,19 +551,20 @@ class DTLBUpdate(Elaboratable):
 
 class DCachePendingHit(Elaboratable):
 
-    def __init__(self, tlb_pte_way, tlb_valid_way, tlb_hit_way,
+    def __init__(self, cfg, tlb_pte_way, tlb_valid_way, tlb_hit_way,
                       cache_i_validdx, cache_tag_set,
                     req_addr,
                     hit_set):
+        self.cfg = cfg
 
         self.go          = Signal()
         self.virt_mode   = Signal()
         self.is_hit      = Signal()
         self.tlb_hit     = Signal()
-        self.hit_way     = Signal(WAY_BITS)
+        self.hit_way     = Signal(cfg.WAY_BITS)
         self.rel_match   = Signal()
-        self.req_index   = Signal(INDEX_BITS)
-        self.reload_tag  = Signal(TAG_BITS)
+        self.req_index   = Signal(cfg.INDEX_BITS)
+        self.reload_tag  = Signal(cfg.TAG_BITS)
 
         self.tlb_hit_way = tlb_hit_way
         self.tlb_pte_way = tlb_pte_way
@@ -515,6 +579,7 @@ class DCachePendingHit(Elaboratable):
         comb = m.d.comb
         sync = m.d.sync
 
+        cfg = self.cfg
         go = self.go
         virt_mode = self.virt_mode
         is_hit = self.is_hit
@@ -532,8 +597,8 @@ class DCachePendingHit(Elaboratable):
         reload_tag = self.reload_tag
 
         rel_matches = Array(Signal(name="rel_matches_%d" % i) \
-                                    for i in range(TLB_NUM_WAYS))
-        hit_way_set = HitWaySet()
+                                    for i in range(cfg.TLB_NUM_WAYS))
+        hit_way_set = cfg.HitWaySet()
 
         # Test if pending request is a hit on any way
         # In order to make timing in virtual mode,
@@ -542,20 +607,21 @@ class DCachePendingHit(Elaboratable):
         # the TLB, and then decide later which match to use.
 
         with m.If(virt_mode):
-            for j in range(TLB_NUM_WAYS): # tlb_num_way_t
-                s_tag       = Signal(TAG_BITS, name="s_tag%d" % j)
+            for j in range(cfg.TLB_NUM_WAYS): # tlb_num_way_t
+                s_tag       = Signal(cfg.TAG_BITS, name="s_tag%d" % j)
                 s_hit       = Signal()
-                s_pte       = Signal(TLB_PTE_BITS)
-                s_ra        = Signal(REAL_ADDR_BITS)
-                comb += s_pte.eq(read_tlb_pte(j, tlb_pte_way))
-                comb += s_ra.eq(Cat(req_addr[0:TLB_LG_PGSZ],
-                                    s_pte[TLB_LG_PGSZ:REAL_ADDR_BITS]))
-                comb += s_tag.eq(get_tag(s_ra))
-
-                for i in range(NUM_WAYS): # way_t
+                s_pte       = Signal(cfg.TLB_PTE_BITS)
+                s_ra        = Signal(cfg.REAL_ADDR_BITS)
+                comb += s_pte.eq(cfg.read_tlb_pte(j, tlb_pte_way))
+                comb += s_ra.eq(Cat(req_addr[0:cfg.TLB_LG_PGSZ],
+                                    s_pte[cfg.TLB_LG_PGSZ:
+                                          cfg.REAL_ADDR_BITS]))
+                comb += s_tag.eq(cfg.get_tag(s_ra))
+
+                for i in range(cfg.NUM_WAYS): # way_t
                     is_tag_hit = Signal(name="is_tag_hit_%d_%d" % (j, i))
                     comb += is_tag_hit.eq(go & cache_i_validdx[i] &
-                                  (read_tag(i, cache_tag_set) == s_tag)
+                                  (cfg.read_tag(i, cache_tag_set) == s_tag)
                                   & tlb_valid_way[j])
                     with m.If(is_tag_hit):
                         comb += hit_way_set[j].eq(i)
@@ -568,12 +634,12 @@ class DCachePendingHit(Elaboratable):
                 comb += hit_way.eq(hit_way_set[tlb_hit_way])
                 comb += rel_match.eq(rel_matches[tlb_hit_way])
         with m.Else():
-            s_tag       = Signal(TAG_BITS)
-            comb += s_tag.eq(get_tag(req_addr))
-            for i in range(NUM_WAYS): # way_t
+            s_tag       = Signal(cfg.TAG_BITS)
+            comb += s_tag.eq(cfg.get_tag(req_addr))
+            for i in range(cfg.NUM_WAYS): # way_t
                 is_tag_hit = Signal(name="is_tag_hit_%d" % i)
                 comb += is_tag_hit.eq(go & cache_i_validdx[i] &
-                          (read_tag(i, cache_tag_set) == s_tag))
+                          (cfg.read_tag(i, cache_tag_set) == s_tag))
                 with m.If(is_tag_hit):
                     comb += hit_way.eq(i)
                     comb += is_hit.eq(1)
@@ -583,16 +649,53 @@ class DCachePendingHit(Elaboratable):
         return m
 
 
-class DCache(Elaboratable):
+class DCache(Elaboratable, DCacheConfig):
     """Set associative dcache write-through
 
+    the geometry (see DCacheConfig) may be given directly as keyword
+    arguments, or taken from pspec (dcache_line_size, dcache_num_lines,
+    dcache_num_ways, dtlb_set_size, dtlb_num_ways).  keyword arguments
+    take precedence.
+
+    num_mshrs (or pspec dcache_num_mshrs) makes the cache non-blocking
+    for loads from loadstore1.  a load miss is put into a Miss Status
+    Holding Register instead of holding up stage 0, so hits (and further
+    misses) can be accepted while the line reloads.  the reload engine
+    is still one line at a time: misses queue up in the MSHR file, and
+    misses to a line already being reloaded share that reload.  when its
+    row arrives the load is replayed through stage 0, where it hits, so
+    completions can be out of order: d_out.id returns the d_in.id of the
+    request.  a store (or dcbz) presented while misses are outstanding
+    is parked, with stall_out set, until the MSHR file is empty, so that
+    a replayed load never sees a later store.  with
+    num_mshrs=0 (the default) the cache blocks on every miss, as before.
+
     TODO (in no specific order):
     * See list in icache.vhdl
     * Complete load misses on the cycle when WB data comes instead of
       at the end of line (this requires dealing with requests coming in
       while not idle...)
     """
-    def __init__(self):
+    def __init__(self, pspec=None, num_mshrs=None, **kwargs):
+        geometry = {}
+        for (pname, kwname) in [("dcache_line_size", "line_size"),
+                                ("dcache_num_lines", "num_lines"),
+                                ("dcache_num_ways", "num_ways"),
+                                ("dtlb_set_size", "tlb_set_size"),
+                                ("dtlb_num_ways", "tlb_num_ways")]:
+            if (hasattr(pspec, pname) and
+                    isinstance(getattr(pspec, pname), int)):
+                geometry[kwname] = getattr(pspec, pname)
+        geometry.update(kwargs)
+        DCacheConfig.__init__(self, **geometry)
+
+        if num_mshrs is None:
+            num_mshrs = 0
+            if (hasattr(pspec, "dcache_num_mshrs") and
+                    isinstance(pspec.dcache_num_mshrs, int)):
+                num_mshrs = pspec.dcache_num_mshrs
+        self.NUM_MSHRS = num_mshrs
+
         self.d_in      = LoadStore1ToDCacheType("d_in")
         self.d_out     = DCacheToLoadStore1Type("d_out")
 
@@ -600,14 +703,23 @@ class DCache(Elaboratable):
         self.m_out     = DCacheToMMUType("m_out")
 
         self.stall_out = Signal()
+        self.mshr_pending = Signal() # load misses outstanding (MSHR file)
 
         self.wb_out    = WBMasterOut("wb_out")
         self.wb_in     = WBSlaveOut("wb_in")
 
         self.log_out   = Signal(20)
+        self.events    = DCacheEventType("events")
 
-    def stage_0(self, m, r0, r1, r0_full):
+    def stage_0(self, m, r0, r1, r0_full, mshr_replay=None, mshr_rreq=None,
+                      mshr_alloc=None, park_valid=None):
         """Latch the request in r0.req as long as we're not stalling
+
+        with an MSHR file, a load whose line has arrived is replayed
+        here (mshr_replay), in a cycle with no new request.  a store
+        (or dcbz) arriving while misses are outstanding is parked
+        (park_valid, which stalls loadstore1) and only enters r0 once
+        the MSHR file is empty, so that no replayed load can see it.
         """
         comb = m.d.comb
         sync = m.d.sync
@@ -644,6 +756,37 @@ class DCache(Elaboratable):
             comb += r.doall.eq(0)
             comb += r.tlbld.eq(0)
             comb += r.mmu_req.eq(0)
+            if mshr_replay is not None:
+                with m.If(mshr_replay):
+                    comb += r.req.eq(0)
+                    comb += r.req.valid.eq(1)
+                    comb += r.req.load.eq(1)
+                    comb += r.req.addr.eq(mshr_rreq.addr)
+                    comb += r.req.byte_sel.eq(mshr_rreq.byte_sel)
+                    comb += r.req.virt_mode.eq(mshr_rreq.virt_mode)
+                    comb += r.req.priv_mode.eq(mshr_rreq.priv_mode)
+                    comb += r.req.id.eq(mshr_rreq.id)
+        if park_valid is not None:
+            # a store is parked, data included, until the misses drain.
+            # park_data is set once the data (a cycle after valid) is in
+            park = LoadStore1ToDCacheType("mshr_park")
+            park_data = Signal()
+            pending = Signal()
+            comb += pending.eq(self.mshr_pending | mshr_alloc)
+            with m.If(~m_in.valid & d_in.valid & ~d_in.load & pending):
+                comb += r.req.valid.eq(0)
+                sync += park.eq(d_in)
+                sync += park_valid.eq(1)
+                sync += park_data.eq(0)
+            with m.If(park_valid & ~park_data):
+                sync += park.data.eq(d_in.data)
+                sync += park_data.eq(1)
+            with m.If(park_valid & park_data & ~pending &
+                      ~d_in.valid & ~m_in.valid):
+                comb += r.req.eq(park)
+                comb += r.d_valid.eq(1)
+                with m.If((~r1.full & ~d_in.hold) | ~r0_full):
+                    sync += park_valid.eq(0)
         with m.If((~r1.full & ~d_in.hold) | ~r0_full):
             sync += r0.eq(r)
             sync += r0_full.eq(r.req.valid)
@@ -671,11 +814,11 @@ class DCache(Elaboratable):
         sync = m.d.sync
         m_in, d_in = self.m_in, self.d_in
 
-        index    = Signal(TLB_SET_BITS)
-        addrbits = Signal(TLB_SET_BITS)
+        index    = Signal(self.TLB_SET_BITS)
+        addrbits = Signal(self.TLB_SET_BITS)
 
-        amin = TLB_LG_PGSZ
-        amax = TLB_LG_PGSZ + TLB_SET_BITS
+        amin = self.TLB_LG_PGSZ
+        amax = self.TLB_LG_PGSZ + self.TLB_SET_BITS
 
         with m.If(m_in.valid):
             comb += addrbits.eq(m_in.addr[amin : amax])
@@ -696,11 +839,11 @@ class DCache(Elaboratable):
         comb = m.d.comb
         sync = m.d.sync
 
-        if TLB_NUM_WAYS == 0:
+        if self.TLB_NUM_WAYS == 0:
             return
-        for i in range(TLB_SET_SIZE):
+        for i in range(self.TLB_SET_SIZE):
             # TLB PLRU interface
-            tlb_plru        = PLRU(TLB_WAY_BITS)
+            tlb_plru        = PLRU(self.TLB_WAY_BITS)
             setattr(m.submodules, "maybe_plru_%d" % i, tlb_plru)
             tlb_plru_acc_en = Signal()
 
@@ -715,18 +858,18 @@ class DCache(Elaboratable):
 
         comb = m.d.comb
 
-        hitway = Signal(TLB_WAY_BITS)
+        hitway = Signal(self.TLB_WAY_BITS)
         hit    = Signal()
-        eatag  = Signal(TLB_EA_TAG_BITS)
+        eatag  = Signal(self.TLB_EA_TAG_BITS)
 
-        TLB_LG_END = TLB_LG_PGSZ + TLB_SET_BITS
-        comb += tlb_req_index.eq(r0.req.addr[TLB_LG_PGSZ : TLB_LG_END])
+        TLB_LG_END = self.TLB_LG_PGSZ + self.TLB_SET_BITS
+        comb += tlb_req_index.eq(r0.req.addr[self.TLB_LG_PGSZ : TLB_LG_END])
         comb += eatag.eq(r0.req.addr[TLB_LG_END : 64 ])
 
-        for i in range(TLB_NUM_WAYS):
+        for i in range(self.TLB_NUM_WAYS):
             is_tag_hit = Signal(name="is_tag_hit%d" % i)
-            tlb_tag = Signal(TLB_EA_TAG_BITS, name="tlb_tag%d" % i)
-            comb += tlb_tag.eq(read_tlb_tag(i, tlb_tag_way))
+            tlb_tag = Signal(self.TLB_EA_TAG_BITS, name="tlb_tag%d" % i)
+            comb += tlb_tag.eq(self.read_tlb_tag(i, tlb_tag_way))
             comb += is_tag_hit.eq(tlb_valid_way[i] & (tlb_tag == eatag))
             with m.If(is_tag_hit):
                 comb += hitway.eq(i)
@@ -736,13 +879,13 @@ class DCache(Elaboratable):
         comb += tlb_hit_way.eq(hitway)
 
         with m.If(tlb_hit):
-            comb += pte.eq(read_tlb_pte(hitway, tlb_pte_way))
+            comb += pte.eq(self.read_tlb_pte(hitway, tlb_pte_way))
         comb += valid_ra.eq(tlb_hit | ~r0.req.virt_mode)
 
         with m.If(r0.req.virt_mode):
-            comb += ra.eq(Cat(Const(0, ROW_OFF_BITS),
-                              r0.req.addr[ROW_OFF_BITS:TLB_LG_PGSZ],
-                              pte[TLB_LG_PGSZ:REAL_ADDR_BITS]))
+            comb += ra.eq(Cat(Const(0, self.ROW_OFF_BITS),
+                              r0.req.addr[self.ROW_OFF_BITS:self.TLB_LG_PGSZ],
+                              pte[self.TLB_LG_PGSZ:self.REAL_ADDR_BITS]))
             comb += perm_attr.reference.eq(pte[8])
             comb += perm_attr.changed.eq(pte[7])
             comb += perm_attr.nocache.eq(pte[5])
@@ -750,8 +893,9 @@ class DCache(Elaboratable):
             comb += perm_attr.rd_perm.eq(pte[2])
             comb += perm_attr.wr_perm.eq(pte[1])
         with m.Else():
-            comb += ra.eq(Cat(Const(0, ROW_OFF_BITS),
-                              r0.req.addr[ROW_OFF_BITS:REAL_ADDR_BITS]))
+            comb += ra.eq(Cat(Const(0, self.ROW_OFF_BITS),
+                              r0.req.addr[self.ROW_OFF_BITS:
+                                          self.REAL_ADDR_BITS]))
             comb += perm_attr.reference.eq(1)
             comb += perm_attr.changed.eq(1)
             comb += perm_attr.nocache.eq(0)
@@ -773,7 +917,7 @@ class DCache(Elaboratable):
                     tlb_hit_way, tlb_hit, tlb_plru_victim, tlb_tag_way,
                     dtlb_tags, tlb_pte_way, dtlb_ptes):
 
-        dtlb_valids = TLBValidBitsArray()
+        dtlb_valids = self.TLBValidBitsArray()
 
         comb = m.d.comb
         sync = m.d.sync
@@ -784,10 +928,10 @@ class DCache(Elaboratable):
         comb += tlbie.eq(r0_valid & r0.tlbie)
         comb += tlbwe.eq(r0_valid & r0.tlbld)
 
-        m.submodules.tlb_update = d = DTLBUpdate()
+        m.submodules.tlb_update = d = DTLBUpdate(self)
         with m.If(tlbie & r0.doall):
             # clear all valid bits at once
-            for i in range(TLB_SET_SIZE):
+            for i in range(self.TLB_SET_SIZE):
                 sync += dtlb_valid_bits[i].eq(0)
         with m.If(d.updated):
             sync += dtlb_tags[tlb_req_index].eq(d.tb_out)
@@ -810,7 +954,8 @@ class DCache(Elaboratable):
             comb += d.repl_way.eq(tlb_hit_way)
         with m.Else():
             comb += d.repl_way.eq(tlb_plru_victim[tlb_req_index])
-        comb += d.eatag.eq(r0.req.addr[TLB_LG_PGSZ + TLB_SET_BITS:64])
+        tlb_lg_end = self.TLB_LG_PGSZ + self.TLB_SET_BITS
+        comb += d.eatag.eq(r0.req.addr[tlb_lg_end:64])
         comb += d.pte_data.eq(r0.req.data)
 
     def maybe_plrus(self, m, r1, plru_victim):
@@ -819,12 +964,12 @@ class DCache(Elaboratable):
         comb = m.d.comb
         sync = m.d.sync
 
-        if TLB_NUM_WAYS == 0:
+        if self.TLB_NUM_WAYS == 0:
             return
 
-        for i in range(NUM_LINES):
+        for i in range(self.NUM_LINES):
             # PLRU interface
-            plru        = PLRU(WAY_BITS)
+            plru        = PLRU(self.WAY_BITS)
             setattr(m.submodules, "plru%d" % i, plru)
             plru_acc_en = Signal()
 
@@ -840,14 +985,14 @@ class DCache(Elaboratable):
         sync = m.d.sync
         m_in, d_in = self.m_in, self.d_in
 
-        index = Signal(INDEX_BITS)
+        index = Signal(self.INDEX_BITS)
 
         with m.If(r0_stall):
             comb += index.eq(req_index)
         with m.Elif(m_in.valid):
-            comb += index.eq(get_index(m_in.addr))
+            comb += index.eq(self.get_index(m_in.addr))
         with m.Else():
-            comb += index.eq(get_index(d_in.addr))
+            comb += index.eq(self.get_index(d_in.addr))
         sync += cache_tag_set.eq(cache_tags[index])
 
     def dcache_request(self, m, r0, ra, req_index, req_row, req_tag,
@@ -857,7 +1002,8 @@ class DCache(Elaboratable):
                        valid_ra, perm_ok, access_ok, req_op, req_go,
                        tlb_pte_way,
                        tlb_hit, tlb_hit_way, tlb_valid_way, cache_tag_set,
-                       cancel_store, req_same_tag, r0_stall, early_req_row):
+                       cancel_store, req_same_tag, r0_stall, early_req_row,
+                       mshr_replay=None, mshr_rreq=None):
         """Cache request parsing and hit detection
         """
 
@@ -865,19 +1011,19 @@ class DCache(Elaboratable):
         m_in, d_in = self.m_in, self.d_in
 
         is_hit      = Signal()
-        hit_way     = Signal(WAY_BITS)
+        hit_way     = Signal(self.WAY_BITS)
         op          = Signal(Op)
         opsel       = Signal(3)
         go          = Signal()
         nc          = Signal()
         hit_set     = Array(Signal(name="hit_set_%d" % i) \
-                                  for i in range(TLB_NUM_WAYS))
-        cache_i_validdx = Signal(NUM_WAYS)
+                                  for i in range(self.TLB_NUM_WAYS))
+        cache_i_validdx = Signal(self.NUM_WAYS)
 
         # Extract line, row and tag from request
-        comb += req_index.eq(get_index(r0.req.addr))
-        comb += req_row.eq(get_row(r0.req.addr))
-        comb += req_tag.eq(get_tag(ra))
+        comb += req_index.eq(self.get_index(r0.req.addr))
+        comb += req_row.eq(self.get_row(r0.req.addr))
+        comb += req_tag.eq(self.get_tag(ra))
 
         if False: # display on comb is a bit... busy.
             comb += Display("dcache_req addr:%x ra: %x idx: %x tag: %x row: %x",
@@ -886,7 +1032,7 @@ class DCache(Elaboratable):
         comb += go.eq(r0_valid & ~(r0.tlbie | r0.tlbld) & ~r1.ls_error)
         comb += cache_i_validdx.eq(cache_valids[req_index])
 
-        m.submodules.dcache_pend = dc = DCachePendingHit(tlb_pte_way,
+        m.submodules.dcache_pend = dc = DCachePendingHit(self, tlb_pte_way,
                                 tlb_valid_way, tlb_hit_way,
                                 cache_i_validdx, cache_tag_set,
                                 r0.req.addr,
@@ -907,14 +1053,14 @@ class DCache(Elaboratable):
             # For a store, consider this a hit even if the row isn't
             # valid since it will be by the time we perform the store.
             # For a load, check the appropriate row valid bit.
-            rrow = Signal(ROW_LINE_BITS)
+            rrow = Signal(self.ROW_LINE_BITS)
             comb += rrow.eq(req_row)
             valid = r1.rows_valid[rrow]
             comb += is_hit.eq((~r0.req.load) | valid)
             comb += hit_way.eq(replace_way)
 
         # Whether to use forwarded data for a load or not
-        with m.If((get_row(r1.req.real_addr) == req_row) &
+        with m.If((self.get_row(r1.req.real_addr) == req_row) &
                   (r1.req.hit_way == hit_way)):
             # Only need to consider r1.write_bram here, since if we
             # are writing refill data here, then we don't have a
@@ -979,9 +1125,12 @@ class DCache(Elaboratable):
         # row requested.
         with m.If(~r0_stall):
             with m.If(m_in.valid):
-                comb += early_req_row.eq(get_row(m_in.addr))
+                comb += early_req_row.eq(self.get_row(m_in.addr))
+            if mshr_replay is not None:
+                with m.Elif(mshr_replay):
+                    comb += early_req_row.eq(self.get_row(mshr_rreq.addr))
             with m.Else():
-                comb += early_req_row.eq(get_row(d_in.addr))
+                comb += early_req_row.eq(self.get_row(d_in.addr))
         with m.Else():
             comb += early_req_row.eq(req_row)
 
@@ -999,7 +1148,8 @@ class DCache(Elaboratable):
             with m.Else():
                 comb += clear_rsrv.eq(r0.req.atomic_last) # store conditional
                 with m.If((~reservation.valid) |
-                         (r0.req.addr[LINE_OFF_BITS:64] != reservation.addr)):
+                         (r0.req.addr[self.LINE_OFF_BITS:64] !=
+                          reservation.addr)):
                     comb += cancel_store.eq(1)
 
     def reservation_reg(self, m, r0_valid, access_ok, set_rsrv, clear_rsrv,
@@ -1013,7 +1163,105 @@ class DCache(Elaboratable):
                 sync += reservation.valid.eq(0)
             with m.Elif(set_rsrv):
                 sync += reservation.valid.eq(1)
-                sync += reservation.addr.eq(r0.req.addr[LINE_OFF_BITS:64])
+                sync += reservation.addr.eq(r0.req.addr[self.LINE_OFF_BITS:64])
+
+    def mshr_file(self, m, mshrs, r0, r0_valid, r0_stall, r1, req_op, ra,
+                  mshr_alloc, mshr_issue, mshr_ireq, mshr_replay, mshr_rreq,
+                  refill_start, refill_addr):
+        """Miss Status Holding Registers: non-blocking load misses
+
+        * allocation: a load miss from loadstore1 takes a free entry
+          (if there is none it goes to r1, and blocks, as usual)
+        * issue: when the state machine is idle, the oldest entry not
+          yet being reloaded starts its line reload.  every entry for
+          the line being reloaded is marked as issued.
+        * replay: once the row of an issued entry is in the cache, the
+          load is re-presented to stage 0 (where it hits) and the entry
+          is freed.
+        """
+        comb = m.d.comb
+        sync = m.d.sync
+        d_in, m_in = self.d_in, self.m_in
+
+        def line_of(addr):
+            return addr[self.LINE_OFF_BITS:self.REAL_ADDR_BITS]
+
+        free_idx = Signal(range(self.NUM_MSHRS))
+        any_free = Signal()
+        issue_valid = Signal()
+        ready_valid = Signal()
+        ready_idx = Signal(range(self.NUM_MSHRS))
+        reloading = Signal()
+        reload_line = Signal(len(line_of(ra)))
+
+        comb += reloading.eq(r1.state == State.RELOAD_WAIT_ACK)
+        comb += reload_line.eq(Cat(r1.store_index, r1.reload_tag))
+
+        # pick the lowest-numbered entry in each case
+        for i in reversed(range(self.NUM_MSHRS)):
+            e = mshrs[i]
+            # free entry, for allocation
+            with m.If(~e.valid):
+                comb += free_idx.eq(i)
+                comb += any_free.eq(1)
+            # entry waiting for its reload to be started
+            with m.If(e.valid & ~e.issued):
+                comb += issue_valid.eq(1)
+                comb += mshr_ireq.eq(e)
+            # entry ready to replay: reload started and not waiting
+            # for its row (any more)
+            row = self.get_row_of_line(self.get_row(e.real_addr))
+            waiting = Signal(name="mshr_waiting_%d" % i)
+            comb += waiting.eq(reloading & (line_of(e.real_addr) ==
+                                            reload_line) &
+                               ~r1.rows_valid[row])
+            with m.If(e.valid & e.issued & ~waiting):
+                comb += ready_valid.eq(1)
+                comb += ready_idx.eq(i)
+                comb += mshr_rreq.eq(e)
+
+        comb += self.mshr_pending.eq(Cat(*[e.valid for e in mshrs]).bool())
+        comb += mshr_alloc.eq(r0_valid & (req_op == Op.OP_LOAD_MISS) &
+                              ~r0.mmu_req & any_free)
+        comb += mshr_issue.eq(issue_valid & ~r1.full &
+                              (r1.state == State.IDLE) &
+                              (req_op != Op.OP_LOAD_MISS) &
+                              (req_op != Op.OP_LOAD_NC) &
+                              (req_op != Op.OP_STORE_MISS) &
+                              (req_op != Op.OP_STORE_HIT))
+        comb += mshr_replay.eq(ready_valid & ~d_in.valid & ~m_in.valid &
+                               ~r0_stall)
+
+        for i in range(self.NUM_MSHRS):
+            e = mshrs[i]
+            # line reload starting: it serves every entry for that line
+            with m.If(refill_start & e.valid &
+                      (line_of(e.real_addr) == line_of(refill_addr))):
+                sync += e.issued.eq(1)
+            # allocate
+            with m.If(mshr_alloc & (free_idx == i)):
+                sync += e.valid.eq(1)
+                sync += e.addr.eq(r0.req.addr)
+                sync += e.real_addr.eq(ra)
+                sync += e.byte_sel.eq(r0.req.byte_sel)
+                sync += e.virt_mode.eq(r0.req.virt_mode)
+                sync += e.priv_mode.eq(r0.req.priv_mode)
+                sync += e.id.eq(r0.req.id)
+                # the reload either starts now (state machine idle) or
+                # is already under way for this line
+                sync += e.issued.eq((r1.state == State.IDLE) |
+                                    (reloading &
+                                     (line_of(ra) == reload_line)))
+            # free on replay
+            with m.If(mshr_replay & (ready_idx == i)):
+                sync += e.valid.eq(0)
+
+        with m.If(mshr_alloc):
+            sync += Display("DCACHE mshr alloc %d addr %x id %d",
+                            free_idx, r0.req.addr, r0.req.id)
+        with m.If(mshr_replay):
+            sync += Display("DCACHE mshr replay %d addr %x id %d",
+                            ready_idx, mshr_rreq.addr, mshr_rreq.id)
 
     def writeback_control(self, m, r1, cache_out_row):
         """Return data for loads & completion control logic
@@ -1046,6 +1294,7 @@ class DCache(Elaboratable):
         comb += d_out.store_done.eq(~r1.stcx_fail)
         comb += d_out.error.eq(r1.ls_error)
         comb += d_out.cache_paradox.eq(r1.cache_paradox)
+        comb += d_out.id.eq(Mux(r1.slow_valid, r1.req.id, r1.hit_id))
 
         # Outputs to MMU
         comb += m_out.done.eq(r1.mmu_done)
@@ -1117,17 +1366,18 @@ class DCache(Elaboratable):
         comb = m.d.comb
         wb_in = self.wb_in
 
-        for i in range(NUM_WAYS):
+        for i in range(self.NUM_WAYS):
             do_read  = Signal(name="do_rd%d" % i)
-            rd_addr  = Signal(ROW_BITS, name="rd_addr_%d" % i)
+            rd_addr  = Signal(self.ROW_BITS, name="rd_addr_%d" % i)
             do_write = Signal(name="do_wr%d" % i)
-            wr_addr  = Signal(ROW_BITS, name="wr_addr_%d" % i)
+            wr_addr  = Signal(self.ROW_BITS, name="wr_addr_%d" % i)
             wr_data  = Signal(WB_DATA_BITS, name="din_%d" % i)
-            wr_sel   = Signal(ROW_SIZE)
-            wr_sel_m = Signal(ROW_SIZE)
+            wr_sel   = Signal(self.ROW_SIZE)
+            wr_sel_m = Signal(self.ROW_SIZE)
             _d_out   = Signal(WB_DATA_BITS, name="dout_%d" % i) # cache_row_t
 
-            way = CacheRam(ROW_BITS, WB_DATA_BITS, ADD_BUF=True, ram_num=i)
+            way = CacheRam(self.ROW_BITS, WB_DATA_BITS, ADD_BUF=True,
+                           ram_num=i)
             setattr(m.submodules, "cacheram_%d" % i, way)
 
             comb += way.rd_en.eq(do_read)
@@ -1155,7 +1405,7 @@ class DCache(Elaboratable):
                 # cycle after the store is in r0.
                 comb += wr_data.eq(r1.req.data)
                 comb += wr_sel.eq(r1.req.byte_sel)
-                comb += wr_addr.eq(get_row(r1.req.real_addr))
+                comb += wr_addr.eq(self.get_row(r1.req.real_addr))
 
                 with m.If(i == r1.req.hit_way):
                     comb += do_write.eq(1)
@@ -1199,6 +1449,7 @@ class DCache(Elaboratable):
         # Set signals for the writeback controls.
         sync += r1.hit_way.eq(req_hit_way)
         sync += r1.hit_index.eq(req_index)
+        sync += r1.hit_id.eq(r0.req.id)
 
         with m.If(req_op == Op.OP_LOAD_HIT):
             sync += r1.hit_load_valid.eq(1)
@@ -1244,21 +1495,23 @@ class DCache(Elaboratable):
     def dcache_slow(self, m, r1, use_forward1_next, use_forward2_next,
                     cache_valids, r0, replace_way,
                     req_hit_way, req_same_tag,
-                    r0_valid, req_op, cache_tags, req_go, ra):
+                    r0_valid, req_op, cache_tags, req_go, ra,
+                    mshr_alloc=None, mshr_issue=None, mshr_ireq=None,
+                    refill_start=None, refill_addr=None):
 
         comb = m.d.comb
         sync = m.d.sync
         wb_in = self.wb_in
         d_in = self.d_in
 
-        req         = MemAccessRequest("mreq_ds")
+        req         = MemAccessRequest(self, "mreq_ds")
 
-        req_row = Signal(ROW_BITS)
-        req_idx = Signal(INDEX_BITS)
-        req_tag = Signal(TAG_BITS)
-        comb += req_idx.eq(get_index(req.real_addr))
-        comb += req_row.eq(get_row(req.real_addr))
-        comb += req_tag.eq(get_tag(req.real_addr))
+        req_row = Signal(self.ROW_BITS)
+        req_idx = Signal(self.INDEX_BITS)
+        req_tag = Signal(self.TAG_BITS)
+        comb += req_idx.eq(self.get_index(req.real_addr))
+        comb += req_row.eq(self.get_row(req.real_addr))
+        comb += req_tag.eq(self.get_tag(req.real_addr))
 
         sync += r1.use_forward1.eq(use_forward1_next)
         sync += r1.forward_sel.eq(0)
@@ -1273,7 +1526,7 @@ class DCache(Elaboratable):
             sync += r1.forward_data1.eq(r1.req.data)
             sync += r1.forward_sel1.eq(r1.req.byte_sel)
             sync += r1.forward_way1.eq(r1.req.hit_way)
-            sync += r1.forward_row1.eq(get_row(r1.req.real_addr))
+            sync += r1.forward_row1.eq(self.get_row(r1.req.real_addr))
             sync += r1.forward_valid1.eq(1)
         with m.Else():
             with m.If(r1.dcbz):
@@ -1303,16 +1556,16 @@ class DCache(Elaboratable):
 
         with m.If(r1.write_tag):
             # Store new tag in selected way
-            for i in range(NUM_WAYS):
+            for i in range(self.NUM_WAYS):
                 with m.If(i == replace_way):
-                    ct = Signal(TAG_RAM_WIDTH)
+                    ct = Signal(self.TAG_RAM_WIDTH)
                     comb += ct.eq(cache_tags[r1.store_index])
                     """
 TODO: check this
 cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                     (TAG_WIDTH - 1 downto TAG_BITS => '0') & r1.reload_tag;
                     """
-                    comb += ct.word_select(i, TAG_WIDTH).eq(r1.reload_tag)
+                    comb += ct.word_select(i, self.TAG_WIDTH).eq(r1.reload_tag)
                     sync += cache_tags[r1.store_index].eq(ct)
             sync += r1.store_way.eq(replace_way)
             sync += r1.write_tag.eq(0)
@@ -1321,6 +1574,13 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
         # else from req_op, ra, etc.
         with m.If(r1.full):
             comb += req.eq(r1.req)
+        if mshr_issue is not None:
+            # nothing else for the state machine to do: start the reload
+            # for a load miss queued in the MSHR file
+            with m.Elif(mshr_issue):
+                comb += req.op.eq(Op.OP_LOAD_MISS)
+                comb += req.real_addr.eq(mshr_ireq.real_addr)
+                comb += req.byte_sel.eq(~0) # all 1s
         with m.Else():
             comb += req.op.eq(req_op)
             comb += req.valid.eq(req_go)
@@ -1344,11 +1604,16 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                 comb += req.byte_sel.eq(r0.req.byte_sel)
             comb += req.hit_way.eq(req_hit_way)
             comb += req.same_tag.eq(req_same_tag)
+            comb += req.id.eq(r0.req.id)
 
             # Store the incoming request from r0,
-            # if it is a slow request
+            # if it is a slow request (a load miss going into the
+            # MSHR file is not: r1 is left free)
             # Note that r1.full = 1 implies req_op = OP_NONE
-            with m.If((req_op == Op.OP_LOAD_MISS)
+            load_miss = (req_op == Op.OP_LOAD_MISS)
+            if mshr_alloc is not None:
+                load_miss = load_miss & ~mshr_alloc
+            with m.If(load_miss
                       | (req_op == Op.OP_LOAD_NC)
                       | (req_op == Op.OP_STORE_MISS)
                       | (req_op == Op.OP_STORE_HIT)):
@@ -1359,7 +1624,7 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
         with m.Switch(r1.state):
 
             with m.Case(State.IDLE):
-                sync += r1.wb.adr.eq(req.real_addr[ROW_LINE_BITS:])
+                sync += r1.wb.adr.eq(req.real_addr[self.ROW_OFF_BITS:])
                 sync += r1.wb.sel.eq(req.byte_sel)
                 sync += r1.wb.dat.eq(req.data)
                 sync += r1.dcbz.eq(req.dcbz)
@@ -1368,16 +1633,22 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                 # for subsequent stores.
                 sync += r1.store_index.eq(req_idx)
                 sync += r1.store_row.eq(req_row)
-                sync += r1.end_row_ix.eq(get_row_of_line(req_row)-1)
+                sync += r1.end_row_ix.eq(self.get_row_of_line(req_row)-1)
                 sync += r1.reload_tag.eq(req_tag)
                 sync += r1.req.same_tag.eq(1)
+                if mshr_alloc is not None:
+                    # the MSHR file tracks this reload, not r1.req
+                    with m.If(mshr_alloc | mshr_issue):
+                        sync += r1.req.same_tag.eq(0)
+                    comb += refill_start.eq(req.op == Op.OP_LOAD_MISS)
+                    comb += refill_addr.eq(req.real_addr)
 
                 with m.If(req.op == Op.OP_STORE_HIT):
                     sync += r1.store_way.eq(req.hit_way)
 
                 # Reset per-row valid bits,
                 # ready for handling OP_LOAD_MISS
-                for i in range(ROW_PER_LINE):
+                for i in range(self.ROW_PER_LINE):
                     sync += r1.rows_valid[i].eq(0)
 
                 with m.If(req_op != Op.OP_NONE):
@@ -1455,20 +1726,21 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                     # Clear stb and set ld_stbs_done so we can handle an
                     # eventual last ack on the same cycle.
                     # sigh - reconstruct wb adr with 3 extra 0s at front
-                    wb_adr = Cat(Const(0, ROW_OFF_BITS), r1.wb.adr)
-                    with m.If(is_last_row_addr(wb_adr, r1.end_row_ix)):
+                    wb_adr = Cat(Const(0, self.ROW_OFF_BITS), r1.wb.adr)
+                    with m.If(self.is_last_row_addr(wb_adr, r1.end_row_ix)):
                         sync += r1.wb.stb.eq(0)
                         comb += ld_stbs_done.eq(1)
 
                     # Calculate the next row address in the current cache line
-                    row = Signal(LINE_OFF_BITS-ROW_OFF_BITS)
+                    row = Signal(self.LINE_OFF_BITS-self.ROW_OFF_BITS)
                     comb += row.eq(r1.wb.adr)
-                    sync += r1.wb.adr[:LINE_OFF_BITS-ROW_OFF_BITS].eq(row+1)
+                    row_bits = self.LINE_OFF_BITS-self.ROW_OFF_BITS
+                    sync += r1.wb.adr[:row_bits].eq(row+1)
 
                 # Incoming acks processing
                 sync += r1.forward_valid1.eq(wb_in.ack)
                 with m.If(wb_in.ack):
-                    srow = Signal(ROW_LINE_BITS)
+                    srow = Signal(self.ROW_LINE_BITS)
                     comb += srow.eq(r1.store_row)
                     sync += r1.rows_valid[srow].eq(1)
 
@@ -1480,7 +1752,7 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                     with m.If(req.valid & r1.req.same_tag &
                               ((r1.dcbz & r1.req.dcbz) |
                                (~r1.dcbz & (r1.req.op == Op.OP_LOAD_MISS))) &
-                                (r1.store_row == get_row(req.real_addr))):
+                                (r1.store_row == self.get_row(req.real_addr))):
                         sync += r1.full.eq(0)
                         sync += r1.slow_valid.eq(1)
                         with m.If(~r1.mmu_req):
@@ -1491,13 +1763,13 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                         sync += r1.use_forward1.eq(1)
 
                     # Check for completion
-                    with m.If(ld_stbs_done & is_last_row(r1.store_row,
+                    with m.If(ld_stbs_done & self.is_last_row(r1.store_row,
                                                       r1.end_row_ix)):
                         # Complete wishbone cycle
                         sync += r1.wb.cyc.eq(0)
 
                         # Cache line is now valid
-                        cv = Signal(INDEX_BITS)
+                        cv = Signal(self.NUM_WAYS)
                         comb += cv.eq(cache_valids[r1.store_index])
                         comb += cv.bit_select(r1.store_way, 1).eq(1)
                         sync += cache_valids[r1.store_index].eq(cv)
@@ -1508,7 +1780,7 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                                          cv, r1.store_index, r1.store_way)
 
                     # Increment store row counter
-                    sync += r1.store_row.eq(next_row(r1.store_row))
+                    sync += r1.store_row.eq(self.next_row(r1.store_row))
 
             with m.Case(State.STORE_WAIT_ACK):
                 st_stbs_done = Signal()
@@ -1533,8 +1805,10 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                     # See if there is another store waiting
                     # to be done which is in the same real page.
                     with m.If(req.valid):
-                        _ra = req.real_addr[ROW_LINE_BITS:SET_SIZE_BITS]
-                        sync += r1.wb.adr[0:SET_SIZE_BITS].eq(_ra)
+                        _ra = req.real_addr[self.ROW_OFF_BITS:
+                                            self.SET_SIZE_BITS]
+                        _adr_bits = self.SET_SIZE_BITS - self.ROW_OFF_BITS
+                        sync += r1.wb.adr[0:_adr_bits].eq(_ra)
                         sync += r1.wb.dat.eq(req.data)
                         sync += r1.wb.sel.eq(req.byte_sel)
 
@@ -1603,9 +1877,9 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
         d_in = self.d_in
 
         # Storage. Hopefully "cache_rows" is a BRAM, the rest is LUTs
-        cache_tags       = CacheTagArray()
-        cache_tag_set    = Signal(TAG_RAM_WIDTH)
-        cache_valids = CacheValidBitsArray()
+        cache_tags       = self.CacheTagArray()
+        cache_tag_set    = Signal(self.TAG_RAM_WIDTH)
+        cache_valids = self.CacheValidBitsArray()
 
         # TODO attribute ram_style : string;
         # TODO attribute ram_style of cache_tags : signal is "distributed";
@@ -1613,9 +1887,9 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
         """note: these are passed to nmigen.hdl.Memory as "attributes".
            don't know how, just that they are.
         """
-        dtlb_valid_bits = TLBValidBitsArray()
-        dtlb_tags       = TLBTagsArray()
-        dtlb_ptes       = TLBPtesArray()
+        dtlb_valid_bits = self.TLBValidBitsArray()
+        dtlb_tags       = self.TLBTagsArray()
+        dtlb_ptes       = self.TLBPtesArray()
         # TODO attribute ram_style of
         #  dtlb_tags : signal is "distributed";
         # TODO attribute ram_style of
@@ -1624,21 +1898,21 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
         r0      = RegStage0("r0")
         r0_full = Signal()
 
-        r1 = RegStage1("r1")
+        r1 = RegStage1(self, "r1")
 
-        reservation = Reservation()
+        reservation = Reservation(self)
 
         # Async signals on incoming request
-        req_index    = Signal(INDEX_BITS)
-        req_row      = Signal(ROW_BITS)
-        req_hit_way  = Signal(WAY_BITS)
-        req_tag      = Signal(TAG_BITS)
+        req_index    = Signal(self.INDEX_BITS)
+        req_row      = Signal(self.ROW_BITS)
+        req_hit_way  = Signal(self.WAY_BITS)
+        req_tag      = Signal(self.TAG_BITS)
         req_op       = Signal(Op)
         req_data     = Signal(64)
         req_same_tag = Signal()
         req_go       = Signal()
 
-        early_req_row     = Signal(ROW_BITS)
+        early_req_row     = Signal(self.ROW_BITS)
 
         cancel_store      = Signal()
         set_rsrv          = Signal()
@@ -1652,28 +1926,47 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
 
         cache_out_row     = Signal(WB_DATA_BITS)
 
-        plru_victim       = PLRUOut()
-        replace_way       = Signal(WAY_BITS)
+        plru_victim       = self.PLRUOut()
+        replace_way       = Signal(self.WAY_BITS)
 
         # Wishbone read/write/cache write formatting signals
         bus_sel           = Signal(8)
 
         # TLB signals
-        tlb_tag_way   = Signal(TLB_TAG_WAY_BITS)
-        tlb_pte_way   = Signal(TLB_PTE_WAY_BITS)
-        tlb_valid_way = Signal(TLB_NUM_WAYS)
-        tlb_req_index = Signal(TLB_SET_BITS)
+        tlb_tag_way   = Signal(self.TLB_TAG_WAY_BITS)
+        tlb_pte_way   = Signal(self.TLB_PTE_WAY_BITS)
+        tlb_valid_way = Signal(self.TLB_NUM_WAYS)
+        tlb_req_index = Signal(self.TLB_SET_BITS)
         tlb_hit       = Signal()
-        tlb_hit_way   = Signal(TLB_WAY_BITS)
-        pte           = Signal(TLB_PTE_BITS)
-        ra            = Signal(REAL_ADDR_BITS)
+        tlb_hit_way   = Signal(self.TLB_WAY_BITS)
+        pte           = Signal(self.TLB_PTE_BITS)
+        ra            = Signal(self.REAL_ADDR_BITS)
         valid_ra      = Signal()
         perm_attr     = PermAttr("dc_perms")
         rc_ok         = Signal()
         perm_ok       = Signal()
         access_ok     = Signal()
 
-        tlb_plru_victim = TLBPLRUOut()
+        tlb_plru_victim = self.TLBPLRUOut()
+
+        # MSHR file (non-blocking load misses), if enabled
+        replay_args, slow_args, park_args = {}, {}, {}
+        if self.NUM_MSHRS:
+            mshrs = [MSHREntry(self, name="mshr%d" % i)
+                     for i in range(self.NUM_MSHRS)]
+            mshr_ireq = MSHREntry(self, name="mshr_ireq")
+            mshr_rreq = MSHREntry(self, name="mshr_rreq")
+            mshr_alloc = Signal()
+            mshr_issue = Signal()
+            mshr_replay = Signal()
+            refill_start = Signal()
+            refill_addr = Signal(self.REAL_ADDR_BITS)
+            park_valid = Signal()
+            replay_args = dict(mshr_replay=mshr_replay, mshr_rreq=mshr_rreq)
+            park_args = dict(mshr_alloc=mshr_alloc, park_valid=park_valid)
+            slow_args = dict(mshr_alloc=mshr_alloc, mshr_issue=mshr_issue,
+                             mshr_ireq=mshr_ireq, refill_start=refill_start,
+                             refill_addr=refill_addr)
 
         # we don't yet handle collisions between loadstore1 requests
         # and MMU requests
@@ -1683,6 +1976,9 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
         comb += r0_stall.eq(r0_full & (r1.full | d_in.hold))
         comb += r0_valid.eq(r0_full & ~r1.full & ~d_in.hold)
         comb += self.stall_out.eq(r0_stall)
+        if self.NUM_MSHRS:
+            # a store parked behind outstanding misses also stalls
+            comb += self.stall_out.eq(r0_stall | park_valid)
 
         # Wire up wishbone request latch out of stage 1
         comb += self.wb_out.eq(r1.wb)
@@ -1694,7 +1990,7 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
 
         # call sub-functions putting everything together, using shared
         # signals established above
-        self.stage_0(m, r0, r1, r0_full)
+        self.stage_0(m, r0, r1, r0_full, **replay_args, **park_args)
         self.tlb_read(m, r0_stall, tlb_valid_way,
                       tlb_tag_way, tlb_pte_way, dtlb_valid_bits,
                       dtlb_tags, dtlb_ptes)
@@ -1714,7 +2010,8 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
                            valid_ra, perm_ok, access_ok, req_op, req_go,
                            tlb_pte_way,
                            tlb_hit, tlb_hit_way, tlb_valid_way, cache_tag_set,
-                           cancel_store, req_same_tag, r0_stall, early_req_row)
+                           cancel_store, req_same_tag, r0_stall, early_req_row,
+                           **replay_args)
         self.reservation_comb(m, cancel_store, set_rsrv, clear_rsrv,
                            r0_valid, r0, reservation)
         self.reservation_reg(m, r0_valid, access_ok, set_rsrv, clear_rsrv,
@@ -1727,9 +2024,24 @@ cache_tags(r1.store_index)((i + 1) * TAG_WIDTH - 1 downto i * TAG_WIDTH) <=
         self.dcache_slow(m, r1, use_forward1_next, use_forward2_next,
                     cache_valids, r0, replace_way,
                     req_hit_way, req_same_tag,
-                         r0_valid, req_op, cache_tags, req_go, ra)
+                         r0_valid, req_op, cache_tags, req_go, ra,
+                         **slow_args)
+        if self.NUM_MSHRS:
+            self.mshr_file(m, mshrs, r0, r0_valid, r0_stall, r1, req_op, ra,
+                           mshr_alloc, mshr_issue, mshr_ireq,
+                           mshr_replay, mshr_rreq, refill_start, refill_addr)
         #self.dcache_log(m, r1, valid_ra, tlb_hit_way, stall_out)
 
+        # performance events.  a load miss which is replayed from the
+        # MSHR file counts as a miss, then as a hit
+        ev = self.events
+        m.d.sync += ev.load_hit.eq(req_op == Op.OP_LOAD_HIT)
+        m.d.sync += ev.load_miss.eq((req_op == Op.OP_LOAD_MISS) |
+                                    (req_op == Op.OP_LOAD_NC))
+        m.d.sync += ev.store_hit.eq(req_op == Op.OP_STORE_HIT)
+        m.d.sync += ev.store_miss.eq(req_op == Op.OP_STORE_MISS)
+        m.d.sync += ev.dtlb_miss.eq(req_go & ~valid_ra)
+
         return m
 
 
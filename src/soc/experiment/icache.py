@@ -8,9 +8,7 @@ TODO (in no specific order):
 * Add debug interface to inspect cache content
 * Add snoop/invalidate path
 * Add multi-hit error detection
-* Pipelined bus interface (wb or axi)
 * Maybe add parity? There's a few bits free in each BRAM row on Xilinx
-* Add optimization: service hits on partially loaded lines
 * Add optimization: (maybe) interrupt reload on fluch/redirect
 * Check if playing with the geometry of the cache tags allow for more
   efficient use of distributed RAM and less logic/muxes. Currently we
@@ -20,7 +18,8 @@ TODO (in no specific order):
 """
 
 from enum import (Enum, unique)
-from nmigen import (Module, Signal, Elaboratable, Cat, Array, Const, Repl)
+from nmigen import (Module, Signal, Elaboratable, Cat, Array, Const, Repl,
+                    Mux)
 from nmigen.cli import main, rtlil
 from nmutil.iocontrol import RecordObject
 from nmigen.utils import log2_int
@@ -29,9 +28,11 @@ from nmutil.util import Display
 #from nmutil.plru import PLRU
 from soc.experiment.cache_ram import CacheRam
 from soc.experiment.plru import PLRU
+from soc.minerva.units.fetch import FetchUnitInterface
 
 from soc.experiment.mem_types import (Fetch1ToICacheType,
                                       ICacheToDecode1Type,
+                                      ICacheEventType,
                                       MMUToICacheType)
 
 from soc.experiment.wb_types import (WB_ADDR_BITS, WB_DATA_BITS,
@@ -49,16 +50,15 @@ from nmigen.cli import main, rtlil
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
+from soc.config.simlog import get_logger
+
+log = get_logger("icache")
 
 
 SIM            = 0
+# Default geometry.  these are parameters of ICache (and ICacheConfig)
 LINE_SIZE      = 64
-# BRAM organisation: We never access more than wishbone_data_bits
-# at a time so to save resources we make the array only that wide,
-# and use consecutive indices for to make a cache "line"
-#
-# ROW_SIZE is the width in bytes of the BRAM (based on WB, so 64-bits)
-ROW_SIZE       = WB_DATA_BITS // 8
 # Number of lines in a set
 NUM_LINES      = 16
 # Number of ways
@@ -67,208 +67,247 @@ NUM_WAYS       = 4
 TLB_SIZE       = 64
 # L1 ITLB log_2(page_size)
 TLB_LG_PGSZ    = 12
-# Number of real address bits that we store
-REAL_ADDR_BITS = 56
 # Non-zero to enable log data collection
 LOG_LENGTH     = 0
 
-ROW_SIZE_BITS  = ROW_SIZE * 8
-# ROW_PER_LINE is the number of row (wishbone) transactions in a line
-ROW_PER_LINE   = LINE_SIZE // ROW_SIZE
-# BRAM_ROWS is the number of rows in BRAM needed to represent the full icache
-BRAM_ROWS      = NUM_LINES * ROW_PER_LINE
-# INSN_PER_ROW is the number of 32bit instructions per BRAM row
-INSN_PER_ROW   = ROW_SIZE_BITS // 32
-
-# Bit fields counts in the address
-#
-# INSN_BITS is the number of bits to select an instruction in a row
-INSN_BITS      = log2_int(INSN_PER_ROW)
-# ROW_BITS is the number of bits to select a row
-ROW_BITS       = log2_int(BRAM_ROWS)
-# ROW_LINE_BITS is the number of bits to select a row within a line
-ROW_LINE_BITS  = log2_int(ROW_PER_LINE)
-# LINE_OFF_BITS is the number of bits for the offset in a cache line
-LINE_OFF_BITS  = log2_int(LINE_SIZE)
-# ROW_OFF_BITS is the number of bits for the offset in a row
-ROW_OFF_BITS   = log2_int(ROW_SIZE)
-# INDEX_BITS is the number of bits to select a cache line
-INDEX_BITS     = log2_int(NUM_LINES)
-# SET_SIZE_BITS is the log base 2 of the set size
-SET_SIZE_BITS  = LINE_OFF_BITS + INDEX_BITS
-# TAG_BITS is the number of bits of the tag part of the address
-TAG_BITS       = REAL_ADDR_BITS - SET_SIZE_BITS
-# TAG_WIDTH is the width in bits of each way of the tag RAM
-TAG_WIDTH      = TAG_BITS + 7 - ((TAG_BITS + 7) % 8)
-
-# WAY_BITS is the number of bits to select a way
-WAY_BITS       = log2_int(NUM_WAYS)
-TAG_RAM_WIDTH  = TAG_BITS * NUM_WAYS
-
-# L1 ITLB
-TLB_BITS        = log2_int(TLB_SIZE)
-TLB_EA_TAG_BITS = 64 - (TLB_LG_PGSZ + TLB_BITS)
-TLB_PTE_BITS    = 64
-
-print("BRAM_ROWS       =", BRAM_ROWS)
-print("INDEX_BITS      =", INDEX_BITS)
-print("INSN_BITS       =", INSN_BITS)
-print("INSN_PER_ROW    =", INSN_PER_ROW)
-print("LINE_SIZE       =", LINE_SIZE)
-print("LINE_OFF_BITS   =", LINE_OFF_BITS)
-print("LOG_LENGTH      =", LOG_LENGTH)
-print("NUM_LINES       =", NUM_LINES)
-print("NUM_WAYS        =", NUM_WAYS)
-print("REAL_ADDR_BITS  =", REAL_ADDR_BITS)
-print("ROW_BITS        =", ROW_BITS)
-print("ROW_OFF_BITS    =", ROW_OFF_BITS)
-print("ROW_LINE_BITS   =", ROW_LINE_BITS)
-print("ROW_PER_LINE    =", ROW_PER_LINE)
-print("ROW_SIZE        =", ROW_SIZE)
-print("ROW_SIZE_BITS   =", ROW_SIZE_BITS)
-print("SET_SIZE_BITS   =", SET_SIZE_BITS)
-print("SIM             =", SIM)
-print("TAG_BITS        =", TAG_BITS)
-print("TAG_RAM_WIDTH   =", TAG_RAM_WIDTH)
-print("TAG_BITS        =", TAG_BITS)
-print("TLB_BITS        =", TLB_BITS)
-print("TLB_EA_TAG_BITS =", TLB_EA_TAG_BITS)
-print("TLB_LG_PGSZ     =", TLB_LG_PGSZ)
-print("TLB_PTE_BITS    =", TLB_PTE_BITS)
-print("TLB_SIZE        =", TLB_SIZE)
-print("WAY_BITS        =", WAY_BITS)
-
 # from microwatt/utils.vhdl
 def ispow2(n):
     return n != 0 and (n & (n - 1)) == 0
 
-assert LINE_SIZE % ROW_SIZE == 0
-assert ispow2(LINE_SIZE), "LINE_SIZE not power of 2"
-assert ispow2(NUM_LINES), "NUM_LINES not power of 2"
-assert ispow2(ROW_PER_LINE), "ROW_PER_LINE not power of 2"
-assert ispow2(INSN_PER_ROW), "INSN_PER_ROW not power of 2"
-assert (ROW_BITS == (INDEX_BITS + ROW_LINE_BITS)), \
-    "geometry bits don't add up"
-assert (LINE_OFF_BITS == (ROW_OFF_BITS + ROW_LINE_BITS)), \
-   "geometry bits don't add up"
-assert (REAL_ADDR_BITS == (TAG_BITS + INDEX_BITS + LINE_OFF_BITS)), \
-    "geometry bits don't add up"
-assert (REAL_ADDR_BITS == (TAG_BITS + ROW_BITS + ROW_OFF_BITS)), \
-    "geometry bits don't add up"
-
-# Example of layout for 32 lines of 64 bytes:
-#
-# ..  tag    |index|  line  |
-# ..         |   row   |    |
-# ..         |     |   | |00| zero          (2)
-# ..         |     |   |-|  | INSN_BITS     (1)
-# ..         |     |---|    | ROW_LINE_BITS  (3)
-# ..         |     |--- - --| LINE_OFF_BITS (6)
-# ..         |         |- --| ROW_OFF_BITS  (3)
-# ..         |----- ---|    | ROW_BITS      (8)
-# ..         |-----|        | INDEX_BITS    (5)
-# .. --------|              | TAG_BITS      (53)
-
-# The cache data BRAM organized as described above for each way
-#subtype cache_row_t is std_ulogic_vector(ROW_SIZE_BITS-1 downto 0);
-#
-# The cache tags LUTRAM has a row per set. Vivado is a pain and will
-# not handle a clean (commented) definition of the cache tags as a 3d
-# memory. For now, work around it by putting all the tags
-def CacheTagArray():
-    return Array(Signal(TAG_RAM_WIDTH, name="cachetag_%d" %x) \
-                 for x in range(NUM_LINES))
-
-# The cache valid bits
-def CacheValidBitsArray():
-    return Array(Signal(NUM_WAYS, name="cachevalid_%d" %x) \
-                 for x in range(NUM_LINES))
-
-def RowPerLineValidArray():
-    return Array(Signal(name="rows_valid_%d" %x) \
-                 for x in range(ROW_PER_LINE))
-
-
-# TODO to be passed to nigmen as ram attributes
-# attribute ram_style : string;
-# attribute ram_style of cache_tags : signal is "distributed";
-
-
-def TLBValidBitsArray():
-    return Array(Signal(name="tlbvalid_%d" %x) \
-                 for x in range(TLB_SIZE))
-
-def TLBTagArray():
-    return Array(Signal(TLB_EA_TAG_BITS, name="tlbtag_%d" %x) \
-                 for x in range(TLB_SIZE))
-
-def TLBPtesArray():
-    return Array(Signal(TLB_PTE_BITS, name="tlbptes_%d" %x) \
-                 for x in range(TLB_SIZE))
-
-# Cache RAM interface
-def CacheRamOut():
-    return Array(Signal(ROW_SIZE_BITS, name="cache_out_%d" %x) \
-                 for x in range(NUM_WAYS))
-
-# PLRU output interface
-def PLRUOut():
-    return Array(Signal(WAY_BITS, name="plru_out_%d" %x) \
-                 for x in range(NUM_LINES))
-
-# Return the cache line index (tag index) for an address
-def get_index(addr):
-    return addr[LINE_OFF_BITS:SET_SIZE_BITS]
-
-# Return the cache row index (data memory) for an address
-def get_row(addr):
-    return addr[ROW_OFF_BITS:SET_SIZE_BITS]
-
-# Return the index of a row within a line
-def get_row_of_line(row):
-    return row[:ROW_LINE_BITS]
-
-# Returns whether this is the last row of a line
-def is_last_row_addr(addr, last):
-    return addr[ROW_OFF_BITS:LINE_OFF_BITS] == last
-
-# Returns whether this is the last row of a line
-def is_last_row(row, last):
-    return get_row_of_line(row) == last
-
-# Return the next row in the current cache line. We use a dedicated
-# function in order to limit the size of the generated adder to be
-# only the bits within a cache line (3 bits with default settings)
-def next_row(row):
-    row_v = row[0:ROW_LINE_BITS] + 1
-    return Cat(row_v[:ROW_LINE_BITS], row[ROW_LINE_BITS:])
-
-# Read the instruction word for the given address
-# in the current cache row
-def read_insn_word(addr, data):
-    word = addr[2:INSN_BITS+2]
-    return data.word_select(word, 32)
-
-# Get the tag value from the address
-def get_tag(addr):
-    return addr[SET_SIZE_BITS:REAL_ADDR_BITS]
-
-# Read a tag from a tag memory row
-def read_tag(way, tagset):
-    return tagset.word_select(way, TAG_BITS)
-
-# Write a tag to tag memory row
-def write_tag(way, tagset, tag):
-    return read_tag(way, tagset).eq(tag)
-
-# Simple hash for direct-mapped TLB index
-def hash_ea(addr):
-    hsh = addr[TLB_LG_PGSZ:TLB_LG_PGSZ + TLB_BITS] ^ addr[
-           TLB_LG_PGSZ + TLB_BITS:TLB_LG_PGSZ + 2 * TLB_BITS
-          ] ^ addr[
-           TLB_LG_PGSZ + 2 * TLB_BITS:TLB_LG_PGSZ + 3 * TLB_BITS
-          ]
-    return hsh
+
+class ICacheConfig:
+    """ICache geometry: the sizes of the cache and of the L1 ITLB
+
+    the bit-field widths of the address and the BRAM organisation are
+    all derived from these.  ICache inherits from this class.
+
+    * :line_size:   line size in bytes
+    * :num_lines:   number of lines in a set
+    * :num_ways:    number of ways
+    * :tlb_size:    L1 ITLB number of entries (direct mapped)
+    * :tlb_lg_pgsz: L1 ITLB log_2(page_size)
+    """
+    def __init__(self, line_size=LINE_SIZE, num_lines=NUM_LINES,
+                       num_ways=NUM_WAYS, tlb_size=TLB_SIZE,
+                       tlb_lg_pgsz=TLB_LG_PGSZ):
+        self.LINE_SIZE      = line_size
+        # BRAM organisation: We never access more than wishbone_data_bits
+        # at a time so to save resources we make the array only that wide,
+        # and use consecutive indices for to make a cache "line"
+        #
+        # ROW_SIZE is the width in bytes of the BRAM (based on WB, so 64-bits)
+        self.ROW_SIZE       = WB_DATA_BITS // 8
+        # Number of lines in a set
+        self.NUM_LINES      = num_lines
+        # Number of ways
+        self.NUM_WAYS       = num_ways
+        # L1 ITLB number of entries (direct mapped)
+        self.TLB_SIZE       = tlb_size
+        # L1 ITLB log_2(page_size)
+        self.TLB_LG_PGSZ    = tlb_lg_pgsz
+        # Number of real address bits that we store
+        self.REAL_ADDR_BITS = 56
+
+        self.ROW_SIZE_BITS  = self.ROW_SIZE * 8
+        # ROW_PER_LINE is the number of row (wishbone) transactions in a line
+        self.ROW_PER_LINE   = self.LINE_SIZE // self.ROW_SIZE
+        # BRAM_ROWS is the number of rows in BRAM needed to represent the
+        # full icache
+        self.BRAM_ROWS      = self.NUM_LINES * self.ROW_PER_LINE
+        # INSN_PER_ROW is the number of 32bit instructions per BRAM row
+        self.INSN_PER_ROW   = self.ROW_SIZE_BITS // 32
+
+        # Bit fields counts in the address
+        #
+        # INSN_BITS is the number of bits to select an instruction in a row
+        self.INSN_BITS      = log2_int(self.INSN_PER_ROW)
+        # ROW_BITS is the number of bits to select a row
+        self.ROW_BITS       = log2_int(self.BRAM_ROWS)
+        # ROW_LINE_BITS is the number of bits to select a row within a line
+        self.ROW_LINE_BITS  = log2_int(self.ROW_PER_LINE)
+        # LINE_OFF_BITS is the number of bits for the offset in a cache line
+        self.LINE_OFF_BITS  = log2_int(self.LINE_SIZE)
+        # ROW_OFF_BITS is the number of bits for the offset in a row
+        self.ROW_OFF_BITS   = log2_int(self.ROW_SIZE)
+        # INDEX_BITS is the number of bits to select a cache line
+        self.INDEX_BITS     = log2_int(self.NUM_LINES)
+        # SET_SIZE_BITS is the log base 2 of the set size
+        self.SET_SIZE_BITS  = self.LINE_OFF_BITS + self.INDEX_BITS
+        # TAG_BITS is the number of bits of the tag part of the address
+        self.TAG_BITS       = self.REAL_ADDR_BITS - self.SET_SIZE_BITS
+        # TAG_WIDTH is the width in bits of each way of the tag RAM
+        self.TAG_WIDTH      = self.TAG_BITS + 7 - ((self.TAG_BITS + 7) % 8)
+
+        # WAY_BITS is the number of bits to select a way
+        self.WAY_BITS       = log2_int(self.NUM_WAYS)
+        self.TAG_RAM_WIDTH  = self.TAG_BITS * self.NUM_WAYS
+
+        # L1 ITLB
+        self.TLB_BITS        = log2_int(self.TLB_SIZE)
+        self.TLB_EA_TAG_BITS = 64 - (self.TLB_LG_PGSZ + self.TLB_BITS)
+        self.TLB_PTE_BITS    = 64
+
+        log.debug("BRAM_ROWS       = %s", self.BRAM_ROWS)
+        log.debug("INDEX_BITS      = %s", self.INDEX_BITS)
+        log.debug("INSN_BITS       = %s", self.INSN_BITS)
+        log.debug("INSN_PER_ROW    = %s", self.INSN_PER_ROW)
+        log.debug("LINE_SIZE       = %s", self.LINE_SIZE)
+        log.debug("LINE_OFF_BITS   = %s", self.LINE_OFF_BITS)
+        log.debug("LOG_LENGTH      = %s", LOG_LENGTH)
+        log.debug("NUM_LINES       = %s", self.NUM_LINES)
+        log.debug("NUM_WAYS        = %s", self.NUM_WAYS)
+        log.debug("REAL_ADDR_BITS  = %s", self.REAL_ADDR_BITS)
+        log.debug("ROW_BITS        = %s", self.ROW_BITS)
+        log.debug("ROW_OFF_BITS    = %s", self.ROW_OFF_BITS)
+        log.debug("ROW_LINE_BITS   = %s", self.ROW_LINE_BITS)
+        log.debug("ROW_PER_LINE    = %s", self.ROW_PER_LINE)
+        log.debug("ROW_SIZE        = %s", self.ROW_SIZE)
+        log.debug("ROW_SIZE_BITS   = %s", self.ROW_SIZE_BITS)
+        log.debug("SET_SIZE_BITS   = %s", self.SET_SIZE_BITS)
+        log.debug("SIM             = %s", SIM)
+        log.debug("TAG_BITS        = %s", self.TAG_BITS)
+        log.debug("TAG_RAM_WIDTH   = %s", self.TAG_RAM_WIDTH)
+        log.debug("TAG_BITS        = %s", self.TAG_BITS)
+        log.debug("TLB_BITS        = %s", self.TLB_BITS)
+        log.debug("TLB_EA_TAG_BITS = %s", self.TLB_EA_TAG_BITS)
+        log.debug("TLB_LG_PGSZ     = %s", self.TLB_LG_PGSZ)
+        log.debug("TLB_PTE_BITS    = %s", self.TLB_PTE_BITS)
+        log.debug("TLB_SIZE        = %s", self.TLB_SIZE)
+        log.debug("WAY_BITS        = %s", self.WAY_BITS)
+
+        assert self.LINE_SIZE % self.ROW_SIZE == 0
+        assert ispow2(self.LINE_SIZE), "LINE_SIZE not power of 2"
+        assert ispow2(self.NUM_LINES), "NUM_LINES not power of 2"
+        assert ispow2(self.NUM_WAYS), "NUM_WAYS not power of 2"
+        assert ispow2(self.TLB_SIZE), "TLB_SIZE not power of 2"
+        assert ispow2(self.ROW_PER_LINE), "ROW_PER_LINE not power of 2"
+        assert ispow2(self.INSN_PER_ROW), "INSN_PER_ROW not power of 2"
+        assert (self.ROW_BITS == (self.INDEX_BITS + self.ROW_LINE_BITS)), \
+            "geometry bits don't add up"
+        assert (self.LINE_OFF_BITS ==
+                (self.ROW_OFF_BITS + self.ROW_LINE_BITS)), \
+           "geometry bits don't add up"
+        assert (self.REAL_ADDR_BITS == (self.TAG_BITS + self.INDEX_BITS +
+                                        self.LINE_OFF_BITS)), \
+            "geometry bits don't add up"
+        assert (self.REAL_ADDR_BITS == (self.TAG_BITS + self.ROW_BITS +
+                                        self.ROW_OFF_BITS)), \
+            "geometry bits don't add up"
+
+    # Example of layout for 32 lines of 64 bytes:
+    #
+    # ..  tag    |index|  line  |
+    # ..         |   row   |    |
+    # ..         |     |   | |00| zero          (2)
+    # ..         |     |   |-|  | INSN_BITS     (1)
+    # ..         |     |---|    | ROW_LINE_BITS  (3)
+    # ..         |     |--- - --| LINE_OFF_BITS (6)
+    # ..         |         |- --| ROW_OFF_BITS  (3)
+    # ..         |----- ---|    | ROW_BITS      (8)
+    # ..         |-----|        | INDEX_BITS    (5)
+    # .. --------|              | TAG_BITS      (53)
+
+    # The cache data BRAM organized as described above for each way
+    #subtype cache_row_t is std_ulogic_vector(ROW_SIZE_BITS-1 downto 0);
+    #
+    # The cache tags LUTRAM has a row per set. Vivado is a pain and will
+    # not handle a clean (commented) definition of the cache tags as a 3d
+    # memory. For now, work around it by putting all the tags
+    def CacheTagArray(self):
+        return Array(Signal(self.TAG_RAM_WIDTH, name="cachetag_%d" %x) \
+                     for x in range(self.NUM_LINES))
+
+    # The cache valid bits
+    def CacheValidBitsArray(self):
+        return Array(Signal(self.NUM_WAYS, name="cachevalid_%d" %x) \
+                     for x in range(self.NUM_LINES))
+
+    def RowPerLineValidArray(self):
+        return Array(Signal(name="rows_valid_%d" %x) \
+                     for x in range(self.ROW_PER_LINE))
+
+
+    # TODO to be passed to nigmen as ram attributes
+    # attribute ram_style : string;
+    # attribute ram_style of cache_tags : signal is "distributed";
+
+
+    def TLBValidBitsArray(self):
+        return Array(Signal(name="tlbvalid_%d" %x) \
+                     for x in range(self.TLB_SIZE))
+
+    def TLBTagArray(self):
+        return Array(Signal(self.TLB_EA_TAG_BITS, name="tlbtag_%d" %x) \
+                     for x in range(self.TLB_SIZE))
+
+    def TLBPtesArray(self):
+        return Array(Signal(self.TLB_PTE_BITS, name="tlbptes_%d" %x) \
+                     for x in range(self.TLB_SIZE))
+
+    # Cache RAM interface
+    def CacheRamOut(self):
+        return Array(Signal(self.ROW_SIZE_BITS, name="cache_out_%d" %x) \
+                     for x in range(self.NUM_WAYS))
+
+    # PLRU output interface
+    def PLRUOut(self):
+        return Array(Signal(self.WAY_BITS, name="plru_out_%d" %x) \
+                     for x in range(self.NUM_LINES))
+
+    # Return the cache line index (tag index) for an address
+    def get_index(self, addr):
+        return addr[self.LINE_OFF_BITS:self.SET_SIZE_BITS]
+
+    # Return the cache row index (data memory) for an address
+    def get_row(self, addr):
+        return addr[self.ROW_OFF_BITS:self.SET_SIZE_BITS]
+
+    # Return the index of a row within a line
+    def get_row_of_line(self, row):
+        return row[:self.ROW_LINE_BITS]
+
+    # Returns whether this is the last row of a line
+    def is_last_row_addr(self, addr, last):
+        return addr[self.ROW_OFF_BITS:self.LINE_OFF_BITS] == last
+
+    # Returns whether this is the last row of a line
+    def is_last_row(self, row, last):
+        return self.get_row_of_line(row) == last
+
+    # Return the next row in the current cache line. We use a dedicated
+    # function in order to limit the size of the generated adder to be
+    # only the bits within a cache line (3 bits with default settings)
+    def next_row(self, row):
+        row_v = row[0:self.ROW_LINE_BITS] + 1
+        return Cat(row_v[:self.ROW_LINE_BITS], row[self.ROW_LINE_BITS:])
+
+    # Read the instruction word for the given address
+    # in the current cache row
+    def read_insn_word(self, addr, data):
+        word = addr[2:self.INSN_BITS+2]
+        return data.word_select(word, 32)
+
+    # Get the tag value from the address
+    def get_tag(self, addr):
+        return addr[self.SET_SIZE_BITS:self.REAL_ADDR_BITS]
+
+    # Read a tag from a tag memory row
+    def read_tag(self, way, tagset):
+        return tagset.word_select(way, self.TAG_BITS)
+
+    # Write a tag to tag memory row
+    def write_tag(self, way, tagset, tag):
+        return self.read_tag(way, tagset).eq(tag)
+
+    # Simple hash for direct-mapped TLB index
+    def hash_ea(self, addr):
+        TLB_LG_PGSZ, TLB_BITS = self.TLB_LG_PGSZ, self.TLB_BITS
+        hsh = addr[TLB_LG_PGSZ:TLB_LG_PGSZ + TLB_BITS] ^ addr[
+               TLB_LG_PGSZ + TLB_BITS:TLB_LG_PGSZ + 2 * TLB_BITS
+              ] ^ addr[
+               TLB_LG_PGSZ + 2 * TLB_BITS:TLB_LG_PGSZ + 3 * TLB_BITS
+              ]
+        return hsh
 
 
 # Cache reload state machine
@@ -280,10 +319,10 @@ class State(Enum):
 
 
 class RegInternal(RecordObject):
-    def __init__(self):
+    def __init__(self, cfg):
         super().__init__()
         # Cache hit state (Latches for 1 cycle BRAM access)
-        self.hit_way      = Signal(NUM_WAYS)
+        self.hit_way      = Signal(cfg.NUM_WAYS)
         self.hit_nia      = Signal(64)
         self.hit_smark    = Signal()
         self.hit_valid    = Signal()
@@ -292,21 +331,50 @@ class RegInternal(RecordObject):
         self.state        = Signal(State, reset=State.IDLE)
         self.wb           = WBMasterOut("wb")
         self.req_adr      = Signal(64)
-        self.store_way    = Signal(NUM_WAYS)
-        self.store_index  = Signal(NUM_LINES)
-        self.store_row    = Signal(BRAM_ROWS)
-        self.store_tag    = Signal(TAG_BITS)
+        self.store_way    = Signal(cfg.NUM_WAYS)
+        self.store_index  = Signal(cfg.INDEX_BITS)
+        self.store_row    = Signal(cfg.ROW_BITS)
+        self.store_tag    = Signal(cfg.TAG_BITS)
         self.store_valid  = Signal()
-        self.end_row_ix   = Signal(ROW_LINE_BITS)
-        self.rows_valid   = RowPerLineValidArray()
+        self.end_row_ix   = Signal(cfg.ROW_LINE_BITS)
+        self.rows_valid   = cfg.RowPerLineValidArray()
 
         # TLB miss state
         self.fetch_failed = Signal()
 
 
-class ICache(Elaboratable):
-    """64 bit direct mapped icache. All instructions are 4B aligned."""
-    def __init__(self):
+class ICache(Elaboratable, ICacheConfig):
+    """64 bit direct mapped icache. All instructions are 4B aligned.
+
+    the geometry (see ICacheConfig) may be given as keyword arguments or
+    taken from pspec (icache_line_size, icache_num_lines, icache_num_ways,
+    itlb_size).  keyword arguments take precedence.
+
+    line refill issues back-to-back wishbone requests, starting at the
+    row containing the missed instruction (critical word first), and
+    fetch resumes as soon as that row has arrived.  with a pipelined
+    wishbone slave (icache_wb_pipelined / wb_pipelined=True) a new
+    request goes out on every cycle that wb_in.stall is clear.  for a
+    classic slave, wb_in.stall is ignored and stall is made up internally
+    (wb_stall = cyc & ~ack), which keeps one request in flight.
+    """
+    def __init__(self, pspec=None, wb_pipelined=None, **kwargs):
+        geometry = {}
+        for (pname, kwname) in [("icache_line_size", "line_size"),
+                                ("icache_num_lines", "num_lines"),
+                                ("icache_num_ways", "num_ways"),
+                                ("itlb_size", "tlb_size")]:
+            if (hasattr(pspec, pname) and
+                    isinstance(getattr(pspec, pname), int)):
+                geometry[kwname] = getattr(pspec, pname)
+        geometry.update(kwargs)
+        ICacheConfig.__init__(self, **geometry)
+
+        if wb_pipelined is None:
+            wb_pipelined = (hasattr(pspec, "icache_wb_pipelined") and
+                            pspec.icache_wb_pipelined == True)
+        self.wb_pipelined = wb_pipelined
+
         self.i_in           = Fetch1ToICacheType(name="i_in")
         self.i_out          = ICacheToDecode1Type(name="i_out")
 
@@ -319,8 +387,11 @@ class ICache(Elaboratable):
 
         self.wb_out         = WBMasterOut(name="wb_out")
         self.wb_in          = WBSlaveOut(name="wb_in")
+        # stall seen by the refill: wb_in.stall, or made up from ack
+        self.wb_stall       = Signal()
 
         self.log_out        = Signal(54)
+        self.events         = ICacheEventType(name="events")
 
 
     # Generate a cache RAM for each way
@@ -332,15 +403,15 @@ class ICache(Elaboratable):
 
         wb_in, stall_in = self.wb_in, self.stall_in
 
-        for i in range(NUM_WAYS):
+        for i in range(self.NUM_WAYS):
             do_read  = Signal(name="do_rd_%d" % i)
             do_write = Signal(name="do_wr_%d" % i)
-            rd_addr  = Signal(ROW_BITS)
-            wr_addr  = Signal(ROW_BITS)
-            d_out    = Signal(ROW_SIZE_BITS, name="d_out_%d" % i)
-            wr_sel   = Signal(ROW_SIZE)
+            rd_addr  = Signal(self.ROW_BITS)
+            wr_addr  = Signal(self.ROW_BITS)
+            d_out    = Signal(self.ROW_SIZE_BITS, name="d_out_%d" % i)
+            wr_sel   = Signal(self.ROW_SIZE)
 
-            way = CacheRam(ROW_BITS, ROW_SIZE_BITS, True)
+            way = CacheRam(self.ROW_BITS, self.ROW_SIZE_BITS, True)
             setattr(m.submodules, "cacheram_%d" % i, way)
 
             comb += way.rd_en.eq(do_read)
@@ -365,24 +436,24 @@ class ICache(Elaboratable):
 
             comb += rd_addr.eq(req_row)
             comb += wr_addr.eq(r.store_row)
-            comb += wr_sel.eq(Repl(do_write, ROW_SIZE))
+            comb += wr_sel.eq(Repl(do_write, self.ROW_SIZE))
 
     # Generate PLRUs
     def maybe_plrus(self, m, r, plru_victim):
         comb = m.d.comb
 
-        with m.If(NUM_WAYS > 1):
-            for i in range(NUM_LINES):
-                plru_acc_i  = Signal(WAY_BITS)
+        with m.If(self.NUM_WAYS > 1):
+            for i in range(self.NUM_LINES):
+                plru_acc_i  = Signal(self.WAY_BITS)
                 plru_acc_en = Signal()
-                plru        = PLRU(WAY_BITS)
+                plru        = PLRU(self.WAY_BITS)
                 setattr(m.submodules, "plru_%d" % i, plru)
 
                 comb += plru.acc_i.eq(plru_acc_i)
                 comb += plru.acc_en.eq(plru_acc_en)
 
                 # PLRU interface
-                with m.If(get_index(r.hit_nia) == i):
+                with m.If(self.get_index(r.hit_nia) == i):
                     comb += plru.acc_en.eq(r.hit_valid)
 
                 comb += plru.acc_i.eq(r.hit_way)
@@ -397,26 +468,26 @@ class ICache(Elaboratable):
 
         i_in = self.i_in
 
-        pte  = Signal(TLB_PTE_BITS)
-        ttag = Signal(TLB_EA_TAG_BITS)
+        pte  = Signal(self.TLB_PTE_BITS)
+        ttag = Signal(self.TLB_EA_TAG_BITS)
 
-        comb += tlb_req_index.eq(hash_ea(i_in.nia))
+        comb += tlb_req_index.eq(self.hash_ea(i_in.nia))
         comb += pte.eq(itlb_ptes[tlb_req_index])
         comb += ttag.eq(itlb_tags[tlb_req_index])
 
         with m.If(i_in.virt_mode):
             comb += real_addr.eq(Cat(
-                     i_in.nia[:TLB_LG_PGSZ],
-                     pte[TLB_LG_PGSZ:REAL_ADDR_BITS]
+                     i_in.nia[:self.TLB_LG_PGSZ],
+                     pte[self.TLB_LG_PGSZ:self.REAL_ADDR_BITS]
                     ))
 
-            with m.If(ttag == i_in.nia[TLB_LG_PGSZ + TLB_BITS:64]):
+            with m.If(ttag == i_in.nia[self.TLB_LG_PGSZ + self.TLB_BITS:64]):
                 comb += ra_valid.eq(itlb_valid_bits[tlb_req_index])
 
             comb += eaa_priv.eq(pte[3])
 
         with m.Else():
-            comb += real_addr.eq(i_in.nia[:REAL_ADDR_BITS])
+            comb += real_addr.eq(i_in.nia[:self.REAL_ADDR_BITS])
             comb += ra_valid.eq(1)
             comb += eaa_priv.eq(1)
 
@@ -431,12 +502,12 @@ class ICache(Elaboratable):
 
         m_in = self.m_in
 
-        wr_index = Signal(TLB_SIZE)
-        comb += wr_index.eq(hash_ea(m_in.addr))
+        wr_index = Signal(self.TLB_BITS)
+        comb += wr_index.eq(self.hash_ea(m_in.addr))
 
         with m.If(m_in.tlbie & m_in.doall):
             # Clear all valid bits
-            for i in range(TLB_SIZE):
+            for i in range(self.TLB_SIZE):
                 sync += itlb_valid_bits[i].eq(0)
 
         with m.Elif(m_in.tlbie):
@@ -445,7 +516,7 @@ class ICache(Elaboratable):
 
         with m.Elif(m_in.tlbld):
             sync += itlb_tags[wr_index].eq(
-                     m_in.addr[TLB_LG_PGSZ + TLB_BITS:64]
+                     m_in.addr[self.TLB_LG_PGSZ + self.TLB_BITS:64]
                     )
             sync += itlb_ptes[wr_index].eq(m_in.pte)
             sync += itlb_valid_bits[wr_index].eq(1)
@@ -463,41 +534,41 @@ class ICache(Elaboratable):
         flush_in, stall_out = self.flush_in, self.stall_out
 
         is_hit  = Signal()
-        hit_way = Signal(NUM_WAYS)
+        hit_way = Signal(self.NUM_WAYS)
 
         # i_in.sequential means that i_in.nia this cycle is 4 more than
         # last cycle.  If we read more than 32 bits at a time, had a
         # cache hit last cycle, and we don't want the first 32-bit chunk
         # then we can keep the data we read last cycle and just use that.
-        with m.If(i_in.nia[2:INSN_BITS+2] != 0):
+        with m.If(i_in.nia[2:self.INSN_BITS+2] != 0):
             comb += use_previous.eq(i_in.sequential & r.hit_valid)
 
         # Extract line, row and tag from request
-        comb += req_index.eq(get_index(i_in.nia))
-        comb += req_row.eq(get_row(i_in.nia))
-        comb += req_tag.eq(get_tag(real_addr))
+        comb += req_index.eq(self.get_index(i_in.nia))
+        comb += req_row.eq(self.get_row(i_in.nia))
+        comb += req_tag.eq(self.get_tag(real_addr))
 
         # Calculate address of beginning of cache row, will be
         # used for cache miss processing if needed
         comb += req_laddr.eq(Cat(
-                 Const(0, ROW_OFF_BITS),
-                 real_addr[ROW_OFF_BITS:REAL_ADDR_BITS],
+                 Const(0, self.ROW_OFF_BITS),
+                 real_addr[self.ROW_OFF_BITS:self.REAL_ADDR_BITS],
                 ))
 
         # Test if pending request is a hit on any way
         hitcond = Signal()
         comb += hitcond.eq((r.state == State.WAIT_ACK)
                  & (req_index == r.store_index)
-                 & r.rows_valid[req_row % ROW_PER_LINE]
+                 & r.rows_valid[req_row % self.ROW_PER_LINE]
                 )
         with m.If(i_in.req):
-            cvb = Signal(NUM_WAYS)
-            ctag = Signal(TAG_RAM_WIDTH)
+            cvb = Signal(self.NUM_WAYS)
+            ctag = Signal(self.TAG_RAM_WIDTH)
             comb += ctag.eq(cache_tags[req_index])
             comb += cvb.eq(cache_valid_bits[req_index])
-            for i in range(NUM_WAYS):
-                tagi = Signal(TAG_BITS, name="tag_i%d" % i)
-                comb += tagi.eq(read_tag(i, ctag))
+            for i in range(self.NUM_WAYS):
+                tagi = Signal(self.TAG_BITS, name="tag_i%d" % i)
+                comb += tagi.eq(self.read_tag(i, ctag))
                 hit_test = Signal(name="hit_test%d" % i)
                 comb += hit_test.eq(i == r.store_way)
                 with m.If((cvb[i] | (hitcond & hit_test))
@@ -531,7 +602,7 @@ class ICache(Elaboratable):
         # be output an entire row which I prefer not to do just yet
         # as it would force fetch2 to know about some of the cache
         # geometry information.
-        comb += i_out.insn.eq(read_insn_word(r.hit_nia, cache_out_row))
+        comb += i_out.insn.eq(self.read_insn_word(r.hit_nia, cache_out_row))
         comb += i_out.valid.eq(r.hit_valid)
         comb += i_out.nia.eq(r.hit_nia)
         comb += i_out.stop_mark.eq(r.hit_smark)
@@ -589,7 +660,7 @@ class ICache(Elaboratable):
         i_in = self.i_in
 
         # Reset per-row valid flags, only used in WAIT_ACK
-        for i in range(ROW_PER_LINE):
+        for i in range(self.ROW_PER_LINE):
             sync += r.rows_valid[i].eq(0)
 
         # We need to read a cache line
@@ -602,13 +673,13 @@ class ICache(Elaboratable):
                     )
 
             # Keep track of our index and way for subsequent stores
-            st_row = Signal(BRAM_ROWS)
-            comb += st_row.eq(get_row(req_laddr))
+            st_row = Signal(self.ROW_BITS)
+            comb += st_row.eq(self.get_row(req_laddr))
             sync += r.store_index.eq(req_index)
             sync += r.store_row.eq(st_row)
             sync += r.store_tag.eq(req_tag)
             sync += r.store_valid.eq(1)
-            sync += r.end_row_ix.eq(get_row_of_line(st_row) - 1)
+            sync += r.end_row_ix.eq(self.get_row_of_line(st_row) - 1)
 
             # Prep for first wishbone read.  We calculate the address
             # of the start of the cache line and start the WB cycle.
@@ -629,15 +700,15 @@ class ICache(Elaboratable):
         # Get victim way from plru
         sync += r.store_way.eq(replace_way)
         # Force misses on that way while reloading that line
-        cv = Signal(INDEX_BITS)
+        cv = Signal(self.NUM_WAYS)
         comb += cv.eq(cache_valid_bits[req_index])
         comb += cv.bit_select(replace_way, 1).eq(0)
         sync += cache_valid_bits[req_index].eq(cv)
 
-        for i in range(NUM_WAYS):
+        for i in range(self.NUM_WAYS):
             with m.If(i == replace_way):
                 comb += tagset.eq(cache_tags[r.store_index])
-                comb += write_tag(i, tagset, r.store_tag)
+                comb += self.write_tag(i, tagset, r.store_tag)
                 sync += cache_tags[r.store_index].eq(tagset)
 
         sync += r.state.eq(State.WAIT_ACK)
@@ -655,11 +726,11 @@ class ICache(Elaboratable):
         comb += stbs_done.eq(stbs_zero)
 
         # If we are still sending requests, was one accepted?
-        with m.If(~wb_in.stall & ~stbs_zero):
+        with m.If(~self.wb_stall & ~stbs_zero):
             # That was the last word? We are done sending.
             # Clear stb and set stbs_done so we can handle
             # an eventual last ack on the same cycle.
-            with m.If(is_last_row_addr(r.req_adr, r.end_row_ix)):
+            with m.If(self.is_last_row_addr(r.req_adr, r.end_row_ix)):
                 sync += Display(
                          "IS_LAST_ROW_ADDR r.wb.addr:%x " \
                          "r.end_row_ix:%x r.wb.stb:%x stbs_zero:%x " \
@@ -670,11 +741,11 @@ class ICache(Elaboratable):
                 comb += stbs_done.eq(1)
 
             # Calculate the next row address
-            rarange = Signal(LINE_OFF_BITS - ROW_OFF_BITS)
+            rarange = Signal(self.LINE_OFF_BITS - self.ROW_OFF_BITS)
             comb += rarange.eq(
-                     r.req_adr[ROW_OFF_BITS:LINE_OFF_BITS] + 1
+                     r.req_adr[self.ROW_OFF_BITS:self.LINE_OFF_BITS] + 1
                     )
-            sync += r.req_adr[ROW_OFF_BITS:LINE_OFF_BITS].eq(
+            sync += r.req_adr[self.ROW_OFF_BITS:self.LINE_OFF_BITS].eq(
                      rarange
                     )
             sync += Display("RARANGE r.req_adr:%x rarange:%x "
@@ -687,18 +758,18 @@ class ICache(Elaboratable):
                             "stbs_done:%x",
                             wb_in.dat, stbs_zero, stbs_done)
 
-            sync += r.rows_valid[r.store_row % ROW_PER_LINE].eq(1)
+            sync += r.rows_valid[r.store_row % self.ROW_PER_LINE].eq(1)
 
             # Check for completion
             with m.If(stbs_done &
-                      is_last_row(r.store_row, r.end_row_ix)):
+                      self.is_last_row(r.store_row, r.end_row_ix)):
                 # Complete wishbone cycle
                 sync += r.wb.cyc.eq(0)
                 # be nice, clear addr
                 sync += r.req_adr.eq(0)
 
                 # Cache line is now valid
-                cv = Signal(INDEX_BITS)
+                cv = Signal(self.NUM_WAYS)
                 comb += cv.eq(cache_valid_bits[r.store_index])
                 comb += cv.bit_select(replace_way, 1).eq(
                          r.store_valid & ~inval_in
@@ -710,7 +781,7 @@ class ICache(Elaboratable):
             # not completed, move on to next request in row
             with m.Else():
                 # Increment store row counter
-                sync += r.store_row.eq(next_row(r.store_row))
+                sync += r.store_row.eq(self.next_row(r.store_row))
 
 
     # Cache miss/reload synchronous machine
@@ -724,15 +795,15 @@ class ICache(Elaboratable):
         stall_in, flush_in = self.stall_in, self.flush_in
         inval_in           = self.inval_in
 
-        tagset    = Signal(TAG_RAM_WIDTH)
+        tagset    = Signal(self.TAG_RAM_WIDTH)
         stbs_done = Signal()
 
         comb += r.wb.sel.eq(-1)
-        comb += r.wb.adr.eq(r.req_adr[3:])
+        comb += r.wb.adr.eq(r.req_adr[self.ROW_OFF_BITS:])
 
         # Process cache invalidations
         with m.If(inval_in):
-            for i in range(NUM_LINES):
+            for i in range(self.NUM_LINES):
                 sync += cache_valid_bits[i].eq(0)
             sync += r.store_valid.eq(0)
 
@@ -777,7 +848,7 @@ class ICache(Elaboratable):
         # Output data to logger
         for i in range(LOG_LENGTH):
             log_data = Signal(54)
-            lway     = Signal(NUM_WAYS)
+            lway     = Signal(self.NUM_WAYS)
             wstate   = Signal()
 
             sync += lway.eq(req_hit_way)
@@ -789,7 +860,7 @@ class ICache(Elaboratable):
             sync += log_data.eq(Cat(
                      ra_valid, access_ok, req_is_miss, req_is_hit,
                      lway, wstate, r.hit_nia[2:6], r.fetch_failed,
-                     stall_out, wb_in.stall, r.wb.cyc, r.wb.stb,
+                     stall_out, self.wb_stall, r.wb.cyc, r.wb.stb,
                      r.real_addr[3:6], wb_in.ack, i_out.insn, i_out.valid
                     ))
             comb += log_out.eq(log_data)
@@ -800,12 +871,12 @@ class ICache(Elaboratable):
         comb             = m.d.comb
 
         # Storage. Hopefully "cache_rows" is a BRAM, the rest is LUTs
-        cache_tags       = CacheTagArray()
-        cache_valid_bits = CacheValidBitsArray()
+        cache_tags       = self.CacheTagArray()
+        cache_valid_bits = self.CacheValidBitsArray()
 
-        itlb_valid_bits  = TLBValidBitsArray()
-        itlb_tags        = TLBTagArray()
-        itlb_ptes        = TLBPtesArray()
+        itlb_valid_bits  = self.TLBValidBitsArray()
+        itlb_tags        = self.TLBTagArray()
+        itlb_ptes        = self.TLBPtesArray()
         # TODO to be passed to nmigen as ram attributes
         # attribute ram_style of itlb_tags : signal is "distributed";
         # attribute ram_style of itlb_ptes : signal is "distributed";
@@ -813,28 +884,36 @@ class ICache(Elaboratable):
         # Privilege bit from PTE EAA field
         eaa_priv         = Signal()
 
-        r                = RegInternal()
+        r                = RegInternal(self)
 
         # Async signal on incoming request
-        req_index        = Signal(NUM_LINES)
-        req_row          = Signal(BRAM_ROWS)
-        req_hit_way      = Signal(NUM_WAYS)
-        req_tag          = Signal(TAG_BITS)
+        req_index        = Signal(self.INDEX_BITS)
+        req_row          = Signal(self.ROW_BITS)
+        req_hit_way      = Signal(self.NUM_WAYS)
+        req_tag          = Signal(self.TAG_BITS)
         req_is_hit       = Signal()
         req_is_miss      = Signal()
         req_laddr        = Signal(64)
 
-        tlb_req_index    = Signal(TLB_SIZE)
-        real_addr        = Signal(REAL_ADDR_BITS)
+        tlb_req_index    = Signal(self.TLB_BITS)
+        real_addr        = Signal(self.REAL_ADDR_BITS)
         ra_valid         = Signal()
         priv_fault       = Signal()
         access_ok        = Signal()
         use_previous     = Signal()
 
-        cache_out_row    = Signal(ROW_SIZE_BITS)
+        cache_out_row    = Signal(self.ROW_SIZE_BITS)
+
+        plru_victim      = self.PLRUOut()
+        replace_way      = Signal(self.NUM_WAYS)
 
-        plru_victim      = PLRUOut()
-        replace_way      = Signal(NUM_WAYS)
+        # deal with a classic (non-pipelined) wishbone slave: only one
+        # request may be outstanding, so the next is held off until ack.
+        # wb_in is left entirely to the parent to drive
+        if self.wb_pipelined:
+            comb += self.wb_stall.eq(self.wb_in.stall)
+        else:
+            comb += self.wb_stall.eq(self.wb_out.cyc & ~self.wb_in.ack)
 
         # call sub-functions putting everything together,
         # using shared signals established above
@@ -856,6 +935,97 @@ class ICache(Elaboratable):
         #self.icache_log(m, log_out, req_hit_way, ra_valid, access_ok,
         #                req_is_miss, req_is_hit, lway, wstate, r)
 
+        # performance events: a hit is counted when it is latched, a miss
+        # when the refill starts
+        ev = self.events
+        m.d.sync += ev.hit.eq(req_is_hit & ~self.stall_in)
+        m.d.sync += ev.miss.eq(req_is_miss & (r.state == State.IDLE))
+        m.d.sync += ev.itlb_miss.eq(self.i_in.req & self.i_in.virt_mode &
+                                    ~ra_valid & ~self.stall_in)
+
+        return m
+
+
+class ICacheFetchUnit(FetchUnitInterface, Elaboratable):
+    """FetchUnitInterface front-end to ICache
+
+    the PC is captured on a_i_valid (and presented to the ICache in that
+    same cycle), then the request is held until the ICache returns the
+    instruction at that address, at which point f_busy_o drops.  the
+    32-bit instruction is replicated across f_instr_o so that selecting
+    by pc[2] (as TestIssuer does for a 64-bit bus) picks it out.
+
+    there is no MMU connection (yet): fetches are real-mode, privileged.
+    the ibus (make_wb_layout) has no stall, so the ICache is always
+    configured for a classic wishbone slave.
+    """
+    def __init__(self, pspec):
+        super().__init__(pspec)
+        assert self.data_wid == WB_DATA_BITS, \
+            "ICacheFetchUnit needs a %d-bit instruction bus" % WB_DATA_BITS
+        self.icache = ICache(pspec, wb_pipelined=False)
+        self.inval_i = Signal() # invalidate the entire cache
+
+    def elaborate(self, platform):
+        m = Module()
+        comb, sync = m.d.comb, m.d.sync
+        m.submodules.icache = icache = self.icache
+        i_in, i_out = icache.i_in, icache.i_out
+        wb_out, wb_in = icache.wb_out, icache.wb_in
+        ibus = self.ibus
+
+        busy = Signal()
+        fetch_pc = Signal(self.addr_wid, reset_less=True)
+        f_instr = Signal(self.data_wid, reset_less=True)
+        got = Signal()
+
+        comb += icache.inval_in.eq(self.inval_i)
+
+        with m.If(self.jtag_en): # for safety, JTAG can completely disable WB
+
+            # ICache is the wishbone master
+            comb += ibus.adr.eq(wb_out.adr)
+            comb += ibus.cyc.eq(wb_out.cyc)
+            comb += ibus.stb.eq(wb_out.stb)
+            comb += ibus.sel.eq(wb_out.sel)
+            comb += ibus.we.eq(wb_out.we)
+            comb += wb_in.ack.eq(ibus.ack)
+            comb += wb_in.dat.eq(ibus.dat_r)
+
+            # real-mode, privileged fetch
+            comb += i_in.priv_mode.eq(1)
+            comb += got.eq(busy & i_out.valid & (i_out.nia == fetch_pc))
+
+            with m.If(busy):
+                comb += i_in.req.eq(1)
+                comb += i_in.nia.eq(fetch_pc)
+                with m.If(got | i_out.fetch_failed | ~self.f_i_valid):
+                    sync += busy.eq(0)
+                    sync += f_instr.eq(Repl(i_out.insn, 2))
+            with m.Elif(self.a_i_valid & ~self.a_stall_i):
+                comb += i_in.req.eq(1)
+                comb += i_in.nia.eq(self.a_pc_i)
+                sync += fetch_pc.eq(self.a_pc_i)
+                sync += busy.eq(1)
+
+            with m.If(busy & i_out.fetch_failed):
+                sync += [
+                    self.f_fetch_err_o.eq(1),
+                    self.f_badaddr_o.eq(fetch_pc[self.adr_lsbs:])
+                ]
+            with m.Elif(~self.f_stall_i):
+                sync += self.f_fetch_err_o.eq(0)
+
+            comb += self.a_busy_o.eq(busy)
+
+            with m.If(self.f_fetch_err_o):
+                comb += self.f_busy_o.eq(0)
+            with m.Else():
+                comb += [
+                    self.f_busy_o.eq(busy & ~got),
+                    self.f_instr_o.eq(Mux(got, Repl(i_out.insn, 2), f_instr))
+                ]
+
         return m
 
 
@@ -885,7 +1055,7 @@ def icache_sim(dut):
     valid = yield i_in.valid
     nia   = yield i_out.nia
     insn  = yield i_in.insn
-    print(f"valid? {valid}")
+    log.debug("valid? %s", valid)
     assert valid
     assert insn == 0x00000001, \
         "insn @%x=%x expected 00000001" % (nia, insn)
@@ -966,10 +1136,11 @@ def test_icache(mem):
      sim.add_clock(1e-6)
 
      sim.add_sync_process(wrap(icache_sim(dut)))
-     with sim.write_vcd('test_icache.vcd'):
+     with write_vcd(sim, 'test_icache.vcd'):
          sim.run()
 
 if __name__ == '__main__':
+    parse_vcd_args()
     dut = ICache()
     vl = rtlil.convert(dut, ports=[])
     with open("test_icache.il", "w") as f:
@@ -38,9 +38,14 @@ from soc.scoreboard.addr_match import LenExpand
 from soc.config.test.test_loadstore import TestMemPspec
 from soc.config.loadstore import ConfigMemoryPortInterface
 from soc.experiment.pimem import PortInterface
+from soc.experiment.storebuf import StoreBuffer
+from soc.experiment.l0_linebuf import L0LineBuffer
 from soc.config.test.test_pi2ls import pi_ld, pi_st, pi_ldst
+from soc.config.simlog import get_logger
 import unittest
 
+log = get_logger("l0_cache")
+
 class L0CacheBuffer2(Elaboratable):
     """L0CacheBuffer2"""
     def __init__(self, n_units=8, regwid=64, addrwid=48):
@@ -212,6 +217,9 @@ class TstDataMerger2(Elaboratable):
 class L0CacheBuffer(Elaboratable):
     """L0 Cache / Buffer
 
+    (see soc.experiment.l0_linebuf.L0LineBuffer for the version which
+    holds, and merges requests into, recently-used lines)
+
     Note that the final version will have *two* interfaces per LDSTCompUnit,
     to cover mis-aligned requests, as well as *two* 128-bit L1 Cache
     interfaces: one for odd (addr[4] == 1) and one for even (addr[4] == 1).
@@ -314,12 +322,46 @@ class TstL0CacheBuffer(Elaboratable):
         addrwid = pspec.addr_wid
         self.cmpi = ConfigMemoryPortInterface(pspec)
         self.pimem = self.cmpi.pi
-        self.l0 = L0CacheBuffer(n_units, self.pimem, regwid, addrwid << 1)
+        # optional store buffer, between the L0 and the memory port
+        self.stbuf = None
+        pimem = self.pimem
+        if (hasattr(pspec, "store_buffer_depth") and
+                isinstance(pspec.store_buffer_depth, int) and
+                pspec.store_buffer_depth > 0):
+            self.stbuf = pimem = StoreBuffer(self.pimem,
+                                             pspec.store_buffer_depth)
+        # L0 holding recently-used lines, instead of the test L0
+        if (hasattr(pspec, "l0_num_lines") and
+                isinstance(pspec.l0_num_lines, int) and
+                pspec.l0_num_lines > 0):
+            self.l0 = L0LineBuffer(n_units, pimem, pspec.l0_num_lines,
+                                   regwid=regwid, addrwid=addrwid)
+        else:
+            self.l0 = L0CacheBuffer(n_units, pimem, regwid, addrwid << 1)
+
+        # drain the store buffer (sync, core stop, DMI memory access):
+        # flushed_o is set once it is empty (always, without one).
+        # memerr_o is set if a buffered store failed as it drained.
+        # inval_i invalidates the L0LineBuffer (if that is the L0)
+        self.flush_i = Signal()
+        self.inval_i = Signal()
+        self.flushed_o = Signal()
+        self.memerr_o = Signal()
 
     def elaborate(self, platform):
         m = Module()
+        comb = m.d.comb
         m.submodules.pimem = self.pimem
+        if self.stbuf is not None:
+            m.submodules.stbuf = self.stbuf
+            comb += self.stbuf.flush_i.eq(self.flush_i)
+            comb += self.flushed_o.eq(self.stbuf.empty_o)
+            comb += self.memerr_o.eq(self.stbuf.drain_err_o)
+        else:
+            comb += self.flushed_o.eq(1)
         m.submodules.l0 = self.l0
+        if hasattr(self.l0, "inval_i"):
+            comb += self.l0.inval_i.eq(self.inval_i)
 
         if not hasattr(self.cmpi, 'lsmem'):
             return m
@@ -339,12 +381,16 @@ class TstL0CacheBuffer(Elaboratable):
         yield from self.cmpi.ports()
         yield from self.l0.ports()
         yield from self.pimem.ports()
+        yield self.flush_i
+        yield self.inval_i
+        yield self.flushed_o
+        yield self.memerr_o
 
 
 def wait_busy(port, no=False):
     while True:
         busy = yield port.busy_o
-        print("busy", no, busy)
+        log.debug("busy %s %s", no, busy)
         if bool(busy) == no:
             break
         yield
@@ -353,7 +399,7 @@ def wait_busy(port, no=False):
 def wait_addr(port):
     while True:
         addr_ok = yield port.addr_ok_o
-        print("addrok", addr_ok)
+        log.debug("addrok %s", addr_ok)
         if not addr_ok:
             break
         yield
@@ -362,7 +408,7 @@ def wait_addr(port):
 def wait_ldok(port):
     while True:
         ldok = yield port.ld.ok
-        print("ldok", ldok)
+        log.debug("ldok %s", ldok)
         if ldok:
             break
         yield
@@ -439,6 +485,31 @@ class TestL0Cache(unittest.TestCase):
         run_simulation(dut, l0_cache_ldst(self, dut),
                        vcd_name='test_l0_cache_basic_testpi.vcd')
 
+    def test_l0_cache_testpi_store_buffer(self):
+
+        pspec = TestMemPspec(ldst_ifacetype='testpi',
+                             addr_wid=48,
+                             mask_wid=8,
+                             reg_wid=64,
+                             store_buffer_depth=4)
+        dut = TstL0CacheBuffer(pspec)
+
+        run_simulation(dut, l0_cache_ldst(self, dut),
+                       vcd_name='test_l0_cache_basic_testpi_stbuf.vcd')
+
+    def test_l0_cache_testpi_line_buffer(self):
+
+        pspec = TestMemPspec(ldst_ifacetype='testpi',
+                             addr_wid=48,
+                             mask_wid=8,
+                             reg_wid=64,
+                             l0_num_lines=2,
+                             store_buffer_depth=4)
+        dut = TstL0CacheBuffer(pspec)
+
+        run_simulation(dut, l0_cache_ldst(self, dut),
+                       vcd_name='test_l0_cache_basic_testpi_l0line.vcd')
+
 
 class TestDataMerger(unittest.TestCase):
 
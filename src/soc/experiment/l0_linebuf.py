@@ -0,0 +1,329 @@
+"""L0 Line Buffer
+
+a multi-port L0 Cache/Buffer holding the most recently used cache lines
+(64 bytes each by default), between several LDSTCompUnit PortInterfaces
+and one memory PortInterface (LoadStore1 / DCache, StoreBuffer,
+TestMemoryPortInterface etc.)
+
+* each port's pending load is looked up in every line at once, using
+  the PartialAddrMatch matrix from soc.scoreboard.addr_match on the
+  line address.  all ports hitting (the same or different lines) are
+  answered on the same cycle, without going to memory.
+* a load which misses fetches the whole line, one doubleword at a time.
+  other ports waiting on the same line then hit: requests from several
+  LDSTCompUnits are merged into the one line access.
+* stores are write-through, one at a time, updating the line in place
+  if it is held.
+
+only real mode (MSR.PR=0), aligned, cacheable requests are held in the
+buffer: anything else is passed straight through.  I/O addresses
+(0xCxxx_xxxx, as in LoadStore1) are never cached.  a store which is
+passed through (virtual mode, misaligned, dcbz, non-cacheable) may
+alias a line held under its real address, so it invalidates the whole
+buffer.  so does inval_i, for memory written by anyone else (the DMI
+memory window, other wishbone masters, a reload by a test) and for cache
+management instructions.  a line fill in progress at the time is then
+not marked valid (it may have read the old contents): the waiting load
+fetches it again.
+
+Links:
+
+* https://bugs.libre-soc.org/show_bug.cgi?id=216
+* https://libre-soc.org/3d_gpu/architecture/memory_and_cache/
+"""
+
+from nmigen import Module, Signal, Mux, Cat, Const, Array, Elaboratable
+from nmigen.cli import rtlil
+from nmigen.lib.coding import PriorityEncoder
+from nmigen.utils import log2_int
+from nmutil.iocontrol import RecordObject
+
+from soc.experiment.pimem import LatchedPortInterface
+from soc.scoreboard.addr_match import PartialAddrMatch
+
+
+class L0Line(RecordObject):
+    def __init__(self, addrwid, line_size, name=None):
+        super().__init__(name=name)
+        self.valid = Signal()
+        self.addr = Signal(addrwid)        # line address
+        self.data = Signal(line_size*8)    # doubleword N is at data[N*64]
+
+
+class L0LineBuffer(Elaboratable):
+    """L0LineBuffer
+
+    * :n_units: number of upstream PortInterfaces (dports)
+    * :pimem: the memory PortInterfaceBase (not added as a submodule:
+              the caller does that)
+    * :num_lines: number of lines held
+    * :line_size: bytes per line
+
+    inval_i invalidates every line (see above)
+    """
+    def __init__(self, n_units, pimem, num_lines=4, line_size=64,
+                       regwid=64, addrwid=48):
+        assert regwid == 64, "L0LineBuffer needs a 64-bit PortInterface"
+        self.n_units = n_units
+        self.pimem = pimem
+        self.dpi = pimem.pi # downstream PortInterface
+        self.num_lines = num_lines
+        self.line_size = line_size
+        self.regwid = regwid
+        self.addrwid = addrwid
+        self.line_bits = log2_int(line_size)
+        self.row_bits = self.line_bits - 3 # doublewords per line
+
+        self.units = [LatchedPortInterface(regwid, addrwid,
+                                           "ldst_port%d" % i)
+                      for i in range(n_units)]
+        self.dports = Array(u.pi for u in self.units)
+        self.inval_i = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        comb, sync = m.d.comb, m.d.sync
+        dpi = self.dpi
+        n_units, num_lines = self.n_units, self.num_lines
+        lbits, rbits = self.line_bits, self.row_bits
+        laddrwid = self.addrwid - lbits
+
+        for i, u in enumerate(self.units):
+            setattr(m.submodules, "port%d" % i, u)
+
+        lines = [L0Line(laddrwid, self.line_size, name="l0line%d" % i)
+                 for i in range(num_lines)]
+
+        def line_of(addr):
+            return addr[lbits:self.addrwid]
+
+        def row_of(addr):
+            return addr[3:lbits]
+
+        def cacheable(addr, misalign, pr, nc):
+            # as LoadStore1: 0xCxxx_xxxx is I/O, never cached
+            return ~misalign & ~pr & ~nc & ~(addr[28:] == Const(0xc, 4))
+
+        # line lookup: ports (0..n_units-1) against lines (n_units...)
+        m.submodules.match = match = PartialAddrMatch(n_units+num_lines,
+                                                      laddrwid)
+        en = []
+        for i, u in enumerate(self.units):
+            comb += match.addrs_i[i].eq(line_of(u.ld_addr))
+            en.append(u.ld_pend)
+        for j, l in enumerate(lines):
+            comb += match.addrs_i[n_units+j].eq(l.addr)
+            en.append(l.valid)
+        comb += match.addr_en_i.eq(Cat(*en))
+        comb += match.addr_rs_i.eq(~Cat(*en))
+
+        # per port: cacheable load, hit (and the doubleword), or needs
+        # memory.  stores always need memory
+        ld_cache = Signal(n_units)
+        ld_hit = Signal(n_units)
+        need = Signal(n_units)
+        for i, u in enumerate(self.units):
+            nomatch = match.addr_nomatch_a_o[i]
+            hits = Cat(*[l.valid & ~nomatch[n_units+j]
+                         for j, l in enumerate(lines)])
+            comb += ld_cache[i].eq(cacheable(u.ld_addr, u.ld_misalign,
+                                             u.ld_pr, u.ld_nc))
+            comb += ld_hit[i].eq(u.ld_pend & ld_cache[i] & hits.bool())
+            for j, l in enumerate(lines):
+                with m.If(hits[j]):
+                    comb += u.ld_data.eq(l.data.word_select(
+                                                row_of(u.ld_addr), 64))
+            with m.If(ld_hit[i]):
+                comb += u.ld_ok.eq(1)
+                comb += u.ld_clr.eq(1)
+            comb += need[i].eq((u.ld_pend & ~ld_hit[i]) | u.st_pend)
+
+        # pick one port needing memory, and hold on to it
+        m.submodules.pick = pick = PriorityEncoder(n_units)
+        comb += pick.i.eq(need)
+        sel = Signal(range(max(n_units, 2)))
+        units = Array(self.units)
+        u = units[sel]
+
+        # line to (re)fill: the first invalid one, else round-robin
+        victim = Signal(range(max(num_lines, 2)))
+        rr = Signal(range(max(num_lines, 2)))
+        comb += victim.eq(rr)
+        for j, l in reversed(list(enumerate(lines))):
+            with m.If(~l.valid):
+                comb += victim.eq(j)
+        fill_idx = Signal(range(max(num_lines, 2)))
+        fill_addr = Signal(laddrwid)
+        fill_row = Signal(rbits)
+        fill_ok = Signal() # no inval_i since the fill started
+
+        # store: cacheable ones update the line in place, others
+        # invalidate everything
+        st_cache = Signal()
+        comb += st_cache.eq(cacheable(u.st_addr, u.st_misalign, u.st_pr,
+                                      u.st_nc) & ~u.st_dcbz)
+
+        def drive_ld():
+            m.d.comb += dpi.is_ld_i.eq(1)
+            m.d.comb += dpi.data_len.eq(u.ld_len)
+            m.d.comb += dpi.addr.data.eq(u.ld_addr)
+            m.d.comb += dpi.addr.ok.eq(1)
+            m.d.comb += dpi.msr_pr.eq(u.ld_pr)
+            m.d.comb += dpi.is_nc.eq(u.ld_nc)
+            m.d.comb += u.pi.exc_o.eq(dpi.exc_o)
+
+        def drive_fill():
+            m.d.comb += dpi.is_ld_i.eq(1)
+            m.d.comb += dpi.data_len.eq(8)
+            m.d.comb += dpi.addr.data.eq(Cat(Const(0, 3), fill_row,
+                                             fill_addr))
+            m.d.comb += dpi.addr.ok.eq(1)
+            m.d.comb += u.pi.exc_o.eq(dpi.exc_o)
+
+        def drive_st():
+            m.d.comb += dpi.is_st_i.eq(1)
+            m.d.comb += dpi.data_len.eq(u.st_len)
+            m.d.comb += dpi.addr.data.eq(u.st_addr)
+            m.d.comb += dpi.addr.ok.eq(1)
+            m.d.comb += dpi.msr_pr.eq(u.st_pr)
+            m.d.comb += dpi.is_dcbz.eq(u.st_dcbz)
+            m.d.comb += dpi.is_nc.eq(u.st_nc)
+            m.d.comb += dpi.st.data.eq(u.st_raw)
+            m.d.comb += u.pi.exc_o.eq(dpi.exc_o)
+
+        with m.FSM(name="l0linebuf"):
+            with m.State("IDLE"):
+                # wait for the previous memory request to finish
+                with m.If(~pick.n & ~dpi.busy_o):
+                    sync += sel.eq(pick.o)
+                    m.next = "START"
+
+            with m.State("START"):
+                with m.If(u.st_pend):
+                    m.next = "ST_ADDR"
+                with m.Elif(~u.ld_pend):
+                    # already answered
+                    m.next = "IDLE"
+                with m.Elif(ld_cache.bit_select(sel, 1)):
+                    with m.If(ld_hit.bit_select(sel, 1)):
+                        # another port's line fill got there first
+                        m.next = "IDLE"
+                    with m.Else():
+                        sync += fill_idx.eq(victim)
+                        sync += fill_addr.eq(line_of(u.ld_addr))
+                        sync += fill_row.eq(0)
+                        sync += fill_ok.eq(1)
+                        for j, l in enumerate(lines):
+                            with m.If(victim == j):
+                                sync += l.valid.eq(0)
+                        m.next = "FILL_ADDR"
+                with m.Else():
+                    m.next = "LD_ADDR"
+
+            # load, straight through to memory
+            with m.State("LD_ADDR"):
+                drive_ld()
+                with m.If(dpi.exc_o.happened):
+                    comb += u.ld_clr.eq(1)
+                    m.next = "IDLE"
+                with m.Elif(dpi.addr_ok_o):
+                    m.next = "LD_DATA"
+            with m.State("LD_DATA"):
+                drive_ld()
+                with m.If(dpi.exc_o.happened):
+                    comb += u.ld_clr.eq(1)
+                    m.next = "IDLE"
+                with m.Elif(dpi.ld.ok):
+                    # PortInterfaceBase shifts it back down
+                    comb += u.ld_ok.eq(1)
+                    comb += u.ld_data.eq(dpi.ld.data << (u.ld_addr[:3]*8))
+                    comb += u.ld_clr.eq(1)
+                    m.next = "IDLE"
+
+            # line fill, one doubleword at a time.  the line is marked
+            # valid at the end, and the waiting port(s) then hit
+            with m.State("FILL_ADDR"):
+                drive_fill()
+                with m.If(dpi.exc_o.happened):
+                    comb += u.ld_clr.eq(1)
+                    m.next = "IDLE"
+                with m.Elif(dpi.addr_ok_o):
+                    m.next = "FILL_DATA"
+            with m.State("FILL_DATA"):
+                drive_fill()
+                with m.If(dpi.exc_o.happened):
+                    comb += u.ld_clr.eq(1)
+                    m.next = "IDLE"
+                with m.Elif(dpi.ld.ok):
+                    for j, l in enumerate(lines):
+                        with m.If(fill_idx == j):
+                            sync += l.data.word_select(fill_row, 64).eq(
+                                                            dpi.ld.data)
+                    m.next = "FILL_NEXT"
+            with m.State("FILL_NEXT"):
+                # is_ld_i must drop, and busy_o clear, between requests
+                with m.If(~dpi.busy_o):
+                    sync += fill_row.eq(fill_row + 1)
+                    m.next = "FILL_ADDR"
+                    with m.If(fill_row == (1 << rbits)-1):
+                        for j, l in enumerate(lines):
+                            with m.If(fill_idx == j):
+                                sync += l.valid.eq(fill_ok)
+                                sync += l.addr.eq(fill_addr)
+                        sync += rr.eq(Mux(rr == num_lines-1, 0, rr+1))
+                        m.next = "IDLE"
+
+            # store, written through to memory
+            with m.State("ST_ADDR"):
+                drive_st()
+                with m.If(dpi.exc_o.happened):
+                    comb += u.st_clr.eq(1)
+                    m.next = "IDLE"
+                with m.Elif(dpi.addr_ok_o):
+                    m.next = "ST_DATA"
+            with m.State("ST_DATA"):
+                drive_st()
+                comb += dpi.st.ok.eq(1)
+                # the store will be done: update (or drop) the lines
+                for j, l in enumerate(lines):
+                    with m.If(~st_cache):
+                        sync += l.valid.eq(0)
+                    with m.Elif(l.valid &
+                                (l.addr == line_of(u.st_addr))):
+                        for k in range(8):
+                            byte = Cat(Const(k, 3), row_of(u.st_addr))
+                            with m.If(u.st_mask[k]):
+                                sync += l.data.word_select(byte, 8).eq(
+                                        u.st_data.word_select(k, 8))
+                m.next = "ST_WAIT"
+            with m.State("ST_WAIT"):
+                drive_st()
+                with m.If(dpi.exc_o.happened | ~dpi.busy_o):
+                    comb += u.st_ok.eq(1)
+                    comb += u.st_clr.eq(1)
+                    m.next = "IDLE"
+
+        # invalidate everything: overrides a line fill completing
+        with m.If(self.inval_i):
+            sync += fill_ok.eq(0)
+            for l in lines:
+                sync += l.valid.eq(0)
+
+        return m
+
+    def __iter__(self):
+        for p in self.dports:
+            yield from p.ports()
+        yield self.inval_i
+
+    def ports(self):
+        return list(self)
+
+
+if __name__ == '__main__':
+    from soc.experiment.pimem import TestMemoryPortInterface
+    pimem = TestMemoryPortInterface(regwid=64, addrwid=48)
+    dut = L0LineBuffer(2, pimem)
+    vl = rtlil.convert(dut, ports=list(dut.ports()))
+    with open("test_l0_linebuf.il", "w") as f:
+        f.write(vl)
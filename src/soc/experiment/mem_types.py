@@ -17,6 +17,18 @@ class DCacheToLoadStore1Type(RecordObject):
         self.store_done    = Signal()
         self.error         = Signal()
         self.cache_paradox = Signal()
+        self.id            = Signal(4) # id of the request being completed
+
+
+class DCacheEventType(RecordObject):
+    # performance events (one-cycle pulses), for the PMU
+    def __init__(self, name=None):
+        super().__init__(name=name)
+        self.load_hit      = Signal()
+        self.load_miss     = Signal()
+        self.store_hit     = Signal()
+        self.store_miss    = Signal()
+        self.dtlb_miss     = Signal()
 
 
 class DCacheToMMUType(RecordObject):
@@ -39,6 +51,15 @@ class Fetch1ToICacheType(RecordObject):
         self.nia           = Signal(64)
 
 
+class ICacheEventType(RecordObject):
+    # performance events (one-cycle pulses), for the PMU
+    def __init__(self, name=None):
+        super().__init__(name=name)
+        self.hit           = Signal()
+        self.miss          = Signal()
+        self.itlb_miss     = Signal()
+
+
 class ICacheToDecode1Type(RecordObject):
     def __init__(self, name=None):
         super().__init__(name=name)
@@ -65,6 +86,7 @@ class LoadStore1ToDCacheType(RecordObject):
         self.addr          = Signal(64)
         self.data          = Signal(64) # valid the cycle after valid=1
         self.byte_sel      = Signal(8)
+        self.id            = Signal(4) # returned with the completion
 
 
 class LoadStore1ToMMUType(RecordObject):
@@ -92,6 +92,7 @@ class MMU(Elaboratable):
         self.d_out = MMUToDCacheType()
         self.d_in  = DCacheToMMUType()
         self.i_out = MMUToICacheType()
+        self.busy_o = Signal() # table walk (or tlbie) in progress, for PMU
 
     def radix_tree_idle(self, m, l_in, r, v):
         comb = m.d.comb
@@ -392,6 +393,7 @@ class MMU(Elaboratable):
         comb += tlb_mask.shift.eq(r.shift)
         comb += finalmask.eq(tlb_mask.mask)
 
+        comb += self.busy_o.eq(r.state != State.IDLE)
         with m.If(r.state != State.IDLE):
             sync += Display("MMU state %d %016x", r.state, data)
 
@@ -155,10 +155,10 @@ class PortInterfaceBase(Elaboratable):
     Base class for PortInterface-compliant Memory read/writers
     """
 
-    def __init__(self, regwid=64, addrwid=4):
+    def __init__(self, regwid=64, addrwid=4, name="ldst_port0"):
         self.regwid = regwid
         self.addrwid = addrwid
-        self.pi = PortInterface("ldst_port0", regwid, addrwid)
+        self.pi = PortInterface(name, regwid, addrwid)
 
     @property
     def addrbits(self):
@@ -323,6 +323,97 @@ class PortInterfaceBase(Elaboratable):
         yield from self.pi.ports()
 
 
+class LatchedPortInterface(PortInterfaceBase):
+    """LatchedPortInterface
+
+    PortInterfaceBase which latches the request, for completion later.
+    set_rd_addr and set_wr_data are called for one cycle only: the LD
+    (ld_pend, ld_addr etc.) or ST (st_pend, st_addr etc.) is captured
+    there.  whoever completes it drives ld_ok/ld_data (or st_ok), and
+    clears ld_pend (or st_pend), either directly from a derived class
+    or from outside with ld_clr (or st_clr).
+
+    st_ok defaults to zero: busy_o stays asserted after st.ok until
+    st_ok is given.
+    """
+
+    def __init__(self, regwid=64, addrwid=4, name="ldst_port0"):
+        super().__init__(regwid, addrwid, name)
+
+        # latched LD request
+        self.ld_pend = Signal()
+        self.ld_addr = Signal(addrwid)
+        self.ld_len = Signal(4)
+        self.ld_mask = Signal(8)
+        self.ld_misalign = Signal()
+        self.ld_pr = Signal()
+        self.ld_nc = Signal()
+        # LD result back to PortInterfaceBase
+        self.ld_ok = Signal()
+        self.ld_data = Signal(regwid)
+        self.ld_clr = Signal()
+
+        # latched ST request
+        self.st_pend = Signal()
+        self.st_addr = Signal(addrwid)
+        self.st_len = Signal(4)
+        self.st_mask = Signal(8)
+        self.st_data = Signal(regwid) # shifted into place
+        self.st_raw = Signal(regwid)  # as given, for passing through
+        self.st_misalign = Signal()
+        self.st_pr = Signal()
+        self.st_dcbz = Signal()
+        self.st_nc = Signal()
+        self.st_ok = Signal()         # ST done
+        self.st_clr = Signal()
+        # ST address, valid from set_wr_addr onwards
+        self.wr_addr = Signal(addrwid)
+        self.wr_mask = Signal(8)
+        self.wr_misalign = Signal()
+        self.wr_pr = Signal()
+
+    def set_wr_addr(self, m, addr, mask, misalign, msr_pr):
+        m.d.comb += self.wr_addr.eq(addr)
+        m.d.comb += self.wr_mask.eq(mask)
+        m.d.comb += self.wr_misalign.eq(misalign)
+        m.d.comb += self.wr_pr.eq(msr_pr)
+
+    def set_rd_addr(self, m, addr, mask, misalign, msr_pr):
+        # called for one cycle only, when the address is acknowledged
+        m.d.sync += self.ld_pend.eq(1)
+        m.d.sync += self.ld_addr.eq(addr)
+        m.d.sync += self.ld_len.eq(self.pi.data_len)
+        m.d.sync += self.ld_mask.eq(mask)
+        m.d.sync += self.ld_misalign.eq(misalign)
+        m.d.sync += self.ld_pr.eq(msr_pr)
+        m.d.sync += self.ld_nc.eq(self.pi.is_nc)
+
+    def set_wr_data(self, m, data, wen):
+        # called for one cycle only (st.ok): capture everything
+        m.d.sync += self.st_pend.eq(1)
+        m.d.sync += self.st_addr.eq(self.wr_addr)
+        m.d.sync += self.st_len.eq(self.pi.data_len)
+        m.d.sync += self.st_mask.eq(self.wr_mask)
+        m.d.sync += self.st_data.eq(data)
+        m.d.sync += self.st_raw.eq(self.pi.st.data)
+        m.d.sync += self.st_misalign.eq(self.wr_misalign)
+        m.d.sync += self.st_pr.eq(self.wr_pr)
+        m.d.sync += self.st_dcbz.eq(self.pi.is_dcbz)
+        m.d.sync += self.st_nc.eq(self.pi.is_nc)
+        return self.st_ok
+
+    def get_rd_data(self, m):
+        return self.ld_data, self.ld_ok
+
+    def elaborate(self, platform):
+        m = super().elaborate(platform)
+        with m.If(self.ld_clr):
+            m.d.sync += self.ld_pend.eq(0)
+        with m.If(self.st_clr):
+            m.d.sync += self.st_pend.eq(0)
+        return m
+
+
 class TestMemoryPortInterface(PortInterfaceBase):
     """TestMemoryPortInterface
 
@@ -0,0 +1,314 @@
+"""Store Buffer / write-combining queue
+
+sits between the L0CacheBuffer (LDSTCompUnits) and the memory
+PortInterface (LoadStore1 / DCache, TestMemoryPortInterface etc.)
+
+* stores complete, as far as the LDSTCompUnit is concerned, as soon as
+  they are in the buffer.  they are drained to memory in the background,
+  in order, whenever the memory port is not needed for a load: the
+  oldest entry as soon as there is a second one, otherwise (to give
+  further stores a chance to merge into it) once no store has come in
+  for drain_delay cycles, or immediately if a request is waiting or
+  flush_i is set (sync, core stop, DMI memory access: see empty_o).
+* a store to the same 8-byte-aligned doubleword as one already in the
+  buffer is merged into it (as long as the bytes remain contiguous), so
+  adjacent byte/half/word stores become a single memory write.
+* a load entirely covered by a buffered store is answered from the
+  buffer (store-to-load forwarding).  a load partially covered waits
+  for the buffer to drain.  loads not touching the buffer go straight
+  to memory, ahead of the buffered stores.  non-cacheable loads are
+  never forwarded and never overtake a buffered store: the buffer is
+  drained first.
+
+only stores which cannot take an exception once buffered are buffered:
+real mode (MSR.PR=0), aligned, cacheable, not dcbz.  anything else waits
+for the buffer to empty and is passed straight through, as are loads in
+virtual mode (the buffer holds real addresses).  should a drain take
+an exception regardless, that is a hardware bug: drain_err_o is set, and
+stays set.
+
+Links:
+
+* https://bugs.libre-soc.org/show_bug.cgi?id=216
+"""
+
+from nmigen import Module, Signal, Mux, Cat, Const
+from nmigen.cli import rtlil
+from nmutil.iocontrol import RecordObject
+
+from soc.experiment.pimem import LatchedPortInterface
+
+
+class StoreBufferEntry(RecordObject):
+    def __init__(self, addrwid, name=None):
+        super().__init__(name=name)
+        self.valid = Signal()
+        self.addr = Signal(addrwid) # doubleword address
+        self.mask = Signal(8)       # bytes written
+        self.data = Signal(64)      # in place: byte N is at data[N*8]
+
+
+class StoreBuffer(LatchedPortInterface):
+    """StoreBuffer
+
+    * :pimem: the memory PortInterfaceBase to drain into (not added as
+              a submodule: the caller does that)
+    * :depth: number of buffer entries (doublewords)
+    * :drain_delay: cycles a lone entry is held for write-combining
+
+    the upstream PortInterface is self.pi, as for any PortInterfaceBase.
+
+    * :flush_i: drain the buffer now (empty_o says when it is done)
+    * :drain_err_o: a drain took an exception (sticky: see above)
+    """
+    def __init__(self, pimem, depth=4, drain_delay=16):
+        assert pimem.regwid == 64, "StoreBuffer needs a 64-bit PortInterface"
+        super().__init__(pimem.regwid, pimem.addrwid)
+        self.pimem = pimem
+        self.dpi = pimem.pi # downstream PortInterface
+        self.depth = depth
+        self.drain_delay = drain_delay
+
+        self.count = Signal(range(depth+1)) # number of entries in use
+        self.empty_o = Signal()
+        self.flush_i = Signal()
+        self.drain_err_o = Signal()
+
+    def elaborate(self, platform):
+        m = super().elaborate(platform)
+        comb, sync = m.d.comb, m.d.sync
+        pi, dpi, depth = self.pi, self.dpi, self.depth
+
+        entries = [StoreBufferEntry(self.addrwid-3, name="sbe%d" % i)
+                   for i in range(depth)]
+        head = Signal(range(depth)) # oldest entry, next to drain
+        tail = Signal(range(depth)) # next free entry
+        empty = self.empty_o
+        comb += empty.eq(self.count == 0)
+
+        def incr(ptr):
+            return Mux(ptr == depth-1, 0, ptr+1)
+
+        def lookup(name, addr):
+            """find the (only) entry holding doubleword addr"""
+            hit = Signal(name=name+"_hit")
+            idx = Signal(range(depth), name=name+"_idx")
+            mask = Signal(8, name=name+"_mask")
+            data = Signal(64, name=name+"_data")
+            for i, e in enumerate(entries):
+                with m.If(e.valid & (e.addr == addr)):
+                    m.d.comb += hit.eq(1)
+                    m.d.comb += idx.eq(i)
+                    m.d.comb += mask.eq(e.mask)
+                    m.d.comb += data.eq(e.data)
+            return hit, idx, mask, data
+
+        # head entry, being drained: first byte and number of bytes
+        h_mask = Signal(8)
+        h_addr = Signal(self.addrwid-3)
+        h_data = Signal(64)
+        h_start = Signal(3)
+        h_len = Signal(4)
+        for i, e in enumerate(entries):
+            with m.If(head == i):
+                comb += h_mask.eq(e.mask)
+                comb += h_addr.eq(e.addr)
+                comb += h_data.eq(e.data)
+        for i in reversed(range(8)):
+            with m.If(h_mask[i]):
+                comb += h_start.eq(i)
+        comb += h_len.eq(sum(h_mask[i] for i in range(8)))
+
+        # store-to-load forwarding: the load must be wholly covered
+        ld_hit, ld_idx, ld_emask, ld_edata = lookup("ld", self.ld_addr[3:])
+        fwd = Signal()
+        ld_direct = Signal()
+        comb += fwd.eq(self.ld_pend & ld_hit & ~self.ld_misalign &
+                       ~self.ld_pr & ~self.ld_nc &
+                       ((ld_emask & self.ld_mask) == self.ld_mask))
+        comb += ld_direct.eq(self.ld_pend & ~fwd &
+                             (empty | (~ld_hit & ~self.ld_misalign &
+                                       ~self.ld_pr & ~self.ld_nc)))
+        with m.If(fwd):
+            comb += self.ld_ok.eq(1)
+            comb += self.ld_data.eq(ld_edata)
+            sync += self.ld_pend.eq(0)
+
+        # buffering a store: merge into an existing entry for the same
+        # doubleword if the bytes stay contiguous (memory only accepts
+        # an address and length), otherwise allocate a new entry.
+        st_hit, st_idx, st_emask, st_edata = lookup("st", self.st_addr[3:])
+        bufferable = Signal()
+        merged = Signal(8)
+        lowbit = Signal(8)
+        contig = Signal()
+        draining = Signal()
+        merge = Signal()
+        alloc = Signal()
+        pop = Signal()
+        st_direct = Signal()
+        comb += bufferable.eq(~self.st_misalign & ~self.st_pr &
+                              ~self.st_dcbz & ~self.st_nc)
+        comb += merged.eq(st_emask | self.st_mask)
+        comb += lowbit.eq(merged & (~merged + 1))
+        comb += contig.eq(((merged + lowbit) & merged) == 0)
+        comb += merge.eq(self.st_pend & bufferable & st_hit & contig &
+                         ~(draining & (st_idx == head)))
+        comb += alloc.eq(self.st_pend & bufferable & ~st_hit &
+                         (self.count != depth))
+        comb += st_direct.eq(self.st_pend & ~bufferable & empty)
+        with m.If(merge | alloc):
+            sync += self.st_pend.eq(0)
+        # store is complete as soon as it is in the buffer: on the cycle
+        # after st.ok if there is room, same as memory would be
+        comb += self.st_ok.eq(~self.st_pend | merge | alloc)
+
+        for i, e in enumerate(entries):
+            with m.If(merge & (st_idx == i)):
+                sync += e.mask.eq(merged)
+                for j in range(8):
+                    with m.If(self.st_mask[j]):
+                        sync += e.data.word_select(j, 8).eq(
+                                        self.st_data.word_select(j, 8))
+            with m.If(alloc & (tail == i)):
+                sync += e.valid.eq(1)
+                sync += e.addr.eq(self.st_addr[3:])
+                sync += e.mask.eq(self.st_mask)
+                sync += e.data.eq(self.st_data)
+            with m.If(pop & (head == i)):
+                sync += e.valid.eq(0)
+        with m.If(alloc):
+            sync += tail.eq(incr(tail))
+        with m.If(pop):
+            sync += head.eq(incr(head))
+        sync += self.count.eq(self.count + alloc - pop)
+
+        # when to drain: see above
+        age = Signal(range(self.drain_delay+1))
+        drain = Signal()
+        with m.If(merge | alloc):
+            sync += age.eq(0)
+        with m.Elif(age != self.drain_delay):
+            sync += age.eq(age + 1)
+        comb += drain.eq(~empty & ((self.count > 1) | self.flush_i |
+                                   (self.ld_pend & ~fwd) |
+                                   (self.st_pend & ~merge & ~alloc) |
+                                   (age == self.drain_delay)))
+
+        # downstream PortInterface: passthrough LD/ST, and draining
+        def drive_ld():
+            m.d.comb += dpi.is_ld_i.eq(1)
+            m.d.comb += dpi.data_len.eq(self.ld_len)
+            m.d.comb += dpi.addr.data.eq(self.ld_addr)
+            m.d.comb += dpi.addr.ok.eq(1)
+            m.d.comb += dpi.msr_pr.eq(self.ld_pr)
+            m.d.comb += dpi.is_nc.eq(self.ld_nc)
+            m.d.comb += pi.exc_o.eq(dpi.exc_o)
+
+        def drive_st():
+            m.d.comb += dpi.is_st_i.eq(1)
+            m.d.comb += dpi.data_len.eq(self.st_len)
+            m.d.comb += dpi.addr.data.eq(self.st_addr)
+            m.d.comb += dpi.addr.ok.eq(1)
+            m.d.comb += dpi.msr_pr.eq(self.st_pr)
+            m.d.comb += dpi.is_dcbz.eq(self.st_dcbz)
+            m.d.comb += dpi.is_nc.eq(self.st_nc)
+            m.d.comb += dpi.st.data.eq(self.st_raw)
+            m.d.comb += pi.exc_o.eq(dpi.exc_o)
+
+        def drive_drain():
+            m.d.comb += draining.eq(1)
+            m.d.comb += dpi.is_st_i.eq(1)
+            m.d.comb += dpi.data_len.eq(h_len)
+            m.d.comb += dpi.addr.data.eq(Cat(h_start, h_addr))
+            m.d.comb += dpi.addr.ok.eq(1)
+            m.d.comb += dpi.st.data.eq(h_data >> (h_start*8))
+
+        with m.FSM(name="stbuf"):
+            with m.State("IDLE"):
+                with m.If(ld_direct):
+                    m.next = "LD_ADDR"
+                with m.Elif(st_direct):
+                    m.next = "ST_ADDR"
+                with m.Elif(drain):
+                    m.next = "DRAIN_ADDR"
+
+            # load, straight through to memory
+            with m.State("LD_ADDR"):
+                drive_ld()
+                with m.If(dpi.exc_o.happened):
+                    sync += self.ld_pend.eq(0)
+                    m.next = "IDLE"
+                with m.Elif(dpi.addr_ok_o):
+                    m.next = "LD_DATA"
+            with m.State("LD_DATA"):
+                drive_ld()
+                with m.If(dpi.exc_o.happened):
+                    sync += self.ld_pend.eq(0)
+                    m.next = "IDLE"
+                with m.Elif(dpi.ld.ok):
+                    # PortInterfaceBase shifts it back down
+                    comb += self.ld_ok.eq(1)
+                    comb += self.ld_data.eq(dpi.ld.data <<
+                                            (self.ld_addr[:3]*8))
+                    sync += self.ld_pend.eq(0)
+                    m.next = "IDLE"
+
+            # unbufferable store, straight through to memory
+            with m.State("ST_ADDR"):
+                drive_st()
+                with m.If(dpi.exc_o.happened):
+                    sync += self.st_pend.eq(0)
+                    m.next = "IDLE"
+                with m.Elif(dpi.addr_ok_o):
+                    m.next = "ST_DATA"
+            with m.State("ST_DATA"):
+                drive_st()
+                comb += dpi.st.ok.eq(1)
+                m.next = "ST_WAIT"
+            with m.State("ST_WAIT"):
+                drive_st()
+                with m.If(dpi.exc_o.happened | ~dpi.busy_o):
+                    comb += self.st_ok.eq(1)
+                    sync += self.st_pend.eq(0)
+                    m.next = "IDLE"
+
+            # drain the oldest entry.  real-mode aligned cacheable
+            # stores cannot fail: an exception here is flagged as an
+            # error (the entry is dropped, there being nobody to retry it)
+            with m.State("DRAIN_ADDR"):
+                drive_drain()
+                with m.If(dpi.exc_o.happened):
+                    sync += self.drain_err_o.eq(1)
+                    comb += pop.eq(1)
+                    m.next = "IDLE"
+                with m.Elif(dpi.addr_ok_o):
+                    m.next = "DRAIN_DATA"
+            with m.State("DRAIN_DATA"):
+                drive_drain()
+                comb += dpi.st.ok.eq(1)
+                m.next = "DRAIN_WAIT"
+            with m.State("DRAIN_WAIT"):
+                drive_drain()
+                with m.If(dpi.exc_o.happened):
+                    sync += self.drain_err_o.eq(1)
+                with m.If(dpi.exc_o.happened | ~dpi.busy_o):
+                    comb += pop.eq(1)
+                    m.next = "IDLE"
+
+        return m
+
+    def ports(self):
+        yield from super().ports()
+        yield self.empty_o
+        yield self.flush_i
+        yield self.drain_err_o
+
+
+if __name__ == '__main__':
+    from soc.experiment.pimem import TestMemoryPortInterface
+    pimem = TestMemoryPortInterface(regwid=64, addrwid=48)
+    dut = StoreBuffer(pimem)
+    vl = rtlil.convert(dut, ports=list(dut.ports()))
+    with open("test_storebuf.il", "w") as f:
+        f.write(vl)
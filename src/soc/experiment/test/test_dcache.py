@@ -18,7 +18,6 @@ Links:
 
 import sys
 
-from nmutil.gtkw import write_gtkw
 
 sys.setrecursionlimit(1000000)
 
@@ -39,6 +38,7 @@ from nmigen.cli import rtlil
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator
+from soc.config.waves import write_vcd, write_gtkw
 
 from nmutil.util import wrap
 
@@ -158,7 +158,7 @@ def dcache_regression_sim(dut, mem, nc=0):
     row = addr
     addr *= 8
 
-    print ("random testing %d 0x%x row %d" % (i, addr, row))
+    print ("random testing 0x%x row %d" % (addr, row))
 
     yield from dcache_load(dut, addr, nc)
 
@@ -245,8 +245,8 @@ def dcache_sim(dut, mem):
     yield
 
 
-def tst_dcache(mem, test_fn, test_name):
-    dut = DCache()
+def tst_dcache(mem, test_fn, test_name, pspec=None):
+    dut = DCache(pspec)
 
     memory = Memory(width=64, depth=len(mem), init=mem, simulate=True)
     sram = SRAM(memory=memory, granularity=8)
@@ -272,7 +272,7 @@ def tst_dcache(mem, test_fn, test_name):
     sim.add_clock(1e-6)
 
     sim.add_sync_process(wrap(test_fn(dut, mem)))
-    with sim.write_vcd('test_dcache%s.vcd' % test_name):
+    with write_vcd(sim, 'test_dcache%s.vcd' % test_name):
         sim.run()
 
 
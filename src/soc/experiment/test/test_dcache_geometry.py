@@ -0,0 +1,61 @@
+"""DCache geometry sweep
+
+runs the test_dcache simulations against a range of cache and DTLB
+geometries, passed in through pspec (as LoadStore1 does).
+"""
+
+import unittest
+from random import seed
+
+from soc.config.test.test_loadstore import TestMemPspec
+from soc.experiment.test.test_dcache import (tst_dcache, dcache_sim,
+                                             dcache_random_sim,
+                                             dcache_regression_sim)
+
+
+# (line_size, num_lines, num_ways, dtlb_set_size, dtlb_num_ways)
+geometries = [
+    (64, 16, 4, 64, 2), # default
+    (64, 64, 8, 64, 2), # larger, for workloads that thrash the default
+    (32, 32, 2, 32, 4),
+    (128, 8, 2, 64, 2),
+]
+
+
+def geometry_pspec(geometry):
+    line_size, num_lines, num_ways, tlb_set_size, tlb_num_ways = geometry
+    return TestMemPspec(dcache_line_size=line_size,
+                        dcache_num_lines=num_lines,
+                        dcache_num_ways=num_ways,
+                        dtlb_set_size=tlb_set_size,
+                        dtlb_num_ways=tlb_num_ways)
+
+
+class TestDCacheGeometry(unittest.TestCase):
+
+    def test_sweep(self):
+        for geometry in geometries:
+            with self.subTest(geometry=geometry):
+                seed(0)
+                pspec = geometry_pspec(geometry)
+                name = "geometry_%d_%d_%d_%d_%d" % geometry
+
+                mem = []
+                for i in range(16):
+                    mem.append(i)
+                tst_dcache(mem, dcache_regression_sim,
+                           name + "_simpleregression", pspec)
+
+                mem = []
+                for i in range(256):
+                    mem.append(i)
+                tst_dcache(mem, dcache_random_sim, name + "_random", pspec)
+
+                mem = []
+                for i in range(1024):
+                    mem.append((i*2)| ((i*2+1)<<32))
+                tst_dcache(mem, dcache_sim, name, pspec)
+
+
+if __name__ == '__main__':
+    unittest.main()
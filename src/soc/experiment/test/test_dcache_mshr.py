@@ -0,0 +1,226 @@
+"""DCache MSHR (non-blocking load miss) tests
+
+* the existing test_dcache simulations, one request at a time, with
+  the MSHR file enabled
+* back-to-back loads: hits (and a second miss) issued while a miss is
+  outstanding must complete, tagged with their id, before the miss
+"""
+
+import unittest
+from random import seed
+
+from nmigen import Module, Memory
+from nmigen.cli import rtlil
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+from nmutil.sim_tmp_alternative import Simulator, Passive, Settle
+from soc.config.waves import write_vcd
+
+from soc.bus.sram import SRAM
+from soc.config.test.test_loadstore import TestMemPspec
+from soc.experiment.dcache import DCache
+from soc.fu.ldst.loadstore import LoadStore1
+from soc.experiment.test.test_dcache import (tst_dcache, dcache_sim,
+                                             dcache_random_sim,
+                                             dcache_regression_sim,
+                                             dcache_store, dcache_load)
+
+
+def mem_value(row):
+    return 0x1000000 + row
+
+
+def dcache_issue_load(dut, addr, id):
+    """presents a load, without waiting for it to complete"""
+    yield Settle()
+    while (yield dut.stall_out):
+        yield
+        yield Settle()
+    yield dut.d_in.load.eq(1)
+    yield dut.d_in.nc.eq(0)
+    yield dut.d_in.addr.eq(addr)
+    yield dut.d_in.byte_sel.eq(~0)
+    yield dut.d_in.id.eq(id)
+    yield dut.d_in.valid.eq(1)
+    yield
+    yield dut.d_in.valid.eq(0)
+    yield dut.d_in.byte_sel.eq(0)
+
+
+class TestDCacheMSHR(unittest.TestCase):
+
+    def run_tst(self, dut, mem, processes, name):
+        memory = Memory(width=64, depth=len(mem), init=mem, simulate=True)
+        sram = SRAM(memory=memory, granularity=8)
+
+        m = Module()
+        m.submodules.dcache = dut
+        m.submodules.sram = sram
+
+        m.d.comb += sram.bus.cyc.eq(dut.wb_out.cyc)
+        m.d.comb += sram.bus.stb.eq(dut.wb_out.stb)
+        m.d.comb += sram.bus.we.eq(dut.wb_out.we)
+        m.d.comb += sram.bus.sel.eq(dut.wb_out.sel)
+        m.d.comb += sram.bus.adr.eq(dut.wb_out.adr)
+        m.d.comb += sram.bus.dat_w.eq(dut.wb_out.dat)
+
+        m.d.comb += dut.wb_in.ack.eq(sram.bus.ack)
+        m.d.comb += dut.wb_in.dat.eq(sram.bus.dat_r)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        for process in processes:
+            sim.add_sync_process(process)
+        with write_vcd(sim, "test_dcache_mshr_%s.vcd" % name):
+            sim.run()
+
+    def test_sequential(self):
+        # one request at a time: the MSHR file must not change anything
+        pspec = TestMemPspec(dcache_num_mshrs=2)
+        seed(0)
+        mem = [i for i in range(16)]
+        tst_dcache(mem, dcache_regression_sim, "mshr_simpleregression",
+                   pspec)
+        mem = [i for i in range(256)]
+        tst_dcache(mem, dcache_random_sim, "mshr_random", pspec)
+        mem = [(i*2) | ((i*2+1)<<32) for i in range(1024)]
+        tst_dcache(mem, dcache_sim, "mshr", pspec)
+
+    def tst_back_to_back(self, num_mshrs):
+        dut = DCache(num_mshrs=num_mshrs)
+        mem = [mem_value(i) for i in range(512)]
+        completed = []
+        order = []
+
+        # (address, id): 0x100 line is already in the cache
+        loads = [(0x200, 1), # miss
+                 (0x108, 2), # hit under miss
+                 (0x110, 3), # hit under miss
+                 (0x400, 4), # second miss: queued
+                 (0x118, 5), # hit
+                 (0x238, 6), # same line as the first miss
+                 (0x408, 7), # same line as the second miss
+                ]
+
+        def monitor():
+            yield Passive()
+            while True:
+                yield
+                yield Settle()
+                if (yield dut.d_out.valid):
+                    id = yield dut.d_out.id
+                    data = yield dut.d_out.data
+                    completed.append((id, data))
+
+        def process():
+            yield dut.d_in.priv_mode.eq(1)
+            yield
+            # warm up the line at 0x100
+            yield from dcache_load(dut, 0x100)
+            del completed[:]
+
+            for addr, id in loads:
+                yield from dcache_issue_load(dut, addr, id)
+            for i in range(200):
+                if len(completed) >= len(loads):
+                    break
+                yield
+
+            # everything completes, once, with the right data
+            self.assertEqual(sorted(id for id, data in completed),
+                             [id for addr, id in loads])
+            for addr, id in loads:
+                self.assertIn((id, mem_value(addr//8)), completed)
+            order.extend(id for id, data in completed)
+
+            # stores wait until no misses are outstanding
+            while (yield dut.mshr_pending):
+                yield
+            yield from dcache_store(dut, 0x208, 0xdeadbeef)
+            data = yield from dcache_load(dut, 0x208)
+            self.assertEqual(data, 0xdeadbeef)
+
+        self.run_tst(dut, mem, [process, monitor], "b2b_%d" % num_mshrs)
+        return order
+
+    def test_blocking(self):
+        # no MSHRs: completion is in order
+        order = self.tst_back_to_back(0)
+        self.assertEqual(order, [1, 2, 3, 4, 5, 6, 7])
+
+    def test_hit_under_miss(self):
+        order = self.tst_back_to_back(2)
+        print("completion order", order)
+        # hits are not held up by the first miss
+        self.assertLess(order.index(2), order.index(1))
+        self.assertLess(order.index(3), order.index(1))
+        # the second miss does not hold up a later hit
+        self.assertLess(order.index(5), order.index(4))
+
+    def test_mshrs_full(self):
+        # a single MSHR: the second miss blocks, as without the file
+        order = self.tst_back_to_back(1)
+        print("completion order", order)
+        self.assertLess(order.index(2), order.index(1))
+
+    def test_store_under_miss(self):
+        # a store while a miss is outstanding is held off (stall_out)
+        # until the MSHR file is empty: the missing load, to the same
+        # doubleword, must not see it
+        dut = DCache(num_mshrs=2)
+        mem = [mem_value(i) for i in range(512)]
+        completed = []
+
+        def monitor():
+            yield Passive()
+            while True:
+                yield
+                yield Settle()
+                if (yield dut.d_out.valid):
+                    completed.append((yield dut.d_out.id))
+
+        def process():
+            yield dut.d_in.priv_mode.eq(1)
+            yield
+            yield from dcache_issue_load(dut, 0x200, 1) # miss
+            yield dut.d_in.id.eq(2)
+            yield from dcache_store(dut, 0x200, 0xdeadbeef)
+            for i in range(100):
+                if len(completed) >= 2:
+                    break
+                yield
+            # the load completed first
+            self.assertEqual(completed, [1, 2])
+            data = yield from dcache_load(dut, 0x200)
+            self.assertEqual(data, 0xdeadbeef)
+            # the load itself returned the old value
+            self.assertEqual(self.load_data, mem_value(0x200//8))
+
+        def capture():
+            yield Passive()
+            while True:
+                yield
+                yield Settle()
+                if (yield dut.d_out.valid) and (yield dut.d_out.id) == 1:
+                    self.load_data = yield dut.d_out.data
+
+        self.run_tst(dut, mem, [process, monitor, capture], "store")
+
+    def test_loadstore_untagged(self):
+        # LoadStore1 only tags its requests (req_id, and the d_in.id
+        # check in ACK_WAIT) when there are MSHRs: the default blocking
+        # dcache path is as it was
+        for num_mshrs, tagged in ((0, False), (2, True)):
+            pspec = TestMemPspec(addr_wid=64, mask_wid=8, reg_wid=64,
+                                 dcache_num_mshrs=num_mshrs)
+            il = rtlil.convert(LoadStore1(pspec), ports=[])
+            wires = set(l.split()[-1] for l in il.splitlines()
+                        if l.strip().startswith("wire "))
+            with self.subTest(num_mshrs=num_mshrs):
+                self.assertEqual("\\req_id" in wires, tagged)
+                self.assertEqual("\\ours" in wires, tagged)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""ICache refill tests
+
+* classic (non-pipelined) wishbone SRAM, over several cache geometries
+* a pipelined wishbone slave, with and without stalls, checking that
+  the refill issues back-to-back requests and that fetch resumes on
+  the critical word rather than at the end of the line
+"""
+
+import unittest
+from random import randint, seed
+
+from nmigen import Module, Signal, Elaboratable, Memory
+from nmutil.util import wrap
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+from nmutil.sim_tmp_alternative import Simulator
+from soc.config.waves import write_vcd
+
+from soc.bus.sram import SRAM
+from soc.experiment.icache import ICache, icache_sim
+from soc.experiment.wb_types import WB_ADDR_BITS, WB_DATA_BITS
+
+
+class PipelinedSRAM(Elaboratable):
+    """minimal pipelined-wishbone read-only memory: accepts a request on
+    every cycle that stall is low, and acks it on the following cycle.
+    stall_i is a test input, for exercising back-pressure.
+    """
+    def __init__(self, memory):
+        self.memory = memory
+        self.cyc = Signal()
+        self.stb = Signal()
+        self.adr = Signal(WB_ADDR_BITS)
+        self.ack = Signal()
+        self.stall = Signal()
+        self.dat_r = Signal(WB_DATA_BITS)
+        self.stall_i = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.rdport = rdport = self.memory.read_port()
+        m.d.comb += rdport.addr.eq(self.adr)
+        m.d.comb += self.dat_r.eq(rdport.data)
+        m.d.comb += self.stall.eq(self.stall_i)
+        m.d.sync += self.ack.eq(self.cyc & self.stb & ~self.stall)
+        return m
+
+
+def icache_fetch(dut, nia, max_cycles=100):
+    """requests an instruction and waits for it.  returns the
+    instruction, number of cycles taken, and whether the refill wishbone
+    cycle was still in progress when the instruction became valid
+    """
+    yield dut.i_in.req.eq(1)
+    yield dut.i_in.nia.eq(nia)
+    for cycles in range(max_cycles):
+        yield
+        valid = yield dut.i_out.valid
+        out_nia = yield dut.i_out.nia
+        if valid and out_nia == nia:
+            break
+    insn = yield dut.i_out.insn
+    refilling = yield dut.wb_out.cyc
+    yield dut.i_in.req.eq(0)
+    yield
+    return insn, cycles, refilling
+
+
+def expected_insn(nia):
+    # memory row i holds (i*2) | ((i*2+1)<<32), i.e. the word at
+    # address a is a//4
+    return nia // 4
+
+
+def make_mem():
+    return [(i*2) | ((i*2+1)<<32) for i in range(512)]
+
+
+class TestICache(unittest.TestCase):
+
+    def run_tst(self, dut, slave, process, name):
+        m = Module()
+        m.submodules.icache = dut
+        m.submodules.sram = slave
+        bus = slave.bus if hasattr(slave, "bus") else slave
+
+        m.d.comb += bus.cyc.eq(dut.wb_out.cyc)
+        m.d.comb += bus.stb.eq(dut.wb_out.stb)
+        m.d.comb += bus.adr.eq(dut.wb_out.adr)
+        if hasattr(slave, "bus"):
+            m.d.comb += bus.we.eq(dut.wb_out.we)
+            m.d.comb += bus.sel.eq(dut.wb_out.sel)
+            m.d.comb += bus.dat_w.eq(dut.wb_out.dat)
+        else:
+            m.d.comb += dut.wb_in.stall.eq(bus.stall)
+
+        m.d.comb += dut.wb_in.ack.eq(bus.ack)
+        m.d.comb += dut.wb_in.dat.eq(bus.dat_r)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(wrap(process))
+        with write_vcd(sim, "%s.vcd" % name):
+            sim.run()
+
+    def test_classic(self):
+        # the original icache_sim test, against the (classic) SRAM
+        for geometry in [dict(),
+                         dict(num_lines=64, num_ways=8),
+                         dict(line_size=32, num_ways=2)]:
+            with self.subTest(**geometry):
+                dut = ICache(**geometry)
+                memory = Memory(width=64, depth=512, init=make_mem())
+                sram = SRAM(memory=memory, granularity=8)
+                self.run_tst(dut, sram, icache_sim(dut), "test_icache")
+
+    def test_pipelined(self):
+        dut = ICache(wb_pipelined=True)
+        memory = Memory(width=64, depth=512, init=make_mem())
+        slave = PipelinedSRAM(memory)
+        row_per_line = dut.ROW_PER_LINE
+
+        def process():
+            yield dut.i_in.priv_mode.eq(1)
+            yield
+            yield
+            # fetch from the last row of a line: that row must be
+            # requested first, and the instruction returned while the
+            # rest of the line is still being loaded.
+            nia = 0x3c
+            insn, cycles, refilling = yield from icache_fetch(dut, nia)
+            print("critical word: insn %x cycles %d" % (insn, cycles))
+            self.assertEqual(insn, expected_insn(nia))
+            self.assertTrue(refilling)
+            self.assertLess(cycles, row_per_line)
+            # let the refill complete, then every word of the line hits
+            for i in range(2*row_per_line):
+                yield
+            for nia in range(0x0, 0x40, 4):
+                insn, cycles, refilling = yield from icache_fetch(dut, nia)
+                self.assertEqual(insn, expected_insn(nia))
+                self.assertFalse(refilling)
+
+            # back-pressure: randomly stall the bus during a refill
+            for nia in [0x100, 0x1c8, 0x248, 0x7f0]:
+                yield dut.i_in.req.eq(1)
+                yield dut.i_in.nia.eq(nia)
+                for cycles in range(100):
+                    yield slave.stall_i.eq(randint(0, 1))
+                    yield
+                    valid = yield dut.i_out.valid
+                    out_nia = yield dut.i_out.nia
+                    if valid and out_nia == nia:
+                        break
+                insn = yield dut.i_out.insn
+                self.assertEqual(insn, expected_insn(nia))
+                yield dut.i_in.req.eq(0)
+                while (yield dut.wb_out.cyc):
+                    yield slave.stall_i.eq(randint(0, 1))
+                    yield
+                yield slave.stall_i.eq(0)
+                # whole line now present
+                base = nia & ~(dut.LINE_SIZE-1)
+                for a in range(base, base+dut.LINE_SIZE, 4):
+                    insn, cycles, refilling = yield from icache_fetch(dut, a)
+                    self.assertEqual(insn, expected_insn(a))
+
+        seed(0)
+        self.run_tst(dut, slave, process(), "test_icache_pipelined")
+
+
+if __name__ == '__main__':
+    unittest.main()
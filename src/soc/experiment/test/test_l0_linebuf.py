@@ -0,0 +1,206 @@
+"""L0LineBuffer tests
+
+* repeated loads to a line are served without memory reads
+* two ports loading from the same line share one line fill
+* stores are written through, and update the line
+* pass-through (virtual mode) stores invalidate the buffer
+* inval_i, for memory written behind the buffer's back: also during a
+  line fill, which must then not be used
+* random LD/ST from several ports checked against a python model
+"""
+
+import unittest
+from random import randint, choice, seed
+
+from nmigen import Module
+from nmutil.util import wrap
+from nmutil.sim_tmp_alternative import Simulator, Passive, Settle
+from soc.config.waves import write_vcd
+
+from soc.config.test.test_pi2ls import pi_ld, pi_st
+from soc.experiment.pimem import TestMemoryPortInterface
+from soc.experiment.l0_linebuf import L0LineBuffer
+from soc.experiment.test.test_storebuf import MemModel
+
+
+class TestL0LineBuffer(unittest.TestCase):
+
+    def run_tst(self, n_units, num_lines, processes, name):
+        pimem = TestMemoryPortInterface(regwid=64, addrwid=48)
+        dut = L0LineBuffer(n_units, pimem, num_lines)
+        dpi = pimem.pi
+        # count the downstream memory operations
+        self.mem_lds = self.mem_sts = 0
+
+        def monitor():
+            yield Passive()
+            while True:
+                if (yield dpi.st.ok):
+                    self.mem_sts += 1
+                if (yield dpi.ld.ok):
+                    self.mem_lds += 1
+                yield
+
+        m = Module()
+        m.submodules.pimem = pimem
+        m.submodules.l0 = dut
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        for process in processes:
+            sim.add_sync_process(wrap(process(dut)))
+        sim.add_sync_process(monitor)
+        with write_vcd(sim, "test_l0_linebuf_%s.vcd" % name):
+            sim.run()
+
+    def wait_idle(self, pi):
+        # note: pi_st returns before busy_o has dropped
+        yield Settle()
+        while (yield pi.busy_o):
+            yield
+            yield Settle()
+
+    def test_reuse(self):
+        def process(dut):
+            pi = dut.dports[0]
+            yield from pi_st(pi, 0x48, 0x0123456789abcdef, 8)
+            yield from self.wait_idle(pi)
+            self.assertEqual(self.mem_sts, 1)
+            # first load fills the (8 doubleword) line, the rest hit
+            data = yield from pi_ld(pi, 0x48, 8)
+            self.assertEqual(data, 0x0123456789abcdef)
+            self.assertEqual(self.mem_lds, 8)
+            data = yield from pi_ld(pi, 0x4c, 4)
+            self.assertEqual(data, 0x01234567)
+            data = yield from pi_ld(pi, 0x40, 8)
+            self.assertEqual(data, 0)
+            self.assertEqual(self.mem_lds, 8)
+            # write-through: memory and line both updated
+            yield from pi_st(pi, 0x4a, 0xbeef, 2)
+            yield from self.wait_idle(pi)
+            self.assertEqual(self.mem_sts, 2)
+            data = yield from pi_ld(pi, 0x48, 8)
+            self.assertEqual(data, 0x01234567beefcdef)
+            self.assertEqual(self.mem_lds, 8)
+        self.run_tst(1, 2, [process], "reuse")
+
+    def test_shared_fill(self):
+        results = {}
+        go = []
+
+        def writer(dut):
+            pi = dut.dports[0]
+            yield from pi_st(pi, 0x80, 0x1111, 8)
+            yield from pi_st(pi, 0xb8, 0x2222, 8)
+            yield from self.wait_idle(pi)
+            go.append(1)
+            while len(results) < 2:
+                yield
+            self.assertEqual(results[1], 0x2222)
+            self.assertEqual(results[2], 0x1111)
+            self.assertEqual(self.mem_lds, 8) # one line fill, not two
+
+        def loader(i, addr):
+            def process(dut):
+                pi = dut.dports[i]
+                while not go:
+                    yield
+                # both ports load from the same line at the same time
+                results[i] = yield from pi_ld(pi, addr, 8)
+            return process
+
+        self.run_tst(3, 2, [writer, loader(1, 0xb8), loader(2, 0x80)],
+                     "shared")
+
+    def test_invalidate(self):
+        def process(dut):
+            pi = dut.dports[0]
+            yield from pi_st(pi, 0x10, 0x55, 1)
+            data = yield from pi_ld(pi, 0x10, 1)
+            self.assertEqual(data, 0x55)
+            self.assertEqual(self.mem_lds, 8)
+            # virtual mode: passed through, buffer invalidated
+            yield from pi_st(pi, 0x10, 0x66, 1, msr_pr=1)
+            yield from self.wait_idle(pi)
+            data = yield from pi_ld(pi, 0x10, 1)
+            self.assertEqual(data, 0x66)
+            self.assertEqual(self.mem_lds, 16)
+        self.run_tst(1, 2, [process], "invalidate")
+
+    def mem_write(self, dut, addr, data):
+        """writes memory directly, as another bus master would"""
+        mem = dut.pimem.mem.mem
+        yield mem._array[(addr >> 3) % mem.depth].eq(data)
+
+    def test_inval(self):
+        def process(dut):
+            pi = dut.dports[0]
+            data = yield from pi_ld(pi, 0xc0, 8)
+            self.assertEqual(data, 0)
+            self.assertEqual(self.mem_lds, 8)
+            # the line is held: a write behind its back is not seen...
+            yield from self.mem_write(dut, 0xc0, 0x1234)
+            data = yield from pi_ld(pi, 0xc0, 8)
+            self.assertEqual(data, 0)
+            # ...until it is invalidated
+            yield dut.inval_i.eq(1)
+            yield
+            yield dut.inval_i.eq(0)
+            data = yield from pi_ld(pi, 0xc0, 8)
+            self.assertEqual(data, 0x1234)
+            self.assertEqual(self.mem_lds, 16)
+        self.run_tst(1, 2, [process], "inval")
+
+    def test_inval_fill(self):
+        done = []
+
+        def loader(dut):
+            pi = dut.dports[0]
+            data = yield from pi_ld(pi, 0x100, 8)
+            self.assertEqual(data, 0x5678)
+            done.append(1)
+
+        def writer(dut):
+            # first doubleword already fetched, then memory changes
+            while self.mem_lds < 2:
+                yield
+            yield from self.mem_write(dut, 0x100, 0x5678)
+            yield dut.inval_i.eq(1)
+            yield
+            yield dut.inval_i.eq(0)
+            while not done:
+                yield
+            # the interrupted fill was not kept: the line was fetched again
+            self.assertEqual(self.mem_lds, 16)
+
+        self.run_tst(1, 2, [loader, writer], "inval_fill")
+
+    def test_random(self):
+        seed(0)
+        model = MemModel()
+
+        def port(i):
+            def process(dut):
+                pi = dut.dports[i]
+                # each port has its own 32 bytes in each of the four
+                # lines: no ordering is needed between ports
+                for k in range(100):
+                    datalen = choice([1, 2, 4, 8])
+                    addr = randint(0, 0x1f) & ~(datalen-1)
+                    addr += i*0x20 + randint(0, 3)*0x40
+                    if randint(0, 1):
+                        data = randint(0, (1 << (datalen*8))-1)
+                        model.st(addr, data, datalen)
+                        yield from pi_st(pi, addr, data, datalen)
+                    else:
+                        data = yield from pi_ld(pi, addr, datalen)
+                        self.assertEqual(data, model.ld(addr, datalen),
+                                         "port %d ld %x len %d" %
+                                         (i, addr, datalen))
+            return process
+
+        self.run_tst(2, 2, [port(0), port(1)], "random")
+        print("memory writes", self.mem_sts, "reads", self.mem_lds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+"""StoreBuffer tests
+
+* store-to-load forwarding (no memory read)
+* adjacent byte stores merged into one memory write
+* partially-covered loads, buffer full, pass-through of stores which
+  cannot be buffered
+* non-cacheable loads: not forwarded, and not ahead of buffered stores
+* flush_i: drain at once, rather than after drain_delay
+* random LD/ST sequence checked against a python model
+"""
+
+import unittest
+from random import randint, choice, seed
+
+from nmigen import Module
+from nmutil.util import wrap
+from nmutil.sim_tmp_alternative import Simulator, Passive, Settle
+from soc.config.waves import write_vcd
+
+from soc.config.test.test_pi2ls import pi_ld, pi_st
+from soc.experiment.pimem import TestMemoryPortInterface
+from soc.experiment.storebuf import StoreBuffer
+
+
+class MemModel:
+    """byte-addressed python model of memory"""
+    def __init__(self):
+        self.mem = {}
+
+    def st(self, addr, data, datalen):
+        for i in range(datalen):
+            self.mem[addr+i] = (data >> (i*8)) & 0xff
+
+    def ld(self, addr, datalen):
+        res = 0
+        for i in range(datalen):
+            res |= self.mem.get(addr+i, 0) << (i*8)
+        return res
+
+
+class TestStoreBuffer(unittest.TestCase):
+
+    def run_tst(self, depth, process, name):
+        pimem = TestMemoryPortInterface(regwid=64, addrwid=48)
+        dut = StoreBuffer(pimem, depth)
+        dpi = pimem.pi
+        # count the downstream memory operations
+        self.mem_lds = self.mem_sts = 0
+
+        def monitor():
+            yield Passive()
+            while True:
+                if (yield dpi.st.ok):
+                    self.mem_sts += 1
+                if (yield dpi.ld.ok):
+                    self.mem_lds += 1
+                yield
+
+        m = Module()
+        m.submodules.pimem = pimem
+        m.submodules.stbuf = dut
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(wrap(process(dut)))
+        sim.add_sync_process(monitor)
+        with write_vcd(sim, "test_storebuf_%s.vcd" % name):
+            sim.run()
+
+    def wait_idle(self, dut):
+        # note: pi_st returns before busy_o has dropped
+        yield Settle()
+        while (yield dut.pi.busy_o):
+            yield
+            yield Settle()
+
+    def wait_empty(self, dut):
+        yield from self.wait_idle(dut)
+        while not (yield dut.empty_o):
+            yield
+            yield Settle()
+        yield
+
+    def is_empty(self, dut):
+        yield from self.wait_idle(dut)
+        return (yield dut.empty_o)
+
+    def test_forward(self):
+        def process(dut):
+            pi = dut.pi
+            yield from pi_st(pi, 0x10, 0x0123456789abcdef, 8)
+            # whole, and partial, loads come from the buffer
+            data = yield from pi_ld(pi, 0x10, 8)
+            self.assertEqual(data, 0x0123456789abcdef)
+            data = yield from pi_ld(pi, 0x12, 2)
+            self.assertEqual(data, 0x89ab)
+            self.assertEqual(self.mem_lds, 0)
+            # drained in the background
+            yield from self.wait_empty(dut)
+            self.assertEqual(self.mem_sts, 1)
+            data = yield from pi_ld(pi, 0x14, 4)
+            self.assertEqual(data, 0x01234567)
+            self.assertEqual(self.mem_lds, 1)
+        self.run_tst(4, process, "forward")
+
+    def test_merge(self):
+        def process(dut):
+            pi = dut.pi
+            # eight adjacent byte stores: one memory write
+            for i in range(8):
+                yield from pi_st(pi, 0x20+i, 0x10+i, 1)
+            yield from self.wait_empty(dut)
+            self.assertEqual(self.mem_sts, 1)
+            data = yield from pi_ld(pi, 0x20, 8)
+            self.assertEqual(data, 0x1716151413121110)
+            # a gap: bytes 0 and 2 cannot be a single write
+            yield from pi_st(pi, 0x30, 0xaa, 1)
+            yield from pi_st(pi, 0x32, 0xbb, 1)
+            yield from self.wait_empty(dut)
+            self.assertEqual(self.mem_sts, 3)
+            data = yield from pi_ld(pi, 0x30, 4)
+            self.assertEqual(data, 0x00bb00aa)
+        self.run_tst(4, process, "merge")
+
+    def test_partial(self):
+        def process(dut):
+            pi = dut.pi
+            yield from pi_st(pi, 0x40, 0x1122334455667788, 8)
+            yield from self.wait_empty(dut)
+            # only one byte of the load is in the buffer: must drain
+            yield from pi_st(pi, 0x43, 0xee, 1)
+            data = yield from pi_ld(pi, 0x40, 8)
+            self.assertEqual(data, 0x11223344ee667788)
+            self.assertTrue((yield from self.is_empty(dut)))
+        self.run_tst(4, process, "partial")
+
+    def test_full(self):
+        def process(dut):
+            pi = dut.pi
+            # more stores than entries, all to different doublewords
+            for i in range(6):
+                yield from pi_st(pi, 0x50+i*8, 0x100+i, 8)
+            for i in range(6):
+                data = yield from pi_ld(pi, 0x50+i*8, 8)
+                self.assertEqual(data, 0x100+i)
+        self.run_tst(2, process, "full")
+
+    def test_passthrough(self):
+        def process(dut):
+            pi = dut.pi
+            yield from pi_st(pi, 0x60, 0x12345678, 4)
+            # virtual mode: not buffered, only written after the
+            # buffered store
+            yield from pi_st(pi, 0x60, 0xabcd, 2, msr_pr=1)
+            self.assertTrue((yield from self.is_empty(dut)))
+            self.assertEqual(self.mem_sts, 2)
+            data = yield from pi_ld(pi, 0x60, 4)
+            self.assertEqual(data, 0x1234abcd)
+        self.run_tst(4, process, "passthrough")
+
+    def test_nc_load(self):
+        def process(dut):
+            pi = dut.pi
+            yield from pi_st(pi, 0x70, 0x1111111111111111, 8)
+            yield from pi_st(pi, 0x78, 0x2222222222222222, 8)
+            # covered, but non-cacheable: goes to memory, after the drain
+            yield pi.is_nc.eq(1)
+            data = yield from pi_ld(pi, 0x70, 8)
+            self.assertEqual(data, 0x1111111111111111)
+            self.assertEqual(self.mem_lds, 1)
+            self.assertEqual(self.mem_sts, 2)
+            yield from pi_st(pi, 0x80, 0x3333333333333333, 8)
+            yield pi.is_nc.eq(0)
+            yield from pi_st(pi, 0x88, 0x4444444444444444, 8)
+            # not covered, but still not allowed ahead of the buffer
+            yield pi.is_nc.eq(1)
+            data = yield from pi_ld(pi, 0x90, 8)
+            yield pi.is_nc.eq(0)
+            self.assertEqual(data, 0)
+            self.assertEqual(self.mem_sts, 4)
+            self.assertTrue((yield from self.is_empty(dut)))
+        self.run_tst(4, process, "nc_load")
+
+    def test_flush(self):
+        def process(dut):
+            pi = dut.pi
+            yield from pi_st(pi, 0xa0, 0x55, 1)
+            yield from self.wait_idle(dut)
+            # held for write-combining, well short of drain_delay
+            for i in range(4):
+                yield
+            self.assertEqual(self.mem_sts, 0)
+            yield dut.flush_i.eq(1)
+            for i in range(8):
+                yield
+            yield Settle()
+            self.assertTrue((yield dut.empty_o))
+            self.assertEqual(self.mem_sts, 1)
+            self.assertFalse((yield dut.drain_err_o))
+            yield dut.flush_i.eq(0)
+        self.run_tst(4, process, "flush")
+
+    def test_random(self):
+        seed(0)
+
+        def process(dut):
+            pi = dut.pi
+            model = MemModel()
+            for i in range(200):
+                datalen = choice([1, 2, 4, 8])
+                addr = randint(0, 0x3f) & ~(datalen-1)
+                if randint(0, 1):
+                    data = randint(0, (1 << (datalen*8))-1)
+                    model.st(addr, data, datalen)
+                    yield from pi_st(pi, addr, data, datalen)
+                else:
+                    data = yield from pi_ld(pi, addr, datalen)
+                    self.assertEqual(data, model.ld(addr, datalen),
+                                     "ld %x len %d" % (addr, datalen))
+            print("memory writes", self.mem_sts, "reads", self.mem_lds)
+        self.run_tst(4, process, "random")
+
+
+if __name__ == '__main__':
+    unittest.main()
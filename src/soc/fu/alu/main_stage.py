@@ -13,6 +13,7 @@ from nmigen import (Module, Signal, Cat, Repl, Mux, Const)
 from nmutil.pipemodbase import PipeModBase
 from nmutil.extend import exts, extz
 from soc.fu.alu.pipe_data import ALUInputData, ALUOutputData
+from soc.fu.narrow import gate_upper, narrow_add_upper
 from ieee754.part.partsig import PartitionedSignal
 from openpower.decoder.power_enums import MicrOp
 
@@ -78,11 +79,23 @@ class ALUMainStage(PipeModBase):
             comb += a_i.eq(a)
             comb += b_i.eq(b)
 
+        # narrow datapath (see soc.fu.narrow): a narrow OP_ADD holds the
+        # upper halves of the adder's operands at zero, the upper half of
+        # the result is made from the fill bits instead.  (not OP_CMP,
+        # which needs the real 64-bit carry-out)
+        narrow = None
+        add_a_i, add_b_i = a_i, b_i
+        if hasattr(self.i, "narrow"):
+            narrow = Signal(reset_less=True)
+            comb += narrow.eq(self.i.narrow & (op.insn_type == MicrOp.OP_ADD))
+            add_a_i = gate_upper(m, a_i, narrow, "add_a_i")
+            add_b_i = gate_upper(m, b_i, narrow, "add_b_i")
+
         with m.If((op.insn_type == MicrOp.OP_ADD) |
                   (op.insn_type == MicrOp.OP_CMP)):
             # in bit 0, 1+carry_in creates carry into bit 1 and above
-            comb += add_a.eq(Cat(cry_i[0], a_i, Const(0, 1)))
-            comb += add_b.eq(Cat(Const(1, 1), b_i, Const(0, 1)))
+            comb += add_a.eq(Cat(cry_i[0], add_a_i, Const(0, 1)))
+            comb += add_b.eq(Cat(Const(1, 1), add_b_i, Const(0, 1)))
             comb += add_o.eq(add_a + add_b)
 
         ##########################
@@ -142,20 +155,30 @@ class ALUMainStage(PipeModBase):
 
             with m.Case(MicrOp.OP_ADD):
                 # bit 0 is not part of the result, top bit is the carry-out
-                comb += o.data.eq(add_o[1:-1])
-                comb += o.ok.eq(1) # output register
+                res = Signal(64, reset_less=True)
+                comb += res.eq(add_o[1:-1])
 
                 # see microwatt OP_ADD code
                 # https://bugs.libre-soc.org/show_bug.cgi?id=319#c5
                 ca = Signal(2, reset_less=True)
                 comb += ca[0].eq(add_o[-1])                   # XER.CA
-                comb += ca[1].eq(add_o[33] ^ (a_i[32] ^ b_i[32])) # XER.CA32
+                # XER.CA32 (from the adder's inputs: bit 32 may be gated)
+                comb += ca[1].eq(add_o[33] ^ (add_a_i[32] ^ add_b_i[32]))
+                if narrow is not None:
+                    with m.If(narrow):
+                        upper, carry = narrow_add_upper(a_i[-1], b_i[-1],
+                                                        ca[1])
+                        comb += res[32:].eq(upper)
+                        comb += ca[0].eq(carry)
+
+                comb += o.data.eq(res)
+                comb += o.ok.eq(1) # output register
                 comb += cry_o.data.eq(ca)
                 comb += cry_o.ok.eq(1)
                 # 32-bit (ov[1]) and 64-bit (ov[0]) overflow
                 ov = Signal(2, reset_less=True)
-                comb += ov[0].eq(calc_ov(a_i[-1], b_i[-1], ca[0], add_o[-2]))
-                comb += ov[1].eq(calc_ov(a_i[31], b_i[31], ca[1], add_o[32]))
+                comb += ov[0].eq(calc_ov(a_i[-1], b_i[-1], ca[0], res[-1]))
+                comb += ov[1].eq(calc_ov(a_i[31], b_i[31], ca[1], res[31]))
                 comb += ov_o.data.eq(ov)
                 comb += ov_o.ok.eq(1)
 
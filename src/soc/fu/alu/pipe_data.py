@@ -1,3 +1,4 @@
+from nmigen import Signal
 from soc.fu.alu.alu_input_record import CompALUOpSubset
 from soc.fu.pipe_data import FUBaseData, CommonPipeSpec
 
@@ -11,6 +12,10 @@ class ALUInputData(FUBaseData):
         super().__init__(pspec, False)
         # convenience
         self.a, self.b = self.ra, self.rb
+        # narrow datapath: set by the input stage, see soc.fu.narrow
+        if getattr(pspec, "narrow", False):
+            self.narrow = Signal(reset_less=True)
+            self.data.append(self.narrow)
 
 
 class ALUOutputData(FUBaseData):
@@ -28,3 +33,7 @@ class ALUOutputData(FUBaseData):
 class ALUPipeSpec(CommonPipeSpec):
     regspec = (ALUInputData.regspec, ALUOutputData.regspec)
     opsubsetkls = CompALUOpSubset
+
+    def __init__(self, id_wid, narrow=False):
+        super().__init__(id_wid)
+        self.narrow = narrow # operand-width-aware datapath (soc.fu.narrow)
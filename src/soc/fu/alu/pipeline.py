@@ -1,5 +1,6 @@
 from nmutil.singlepipe import ControlBase
 from nmutil.pipemodbase import PipeModBaseChain
+from soc.fu.narrow import NarrowEvents
 from soc.fu.alu.input_stage import ALUInputStage
 from soc.fu.alu.main_stage import ALUMainStage
 from soc.fu.alu.output_stage import ALUOutputStage
@@ -24,10 +25,22 @@ class ALUBasePipe(ControlBase):
         self.pipe1 = ALUStages(pspec)
         self.pipe2 = ALUStageEnd(pspec)
         self._eqs = self.connect([self.pipe1, self.pipe2])
+        # narrow datapath activity, for the PMU (see soc.fu.narrow)
+        if getattr(pspec, "narrow", False):
+            self.narrow_events = NarrowEvents()
+            self.events = self.narrow_events.events
 
     def elaborate(self, platform):
         m = ControlBase.elaborate(self, platform)
         m.submodules.pipe1 = self.pipe1
         m.submodules.pipe2 = self.pipe2
         m.d.comb += self._eqs
+        if hasattr(self, "narrow_events"):
+            # operands as they leave the input stage, counted on accept
+            m.submodules.narrow_events = ev = self.narrow_events
+            inp = self.pipe1.chain[0].o
+            m.d.comb += [ev.valid_i.eq(self.p.i_valid & self.p.o_ready),
+                         ev.narrow_i.eq(inp.narrow),
+                         ev.a_i.eq(inp.a),
+                         ev.b_i.eq(inp.b)]
         return m
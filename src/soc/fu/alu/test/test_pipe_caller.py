@@ -14,10 +14,12 @@ from nmutil.formaltest import FHDLTestCase
 from nmigen import Module, Signal
 
 from openpower.test.alu.alu_cases import ALUTestCase
+from soc.fu.test.pipe_stream import PipeStreamRunner
 
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
 
 
 def get_cu_inputs(dec2, sim):
@@ -58,7 +60,7 @@ class ALUIAllCases(ALUTestCase):
             f.write(vl)
 
 
-class TestRunner(unittest.TestCase):
+class TestRunner(PipeStreamRunner, unittest.TestCase):
 
     def execute(self, alu,instruction, pdecode2, test):
         program = test.program
@@ -141,9 +143,30 @@ class TestRunner(unittest.TestCase):
                     yield from self.execute(alu, instruction, pdecode2, test)
 
         sim.add_sync_process(process)
-        with sim.write_vcd("alu_simulator.vcd"):
+        with write_vcd(sim, "alu_simulator.vcd"):
             sim.run()
 
+    def test_stream(self, narrow=False):
+        """same tests, with the pipeline kept full"""
+        def mkdecode():
+            return PowerDecode2(create_pdecode(), ALUPipeSpec.opsubsetkls,
+                                "ALU")
+
+        def set_inputs(alu, dec2, sim, code):
+            yield from set_alu_inputs(alu, dec2, sim)
+
+        def check_outputs(alu, dec2, sim, code, inputs):
+            yield from self.check_alu_outputs(alu, dec2, sim, code)
+
+        pspec = ALUPipeSpec(id_wid=8, narrow=narrow)
+        self.run_stream(ALUTestCase().test_data, ALUBasePipe(pspec),
+                        mkdecode, Function.ALU, set_inputs, check_outputs,
+                        "alu")
+
+    def test_stream_narrow(self):
+        """same tests, with the narrow datapath (see soc.fu.narrow)"""
+        self.test_stream(narrow=True)
+
     def check_alu_outputs(self, alu, dec2, sim, code):
 
         rc = yield dec2.e.do.rc.rc
@@ -186,4 +209,5 @@ class TestRunner(unittest.TestCase):
 
 
 if __name__ == "__main__":
+    parse_vcd_args()
     unittest.main()
@@ -3,6 +3,7 @@ from nmigen import Module, Signal
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
 
 from nmigen.cli import rtlil
 import unittest
@@ -137,7 +138,7 @@ class TestRunner(unittest.TestCase):
                                                        code)
 
         sim.add_sync_process(process)
-        with sim.write_vcd("branch_simulator.vcd"):
+        with write_vcd(sim, "branch_simulator.vcd"):
             sim.run()
 
     def assert_outputs(self, branch, dec2, sim, prev_nia, code):
@@ -170,4 +171,5 @@ class TestRunner(unittest.TestCase):
 
 
 if __name__ == "__main__":
+    parse_vcd_args()
     unittest.main()
@@ -5,6 +5,7 @@ from nmigen import (Module, Signal)
 from nmutil.pipemodbase import PipeModBase
 from openpower.decoder.power_enums import MicrOp
 from openpower.decoder.power_enums import CryIn
+from soc.fu.narrow import is_narrow
 
 
 class CommonInputStage(PipeModBase):
@@ -52,6 +53,11 @@ class CommonInputStage(PipeModBase):
         with m.If(~op.sv_pred_sz):
             comb += self.o.b.eq(b)
 
+        ##### operand width (narrow datapath, see soc.fu.narrow) #####
+
+        if hasattr(self.o, "narrow"):
+            comb += self.o.narrow.eq(is_narrow(self.o.a, self.o.b))
+
         ##### carry-in #####
 
         # either copy incoming carry or set to 1/0 as defined by op
@@ -43,11 +43,14 @@ see:
 
 # imports
 
+from functools import partial
 from nmigen import Elaboratable, Module
 from nmigen.cli import rtlil
+from nmutil.concurrentunit import ReservationStations
 from soc.experiment.compalu_multi import MultiCompUnit
 from openpower.decoder.power_enums import Function
 from soc.config.test.test_loadstore import TestMemPspec
+from soc.config.elabcache import cached_convert
 
 # pipeline / spec imports
 
@@ -120,10 +123,69 @@ class FunctionUnitBaseSingle(MultiCompUnit):
 
 
 ##############################################################
-# TODO: ReservationStations-based (FunctionUnitBaseConcurrent)
+###### FunctionUnitBaseMulti - ReservationStations-based ######
 
-class FunctionUnitBaseMulti:
-    pass
+class PseudoALU(Elaboratable):
+    """PseudoALU
+
+    stands in for the ALU of one MultiCompUnit front-end: it is just the
+    row (p and n) of the ReservationStations fan-in and fan-out that
+    belongs to that front-end.  the actual pipeline is elsewhere (shared)
+    """
+
+    def __init__(self, p, n):
+        self.p = p
+        self.n = n
+
+    def elaborate(self, platform):
+        return Module()
+
+
+class FunctionUnitBaseMulti(ReservationStations):
+    """FunctionUnitBaseMulti
+
+    one multi-stage pipeline shared by num_rows MultiCompUnit front-ends
+    (Reservation Stations), so that an N-stage pipeline may have up to N
+    operations in flight.  each front-end (self.cu[idx]) sets the muxid
+    of its row in the fan-in to idx: the pipeline carries the muxid through
+    in ctx, and the fan-out uses it to route each result back to the
+    front-end that issued it.
+
+    * :speckls:  - the specification (as for FunctionUnitBaseSingle)
+    * :pipekls:  - the type of pipeline: only one is created
+    * :num_rows: - the number of front-ends
+
+    note that the front-ends are *not* submodules of this class: they are
+    Function Units in their own right (each has its own regfile ports and
+    is separately issued), and it is up to the user (AllFunctionUnits) to
+    add both them and this class (the fan-in, pipeline and fan-out).
+    """
+
+    def __init__(self, speckls, pipekls, num_rows):
+        id_wid = max(1, (num_rows-1).bit_length()) # enough muxid for all rows
+        pspec = speckls(id_wid=id_wid)           # spec (NNNPipeSpec instance)
+        opsubset = pspec.opsubsetkls             # get the operand subset class
+        regspec = pspec.regspec                  # get the regspec
+        self.alu = pipekls(pspec)                # create the one NNNBasePipe
+        self.pspec = pspec
+        super().__init__(num_rows)               # fan-in and fan-out
+
+        # create the front-ends, one per row
+        self.cu = []
+        for idx in range(num_rows):
+            alu_name = "alu_%s%d" % (self.fnunit.name.lower(), idx)
+            palu = PseudoALU(self.p[idx], self.n[idx])
+            cu = MultiCompUnit(regspec, palu, opsubset, name=alu_name)
+            cu.fnunit = self.fnunit
+            cu.pspec = pspec
+            self.cu.append(cu)
+
+    def elaborate(self, platform):
+        m = super().elaborate(platform)
+        # each front-end identifies its operations by its row number
+        for idx in range(self.num_rows):
+            m.d.comb += self.p[idx].i_data.muxid.eq(idx)
+        return m
 
 
 ######################################################################
@@ -132,15 +194,17 @@ class FunctionUnitBaseMulti:
 class ALUFunctionUnit(FunctionUnitBaseSingle):
     fnunit = Function.ALU
 
-    def __init__(self, idx):
-        super().__init__(ALUPipeSpec, ALUBasePipe, idx)
+    def __init__(self, idx, narrow=False):
+        speckls = partial(ALUPipeSpec, narrow=narrow)
+        super().__init__(speckls, ALUBasePipe, idx)
 
 
 class LogicalFunctionUnit(FunctionUnitBaseSingle):
     fnunit = Function.LOGICAL
 
-    def __init__(self, idx):
-        super().__init__(LogicalPipeSpec, LogicalBasePipe, idx)
+    def __init__(self, idx, narrow=False):
+        speckls = partial(LogicalPipeSpec, narrow=narrow)
+        super().__init__(speckls, LogicalBasePipe, idx)
 
 
 class CRFunctionUnit(FunctionUnitBaseSingle):
@@ -167,8 +231,11 @@ class ShiftRotFunctionUnit(FunctionUnitBaseSingle):
 class DivFSMFunctionUnit(FunctionUnitBaseSingle):
     fnunit = Function.DIV
 
-    def __init__(self, idx):
-        super().__init__(DivPipeSpecFSMDivCore, DivBasePipe, idx)
+    def __init__(self, idx, bits_per_cycle=1, early_out=False):
+        speckls = partial(DivPipeSpecFSMDivCore,
+                          bits_per_cycle=bits_per_cycle,
+                          early_out=early_out)
+        super().__init__(speckls, DivBasePipe, idx)
 
 
 class MMUFSMFunctionUnit(FunctionUnitBaseSingle):
@@ -181,15 +248,19 @@ class MMUFSMFunctionUnit(FunctionUnitBaseSingle):
 class DivPipeFunctionUnit(FunctionUnitBaseSingle):
     fnunit = Function.DIV
 
-    def __init__(self, idx):
-        super().__init__(DivPipeSpecDivPipeCore, DivBasePipe, idx)
+    def __init__(self, idx, log2_radix=None, compute_steps_per_stage=4):
+        speckls = partial(DivPipeSpecDivPipeCore, log2_radix=log2_radix,
+                          compute_steps_per_stage=compute_steps_per_stage)
+        super().__init__(speckls, DivBasePipe, idx)
 
 
 class MulFunctionUnit(FunctionUnitBaseSingle):
     fnunit = Function.MUL
 
-    def __init__(self, idx):
-        super().__init__(MulPipeSpec, MulBasePipe, idx)
+    def __init__(self, idx, csa_levels_per_stage=None):
+        pipekls = partial(MulBasePipe,
+                          csa_levels_per_stage=csa_levels_per_stage)
+        super().__init__(MulPipeSpec, pipekls, idx)
 
 
 class TrapFunctionUnit(FunctionUnitBaseSingle):
@@ -223,7 +294,23 @@ class LDSTFunctionUnit(LDSTCompUnit):
 #####################################################################
 ###### actual Function Units: these are "multi" stage pipelines #####
 
-# TODO: ReservationStations-based.
+class MulFunctionUnitMulti(FunctionUnitBaseMulti):
+    fnunit = Function.MUL
+
+    def __init__(self, num_rows, csa_levels_per_stage=None):
+        pipekls = partial(MulBasePipe,
+                          csa_levels_per_stage=csa_levels_per_stage)
+        super().__init__(MulPipeSpec, pipekls, num_rows)
+
+
+class DivPipeFunctionUnitMulti(FunctionUnitBaseMulti):
+    fnunit = Function.DIV
+
+    def __init__(self, num_rows, log2_radix=None, compute_steps_per_stage=4):
+        speckls = partial(DivPipeSpecDivPipeCore, log2_radix=log2_radix,
+                          compute_steps_per_stage=compute_steps_per_stage)
+        super().__init__(speckls, DivBasePipe, num_rows)
+
 
 # simple one-only function unit class, for test purposes
 class AllFunctionUnits(Elaboratable):
@@ -236,12 +323,34 @@ class AllFunctionUnits(Elaboratable):
      * quantity of FUs required
      * type of FU required
 
+    with pspec.reservation_stations set, the multi-stage pipelines (MUL,
+    and DIV when not an FSM) are instead created once each, with the
+    quantity being the number of Reservation Stations in front of it
+    (FunctionUnitBaseMulti).  either way the (front-end) Function Units
+    are named the same: mul0, mul1, ...
+
+    an integer pspec.mul_csa_levels selects the pipelined Booth/Wallace
+    multiplier, at that many carry-save levels per stage (see MulBasePipe).
+    the FSM divider does pspec.div_bits_per_cycle (integer) quotient bits
+    per cycle, and with pspec.div_early_out skips leading zero quotient
+    bits (see FSMDivCoreConfig).  the pipelined divider (div_fsm=False,
+    or pspec.div_pipe) takes integer pspec.div_log2_radix (quotient bits
+    per calculate stage) and pspec.div_steps_per_stage (calculate stages
+    per pipeline register)
+
+    pspec.narrow_datapath gates off the upper halves of the ALU and Logical
+    datapaths for operations on 32-bit (sign- or zero-filled) operands,
+    and counts the activity saved (see soc.fu.narrow)
     """
 
     def __init__(self, pspec, pilist=None, div_fsm=True):
         addrwid = pspec.addr_wid
         units = pspec.units
         microwatt_mmu = hasattr(pspec, "mmu") and pspec.mmu == True
+        rs_units = (hasattr(pspec, "reservation_stations") and
+                    pspec.reservation_stations == True)
+        if hasattr(pspec, "div_pipe") and pspec.div_pipe == True:
+            div_fsm = False # pipelined divider selected by the build
         print("AllFunctionUnits.microwatt_mmu="+str(microwatt_mmu))
         if not isinstance(units, dict):
             units = {'alu': 1, 'cr': 1, 'branch': 1, 'trap': 1,
@@ -262,13 +371,52 @@ class AllFunctionUnits(Elaboratable):
                 'shiftrot': ShiftRotFunctionUnit,
                 }
         if div_fsm:
-            alus['div'] = DivFSMFunctionUnit
+            div_bits_per_cycle = getattr(pspec, "div_bits_per_cycle", None)
+            if not isinstance(div_bits_per_cycle, int):
+                div_bits_per_cycle = 1
+            div_early_out = (hasattr(pspec, "div_early_out") and
+                             pspec.div_early_out == True)
+            alus['div'] = partial(DivFSMFunctionUnit,
+                                  bits_per_cycle=div_bits_per_cycle,
+                                  early_out=div_early_out)
         else:
-            alus['div'] = DivPipeFunctionUnit
+            div_kw = {}
+            div_log2_radix = getattr(pspec, "div_log2_radix", None)
+            if isinstance(div_log2_radix, int):
+                div_kw['log2_radix'] = div_log2_radix
+            div_steps = getattr(pspec, "div_steps_per_stage", None)
+            if isinstance(div_steps, int):
+                div_kw['compute_steps_per_stage'] = div_steps
+            alus['div'] = partial(DivPipeFunctionUnit, **div_kw)
+
+        if hasattr(pspec, "narrow_datapath") and pspec.narrow_datapath == True:
+            alus['alu'] = partial(ALUFunctionUnit, narrow=True)
+            alus['logical'] = partial(LogicalFunctionUnit, narrow=True)
+
+        mul_csa_levels = getattr(pspec, "mul_csa_levels", None)
+        if isinstance(mul_csa_levels, int):
+            alus['mul'] = partial(MulFunctionUnit,
+                                  csa_levels_per_stage=mul_csa_levels)
+        else:
+            mul_csa_levels = None
+
+        # multi-stage pipelines that may be shared by Reservation Stations
+        multis = {}
+        if rs_units:
+            multis['mul'] = partial(MulFunctionUnitMulti,
+                                    csa_levels_per_stage=mul_csa_levels)
+            if not div_fsm:
+                multis['div'] = partial(DivPipeFunctionUnitMulti, **div_kw)
 
         # create dictionary of Function Units
         self.fus = {}
+        self.rs = {} # shared pipelines, front-ends are also in self.fus
         for name, qty in units.items():
+            if name in multis and qty > 0:
+                self.rs[name] = rs = multis[name](qty)
+                for i, cu in enumerate(rs.cu):
+                    self.fus["%s%d" % (name, i)] = cu
+                continue
             kls = alus[name]
             for i in range(qty):
                 self.fus["%s%d" % (name, i)] = kls(i)
@@ -302,6 +450,8 @@ class AllFunctionUnits(Elaboratable):
         m = Module()
         for (name, fu) in self.fus.items():
             setattr(m.submodules, name, fu)
+        for (name, rs) in self.rs.items():
+            setattr(m.submodules, "%s_rs" % name, rs)
         return m
 
     def __iter__(self):
@@ -321,8 +471,7 @@ def tst_single_fus_il():
                         ('mul', MulFunctionUnit),
                         ('logical', LogicalFunctionUnit),
                         ('shiftrot', ShiftRotFunctionUnit)):
-        fu = kls(0)
-        vl = rtlil.convert(fu, ports=fu.ports())
+        vl = cached_convert(lambda: kls(0), key="fu_%s" % name)
         with open("fu_%s.il" % name, "w") as f:
             f.write(vl)
 
@@ -333,8 +482,8 @@ def tst_all_fus():
                          addr_wid=48,
                          mask_wid=8,
                          reg_wid=64)
-    dut = AllFunctionUnits(pspec)
-    vl = rtlil.convert(dut, ports=dut.ports())
+    vl = cached_convert(lambda: AllFunctionUnits(pspec), pspec,
+                        key="all_fus")
     with open("all_fus.il", "w") as f:
         f.write(vl)
 
@@ -1,8 +1,10 @@
+import logging
 from nmigen import Module, Signal, ResetSignal, Memory
 
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd
 
 from nmutil.formaltest import FHDLTestCase
 from nmigen.cli import rtlil
@@ -14,6 +16,10 @@ from openpower.decoder.isa.all import ISA
 
 from soc.experiment.compalu_multi import find_ok  # hack
 from soc.config.test.test_loadstore import TestMemPspec
+from soc.simple.bulkstate import BulkState
+from soc.config.simlog import get_logger
+
+log = get_logger("compunit")
 
 
 def set_cu_input(cu, idx, data):
@@ -21,7 +27,8 @@ def set_cu_input(cu, idx, data):
     yield cu.src_i[idx].eq(data)
     while True:
         rd_rel_o = yield cu.rd.rel_o[idx]
-        print("rd_rel %d wait HI" % idx, rd_rel_o, rdop, hex(data))
+        log.debug("rd_rel %d wait HI %s %s %s", idx, rd_rel_o, rdop,
+                  hex(data))
         if rd_rel_o:
             break
         yield
@@ -31,7 +38,7 @@ def set_cu_input(cu, idx, data):
         rd_rel_o = yield cu.rd.rel_o[idx]
         if rd_rel_o:
             break
-        print("rd_rel %d wait HI" % idx, rd_rel_o)
+        log.debug("rd_rel %d wait HI %s", idx, rd_rel_o)
         yield
     yield cu.rd.go_i[idx].eq(0)
     yield cu.src_i[idx].eq(0)
@@ -43,7 +50,8 @@ def get_cu_output(cu, idx, code):
     wrok = cu.get_out(idx)
     fname = find_ok(wrok.fields)
     wrok = yield getattr(wrok, fname)
-    print("wr_rel mask", repr(code), idx, wrop, bin(wrmask), fname, wrok)
+    log.debug("wr_rel mask %s %s %s %s %s %s", repr(code), idx, wrop,
+              bin(wrmask), fname, wrok)
     assert wrmask & (1 << idx), \
         "get_cu_output '%s': mask bit %d not set\n" \
         "write-operand '%s' Data.ok likely not set (%s)" \
@@ -51,7 +59,7 @@ def get_cu_output(cu, idx, code):
     while True:
         wr_relall_o = yield cu.wr.rel_o
         wr_rel_o = yield cu.wr.rel_o[idx]
-        print("wr_rel %d wait" % idx, hex(wr_relall_o), wr_rel_o)
+        log.debug("wr_rel %d wait %s %s", idx, hex(wr_relall_o), wr_rel_o)
         if wr_rel_o:
             break
         yield
@@ -60,13 +68,14 @@ def get_cu_output(cu, idx, code):
     result = yield cu.dest[idx]
     yield
     yield cu.wr.go_i[idx].eq(0)
-    print("result", repr(code), idx, wrop, wrok, hex(result))
+    log.debug("result %s %s %s %s %s", repr(code), idx, wrop, wrok,
+              hex(result))
 
     return result
 
 
 def set_cu_inputs(cu, inp):
-    print("set_cu_inputs", inp)
+    log.debug("set_cu_inputs %s", inp)
     for idx, data in inp.items():
         yield from set_cu_input(cu, idx, data)
     # gets out of sync when checking busy if there is no wait, here.
@@ -99,7 +108,7 @@ def get_cu_outputs(cu, code):
 
     wrmask = yield cu.wrmask
     wr_rel_o = yield cu.wr.rel_o
-    print("get_cu_outputs", cu.n_dst, wrmask, wr_rel_o)
+    log.debug("get_cu_outputs %s %s %s", cu.n_dst, wrmask, wr_rel_o)
     # no point waiting (however really should doublecheck wr.rel)
     if not wrmask:
         return {}
@@ -114,7 +123,7 @@ def get_cu_outputs(cu, code):
         if wr_rel_o:
             result = yield from get_cu_output(cu, i, code)
             wrop = cu.get_out_name(i)
-            print("output", i, wrop, hex(result))
+            log.debug("output %s %s %s", i, wrop, hex(result))
             res[wrop] = result
     return res
 
@@ -139,40 +148,54 @@ def get_l0_mem(l0):  # BLECH! this is awful! hunting around through structures
 
 def setup_tst_memory(l0, sim):
     mem = get_l0_mem(l0)
-    print("before, init mem", mem.depth, mem.width, mem)
+    log.debug("before, init mem %s %s %s", mem.depth, mem.width, mem)
     for i in range(mem.depth):
         data = sim.mem.ld(i*8, 8, False)
-        print("init ", i, hex(data))
+        log.debug("init  %d %x", i, data)
         yield mem._array[i].eq(data)
     yield Settle()
+    if not log.isEnabledFor(logging.DEBUG):
+        return
     for k, v in sim.mem.mem.items():
-        print("    %6x %016x" % (k, v))
-    print("before, nmigen mem dump")
+        log.debug("    %6x %016x", k, v)
+    log.debug("before, nmigen mem dump")
     for i in range(mem.depth):
         actual_mem = yield mem._array[i]
-        print("    %6i %016x" % (i, actual_mem))
+        log.debug("    %6i %016x", i, actual_mem)
 
 
 def dump_sim_memory(dut, l0, sim, code):
+    if not log.isEnabledFor(logging.DEBUG):
+        return
     mem = get_l0_mem(l0)
-    print("sim mem dump")
+    log.debug("sim mem dump")
     for k, v in sim.mem.mem.items():
-        print("    %6x %016x" % (k, v))
-    print("nmigen mem dump")
+        log.debug("    %6x %016x", k, v)
+    log.debug("nmigen mem dump")
     for i in range(mem.depth):
         actual_mem = yield mem._array[i]
-        print("    %6i %016x" % (i, actual_mem))
+        log.debug("    %6i %016x", i, actual_mem)
 
 
-def check_sim_memory(dut, l0, sim, code):
+def check_sim_memory(dut, l0, sim, code, bulk=None):
+    """compares L0 memory against ISACaller (sim).  with a BulkState
+    (bulk) memory is read in one go, and only words changed since the
+    last check are compared.
+    """
+    if bulk is None:
+        bulk = BulkState()
     mem = get_l0_mem(l0)
 
-    for i in range(mem.depth):
-        expected_mem = sim.mem.ld(i*8, 8, False)
-        actual_mem = yield mem._array[i]
-        dut.assertEqual(expected_mem, actual_mem,
+    actual = yield from bulk.read_memory(mem)
+    if sim.mem.bytes_per_word == 8:
+        # same as sim.mem.ld(i*8, 8, False), without its debug prints
+        expected = [sim.mem.mem.get(i, 0) for i in range(mem.depth)]
+    else:
+        expected = [sim.mem.ld(i*8, 8, False) for i in range(mem.depth)]
+    for i in bulk.dirty("mem", actual, expected):
+        dut.assertEqual(expected[i], actual[i],
                         "%s %d %x %x" % (code, i,
-                                         expected_mem, actual_mem))
+                                         expected[i], actual[i]))
 
 
 class TestRunner(FHDLTestCase):
@@ -187,7 +210,7 @@ class TestRunner(FHDLTestCase):
     def execute(self, cu, l0, instruction, pdecode2, simdec2, test):
 
         program = test.program
-        print("test", test.name, test.mem)
+        log.debug("test %s %s", test.name, test.mem)
         gen = list(program.generate_instructions())
         insncode = program.assembly.splitlines()
         instructions = list(zip(gen, insncode))
@@ -205,14 +228,14 @@ class TestRunner(FHDLTestCase):
         index = pc//4
         msr = sim.msr.value
         while True:
-            print("instr pc", pc)
+            log.debug("instr pc %s", pc)
             try:
                 yield from sim.setup_one()
             except KeyError:  # indicates instruction not in imem: stop
                 break
             yield Settle()
             ins, code = instructions[index]
-            print("instruction @", index, code)
+            log.debug("instruction @ %s %s", index, code)
 
             # ask the decoder to decode this binary data (endian'd)
             yield pdecode2.dec.bigendian.eq(self.bigendian)  # le / be?
@@ -225,10 +248,10 @@ class TestRunner(FHDLTestCase):
                 lk = yield pdecode2.e.do.lk
                 fast_out2 = yield pdecode2.e.write_fast2.data
                 fast_out2_ok = yield pdecode2.e.write_fast2.ok
-                print("lk:", lk, fast_out2, fast_out2_ok)
+                log.debug("lk: %s %s %s", lk, fast_out2, fast_out2_ok)
                 op_lk = yield cu.alu.pipe1.p.i_data.ctx.op.lk
-                print("op_lk:", op_lk)
-                print(dir(cu.alu.pipe1.n.o_data))
+                log.debug("op_lk: %s", op_lk)
+                log.debug("%s", dir(cu.alu.pipe1.n.o_data))
             fn_unit = yield pdecode2.e.do.fn_unit
             fuval = self.funit.value
             self.assertEqual(fn_unit & fuval, fuval)
@@ -256,8 +279,8 @@ class TestRunner(FHDLTestCase):
             # set inputs into CU
             rd_rel_o = yield cu.rd.rel_o
             wr_rel_o = yield cu.wr.rel_o
-            print("before inputs, rd_rel, wr_rel: ",
-                  bin(rd_rel_o), bin(wr_rel_o))
+            log.debug("before inputs, rd_rel, wr_rel: %s %s", bin(rd_rel_o),
+                      bin(wr_rel_o))
             assert wr_rel_o == 0, "wr.rel %s must be zero. "\
                 "previous instr not written all regs\n"\
                 "respec %s" % \
@@ -266,8 +289,8 @@ class TestRunner(FHDLTestCase):
             rd_rel_o = yield cu.rd.rel_o
             wr_rel_o = yield cu.wr.rel_o
             wrmask = yield cu.wrmask
-            print("after inputs, rd_rel, wr_rel, wrmask: ",
-                  bin(rd_rel_o), bin(wr_rel_o), bin(wrmask))
+            log.debug("after inputs, rd_rel, wr_rel, wrmask: %s %s %s",
+                      bin(rd_rel_o), bin(wr_rel_o), bin(wrmask))
 
             # call simulated operation
             yield from sim.execute_one()
@@ -281,13 +304,13 @@ class TestRunner(FHDLTestCase):
             wrmask = yield cu.wrmask
             rd_rel_o = yield cu.rd.rel_o
             wr_rel_o = yield cu.wr.rel_o
-            print("after got outputs, rd_rel, wr_rel, wrmask: ",
-                  bin(rd_rel_o), bin(wr_rel_o), bin(wrmask))
+            log.debug("after got outputs, rd_rel, wr_rel, wrmask: %s %s %s",
+                      bin(rd_rel_o), bin(wr_rel_o), bin(wrmask))
 
             # wait for busy to go low
             while True:
                 busy_o = yield cu.busy_o
-                print("busy", busy_o)
+                log.debug("busy %s", busy_o)
                 if not busy_o:
                     break
                 yield
@@ -300,14 +323,14 @@ class TestRunner(FHDLTestCase):
             if self.funit == Function.BRANCH:
                 lr = yield cu.alu.pipe1.n.o_data.lr.data
                 lr_ok = yield cu.alu.pipe1.n.o_data.lr.ok
-                print("lr:", hex(lr), lr_ok)
+                log.debug("lr: %s %s", hex(lr), lr_ok)
 
             if self.funit == Function.LDST:
                 yield from dump_sim_memory(self, l0, sim, code)
 
             # sigh.  hard-coded.  test memory
             if self.funit == Function.LDST:
-                yield from check_sim_memory(self, l0, sim, code)
+                yield from check_sim_memory(self, l0, sim, code, self.bulk)
                 yield from self.iodef.check_cu_outputs(res, pdecode2,
                                                        sim, cu,
                                                        code)
@@ -346,6 +369,7 @@ class TestRunner(FHDLTestCase):
 
         comb += pdecode2.dec.raw_opcode_in.eq(instruction)
         sim = Simulator(m)
+        self.bulk = BulkState(sim)
 
         sim.add_clock(1e-6)
 
@@ -354,7 +378,7 @@ class TestRunner(FHDLTestCase):
             yield
 
             for test in self.test_data:
-                print(test.name)
+                log.info("%s", test.name)
                 with self.subTest(test.name):
                     yield from self.execute(cu, l0, instruction,
                                             pdecode2, simdec2,
@@ -363,6 +387,6 @@ class TestRunner(FHDLTestCase):
         sim.add_sync_process(process)
 
         name = self.funit.name.lower()
-        with sim.write_vcd("%s_simulator.vcd" % name,
-                           traces=[]):
+        with write_vcd(sim, "%s_simulator.vcd" % name,
+                            traces=[]):
             sim.run()
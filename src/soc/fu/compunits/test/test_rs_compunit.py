@@ -0,0 +1,49 @@
+"""test of the Reservation-Station Function Units: several MUL front-ends
+sharing one MulBasePipe, each with its own muxid row
+"""
+
+import unittest
+
+from nmigen.cli import rtlil
+
+from soc.config.test.test_loadstore import TestMemPspec
+from soc.fu.compunits.compunits import (AllFunctionUnits, MulFunctionUnit,
+                                        MulFunctionUnitMulti)
+from soc.fu.mul.pipeline import MulBasePipe
+
+
+class TestReservationStations(unittest.TestCase):
+
+    def make_fus(self, reservation_stations):
+        pspec = TestMemPspec(addr_wid=48,
+                             mask_wid=8,
+                             reg_wid=64,
+                             units={'alu': 1, 'mul': 3},
+                             reservation_stations=reservation_stations)
+        return AllFunctionUnits(pspec)
+
+    def test_shared_pipeline(self):
+        fus = self.make_fus(True)
+        rs = fus.rs['mul']
+        self.assertIsInstance(rs, MulFunctionUnitMulti)
+        self.assertIsInstance(rs.alu, MulBasePipe)
+        self.assertEqual(rs.num_rows, 3)
+        # the front-ends are the Function Units, named as before
+        self.assertEqual([fus.fus["mul%d" % i] for i in range(3)], rs.cu)
+        for i, cu in enumerate(rs.cu):
+            self.assertIs(cu.alu.p, rs.p[i])
+            self.assertIs(cu.alu.n, rs.n[i])
+            self.assertEqual(cu.fnunit, MulFunctionUnitMulti.fnunit)
+        self.assertEqual(len(rs.p[0].i_data.muxid), 2)
+        vl = rtlil.convert(fus, ports=fus.ports())
+        self.assertIn("mul_rs", vl)
+
+    def test_default_single(self):
+        fus = self.make_fus(False)
+        self.assertEqual(fus.rs, {})
+        for i in range(3):
+            self.assertIsInstance(fus.fus["mul%d" % i], MulFunctionUnit)
+
+
+if __name__ == '__main__':
+    unittest.main()
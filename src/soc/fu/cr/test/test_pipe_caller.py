@@ -3,6 +3,7 @@ from nmigen import Module, Signal
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
 
 from nmigen.cli import rtlil
 import unittest
@@ -16,6 +17,7 @@ from openpower.test.common import TestAccumulatorBase, ALUHelpers
 from openpower.util import mask_extend
 from soc.fu.cr.pipeline import CRBasePipe
 from soc.fu.cr.pipe_data import CRPipeSpec
+from soc.fu.test.pipe_stream import PipeStreamRunner
 import random
 
 from openpower.test.cr.cr_cases import CRTestCase
@@ -55,9 +57,9 @@ def get_cu_inputs(dec2, sim):
     return res
 
 
-class TestRunner(unittest.TestCase):
-    def __init__(self, test_data):
-        super().__init__("run_all")
+class TestRunner(PipeStreamRunner, unittest.TestCase):
+    def __init__(self, test_data, method="run_all"):
+        super().__init__(method)
         self.test_data = test_data
 
     def set_inputs(self, alu, dec2, simulator):
@@ -161,14 +163,31 @@ class TestRunner(unittest.TestCase):
                     yield from self.execute(alu, instruction, pdecode2, test)
 
         sim.add_sync_process(process)
-        with sim.write_vcd("cr_simulator.vcd"):
+        with write_vcd(sim, "cr_simulator.vcd"):
             sim.run()
 
+    def run_all_stream(self):
+        """same tests, with the pipeline kept full"""
+        def mkdecode():
+            return PowerDecode2(None, CRPipeSpec.opsubsetkls, "CR")
+
+        def set_inputs(alu, dec2, sim, code):
+            yield from self.set_inputs(alu, dec2, sim)
+
+        def check_outputs(alu, dec2, sim, code, inputs):
+            yield from self.assert_outputs(alu, dec2, sim, code)
+
+        pspec = CRPipeSpec(id_wid=8)
+        self.run_stream(self.test_data, CRBasePipe(pspec), mkdecode,
+                        Function.CR, set_inputs, check_outputs, "cr")
+
 
 if __name__ == "__main__":
+    parse_vcd_args()
     unittest.main(exit=False)
     suite = unittest.TestSuite()
     suite.addTest(TestRunner(CRTestCase().test_data))
+    suite.addTest(TestRunner(CRTestCase().test_data, "run_all_stream"))
     suite.addTest(TestRunner(CRIlangCase().test_data))
 
     runner = unittest.TextTestRunner()
@@ -1,5 +1,6 @@
 import enum
 from nmigen import Elaboratable, Module, Signal, Shape, unsigned, Cat, Mux
+from nmutil.clz import CLZ
 from soc.fu.div.pipe_data import CoreInputData, CoreOutputData, DivPipeSpec
 from nmutil.iocontrol import PrevControl, NextControl
 from nmutil.singlepipe import ControlBase
@@ -7,10 +8,23 @@ from ieee754.div_rem_sqrt_rsqrt.core import DivPipeCoreOperation
 
 
 class FSMDivCoreConfig:
+    """FSMDivCoreConfig
+
+    * :bits_per_cycle: quotient bits per cycle (1, 2, 4 or 8): the number
+                       of DivStateNext chained together each cycle
+    * :early_out:      skip the leading quotient bits known to be zero,
+                       from the leading zeros of dividend and divisor
+    """
     n_stages = 1
     bit_width = 64
     fract_width = 64
 
+    def __init__(self, bits_per_cycle=1, early_out=False):
+        assert self.bit_width % bits_per_cycle == 0, \
+            "bits_per_cycle must divide %d" % self.bit_width
+        self.bits_per_cycle = bits_per_cycle
+        self.early_out = early_out
+
 
 class FSMDivCoreInputData:
     def __init__(self, core_config, reset_less=True):
@@ -84,15 +98,41 @@ class DivStateNext(Elaboratable):
 
 
 class DivStateInit(Elaboratable):
-    def __init__(self, quotient_width):
+    def __init__(self, quotient_width, early_out=False):
         self.quotient_width = quotient_width
+        self.early_out = early_out
         self.dividend = Signal(quotient_width * 2)
+        self.divisor = Signal(quotient_width) # only used by early_out
         self.o = DivState(quotient_width=quotient_width, name="o")
 
     def elaborate(self, platform):
         m = Module()
-        m.d.comb += self.o.q_bits_known.eq(0)
-        m.d.comb += self.o.dividend_quotient.eq(self.dividend)
+        if not self.early_out:
+            m.d.comb += self.o.q_bits_known.eq(0)
+            m.d.comb += self.o.dividend_quotient.eq(self.dividend)
+            return m
+
+        # early-out: dividend < 2**(2*qw-lz_dividend) and
+        # divisor >= 2**(qw-1-lz_divisor), so the quotient is less than
+        # 2**(qw+1-lz_dividend+lz_divisor): its top lz_dividend-lz_divisor-1
+        # bits are zero.  each of those steps of DivStateNext would only
+        # shift the (zero) top bit of the dividend out, so instead start
+        # with that many bits known.  (not when dividing by zero, to leave
+        # that case exactly as it was)
+        qw = self.quotient_width
+        m.submodules.clz_dividend = clz_dividend = CLZ(qw * 2)
+        m.submodules.clz_divisor = clz_divisor = CLZ(qw)
+        m.d.comb += clz_dividend.sig_in.eq(self.dividend)
+        m.d.comb += clz_divisor.sig_in.eq(self.divisor)
+
+        lz_dividend, lz_divisor = clz_dividend.lz, clz_divisor.lz
+        zero_bits = Signal(len(lz_dividend))
+        skip = Signal(range(1 + qw))
+        m.d.comb += zero_bits.eq(lz_dividend - lz_divisor - 1)
+        with m.If((self.divisor != 0) & (lz_dividend > lz_divisor + 1)):
+            m.d.comb += skip.eq(Mux(zero_bits > qw, qw, zero_bits))
+        m.d.comb += self.o.q_bits_known.eq(skip)
+        m.d.comb += self.o.dividend_quotient.eq(self.dividend << skip)
         return m
 
 
@@ -139,13 +179,23 @@ class FSMDivCoreStage(ControlBase):
         self.saved_input_data = CoreInputData(pspec)
         self.empty = Signal(reset=1)
         self.saved_state = DivState(64, name="saved_state")
-        self.div_state_next = DivStateNext(64)
-        self.div_state_init = DivStateInit(64)
+        # bits_per_cycle DivStateNexts, chained: the first takes the
+        # saved (or initial) state, the last gives the next state
+        self.bits_per_cycle = pspec.core_config.bits_per_cycle
+        early_out = pspec.core_config.early_out
+        self.div_state_nexts = []
+        for i in range(self.bits_per_cycle):
+            self.div_state_nexts.append(DivStateNext(64))
+        self.div_state_next = self.div_state_nexts[0]
+        self.div_state_init = DivStateInit(64, early_out=early_out)
         self.divisor = Signal(unsigned(64))
 
     def elaborate(self, platform):
         m = super().elaborate(platform)
         m.submodules.div_state_next = self.div_state_next
+        for i in range(1, self.bits_per_cycle):
+            setattr(m.submodules, "div_state_next_%d" % i,
+                    self.div_state_nexts[i])
         m.submodules.div_state_init = self.div_state_init
         i_data = self.p.i_data
         o_data = self.n.o_data
@@ -157,20 +207,29 @@ class FSMDivCoreStage(ControlBase):
         # TODO: handle cancellation
 
         m.d.comb += self.div_state_init.dividend.eq(core_i.dividend)
+        m.d.comb += self.div_state_init.divisor.eq(core_i.divisor_radicand)
+
+        # chain the DivStateNexts, all with the same divisor
+        last_next = self.div_state_nexts[-1]
+        for prev, nxt in zip(self.div_state_nexts, self.div_state_nexts[1:]):
+            m.d.comb += nxt.i.eq(prev.o)
+        for nxt in self.div_state_nexts[1:]:
+            m.d.comb += nxt.divisor.eq(self.div_state_next.divisor)
 
         m.d.comb += o_data.eq_without_core(self.saved_input_data)
-        m.d.comb += core_o.quotient_root.eq(self.div_state_next.o.quotient)
+        m.d.comb += core_o.quotient_root.eq(last_next.o.quotient)
         # fract width of `DivPipeCoreOutputData.remainder`
         remainder_fract_width = 64 * 3
         # fract width of `DivPipeCoreInputData.dividend`
         dividend_fract_width = 64 * 2
         rem_start = remainder_fract_width - dividend_fract_width
-        m.d.comb += core_o.remainder.eq(self.div_state_next.o.remainder
+        m.d.comb += core_o.remainder.eq(last_next.o.remainder
                                         << rem_start)
         m.d.comb += self.n.o_valid.eq(
-            ~self.empty & self.saved_state.will_be_done_after(1))
+            ~self.empty &
+            self.saved_state.will_be_done_after(self.bits_per_cycle))
         m.d.comb += self.p.o_ready.eq(self.empty)
-        m.d.sync += self.saved_state.eq(self.div_state_next.o)
+        m.d.sync += self.saved_state.eq(last_next.o)
 
         with m.If(self.empty):
             m.d.comb += self.div_state_next.i.eq(self.div_state_init.o)
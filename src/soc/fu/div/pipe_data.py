@@ -129,23 +129,47 @@ class DivPipeKind(enum.Enum):
 
 
 class DivPipeSpec(CommonPipeSpec):
-    def __init__(self, id_wid, div_pipe_kind):
+    """DivPipeSpec
+
+    * :log2_radix: DivPipeCore only: quotient bits per calculate stage
+                   (None: that of DivPipeKind.DivPipeCore, 1).
+                   64 / log2_radix calculate stages are needed.
+    * :compute_steps_per_stage: DivPipeCore only: calculate stages
+                   between pipeline registers (see DivBasePipe)
+    """
+    def __init__(self, id_wid, div_pipe_kind, log2_radix=None,
+                 compute_steps_per_stage=4):
         super().__init__(id_wid=id_wid)
         self.div_pipe_kind = div_pipe_kind
         self.core_config = div_pipe_kind.config.core_config
+        self.compute_steps_per_stage = compute_steps_per_stage
+        if log2_radix is not None:
+            assert div_pipe_kind == DivPipeKind.DivPipeCore, \
+                "log2_radix is only for DivPipeKind.DivPipeCore"
+            self.core_config = DivPipeCoreConfig(
+                bit_width=64,
+                fract_width=64,
+                log2_radix=log2_radix,
+                supported=[DP.UDivRem])
 
     regspec = (DivInputData.regspec, DivMulOutputData.regspec)
     opsubsetkls = CompLogicalOpSubset
 
 
 class DivPipeSpecDivPipeCore(DivPipeSpec):
-    def __init__(self, id_wid):
-        super().__init__(id_wid=id_wid, div_pipe_kind=DivPipeKind.DivPipeCore)
+    def __init__(self, id_wid, log2_radix=None, compute_steps_per_stage=4):
+        super().__init__(id_wid=id_wid, div_pipe_kind=DivPipeKind.DivPipeCore,
+                         log2_radix=log2_radix,
+                         compute_steps_per_stage=compute_steps_per_stage)
 
 
 class DivPipeSpecFSMDivCore(DivPipeSpec):
-    def __init__(self, id_wid):
+    def __init__(self, id_wid, bits_per_cycle=1, early_out=False):
         super().__init__(id_wid=id_wid, div_pipe_kind=DivPipeKind.FSMDivCore)
+        # import here to avoid import loop
+        from soc.fu.div.fsm import FSMDivCoreConfig
+        self.core_config = FSMDivCoreConfig(bits_per_cycle=bits_per_cycle,
+                                            early_out=early_out)
 
 
 class DivPipeSpecSimOnly(DivPipeSpec):
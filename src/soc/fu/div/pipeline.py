@@ -51,9 +51,12 @@ class DivStagesEnd(PipeModBaseChain):
 
 
 class DivBasePipe(ControlBase):
-    def __init__(self, pspec, compute_steps_per_stage=4):
+    def __init__(self, pspec, compute_steps_per_stage=None):
         ControlBase.__init__(self)
         self.pspec = pspec
+        if compute_steps_per_stage is None:
+            compute_steps_per_stage = getattr(pspec,
+                                              "compute_steps_per_stage", 4)
         self.pipe_start = DivStagesStart(pspec)
         self.pipe_middles = []
         if isinstance(self.pspec.div_pipe_kind.config,
@@ -6,6 +6,7 @@ from nmigen import Module, Signal
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Delay
+from soc.config.waves import write_vcd
 
 from openpower.decoder.power_decoder import (create_pdecode)
 from openpower.decoder.power_decoder2 import (PowerDecode2)
@@ -17,6 +18,7 @@ from openpower.test.common import ALUHelpers
 from soc.fu.test.pia import pia_res_to_output
 from soc.fu.div.pipeline import DivBasePipe
 from soc.fu.div.pipe_data import DivPipeSpec
+from soc.fu.test.pipe_stream import PipeStreamRunner
 
 
 def log_rand(n, min_val=1):
@@ -58,7 +60,7 @@ def set_alu_inputs(alu, dec2, sim):
     return pia.InstructionInput(ra=inp["ra"], rb=inp["rb"], overflow=overflow)
 
 
-class DivTestHelper(unittest.TestCase):
+class DivTestHelper(PipeStreamRunner, unittest.TestCase):
     def execute(self, alu, instruction, pdecode2, test, div_pipe_kind, sim):
         prog = test.program
         isa_sim = ISA(pdecode2, test.regs, test.sprs, test.cr,
@@ -154,7 +156,8 @@ class DivTestHelper(unittest.TestCase):
                                               pia_res)
             yield
 
-    def run_all(self, test_data, div_pipe_kind, file_name_prefix):
+    def run_all(self, test_data, div_pipe_kind, file_name_prefix,
+                log2_radix=None):
         m = Module()
         comb = m.d.comb
         instruction = Signal(32)
@@ -163,7 +166,8 @@ class DivTestHelper(unittest.TestCase):
 
         m.submodules.pdecode2 = pdecode2 = PowerDecode2(pdecode)
 
-        pspec = DivPipeSpec(id_wid=2, div_pipe_kind=div_pipe_kind)
+        pspec = DivPipeSpec(id_wid=2, div_pipe_kind=div_pipe_kind,
+                            log2_radix=log2_radix)
         m.submodules.alu = alu = DivBasePipe(pspec)
 
         comb += alu.p.i_data.ctx.op.eq_from_execute1(pdecode2.do)
@@ -181,9 +185,28 @@ class DivTestHelper(unittest.TestCase):
                                             test, div_pipe_kind, sim)
 
         sim.add_sync_process(process)
-        with sim.write_vcd(f"{file_name_prefix}_{div_pipe_kind.name}.vcd"):
+        with write_vcd(sim, f"{file_name_prefix}_{div_pipe_kind.name}.vcd"):
             sim.run()
 
+    def run_all_stream(self, test_data, div_pipe_kind, file_name_prefix):
+        """as run_all, with the pipeline kept full"""
+        def mkdecode():
+            return PowerDecode2(create_pdecode())
+
+        def set_inputs(alu, dec2, sim, code):
+            pia_inputs = yield from set_alu_inputs(alu, dec2, sim)
+            fnname = code.split(' ')[0].replace(".", "_")
+            return getattr(pia, fnname)(pia_inputs)
+
+        def check_outputs(alu, dec2, sim, code, pia_res):
+            msg = "%s: %s" % (div_pipe_kind.name, code)
+            yield from self.check_alu_outputs(alu, dec2, sim, msg, pia_res)
+
+        pspec = DivPipeSpec(id_wid=8, div_pipe_kind=div_pipe_kind)
+        return self.run_stream(test_data, DivBasePipe(pspec), mkdecode,
+                               Function.DIV, set_inputs, check_outputs,
+                               f"{file_name_prefix}_{div_pipe_kind.name}")
+
     def check_alu_outputs(self, alu, dec2, sim, code, pia_res):
 
         rc = yield dec2.e.do.rc.data
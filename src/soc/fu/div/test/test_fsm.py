@@ -1,5 +1,8 @@
+import random
 import unittest
-from soc.fu.div.fsm import DivState, DivStateInit, DivStateNext
+from soc.fu.div.fsm import (DivState, DivStateInit, DivStateNext,
+                            FSMDivCoreStage)
+from soc.fu.div.pipe_data import DivPipeSpecFSMDivCore
 from nmigen import Elaboratable, Module, Signal, unsigned
 from nmigen.cli import rtlil
 try:
@@ -129,6 +132,49 @@ class DivStateFSMTest(Elaboratable):
         return m
 
 
+class DivStateRadixFSMTest(Elaboratable):
+    """the FSM as FSMDivCoreStage uses it: bits_per_cycle copies of the
+    state-function chained each clock, and optionally the early-out
+    """
+
+    def __init__(self, quotient_width, bits_per_cycle, early_out):
+        self.quotient_width = quotient_width
+        self.dividend = Signal(unsigned(quotient_width * 2))
+        self.divisor = Signal(unsigned(quotient_width))
+        self.start = Signal()
+        self.state = DivState(quotient_width=quotient_width, name="state")
+        self.init = DivStateInit(quotient_width, early_out=early_out)
+        self.nexts = []
+        for i in range(bits_per_cycle):
+            self.nexts.append(DivStateNext(quotient_width))
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.init = self.init
+        m.d.comb += self.init.dividend.eq(self.dividend)
+        m.d.comb += self.init.divisor.eq(self.divisor)
+        last_state = self.state
+        for i, next in enumerate(self.nexts):
+            setattr(m.submodules, f"next{i}", next)
+            m.d.comb += next.divisor.eq(self.divisor)
+            m.d.comb += next.i.eq(last_state)
+            last_state = next.o
+        with m.If(self.start):
+            m.d.sync += self.state.eq(self.init.o)
+        with m.Else():
+            m.d.sync += self.state.eq(last_state)
+        return m
+
+
+def get_skip(quotient_width, dividend, divisor):
+    """quotient bits skipped by the early-out"""
+    if divisor == 0:
+        return 0
+    zero_bits = (2 * quotient_width - dividend.bit_length()) - \
+                (quotient_width - divisor.bit_length()) - 1
+    return max(0, min(quotient_width, zero_bits))
+
+
 def get_cases(quotient_width):
     test_cases = []
     mask = ~(~0 << quotient_width)
@@ -298,6 +344,125 @@ class TestDivState(unittest.TestCase):
             sim.add_process(check_process)
             sim.run()
 
+    def run_radix_fsm(self, quotient_width, bits_per_cycle, early_out,
+                      cases):
+        dut = DivStateRadixFSMTest(quotient_width, bits_per_cycle, early_out)
+        mask = ~(~0 << quotient_width)
+
+        def process():
+            for dividend, divisor in cases:
+                with self.subTest(dividend=f"{dividend:#x}",
+                                  divisor=f"{divisor:#x}",
+                                  bits_per_cycle=bits_per_cycle,
+                                  early_out=early_out):
+                    yield dut.dividend.eq(dividend)
+                    yield dut.divisor.eq(divisor)
+                    yield dut.start.eq(1)
+                    yield Tick()
+                    yield dut.start.eq(0)
+                    yield Delay(0.1e-6)
+                    cycles = 0
+                    while not (yield dut.state.done):
+                        yield Tick()
+                        yield Delay(0.1e-6)
+                        cycles += 1
+                    skip = 0
+                    if early_out:
+                        skip = get_skip(quotient_width, dividend, divisor)
+                    expected = -(-(quotient_width - skip) // bits_per_cycle)
+                    self.assertEqual(cycles, expected)
+                    if divisor != 0 and dividend // divisor <= mask:
+                        self.assertEqual((yield dut.state.quotient),
+                                         dividend // divisor)
+                        self.assertEqual((yield dut.state.remainder),
+                                         dividend % divisor)
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-6)
+        sim.add_process(process)
+        sim.run()
+
+    def test_div_state_radix(self, quotient_width=8):
+        test_cases = get_cases(quotient_width)
+        cases = []
+        for dividend_high in test_cases:
+            for dividend_low in test_cases:
+                dividend = dividend_low + (dividend_high << quotient_width)
+                for divisor in test_cases:
+                    cases.append((dividend, divisor))
+        for bits_per_cycle, early_out in ((1, True), (2, False), (4, True),
+                                          (8, True)):
+            self.run_radix_fsm(quotient_width, bits_per_cycle, early_out,
+                               cases)
+
+    def test_div_state_early_out_64(self):
+        # small quotients finish in a handful of cycles
+        cases = [(100, 7), (1 << 40, 3 << 30), ((1 << 64) - 1, 1 << 63),
+                 (12345, 0), (0, 5), ((1 << 64) - 1, 10)]
+        self.run_radix_fsm(64, 4, True, cases)
+
+    def run_core_stage(self, bits_per_cycle, early_out, cases):
+        """FSMDivCoreStage itself: its o_valid timing, and the results"""
+        pspec = DivPipeSpecFSMDivCore(id_wid=2,
+                                      bits_per_cycle=bits_per_cycle,
+                                      early_out=early_out)
+        dut = FSMDivCoreStage(pspec)
+        core_i, core_o = dut.p.i_data.core, dut.n.o_data.core
+
+        def process():
+            yield dut.n.i_ready.eq(1)
+            for dividend, divisor in cases:
+                with self.subTest(dividend=f"{dividend:#x}",
+                                  divisor=f"{divisor:#x}",
+                                  bits_per_cycle=bits_per_cycle,
+                                  early_out=early_out):
+                    yield core_i.dividend.eq(dividend)
+                    yield core_i.divisor_radicand.eq(divisor)
+                    yield dut.p.i_valid.eq(1)
+                    yield Delay(0.1e-6)
+                    self.assertTrue((yield dut.p.o_ready))
+                    yield Tick()
+                    yield dut.p.i_valid.eq(0)
+                    yield Delay(0.1e-6)
+                    self.assertFalse((yield dut.p.o_ready))
+                    cycles = 1
+                    while not (yield dut.n.o_valid):
+                        yield Tick()
+                        yield Delay(0.1e-6)
+                        cycles += 1
+                    skip = 0
+                    if early_out:
+                        skip = get_skip(64, dividend, divisor)
+                    steps = -(-(64 - skip) // bits_per_cycle)
+                    self.assertEqual(cycles, max(1, steps - 1))
+                    if divisor != 0:
+                        self.assertEqual((yield core_o.quotient_root),
+                                         dividend // divisor)
+                        self.assertEqual((yield core_o.remainder) >> 64,
+                                         dividend % divisor)
+                    # taken by n.i_ready: ready for the next one
+                    yield Tick()
+                    yield Delay(0.1e-6)
+                    self.assertTrue((yield dut.p.o_ready))
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-6)
+        sim.add_process(process)
+        sim.run()
+
+    def test_core_stage(self):
+        cases = [(100, 7), (1 << 40, 3 << 30), ((1 << 64) - 1, 1 << 63),
+                 (0, 5), ((1 << 64) - 1, 10), ((1 << 127) - 1, 1 << 63)]
+        rand = random.Random(23)
+        for i in range(6):
+            divisor = rand.getrandbits(rand.randint(1, 64)) or 1
+            quotient = rand.getrandbits(rand.randint(1, 64))
+            cases.append((quotient * divisor + rand.randrange(divisor),
+                          divisor))
+        for bits_per_cycle in (2, 4, 8):
+            self.run_core_stage(bits_per_cycle, True, cases)
+        self.run_core_stage(4, False, cases[:4])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -12,6 +12,14 @@ class TestPipe(DivTestHelper):
         self.run_all(DivTestCases().test_data,
                      DivPipeKind.DivPipeCore, "div_pipe_caller")
 
+    def test_div_pipe_core_radix(self):
+        for log2_radix in (2, 3, 4):
+            with self.subTest(log2_radix=log2_radix):
+                self.run_all(DivTestCases().test_data,
+                             DivPipeKind.DivPipeCore,
+                             "div_pipe_caller_radix%d" % log2_radix,
+                             log2_radix=log2_radix)
+
     def test_fsm_div_core(self):
         self.run_all(DivTestCases().test_data,
                      DivPipeKind.FSMDivCore, "div_pipe_caller")
@@ -20,6 +28,18 @@ class TestPipe(DivTestHelper):
         self.run_all(DivTestCases().test_data,
                      DivPipeKind.SimOnly, "div_pipe_caller")
 
+    def test_div_pipe_core_stream(self):
+        self.run_all_stream(DivTestCases().test_data,
+                            DivPipeKind.DivPipeCore, "div_pipe_caller")
+
+    def test_fsm_div_core_stream(self):
+        self.run_all_stream(DivTestCases().test_data,
+                            DivPipeKind.FSMDivCore, "div_pipe_caller")
+
+    def test_sim_only_stream(self):
+        self.run_all_stream(DivTestCases().test_data,
+                            DivPipeKind.SimOnly, "div_pipe_caller")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -68,7 +68,7 @@ class LoadStore1(PortInterfaceBase):
         addrwid = pspec.addr_wid
 
         super().__init__(regwid, addrwid)
-        self.dcache = DCache()
+        self.dcache = DCache(pspec)
         # these names are from the perspective of here (LoadStore1)
         self.d_out  = self.dcache.d_in     # in to dcache is out for LoadStore
         self.d_in = self.dcache.d_out      # out from dcache is in for LoadStore
@@ -114,6 +114,8 @@ class LoadStore1(PortInterfaceBase):
         self.busy          = Signal()
         self.wait_dcache   = Signal()
         self.wait_mmu      = Signal()
+        self.req_id        = Signal(4) # tags requests to dcache (MSHRs only)
+        self.mshr_pending  = Signal()  # dcache has load misses outstanding
         #self.mode_32bit    = Signal()
         #self.intr_vec     : integer range 0 to 16#fff#;
         #self.nia           = Signal(64)
@@ -182,6 +184,15 @@ class LoadStore1(PortInterfaceBase):
         exc = self.pi.exc_o
         exception = exc.happened
         mmureq = Signal()
+        # with MSHRs (non-blocking dcache) a completion (or error) is only
+        # for us if it carries our id.  a blocking dcache completes in
+        # order: everything is ours, and requests are not tagged
+        tagged = dcache.NUM_MSHRS > 0
+        ours = Const(1, 1)
+        if tagged:
+            ours = Signal()
+            comb += ours.eq(d_in.id == self.req_id)
+        comb += self.mshr_pending.eq(dcache.mshr_pending)
 
         # copy of address, but gets over-ridden for OP_FETCH_FAILED
         maddr = Signal(64)
@@ -207,7 +218,7 @@ class LoadStore1(PortInterfaceBase):
             with m.Case(State.ACK_WAIT):
                 comb += self.busy.eq(~exc.happened)
 
-                with m.If(d_in.error):
+                with m.If(d_in.error & ours):
                     # cache error is not necessarily "final", it could
                     # be that it was just a TLB miss
                     with m.If(d_in.cache_paradox):
@@ -225,8 +236,10 @@ class LoadStore1(PortInterfaceBase):
                         # in case the PTE has been updated.
                         comb += mmureq.eq(1)
                         sync += self.state.eq(State.MMU_LOOKUP)
-                with m.If(d_in.valid):
+                with m.If(d_in.valid & ours):
                     m.d.comb += self.done.eq(~mmureq) # done if not doing MMU
+                    if tagged:
+                        sync += self.req_id.eq(self.req_id + 1)
                     with m.If(self.done):
                         sync += Display("ACK_WAIT, done %x", self.addr)
                     sync += self.state.eq(State.IDLE)
@@ -333,6 +346,9 @@ class LoadStore1(PortInterfaceBase):
         # cannot be... yet. TODO, investigate
         m.d.comb += self.load_data.eq(d_in.data)
         m.d.comb += d_out.addr.eq(self.addr)
+        if tagged:
+            # requests are tagged: ACK_WAIT only accepts d_in.id == req_id
+            m.d.comb += d_out.id.eq(self.req_id)
 
         # Update outputs to MMU
         m.d.comb += m_out.valid.eq(mmureq)
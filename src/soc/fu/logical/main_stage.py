@@ -13,6 +13,7 @@ from soc.fu.logical.pipe_data import LogicalInputData
 from soc.fu.logical.bpermd import Bpermd
 from soc.fu.logical.popcount import Popcount
 from soc.fu.logical.pipe_data import LogicalOutputData
+from soc.fu.narrow import gate_upper, narrow_result
 from ieee754.part.partsig import PartitionedSignal
 from openpower.decoder.power_enums import MicrOp
 
@@ -42,6 +43,20 @@ class LogicalMainStage(PipeModBase):
         m.submodules.bpermd = bpermd = Bpermd(64)
         m.submodules.popcount = popcount = Popcount()
 
+        # narrow datapath (see soc.fu.narrow): a narrow AND, OR or XOR
+        # holds the upper halves of its operands at zero, the upper half
+        # of the result is the same op on the fill bits instead
+        narrow = None
+        a_l, b_l = a, b
+        if hasattr(self.i, "narrow"):
+            narrow = Signal(reset_less=True)
+            comb += narrow.eq(self.i.narrow &
+                              ((op.insn_type == MicrOp.OP_AND) |
+                               (op.insn_type == MicrOp.OP_OR) |
+                               (op.insn_type == MicrOp.OP_XOR)))
+            a_l = gate_upper(m, a, narrow, "logic_a")
+            b_l = gate_upper(m, b, narrow, "logic_b")
+
         ##########################
         # main switch for logic ops AND, OR and XOR, cmpb, parity, and popcount
 
@@ -51,11 +66,14 @@ class LogicalMainStage(PipeModBase):
             ###### AND, OR, XOR  v3.0B p92-95
 
             with m.Case(MicrOp.OP_AND):
-                comb += o.data.eq(a & b)
+                comb += o.data.eq(narrow_result(a_l & b_l, a[-1] & b[-1],
+                                                narrow))
             with m.Case(MicrOp.OP_OR):
-                comb += o.data.eq(a | b)
+                comb += o.data.eq(narrow_result(a_l | b_l, a[-1] | b[-1],
+                                                narrow))
             with m.Case(MicrOp.OP_XOR):
-                comb += o.data.eq(a ^ b)
+                comb += o.data.eq(narrow_result(a_l ^ b_l, a[-1] ^ b[-1],
+                                                narrow))
 
             ###################
             ###### cmpb  v3.0B p97
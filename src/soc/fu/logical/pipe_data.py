@@ -1,3 +1,4 @@
+from nmigen import Signal
 from soc.fu.pipe_data import FUBaseData
 from soc.fu.alu.pipe_data import ALUOutputData, CommonPipeSpec
 from soc.fu.logical.logical_input_record import CompLogicalOpSubset
@@ -13,6 +14,10 @@ class LogicalInputData(FUBaseData):
         super().__init__(pspec, False)
         # convenience
         self.a, self.b = self.ra, self.rb
+        # narrow datapath: set by the input stage, see soc.fu.narrow
+        if getattr(pspec, "narrow", False):
+            self.narrow = Signal(reset_less=True)
+            self.data.append(self.narrow)
 
 
 # input to logical final stage (common output)
@@ -42,3 +47,7 @@ class LogicalOutputDataFinal(FUBaseData):
 class LogicalPipeSpec(CommonPipeSpec):
     regspec = (LogicalInputData.regspec, LogicalOutputDataFinal.regspec)
     opsubsetkls = CompLogicalOpSubset
+
+    def __init__(self, id_wid, narrow=False):
+        super().__init__(id_wid)
+        self.narrow = narrow # operand-width-aware datapath (soc.fu.narrow)
@@ -3,6 +3,7 @@ from nmigen import Module, Signal
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
 
 from nmutil.formaltest import FHDLTestCase
 from nmigen.cli import rtlil
@@ -17,6 +18,7 @@ from openpower.endian import bigendian
 from openpower.test.common import TestAccumulatorBase, ALUHelpers
 from soc.fu.logical.pipeline import LogicalBasePipe
 from soc.fu.logical.pipe_data import LogicalPipeSpec
+from soc.fu.test.pipe_stream import PipeStreamRunner
 import random
 
 from openpower.test.logical.logical_cases import LogicalTestCase
@@ -58,10 +60,11 @@ class LogicalIlangCase(TestAccumulatorBase):
             f.write(vl)
 
 
-class TestRunner(FHDLTestCase):
-    def __init__(self, test_data):
-        super().__init__("run_all")
+class TestRunner(PipeStreamRunner, FHDLTestCase):
+    def __init__(self, test_data, method="run_all"):
+        super().__init__(method)
         self.test_data = test_data
+        self.narrow = False
 
     def execute(self, alu,instruction, pdecode2, test):
         print(test.name)
@@ -134,10 +137,30 @@ class TestRunner(FHDLTestCase):
                     yield from self.execute(alu, instruction, pdecode2, test)
 
         sim.add_sync_process(process)
-        with sim.write_vcd("logical_simulator.vcd", "logical_simulator.gtkw",
-                           traces=[]):
+        with write_vcd(sim, "logical_simulator.vcd", "logical_simulator.gtkw",
+                            traces=[]):
             sim.run()
 
+    def run_all_stream(self):
+        """same tests, with the pipeline kept full"""
+        def mkdecode():
+            return PowerDecode2(create_pdecode())
+
+        def set_inputs(alu, dec2, sim, code):
+            yield from set_alu_inputs(alu, dec2, sim)
+
+        def check_outputs(alu, dec2, sim, code, inputs):
+            yield from self.check_alu_outputs(alu, dec2, sim, code)
+
+        pspec = LogicalPipeSpec(id_wid=8, narrow=self.narrow)
+        self.run_stream(self.test_data, LogicalBasePipe(pspec), mkdecode,
+                        Function.LOGICAL, set_inputs, check_outputs, "logical")
+
+    def run_all_stream_narrow(self):
+        """same tests, with the narrow datapath (see soc.fu.narrow)"""
+        self.narrow = True
+        self.run_all_stream()
+
     def check_alu_outputs(self, alu, dec2, sim, code):
 
         rc = yield dec2.e.do.rc.data
@@ -163,10 +186,14 @@ class TestRunner(FHDLTestCase):
 
 
 if __name__ == "__main__":
+    parse_vcd_args()
     unittest.main(exit=False)
     suite = unittest.TestSuite()
     suite.addTest(TestRunner(LogicalIlangCase().test_data))
     suite.addTest(TestRunner(LogicalTestCase().test_data))
+    suite.addTest(TestRunner(LogicalTestCase().test_data, "run_all_stream"))
+    suite.addTest(TestRunner(LogicalTestCase().test_data,
+                             "run_all_stream_narrow"))
 
     runner = unittest.TextTestRunner()
     runner.run(suite)
@@ -3,6 +3,7 @@ from nmigen import Module, Signal
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
 
 from nmigen.cli import rtlil
 import unittest
@@ -241,11 +242,12 @@ class TestRunner(unittest.TestCase):
                     yield from self.execute(fsm, instruction, pdecode2, test)
 
         sim.add_sync_process(process)
-        with sim.write_vcd("alu_simulator.vcd", "simulator.gtkw",
-                           traces=[]):
+        with write_vcd(sim, "alu_simulator.vcd", "simulator.gtkw",
+                            traces=[]):
             sim.run()
 
 if __name__ == "__main__":
+    parse_vcd_args()
     unittest.main(exit=False)
     suite = unittest.TestSuite()
     suite.addTest(TestRunner(MMUTestCase().test_data))
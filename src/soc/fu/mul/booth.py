@@ -0,0 +1,142 @@
+"""Radix-4 Booth partial products and a carry-save (Wallace) reduction tree
+
+an unsigned multiply o = a * b, split up so that it may be spread across
+pipeline stages (see MulBasePipe), rather than the one-line "a * b":
+
+* booth_rows: one partial product per radix-4 digit of b (each digit is
+  one of -2, -1, 0, +1, +2, so each row is a, 2a or nothing, possibly
+  inverted), plus one "correction" row carrying the +1s that complete
+  the twos-complement negation of the negative digits' rows.
+* csa_reduce: levels of 3:2 compressors (full adders, bit-wise): three
+  rows in, sum and carry rows out.  34 rows (64-bit b) take 8 levels to
+  get down to 2.
+* the final two rows are then added (one carry-propagate adder).
+
+all rows are len(a)+len(b) wide, and all arithmetic is modulo that: the
+negative rows simply wrap around, and the product always fits.
+
+BoothMultiplier puts it all together, combinatorially (for tests and
+the formal proof against "a * b").
+"""
+
+from nmigen import Module, Signal, Elaboratable, Mux, Cat, Const, Repl
+
+
+def booth_row_count(b_wid):
+    """number of rows that booth_rows creates (including the correction
+    row).  unsigned b is zero-extended so the top digit is never negative
+    """
+    return (b_wid + 2) // 2 + 1
+
+
+def csa_rows_after(n_rows, levels):
+    """number of rows left after levels of 3:2 reduction"""
+    for i in range(levels):
+        if n_rows <= 2:
+            break
+        n_rows = 2 * (n_rows // 3) + n_rows % 3
+    return n_rows
+
+
+def csa_depth(n_rows):
+    """number of levels of 3:2 reduction needed to get down to 2 rows"""
+    levels = 0
+    while n_rows > 2:
+        n_rows = csa_rows_after(n_rows, 1)
+        levels += 1
+    return levels
+
+
+def booth_rows(m, a, b, name="pp"):
+    """creates the radix-4 Booth partial products of a * b (both unsigned).
+    returns a list of Signals, len(a)+len(b) wide, whose sum (modulo that
+    width) is the product
+    """
+    comb = m.d.comb
+    wid = len(a) + len(b)
+    n_digits = booth_row_count(len(b)) - 1
+
+    # zero-extended b, with a zero below bit 0 for the first digit
+    bx = Signal(2*n_digits + 1, name="%s_b" % name, reset_less=True)
+    comb += bx.eq(Cat(Const(0, 1), b))
+
+    a1 = Signal(wid, name="%s_a1" % name, reset_less=True)
+    a2 = Signal(wid, name="%s_a2" % name, reset_less=True)
+    comb += a1.eq(a)
+    comb += a2.eq(a << 1)
+
+    rows = []
+    negs = []
+    for i in range(n_digits):
+        x0, x1, x2 = bx[2*i], bx[2*i+1], bx[2*i+2]
+        one = Signal(name="%s%d_one" % (name, i), reset_less=True)
+        two = Signal(name="%s%d_two" % (name, i), reset_less=True)
+        neg = Signal(name="%s%d_neg" % (name, i), reset_less=True)
+        comb += one.eq(x1 ^ x0)
+        comb += two.eq((x2 & ~x1 & ~x0) | (~x2 & x1 & x0))
+        comb += neg.eq(x2)
+
+        # select a, 2a or 0, then invert if the digit is negative.
+        # (the +1 of the negation goes into the correction row, at 2i)
+        sel = Signal(wid, name="%s%d_sel" % (name, i), reset_less=True)
+        row = Signal(wid, name="%s%d" % (name, i), reset_less=True)
+        comb += sel.eq(Mux(one, a1, Mux(two, a2, 0)))
+        comb += row.eq((sel ^ Repl(neg, wid)) << (2*i))
+        rows.append(row)
+        negs += [neg, Const(0, 1)]
+
+    corr = Signal(wid, name="%s_corr" % name, reset_less=True)
+    comb += corr.eq(Cat(*negs))
+    rows.append(corr)
+    return rows
+
+
+def csa_reduce(m, rows, levels=None, name="csa"):
+    """reduces rows (all of the same width) with levels of 3:2
+    compressors, or all the way down to 2 rows if levels is None.
+    returns the new list of rows: their sum is the same (modulo the width)
+    """
+    comb = m.d.comb
+    if levels is None:
+        levels = csa_depth(len(rows))
+    wid = len(rows[0])
+    for level in range(levels):
+        if len(rows) <= 2:
+            break
+        nxt = []
+        for j in range(len(rows) // 3):
+            x, y, z = rows[3*j:3*j+3]
+            s = Signal(wid, name="%s%d_s%d" % (name, level, j),
+                       reset_less=True)
+            c = Signal(wid, name="%s%d_c%d" % (name, level, j),
+                       reset_less=True)
+            comb += s.eq(x ^ y ^ z)
+            comb += c.eq(((x & y) | (x & z) | (y & z)) << 1)
+            nxt += [s, c]
+        nxt += rows[3*(len(rows)//3):] # left-over rows go straight through
+        rows = nxt
+    return rows
+
+
+class BoothMultiplier(Elaboratable):
+    """BoothMultiplier: combinatorial unsigned o = a * b
+
+    * :a_wid: width of a
+    * :b_wid: width of b (defaults to a_wid)
+    """
+
+    def __init__(self, a_wid, b_wid=None):
+        b_wid = b_wid or a_wid
+        self.a = Signal(a_wid, reset_less=True)
+        self.b = Signal(b_wid, reset_less=True)
+        self.o = Signal(a_wid + b_wid, reset_less=True)
+
+    def elaborate(self, platform):
+        m = Module()
+        rows = booth_rows(m, self.a, self.b)
+        s, c = csa_reduce(m, rows)
+        m.d.comb += self.o.eq(s + c)
+        return m
+
+    def ports(self):
+        return [self.a, self.b, self.o]
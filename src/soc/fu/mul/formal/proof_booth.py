@@ -0,0 +1,62 @@
+"""Formal Correctness Proof for the Booth/Wallace multiplier
+
+proves BoothMultiplier equivalent to "a * b" (the single-stage multiply
+in MulMainStage2), for any a and b.  booth_rows and csa_reduce are the
+same code at every width, however proving a 64x64 multiply with an SMT
+solver takes far too long: the proofs are at 8 and 16 bits (including
+unequal widths), and soc.fu.mul.test.test_booth checks 64-bit values.
+"""
+
+from nmigen import Module, Signal, Elaboratable
+from nmigen.asserts import Assert, AnyConst
+from nmutil.formaltest import FHDLTestCase
+from nmigen.cli import rtlil
+
+from soc.fu.mul.booth import BoothMultiplier
+import unittest
+
+
+# This defines a module to drive the device under test and assert
+# properties about its outputs
+class Driver(Elaboratable):
+    def __init__(self, a_wid, b_wid):
+        self.a_wid = a_wid
+        self.b_wid = b_wid
+
+    def elaborate(self, platform):
+        m = Module()
+        comb = m.d.comb
+
+        m.submodules.dut = dut = BoothMultiplier(self.a_wid, self.b_wid)
+
+        a = Signal(self.a_wid)
+        b = Signal(self.b_wid)
+        comb += a.eq(AnyConst(self.a_wid))
+        comb += b.eq(AnyConst(self.b_wid))
+        comb += dut.a.eq(a)
+        comb += dut.b.eq(b)
+
+        comb += Assert(dut.o == a * b)
+
+        return m
+
+
+class BoothTestCase(FHDLTestCase):
+    def test_formal_8(self):
+        self.assertFormal(Driver(8, 8), mode="bmc", depth=1)
+
+    def test_formal_8_5(self):
+        self.assertFormal(Driver(8, 5), mode="bmc", depth=1)
+
+    def test_formal_16(self):
+        self.assertFormal(Driver(16, 16), mode="bmc", depth=1)
+
+    def test_ilang(self):
+        dut = Driver(16, 16)
+        vl = rtlil.convert(dut, ports=[])
+        with open("booth.il", "w") as f:
+            f.write(vl)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,10 @@
 
 from nmigen import Module
 from nmutil.pipemodbase import PipeModBase
-from soc.fu.mul.pipe_data import MulIntermediateData, MulOutputData
+from soc.fu.mul.pipe_data import (MulIntermediateData, MulOutputData,
+                                  MulCSAData)
+from soc.fu.mul.booth import (booth_rows, booth_row_count, csa_reduce,
+                              csa_rows_after)
 from ieee754.part.partsig import PartitionedSignal
 
 
@@ -36,3 +39,98 @@ class MulMainStage2(PipeModBase):
 
         return m
 
+
+
+# The Booth/Wallace alternative to MulMainStage2: the same multiply, split
+# up so that it can be spread across pipeline stages (see MulBasePipe).
+# MulBoothStage creates the partial products, MulCSAStages reduce them
+# (levels start to end of the carry-save tree) and MulAddStage adds
+# the last two rows.
+
+class MulBoothStage(PipeModBase):
+    def __init__(self, pspec):
+        super().__init__(pspec, "mul_booth")
+
+    def ispec(self):
+        return MulIntermediateData(self.pspec) # pipeline stage input format
+
+    def ospec(self):
+        return MulCSAData(self.pspec, booth_row_count(64)) # output format
+
+    def elaborate(self, platform):
+        m = Module()
+        comb = m.d.comb
+
+        # radix-4 Booth partial products of a * b
+        rows = booth_rows(m, self.i.a, self.i.b)
+        for row_o, row in zip(self.o.rows, rows):
+            comb += row_o.eq(row)
+
+        ###### xer and context, all pass-through #####
+
+        comb += self.o.neg_res.eq(self.i.neg_res)
+        comb += self.o.neg_res32.eq(self.i.neg_res32)
+        comb += self.o.xer_so.eq(self.i.xer_so)
+        comb += self.o.ctx.eq(self.i.ctx)
+
+        return m
+
+
+class MulCSAStage(PipeModBase):
+    def __init__(self, pspec, start, end):
+        self.n_rows = booth_row_count(64)
+        self.start, self.end = start, end
+        super().__init__(pspec, "mul_csa%d" % start)
+
+    def ispec(self):
+        n_rows = csa_rows_after(self.n_rows, self.start)
+        return MulCSAData(self.pspec, n_rows) # pipeline stage input format
+
+    def ospec(self):
+        n_rows = csa_rows_after(self.n_rows, self.end)
+        return MulCSAData(self.pspec, n_rows) # pipeline stage output format
+
+    def elaborate(self, platform):
+        m = Module()
+        comb = m.d.comb
+
+        # carry-save reduction, levels start to end
+        rows = csa_reduce(m, self.i.rows, self.end - self.start)
+        for row_o, row in zip(self.o.rows, rows):
+            comb += row_o.eq(row)
+
+        ###### xer and context, all pass-through #####
+
+        comb += self.o.neg_res.eq(self.i.neg_res)
+        comb += self.o.neg_res32.eq(self.i.neg_res32)
+        comb += self.o.xer_so.eq(self.i.xer_so)
+        comb += self.o.ctx.eq(self.i.ctx)
+
+        return m
+
+
+class MulAddStage(PipeModBase):
+    def __init__(self, pspec):
+        super().__init__(pspec, "mul_add")
+
+    def ispec(self):
+        return MulCSAData(self.pspec, 2) # pipeline stage input format
+
+    def ospec(self):
+        return MulOutputData(self.pspec) # pipeline stage output format
+
+    def elaborate(self, platform):
+        m = Module()
+        comb = m.d.comb
+
+        # final carry-propagate add of the carry-save result
+        comb += self.o.o.eq(self.i.rows[0] + self.i.rows[1])
+
+        ###### xer and context, all pass-through #####
+
+        comb += self.o.neg_res.eq(self.i.neg_res)
+        comb += self.o.neg_res32.eq(self.i.neg_res32)
+        comb += self.o.xer_so.eq(self.i.xer_so)
+        comb += self.o.ctx.eq(self.i.ctx)
+
+        return m
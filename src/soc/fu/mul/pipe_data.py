@@ -26,6 +26,25 @@ class MulOutputData(FUBaseData):
         self.data.append(self.neg_res32)
 
 
+class MulCSAData(FUBaseData):
+    """partial products, in carry-save form (rows to be added), between
+    the stages of the Booth/Wallace multiplier (soc.fu.mul.booth)
+    """
+    regspec = [('XER', 'xer_so', '32')] # XER bit 32: SO
+    def __init__(self, pspec, n_rows):
+        super().__init__(pspec, False)
+
+        self.rows = []
+        for i in range(n_rows):
+            row = Signal(128, name="row%d" % i, reset_less=True)
+            self.rows.append(row)
+        self.neg_res = Signal(reset_less=True)
+        self.neg_res32 = Signal(reset_less=True)
+        self.data += self.rows
+        self.data.append(self.neg_res)
+        self.data.append(self.neg_res32)
+
+
 class MulPipeSpec(CommonPipeSpec):
     regspec = (DivInputData.regspec, DivMulOutputData.regspec)
     opsubsetkls = CompMULOpSubset
@@ -3,7 +3,9 @@ from nmutil.pipemodbase import PipeModBaseChain
 from soc.fu.div.input_stage import DivMulInputStage
 from soc.fu.mul.output_stage import DivMulOutputStage
 from soc.fu.mul.pre_stage import MulMainStage1
-from soc.fu.mul.main_stage import MulMainStage2
+from soc.fu.mul.main_stage import (MulMainStage2, MulBoothStage,
+                                   MulCSAStage, MulAddStage)
+from soc.fu.mul.booth import booth_row_count, csa_depth
 from soc.fu.mul.post_stage import MulMainStage3
 
 
@@ -20,6 +22,25 @@ class MulStages2(PipeModBaseChain):
         return [main2]
 
 
+class MulStagesCSA(PipeModBaseChain):
+    """Booth/Wallace multiply, carry-save levels start to end.  the first
+    creates the partial products, the last does the final add
+    """
+    def __init__(self, pspec, start, end):
+        self.start = start
+        self.end = end
+        super().__init__(pspec)
+
+    def get_chain(self):
+        stages = []
+        if self.start == 0:
+            stages.append(MulBoothStage(self.pspec)) # partial products
+        stages.append(MulCSAStage(self.pspec, self.start, self.end))
+        if self.end == csa_depth(booth_row_count(64)):
+            stages.append(MulAddStage(self.pspec)) # add last 2 rows
+        return stages
+
+
 class MulStages3(PipeModBaseChain):
     def get_chain(self):
         main3 = MulMainStage3(self.pspec) # select output bits, invert, set ov
@@ -28,18 +49,41 @@ class MulStages3(PipeModBaseChain):
 
 
 class MulBasePipe(ControlBase):
-    def __init__(self, pspec):
+    """MulBasePipe
+
+    * :csa_levels_per_stage: None for the multiply as one stage ("a * b").
+      otherwise a Booth/Wallace multiply is used, spread across as many
+      stages as it takes at this many levels of the carry-save tree per
+      stage (there are 8 levels: 4 gives 2 stages, 1 gives 8)
+    """
+    def __init__(self, pspec, csa_levels_per_stage=None):
         ControlBase.__init__(self)
         self.pspec = pspec
         self.pipe1 = MulStages1(pspec)
-        self.pipe2 = MulStages2(pspec)
+        self.pipe_middles = []
+        if csa_levels_per_stage is None:
+            self.pipe_middles.append(MulStages2(pspec))
+        else:
+            assert csa_levels_per_stage >= 1, \
+                "MulBasePipe: csa_levels_per_stage %s is not >= 1" % \
+                csa_levels_per_stage
+            levels = csa_depth(booth_row_count(64))
+            for start in range(0, levels, csa_levels_per_stage):
+                end = min(start + csa_levels_per_stage, levels)
+                self.pipe_middles.append(MulStagesCSA(pspec, start, end))
+        self.pipe2 = self.pipe_middles[0]
         self.pipe3 = MulStages3(pspec)
-        self._eqs = self.connect([self.pipe1, self.pipe2, self.pipe3])
+        self._eqs = self.connect([self.pipe1,
+                                  *self.pipe_middles,
+                                  self.pipe3])
 
     def elaborate(self, platform):
         m = ControlBase.elaborate(self, platform)
         m.submodules.mul_pipe1 = self.pipe1
         m.submodules.mul_pipe2 = self.pipe2
+        for i in range(1, len(self.pipe_middles)):
+            name = f"mul_pipe2_{i}"
+            setattr(m.submodules, name, self.pipe_middles[i])
         m.submodules.mul_pipe3 = self.pipe3
         m.d.comb += self._eqs
         return m
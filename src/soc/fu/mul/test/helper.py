@@ -3,6 +3,7 @@ from nmigen import Module, Signal
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Delay, Settle
+from soc.config.waves import write_vcd
 
 import power_instruction_analyzer as pia
 
@@ -21,6 +22,7 @@ from openpower.test.common import (TestAccumulatorBase, TestCase, ALUHelpers)
 from soc.fu.test.pia import pia_res_to_output
 from soc.fu.mul.pipeline import MulBasePipe
 from soc.fu.mul.pipe_data import MulPipeSpec
+from soc.fu.test.pipe_stream import PipeStreamRunner
 import random
 
 
@@ -64,7 +66,24 @@ def set_alu_inputs(alu, dec2, sim, has_third_input):
                                 rc=rc, overflow=overflow)
 
 
-class MulTestHelper(unittest.TestCase):
+def get_pia_res(code, pia_inputs):
+    opname = code.split(' ')[0]
+    fnname = opname.replace(".", "_")
+    print(f"{fnname}({pia_inputs})")
+    pia_res = None
+    try:
+        pia_res = getattr(pia, fnname)(pia_inputs)
+    except AttributeError:
+        EXPECTED_FAILURES = ["mulli"]
+        if fnname not in EXPECTED_FAILURES:
+            raise
+        else:
+            print("not implemented, as expected.")
+    print(f"-> {pia_res}")
+    return pia_res
+
+
+class MulTestHelper(PipeStreamRunner, unittest.TestCase):
     def execute(self, pdecode2, test, instruction, alu, has_third_input, sim):
         program = test.program
         isa_sim = ISA(pdecode2, test.regs, test.sprs, test.cr,
@@ -100,20 +119,9 @@ class MulTestHelper(unittest.TestCase):
             yield
             yield alu.p.i_valid.eq(0)
 
-            opname = code.split(' ')[0]
-            fnname = opname.replace(".", "_")
-            print(f"{fnname}({pia_inputs})")
-            pia_res = None
-            try:
-                pia_res = getattr(pia, fnname)(pia_inputs)
-            except AttributeError:
-                EXPECTED_FAILURES = ["mulli"]
-                if fnname not in EXPECTED_FAILURES:
-                    raise
-                else:
-                    print("not implemented, as expected.")
-            print(f"-> {pia_res}")
+            pia_res = get_pia_res(code, pia_inputs)
 
+            opname = code.split(' ')[0]
             yield from isa_sim.call(opname)
             index = isa_sim.pc.CIA.value//4
 
@@ -166,9 +174,27 @@ class MulTestHelper(unittest.TestCase):
                                             has_third_input, sim)
 
         sim.add_sync_process(process)
-        with sim.write_vcd(f"{file_name_prefix}.vcd"):
+        with write_vcd(sim, f"{file_name_prefix}.vcd"):
             sim.run()
 
+    def run_all_stream(self, test_data, file_name_prefix, has_third_input):
+        """as run_all, with the pipeline kept full"""
+        def mkdecode():
+            return PowerDecode2(None, MulPipeSpec.opsubsetkls, "MUL")
+
+        def set_inputs(alu, dec2, sim, code):
+            pia_inputs = yield from set_alu_inputs(alu, dec2, sim,
+                                                   has_third_input)
+            return get_pia_res(code, pia_inputs)
+
+        def check_outputs(alu, dec2, sim, code, pia_res):
+            yield from self.check_alu_outputs(alu, dec2, sim, code, pia_res)
+
+        pspec = MulPipeSpec(id_wid=8)
+        return self.run_stream(test_data, MulBasePipe(pspec), mkdecode,
+                               Function.MUL, set_inputs, check_outputs,
+                               file_name_prefix)
+
     def check_alu_outputs(self, alu, dec2, sim, code, pia_res):
 
         rc = yield dec2.e.do.rc.rc
@@ -0,0 +1,120 @@
+"""test of MulBasePipe with the pipelined Booth/Wallace multiplier, driven
+directly (no decoder): a new operation every cycle that the pipeline
+takes one, with back-pressure, results matched up by ctx.muxid, at
+several carry-save levels per stage (and the one-stage "a * b")
+"""
+
+import random
+import unittest
+
+from nmigen import Module
+from nmutil.sim_tmp_alternative import Simulator, Settle
+
+from openpower.decoder.power_enums import MicrOp
+from soc.config.waves import write_vcd
+from soc.fu.mul.pipe_data import MulPipeSpec
+from soc.fu.mul.pipeline import MulBasePipe
+
+
+MASK = (1 << 64) - 1
+
+
+def signed64(x):
+    return x - (1 << 64) if x & (1 << 63) else x
+
+
+def mul_ref(insn_type, is_signed, a, b):
+    """expected 64-bit result of a 64-bit mulld/mulhd/mulhdu"""
+    if is_signed:
+        a, b = signed64(a), signed64(b)
+    res = a * b
+    if insn_type == MicrOp.OP_MUL_H64:
+        res >>= 64
+    return res & MASK
+
+
+class TestBoothPipe(unittest.TestCase):
+
+    def run_pipe(self, csa_levels_per_stage, n_ops=60):
+        pspec = MulPipeSpec(id_wid=2)
+        m = Module()
+        m.submodules.mul = pipe = MulBasePipe(pspec, csa_levels_per_stage)
+        ntags = 1 << len(pipe.p.i_data.ctx.muxid)
+        rand = random.Random(csa_levels_per_stage or 0)
+        corners = [0, 1, MASK, 1 << 63, (1 << 63) - 1, 0x5555555555555555]
+        ops = []
+        for i in range(n_ops):
+            insn_type = rand.choice([MicrOp.OP_MUL_L64, MicrOp.OP_MUL_H64])
+            is_signed = rand.randint(0, 1)
+            a = rand.choice(corners + [rand.getrandbits(64)] * 4)
+            b = rand.choice(corners + [rand.getrandbits(64)] * 4)
+            ops.append((insn_type, is_signed, a, b))
+        pending = {}  # muxid: op index
+        done = []
+
+        def issue():
+            for i, (insn_type, is_signed, a, b) in enumerate(ops):
+                tag = i % ntags
+                while tag in pending:
+                    yield pipe.p.i_valid.eq(0)
+                    yield
+                op = pipe.p.i_data.ctx.op
+                yield op.insn_type.eq(insn_type)
+                yield op.is_signed.eq(is_signed)
+                yield op.is_32bit.eq(0)
+                yield pipe.p.i_data.ra.eq(a)
+                yield pipe.p.i_data.rb.eq(b)
+                yield pipe.p.i_data.ctx.muxid.eq(tag)
+                yield pipe.p.i_valid.eq(1)
+                yield Settle()
+                while not (yield pipe.p.o_ready):
+                    yield
+                    yield Settle()
+                pending[tag] = i
+                yield
+            yield pipe.p.i_valid.eq(0)
+
+        def collect():
+            while len(done) < len(ops):
+                ready = rand.random() >= 0.25
+                yield pipe.n.i_ready.eq(ready)
+                yield Settle()
+                if ready and (yield pipe.n.o_valid):
+                    tag = yield pipe.n.o_data.ctx.muxid
+                    self.assertIn(tag, pending, "unexpected muxid")
+                    i = pending.pop(tag)
+                    insn_type, is_signed, a, b = ops[i]
+                    o = yield pipe.n.o_data.o.data
+                    self.assertEqual(o, mul_ref(insn_type, is_signed, a, b),
+                                     "%s %d %x %x (levels %s)" %
+                                     (insn_type.name, is_signed, a, b,
+                                      csa_levels_per_stage))
+                    done.append(i)
+                yield
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(issue)
+        sim.add_sync_process(collect)
+        with write_vcd(sim, "mul_booth_pipe_%s.vcd" % csa_levels_per_stage):
+            sim.run()
+        self.assertEqual(sorted(done), list(range(len(ops))))
+        return pipe
+
+    def test_one_stage(self):
+        self.run_pipe(None)
+
+    def test_csa_levels(self):
+        for levels, stages in ((1, 8), (3, 3), (8, 1)):
+            with self.subTest(levels=levels):
+                pipe = self.run_pipe(levels)
+                self.assertEqual(len(pipe.pipe_middles), stages)
+
+    def test_bad_levels(self):
+        for levels in (0, -1):
+            with self.assertRaises(AssertionError):
+                MulBasePipe(MulPipeSpec(id_wid=2), levels)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,14 @@ class TestPipe(MulTestHelper):
         self.run_all(MulTestCases3Arg().test_data, "mul_pipe_caller_3_arg",
                      has_third_input=True)
 
+    def test_mul_pipe_2_arg_stream(self):
+        self.run_all_stream(MulTestCases2Arg().test_data,
+                            "mul_pipe_caller_2_arg", has_third_input=False)
+
+    def test_mul_pipe_3_arg_stream(self):
+        self.run_all_stream(MulTestCases3Arg().test_data,
+                            "mul_pipe_caller_3_arg", has_third_input=True)
+
 
 if __name__ == "__main__":
     unittest.main()
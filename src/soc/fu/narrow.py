@@ -0,0 +1,125 @@
+"""operand-width-aware ("narrow") datapath for the ALU and Logical pipelines
+
+most of the integer work in 32-bit firmware (and any small immediate)
+has 64-bit operands whose upper halves are nothing but a sign- or
+zero-fill: all 0s or all 1s.  the full 64-bit adder and bitwise logic
+then toggle the upper 32 bits for a result that is also just a fill.
+
+with the pipe spec's narrow set (ALUPipeSpec, LogicalPipeSpec):
+
+* the input stage (CommonInputStage) flags an operation as narrow when
+  both operands' upper halves are fills (is_narrow).
+* the main stages hold the upper halves of their operands at zero for a
+  narrow add, and, or or xor (gate_upper): those upper 32 bits of the
+  carry chain and logic do not toggle.  the upper half of the result
+  (and the carry-out) is made from the two fill bits and the carry into
+  bit 32 instead (narrow_add_upper, narrow_result).
+* NarrowEvents counts what that saves, for the PMU: operations, narrow
+  operations, and the upper operand bits that would have toggled.
+
+note that the saving is activity (dynamic power) only: the gated upper
+half is still there and still sets the critical path.
+"""
+
+from nmigen import Module, Signal, Elaboratable, Mux, Cat, Repl
+from nmutil.iocontrol import RecordObject
+
+
+def is_fill(x):
+    """true when the upper half of x is all 0s or all 1s"""
+    upper = x[len(x)//2:]
+    return ~upper.any() | upper.all()
+
+
+def is_narrow(a, b):
+    """true when both operands' upper halves are fills"""
+    return is_fill(a) & is_fill(b)
+
+
+def gate_upper(m, x, gate, name):
+    """returns x with its upper half held at zero when gate is set"""
+    half = len(x)//2
+    res = Signal(len(x), name=name, reset_less=True)
+    m.d.comb += res.eq(Cat(x[:half], Mux(gate, 0, x[half:])))
+    return res
+
+
+def narrow_add_upper(fill_a, fill_b, c32, half=32):
+    """upper half of the result, and the carry-out, of an add whose
+    operands' upper halves are fills (fill_a, fill_b) given the carry
+    into the upper half (c32): the fills add up to 0, -1 or -2 (modulo),
+    plus the carry.  returns (upper half, half bits wide, and carry-out)
+    """
+    bit32 = fill_a ^ fill_b ^ c32
+    top = (fill_a | fill_b) & ~((fill_a ^ fill_b) & c32)
+    carry = (fill_a & fill_b) | (fill_a & c32) | (fill_b & c32)
+    return Cat(bit32, Repl(top, half-1)), carry
+
+
+def narrow_result(x, fill, narrow):
+    """x, with its upper half replaced by a fill (the bit fill, repeated)
+    when narrow is set.  narrow may be None (no narrow datapath): just x
+    """
+    if narrow is None:
+        return x
+    half = len(x)//2
+    return Cat(x[:half], Mux(narrow, Repl(fill, len(x)-half), x[half:]))
+
+
+class NarrowEventType(RecordObject):
+    # performance events (one cycle each, per operation), for the PMU
+    def __init__(self, name=None):
+        super().__init__(name=name)
+        self.op            = Signal()
+        self.narrow        = Signal()
+        self.upper_toggles = Signal(7) # count: add, not just increment
+
+
+class NarrowEvents(Elaboratable):
+    """NarrowEvents: activity monitor for a narrow datapath
+
+    watches the operands as each operation is accepted (valid_i): counts
+    it, whether it is narrow, and (for narrow ones) how many upper-half
+    operand bits changed since the previous operation: the toggles that
+    the gated upper half did not see.
+
+    * :wid: width of the operands
+    """
+
+    def __init__(self, wid=64):
+        self.valid_i = Signal()
+        self.narrow_i = Signal()
+        self.a_i = Signal(wid)
+        self.b_i = Signal(wid)
+        self.events = NarrowEventType(name="events")
+
+    def elaborate(self, platform):
+        m = Module()
+        comb, sync = m.d.comb, m.d.sync
+        ev = self.events
+        half = len(self.a_i)//2
+
+        upper = Cat(self.a_i[half:], self.b_i[half:])
+        prev = Signal(len(upper), reset_less=True)
+        diff = Signal(len(upper), reset_less=True)
+        toggles = Signal(len(ev.upper_toggles), reset_less=True)
+        comb += diff.eq(upper ^ prev)
+        comb += toggles.eq(sum(diff[i] for i in range(len(diff))))
+
+        with m.If(self.valid_i):
+            sync += prev.eq(upper)
+        sync += ev.op.eq(self.valid_i)
+        sync += ev.narrow.eq(self.valid_i & self.narrow_i)
+        sync += ev.upper_toggles.eq(Mux(self.valid_i & self.narrow_i,
+                                        toggles, 0))
+        return m
+
+    def __iter__(self):
+        yield self.valid_i
+        yield self.narrow_i
+        yield self.a_i
+        yield self.b_i
+        yield from self.events.fields.values()
+
+    def ports(self):
+        return list(self)
@@ -1,6 +1,7 @@
 import random
 from soc.fu.shift_rot.pipe_data import ShiftRotPipeSpec
 from soc.fu.shift_rot.pipeline import ShiftRotBasePipe
+from soc.fu.test.pipe_stream import PipeStreamRunner
 from openpower.test.common import TestAccumulatorBase, TestCase, ALUHelpers
 from openpower.endian import bigendian
 from openpower.decoder.isa.all import ISA
@@ -15,6 +16,7 @@ from nmigen import Module, Signal
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
 from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
 
 from openpower.test.shift_rot.shift_rot_cases import ShiftRotTestCase
 
@@ -77,9 +79,9 @@ class ShiftRotIlangCase(TestAccumulatorBase):
             f.write(vl)
 
 
-class TestRunner(unittest.TestCase):
-    def __init__(self, test_data):
-        super().__init__("run_all")
+class TestRunner(PipeStreamRunner, unittest.TestCase):
+    def __init__(self, test_data, method="run_all"):
+        super().__init__(method)
         self.test_data = test_data
 
     def execute(self, alu, instruction, pdecode2, test):
@@ -154,9 +156,26 @@ class TestRunner(unittest.TestCase):
                     yield from self.execute(alu, instruction, pdecode2, test)
 
         sim.add_sync_process(process)
-        with sim.write_vcd("shift_rot_simulator.vcd"):
+        with write_vcd(sim, "shift_rot_simulator.vcd"):
             sim.run()
 
+    def run_all_stream(self):
+        """same tests, with the pipeline kept full"""
+        def mkdecode():
+            return PowerDecode2(None, ShiftRotPipeSpec.opsubsetkls,
+                                "SHIFT_ROT")
+
+        def set_inputs(alu, dec2, sim, code):
+            yield from set_alu_inputs(alu, dec2, sim)
+
+        def check_outputs(alu, dec2, sim, code, inputs):
+            yield from self.check_alu_outputs(alu, dec2, sim, code)
+
+        pspec = ShiftRotPipeSpec(id_wid=8)
+        self.run_stream(self.test_data, ShiftRotBasePipe(pspec), mkdecode,
+                        Function.SHIFT_ROT, set_inputs, check_outputs,
+                        "shift_rot")
+
     def check_alu_outputs(self, alu, dec2, sim, code):
 
         rc = yield dec2.e.do.rc.rc
@@ -188,9 +207,11 @@ class TestRunner(unittest.TestCase):
 
 
 if __name__ == "__main__":
+    parse_vcd_args()
     unittest.main(exit=False)
     suite = unittest.TestSuite()
     suite.addTest(TestRunner(ShiftRotTestCase().test_data))
+    suite.addTest(TestRunner(ShiftRotTestCase().test_data, "run_all_stream"))
     suite.addTest(TestRunner(ShiftRotIlangCase().test_data))
 
     runner = unittest.TextTestRunner()
@@ -0,0 +1,222 @@
+"""streaming (pipeline-saturating) test harness for the fu test_pipe_callers
+
+the normal test_pipe_caller runners put one instruction into the pipeline
+and wait for its result before sending the next, so the pipelines are
+never run full.  here a new instruction is sent every cycle that p.o_ready
+allows, each tagged with its own ctx.muxid, while n.i_ready is randomly
+dropped to apply back-pressure.  results are matched up by muxid, in
+whatever order they come out, and checked with the FU's usual check
+function.  throughput and latency are printed at the end.
+
+expected results: the issuing ISA simulator runs ahead of the pipeline
+(it provides the inputs for the next instruction), so each test also has
+a second "check" ISA simulator, on its own PowerDecode2, which is stepped
+up to the instruction whose result has just come out.  a result arriving
+for an instruction the check simulator has already gone past (out of
+order completion) restarts it from the beginning of the test.
+"""
+
+import random
+
+from nmigen import Module, Signal
+from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd
+
+from openpower.decoder.isa.all import ISA
+from openpower.endian import bigendian
+
+
+class StreamOp:
+    """an instruction in flight in the pipeline"""
+    def __init__(self, test_idx, index, ins, code, inputs, issued):
+        self.test_idx = test_idx
+        self.index = index      # number of instructions before this one
+        self.ins = ins
+        self.code = code
+        self.inputs = inputs    # whatever set_inputs returned
+        self.issued = issued    # cycle accepted by the pipeline
+
+
+class StreamStats:
+    def __init__(self, name):
+        self.name = name
+        self.ops = 0
+        self.first = None
+        self.last = None
+        self.latencies = []
+
+    def completed(self, op, cycle):
+        self.ops += 1
+        if self.first is None or op.issued < self.first:
+            self.first = op.issued
+        self.last = cycle
+        self.latencies.append(cycle - op.issued)
+
+    @property
+    def cycles(self):
+        if self.first is None:
+            return 0
+        return self.last - self.first + 1
+
+    @property
+    def throughput(self):
+        return self.ops / self.cycles if self.ops else 0.0
+
+    def __repr__(self):
+        if not self.ops:
+            return "%s: no ops" % self.name
+        lat = self.latencies
+        return ("%s: %d ops in %d cycles, %.2f ops/cycle, "
+                "latency min %d avg %.1f max %d" %
+                (self.name, self.ops, self.cycles, self.throughput,
+                 min(lat), sum(lat)/len(lat), max(lat)))
+
+
+class PipeStreamRunner:
+    """mixin for a unittest.TestCase
+
+    * stall: probability, each cycle, of n.i_ready being dropped
+    * seed: for the stalls (the test is repeatable)
+    """
+    stall = 0.25
+    seed = 0
+
+    def _stream_insns(self, test):
+        gen = test.program.generate_instructions()
+        return list(zip(gen, test.program.assembly.splitlines()))
+
+    def run_stream(self, test_data, pipe, mkdecode, fn_unit,
+                   set_inputs, check_outputs, name):
+        """streams test_data through pipe, returns a StreamStats
+
+        * mkdecode: creates a PowerDecode2 for the pipe (called twice)
+        * fn_unit: the Function the instructions must decode to
+        * set_inputs(pipe, dec2, sim, code): generator, sets the pipe
+          inputs from the ISA simulator.  its return value is passed to
+          check_outputs
+        * check_outputs(pipe, dec2, sim, code, inputs): generator, checks
+          pipe.n.o_data against the (check) ISA simulator
+        """
+        m = Module()
+        comb = m.d.comb
+        instruction = Signal(32)
+        check_insn = Signal(32)
+        cycle = Signal(32)
+        m.d.sync += cycle.eq(cycle + 1)
+
+        m.submodules.pdecode2 = pdecode2 = mkdecode()
+        m.submodules.cdecode2 = cdecode2 = mkdecode()
+        m.submodules.alu = pipe
+
+        comb += pipe.p.i_data.ctx.op.eq_from_execute1(pdecode2.do)
+        comb += pdecode2.dec.raw_opcode_in.eq(instruction)
+        comb += cdecode2.dec.raw_opcode_in.eq(check_insn)
+
+        ntags = 1 << len(pipe.p.i_data.ctx.muxid)
+        pending = {}                    # muxid: StreamOp
+        checkers = {}                   # test index: [ISA, count]
+        stats = StreamStats(name)
+        issue_done = []                 # total instructions sent
+        rand = random.Random(self.seed)
+
+        def issue():
+            tag = 0
+            total = 0
+            for test_idx, test in enumerate(test_data):
+                print(test.name)
+                sim = ISA(pdecode2, test.regs, test.sprs, test.cr,
+                          test.mem, test.msr,
+                          bigendian=bigendian)
+                instructions = self._stream_insns(test)
+                count = 0
+                index = sim.pc.CIA.value//4
+                while index < len(instructions):
+                    ins, code = instructions[index]
+                    # wait for this muxid's last use to come out
+                    while tag in pending:
+                        yield pipe.p.i_valid.eq(0)
+                        yield
+
+                    yield pdecode2.dec.bigendian.eq(bigendian)
+                    yield instruction.eq(ins)
+                    yield Settle()
+                    unit = yield pdecode2.e.do.fn_unit
+                    self.assertEqual(unit, fn_unit.value, code)
+                    inputs = yield from set_inputs(pipe, pdecode2, sim,
+                                                   code)
+                    yield pipe.p.i_data.ctx.muxid.eq(tag)
+                    yield pipe.p.i_valid.eq(1)
+
+                    # hold it there until the pipeline takes it
+                    yield Settle()
+                    while not (yield pipe.p.o_ready):
+                        yield
+                        yield Settle()
+                    issued = yield cycle
+                    # registered before the clock edge that accepts it:
+                    # with a one-cycle pipeline the result can be seen
+                    # by collect() straight after that edge
+                    pending[tag] = StreamOp(test_idx, count, ins, code,
+                                            inputs, issued)
+                    yield
+
+                    # decoder still has this instruction: run it
+                    opname = code.split(' ')[0]
+                    yield from sim.call(opname)
+                    index = sim.pc.CIA.value//4
+                    count += 1
+                    total += 1
+                    tag = (tag + 1) % ntags
+
+            yield pipe.p.i_valid.eq(0)
+            issue_done.append(total)
+
+        def check_sim(op):
+            """steps the test's check ISA simulator to op"""
+            test = test_data[op.test_idx]
+            checker = checkers.get(op.test_idx)
+            if checker is None or checker[1] > op.index:
+                sim = ISA(cdecode2, test.regs, test.sprs, test.cr,
+                          test.mem, test.msr,
+                          bigendian=bigendian)
+                checker = checkers[op.test_idx] = [sim, 0]
+            sim = checker[0]
+            instructions = self._stream_insns(test)
+            yield cdecode2.dec.bigendian.eq(bigendian)
+            while checker[1] <= op.index:
+                ins, code = instructions[sim.pc.CIA.value//4]
+                yield check_insn.eq(ins)
+                yield Settle()
+                yield from sim.call(code.split(' ')[0])
+                checker[1] += 1
+            # leaves the check decoder decoding op, for check_outputs
+            self.assertEqual(ins, op.ins, op.code)
+            return sim
+
+        def collect():
+            while not issue_done or pending:
+                ready = rand.random() >= self.stall
+                yield pipe.n.i_ready.eq(ready)
+                yield Settle()
+                if ready and (yield pipe.n.o_valid):
+                    tag = yield pipe.n.o_data.ctx.muxid
+                    self.assertIn(tag, pending, "unexpected muxid")
+                    op = pending.pop(tag)
+                    stats.completed(op, (yield cycle))
+                    sim = yield from check_sim(op)
+                    with self.subTest(test_data[op.test_idx].name,
+                                      code=op.code):
+                        yield from check_outputs(pipe, cdecode2, sim,
+                                                 op.code, op.inputs)
+                yield
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(issue)
+        sim.add_sync_process(collect)
+        with write_vcd(sim, "%s_stream.vcd" % name):
+            sim.run()
+
+        print(stats)
+        self.assertEqual(stats.ops, issue_done[0])
+        return stats
@@ -0,0 +1,138 @@
+"""test of the narrow datapath helpers (soc.fu.narrow): the gated add and
+bitwise ops against the full 64-bit result, and the activity counter
+"""
+
+import random
+import unittest
+
+from nmigen import Module, Signal, Elaboratable, Cat, Const
+from nmutil.sim_tmp_alternative import Simulator, Settle
+
+from soc.fu.narrow import (is_narrow, gate_upper, narrow_add_upper,
+                           narrow_result, NarrowEvents)
+
+
+MASK = (1<<64)-1
+
+
+def narrow_val(x):
+    """a 32-bit value, sign- or zero-extended to 64"""
+    x &= 0xffffffff
+    if random.randint(0, 1) and x & (1<<31):
+        x |= 0xffffffff00000000
+    return x
+
+
+class NarrowAdd(Elaboratable):
+    """the narrow OP_ADD of ALUMainStage, on its own"""
+    def __init__(self):
+        self.a = Signal(64)
+        self.b = Signal(64)
+        self.cin = Signal()
+        self.narrow = Signal()
+        self.o = Signal(64)
+        self.ca = Signal(2)
+        self.o_and = Signal(64)
+        self.o_xor = Signal(64)
+
+    def elaborate(self, platform):
+        m = Module()
+        comb = m.d.comb
+        a, b = self.a, self.b
+        comb += self.narrow.eq(is_narrow(a, b))
+        a_g = gate_upper(m, a, self.narrow, "a_g")
+        b_g = gate_upper(m, b, self.narrow, "b_g")
+
+        add_o = Signal(66)
+        comb += add_o.eq(Cat(self.cin, a_g, Const(0, 1)) +
+                         Cat(Const(1, 1), b_g, Const(0, 1)))
+        res = Signal(64)
+        comb += res.eq(add_o[1:-1])
+        comb += self.ca[0].eq(add_o[-1])
+        comb += self.ca[1].eq(add_o[33] ^ a_g[32] ^ b_g[32])
+        with m.If(self.narrow):
+            upper, carry = narrow_add_upper(a[-1], b[-1], self.ca[1])
+            comb += res[32:].eq(upper)
+            comb += self.ca[0].eq(carry)
+        comb += self.o.eq(res)
+
+        comb += self.o_and.eq(narrow_result(a_g & b_g, a[-1] & b[-1],
+                                            self.narrow))
+        comb += self.o_xor.eq(narrow_result(a_g ^ b_g, a[-1] ^ b[-1],
+                                            self.narrow))
+        return m
+
+
+class TestNarrow(unittest.TestCase):
+
+    def test_add(self):
+        m = Module()
+        m.submodules.dut = dut = NarrowAdd()
+
+        def process():
+            random.seed(25)
+            vals = [0, 1, 0x7fffffff, 0x80000000, 0xffffffff, MASK,
+                    0xffffffff80000000]
+            cases = [(a, b) for a in vals for b in vals]
+            cases += [(narrow_val(random.getrandbits(32)),
+                       narrow_val(random.getrandbits(32)))
+                      for i in range(200)]
+            for a, b in cases:
+                for cin in (0, 1):
+                    yield dut.a.eq(a)
+                    yield dut.b.eq(b)
+                    yield dut.cin.eq(cin)
+                    yield Settle()
+                    msg = "%x %x %d" % (a, b, cin)
+                    self.assertTrue((yield dut.narrow), msg)
+                    full = a + b + cin
+                    ca32 = ((a & 0xffffffff) + (b & 0xffffffff) + cin) >> 32
+                    self.assertEqual((yield dut.o), full & MASK, msg)
+                    self.assertEqual((yield dut.ca), (full >> 64) |
+                                                     (ca32 << 1), msg)
+                    self.assertEqual((yield dut.o_and), a & b, msg)
+                    self.assertEqual((yield dut.o_xor), a ^ b, msg)
+            # wide operands are not narrow (and take the full path)
+            a, b = 0x123456789, 0x1
+            yield dut.a.eq(a)
+            yield dut.b.eq(b)
+            yield dut.cin.eq(0)
+            yield Settle()
+            self.assertFalse((yield dut.narrow))
+            self.assertEqual((yield dut.o), a + b)
+
+        sim = Simulator(m)
+        sim.add_process(process)
+        sim.run()
+
+    def test_events(self):
+        m = Module()
+        m.submodules.dut = dut = NarrowEvents()
+
+        def process():
+            ops = [(1, 1, 0, 0),            # narrow, nothing toggles
+                   (1, 1, MASK, 0),         # narrow, a's upper half: 32
+                   (0, 0, 0, 0),            # not accepted
+                   (1, 0, 1<<40, 0),        # accepted but wide: not counted
+                   (1, 1, 0, MASK)]         # narrow, 1 (a) + 32 (b)
+            expected = [(1, 1, 0), (1, 1, 32), (0, 0, 0), (1, 0, 0),
+                        (1, 1, 33)]
+            for (valid, narrow, a, b), exp in zip(ops, expected):
+                yield dut.valid_i.eq(valid)
+                yield dut.narrow_i.eq(narrow)
+                yield dut.a_i.eq(a)
+                yield dut.b_i.eq(b)
+                yield
+                yield Settle()
+                ev = dut.events
+                self.assertEqual(((yield ev.op), (yield ev.narrow),
+                                  (yield ev.upper_toggles)), exp)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(process)
+        sim.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+"""Branch Predictor: static backward-taken/forward-not-taken plus a BTB
+
+sits in front of the TestIssuer fetch FSM, where (in prefetch mode) it
+picks the address of the *next* instruction to be prefetched.
+
+* direct branches (b, bc) are partially decoded here, from the raw
+  instruction.  "b" is always taken.  "bc" is predicted taken if its BO
+  field says "branch always", by its "at" hint bits if they are set,
+  and otherwise backward-taken, forward-not-taken.
+* a small direct-mapped Branch Target Buffer, updated from the result of
+  the Branch Function Unit, provides targets for indirect branches (bclr,
+  bcctr, bctar).  optionally each entry also has a 2-bit bimodal
+  saturating counter which then overrides the static direction.
+
+mispredicts need no special recovery path here: the issuer only ever uses
+a prefetched instruction if its address matches the PC that was actually
+produced by Execute.
+"""
+
+from nmigen import Elaboratable, Module, Signal, Array, Cat, Const, Mux
+from nmigen.utils import log2_int
+from nmigen.cli import rtlil
+
+from nmutil.extend import exts
+from nmutil.byterev import byte_reverse
+
+
+def br_ext(bd, addr_wid):
+    """computes sign-extended branch offset (assumes word-alignment)
+    """
+    return Cat(Const(0, 2), exts(bd, bd.shape().width, addr_wid - 2))
+
+
+class BranchPredictor(Elaboratable):
+    """BranchPredictor
+
+    * :n_entries: number of BTB entries (direct-mapped, power of 2)
+    * :bimodal:   add a 2-bit saturating counter to each BTB entry
+    * :addr_wid:  width of the PC
+    """
+    def __init__(self, n_entries=16, bimodal=False, addr_wid=64):
+        assert n_entries >= 2, "BTB needs at least 2 entries"
+        self.n_entries = n_entries
+        self.bimodal = bimodal
+        self.addr_wid = addr_wid
+        self.idx_bits = log2_int(n_entries)
+        self.tag_bits = addr_wid - self.idx_bits - 2
+
+        # lookup: current PC and the (raw, from memory) instruction there
+        self.pc_i = Signal(addr_wid, reset_less=True)
+        self.insn_i = Signal(32, reset_less=True)
+        self.bigendian_i = Signal(reset_less=True)
+        self.taken_o = Signal(reset_less=True) # predicted taken
+        self.nia_o = Signal(addr_wid, reset_less=True) # predicted target
+
+        # update: from the result of the Branch Function Unit
+        self.upd_i = Signal(reset_less=True)
+        self.upd_pc_i = Signal(addr_wid, reset_less=True)
+        self.upd_taken_i = Signal(reset_less=True)
+        self.upd_nia_i = Signal(addr_wid, reset_less=True)
+
+    def elaborate(self, platform):
+        m = Module()
+        comb, sync = m.d.comb, m.d.sync
+        n, idx_bits = self.n_entries, self.idx_bits
+
+        # BTB storage.  small enough to be registers rather than SRAM
+        valid = Signal(n)
+        tags = Array(Signal(self.tag_bits, name="btb_tag%d" % i,
+                            reset_less=True) for i in range(n))
+        targets = Array(Signal(self.addr_wid-2, name="btb_target%d" % i,
+                               reset_less=True) for i in range(n))
+        if self.bimodal:
+            # reset to "weakly not-taken"
+            ctrs = Array(Signal(2, name="btb_ctr%d" % i, reset=0b01)
+                         for i in range(n))
+
+        # BTB lookup
+        lidx = self.pc_i[2:2+idx_bits]
+        ltag = self.pc_i[2+idx_bits:]
+        btb_hit = Signal(reset_less=True)
+        comb += btb_hit.eq(valid.bit_select(lidx, 1) & (tags[lidx] == ltag))
+
+        # partial decode of the instruction (byte-reversed if bigendian)
+        insn = Signal(32, reset_less=True)
+        with m.If(self.bigendian_i):
+            comb += insn.eq(byte_reverse(m, "insn_rev", self.insn_i, 4))
+        with m.Else():
+            comb += insn.eq(self.insn_i)
+        opcode = insn[26:32]
+        xo = insn[1:11]
+        aa = insn[1]
+        bo = insn[21:26]
+        li = insn[2:26]
+        bd = insn[2:16]
+        base = Mux(aa, 0, self.pc_i)
+
+        # BO hint bits ("at"): CR-only forms 001at/011at, CTR forms 1a00t/1a01t
+        always = Signal(reset_less=True)
+        hint_valid = Signal(reset_less=True)
+        hint_taken = Signal(reset_less=True)
+        comb += always.eq(bo[4] & bo[2])
+        with m.If(~bo[4] & bo[2]):
+            comb += hint_valid.eq(bo[1])
+            comb += hint_taken.eq(bo[0])
+        with m.Elif(bo[4] & ~bo[2]):
+            comb += hint_valid.eq(bo[3])
+            comb += hint_taken.eq(bo[0])
+
+        is_direct = Signal(reset_less=True)
+        is_indirect = Signal(reset_less=True)
+        static_taken = Signal(reset_less=True)
+        direct_nia = Signal(self.addr_wid, reset_less=True)
+        with m.Switch(opcode):
+            with m.Case(18): # b
+                comb += is_direct.eq(1)
+                comb += static_taken.eq(1)
+                comb += direct_nia.eq(base + br_ext(li, self.addr_wid))
+            with m.Case(16): # bc
+                comb += is_direct.eq(1)
+                with m.If(always):
+                    comb += static_taken.eq(1)
+                with m.Elif(hint_valid):
+                    comb += static_taken.eq(hint_taken)
+                with m.Else():
+                    comb += static_taken.eq(bd[-1]) # backward: taken
+                comb += direct_nia.eq(base + br_ext(bd, self.addr_wid))
+            with m.Case(19): # bclr, bcctr, bctar
+                with m.Switch(xo):
+                    with m.Case(16, 528, 560):
+                        comb += is_indirect.eq(1)
+
+        # combine the static prediction with the BTB
+        with m.If(is_direct):
+            comb += self.nia_o.eq(direct_nia)
+            if self.bimodal:
+                comb += self.taken_o.eq(Mux(btb_hit, ctrs[lidx][1],
+                                            static_taken))
+            else:
+                comb += self.taken_o.eq(btb_hit | static_taken)
+        with m.Elif(is_indirect & btb_hit):
+            comb += self.nia_o.eq(Cat(Const(0, 2), targets[lidx]))
+            if self.bimodal:
+                comb += self.taken_o.eq(ctrs[lidx][1])
+            else:
+                comb += self.taken_o.eq(1)
+
+        # BTB update, from the branch result
+        uidx = self.upd_pc_i[2:2+idx_bits]
+        utag = self.upd_pc_i[2+idx_bits:]
+        upd_hit = Signal(reset_less=True)
+        comb += upd_hit.eq(valid.bit_select(uidx, 1) & (tags[uidx] == utag))
+        with m.If(self.upd_i):
+            with m.If(self.upd_taken_i):
+                # install (or refresh) the entry
+                sync += valid.bit_select(uidx, 1).eq(1)
+                sync += tags[uidx].eq(utag)
+                sync += targets[uidx].eq(self.upd_nia_i[2:])
+                if self.bimodal:
+                    ctr = ctrs[uidx]
+                    with m.If(~upd_hit):
+                        sync += ctr.eq(0b10) # weakly taken
+                    with m.Elif(ctr != 0b11):
+                        sync += ctr.eq(ctr + 1)
+            with m.Elif(upd_hit):
+                if self.bimodal:
+                    ctr = ctrs[uidx]
+                    with m.If(ctr != 0b00):
+                        sync += ctr.eq(ctr - 1)
+                else:
+                    # no counter: simply forget it
+                    sync += valid.bit_select(uidx, 1).eq(0)
+
+        return m
+
+    def __iter__(self):
+        yield self.pc_i
+        yield self.insn_i
+        yield self.bigendian_i
+        yield self.taken_o
+        yield self.nia_o
+        yield self.upd_i
+        yield self.upd_pc_i
+        yield self.upd_taken_i
+        yield self.upd_nia_i
+
+    def ports(self):
+        return list(self)
+
+
+if __name__ == '__main__':
+    dut = BranchPredictor(bimodal=True)
+    vl = rtlil.convert(dut, ports=dut.ports())
+    with open("test_bpred.il", "w") as f:
+        f.write(vl)
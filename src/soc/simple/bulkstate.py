@@ -0,0 +1,82 @@
+"""bulk reads of (pysim) simulation state, for comparing against ISACaller
+
+reading a signal with "yield sig" compiles and runs a small python
+expression each time: reading the whole of a regfile or of the L0 memory
+after every instruction, one yield per word, dominates a co-simulation.
+BulkState reads the pysim engine's signal state directly instead, so a
+whole regfile or memory is one call:
+
+    sim = Simulator(m)
+    bulk = BulkState(sim)
+
+    def process():
+        ...
+        intregs = yield from bulk.read_regfile(core.regs.int)
+        words = yield from bulk.read_memory(mem)
+
+(with any other engine, cxxsim, the same calls fall back to a yield per
+signal).
+
+it also keeps the values seen at the last check, so that only locations
+that have changed since, on either side, need comparing (dirty()).
+"""
+
+from nmigen import Memory
+
+
+class BulkState:
+    """BulkState
+
+    * :simulator: the Simulator, or None to always use a yield per signal
+    """
+    def __init__(self, simulator=None):
+        engine = getattr(simulator, "_engine", simulator)
+        state = getattr(engine, "_state", None)
+        if not (hasattr(state, "slots") and hasattr(state, "get_signal")):
+            state = None
+        self.state = state
+        self.last = {} # name: (hdl values, isa values) at the last check
+
+    def read(self, signals):
+        """returns the current values of a list of (unsigned) signals"""
+        if self.state is None:
+            res = []
+            for sig in signals:
+                res.append((yield sig))
+            return res
+        slots, get_signal = self.state.slots, self.state.get_signal
+        return [slots[get_signal(sig)].curr for sig in signals]
+
+    def read_regfile(self, regfile):
+        """reads all of a RegFileArray (unary) or RegFileMem"""
+        if getattr(regfile, "unary", True):
+            signals = [reg.reg for reg in regfile.regs]
+        else:
+            signals = regfile.memory._array
+        return (yield from self.read(signals))
+
+    def read_memory(self, mem, start=0, count=None):
+        """reads count words of a Memory, from start"""
+        if count is None:
+            count = mem.depth - start
+        assert isinstance(mem, Memory)
+        return (yield from self.read(mem._array[start:start+count]))
+
+    def dirty(self, name, hdl, isa):
+        """returns the indices at which either the HDL values or the
+        ISA values have changed since the last call for name: the only
+        ones that can differ, if they all matched last time.  the first
+        call for a name returns them all.
+        """
+        last = self.last.get(name)
+        self.last[name] = (list(hdl), list(isa))
+        if last is None or len(last[0]) != len(hdl):
+            return list(range(len(hdl)))
+        last_hdl, last_isa = last
+        return [i for i in range(len(hdl))
+                if hdl[i] != last_hdl[i] or isa[i] != last_isa[i]]
+
+    def forget(self):
+        """the next check compares everything (e.g. after state has been
+        poked behind the back of dirty())"""
+        self.last.clear()
@@ -0,0 +1,119 @@
+"""save and restore of the state of a running (pysim) simulation
+
+a checkpoint is the value of every signal driven from a clock domain
+(not comb), in the design as elaborated for the simulator.  that is
+all of the state of the design: the regfiles (Register flops in a
+RegFileArray, the Memory of a RegFileMem), Memory contents (TestMemory,
+SRAM, the instruction memory, L0), arrays built at elaborate time such
+as CacheRam and the ICache/DCache tags and valid bits, FSM states, and
+all the other flops.  Memories that have no write port (ROMs) are not
+driven by anything, so are added explicitly (memories).
+
+signals are named by their path in the hierarchy, which is the same
+every time the same design is elaborated.  so a checkpoint saved from
+one simulation can be restored into a freshly elaborated one:
+
+    frag = Fragment.get(dut, None)
+    ckpt = SimCheckpoint(frag)
+    sim = Simulator(frag)   # must be given the same fragment
+
+    def process():
+        ...
+        state = yield from ckpt.save()
+        write_checkpoint("run.ckpt", state)
+
+and, later, at the start of a process in a new simulation:
+
+        yield from ckpt.restore(read_checkpoint("run.ckpt"))
+
+the file is gzip'd JSON, holding only the signals that are not at their
+reset value.
+
+anything held outside the HDL (a python model of memory running as a
+simulation process, for example) must be saved separately.
+"""
+
+import gzip
+import json
+from collections import OrderedDict
+
+from nmigen import Fragment
+from nmutil.sim_tmp_alternative import Settle
+
+
+CHECKPOINT_VERSION = 1
+
+
+class SimCheckpoint:
+    """SimCheckpoint
+
+    * :fragment: the (elaborated) Fragment that the Simulator is given
+    * :memories: extra Memory objects to save, e.g. ones with no
+      write port
+    """
+    def __init__(self, fragment, memories=()):
+        fragment = Fragment.get(fragment, None)
+        self.signals = OrderedDict()
+        self._add_fragment(fragment, "top")
+        for mem in memories:
+            for sig in mem._array:
+                self._add(mem.name, sig)
+
+    def _add(self, path, sig):
+        name = "%s.%s" % (path, sig.name)
+        # signals may share a name: number the later ones
+        key, i = name, 0
+        while key in self.signals:
+            if self.signals[key] is sig:
+                return
+            i += 1
+            key = "%s#%d" % (name, i)
+        self.signals[key] = sig
+
+    def _add_fragment(self, fragment, path):
+        for domain, sig in fragment.iter_drivers():
+            if domain is not None: # comb signals are not state
+                self._add(path, sig)
+        for i, (sub, name) in enumerate(fragment.subfragments):
+            if name is None:
+                name = "U$%d" % i
+            self._add_fragment(sub, "%s.%s" % (path, name))
+
+    def save(self):
+        """returns the state as a dict of name: value (non-reset only)"""
+        state = {}
+        yield Settle()
+        for name, sig in self.signals.items():
+            val = yield sig
+            if val != sig.reset:
+                state[name] = val
+        return state
+
+    def restore(self, state):
+        """puts the design into a saved state.  signals not in the
+        checkpoint are set to their reset value.
+        """
+        unknown = set(state) - set(self.signals)
+        if unknown:
+            raise KeyError("checkpoint does not match the design: %s" %
+                           ", ".join(sorted(unknown)[:10]))
+        # let this clock edge's updates land first, else they overwrite
+        yield Settle()
+        for name, sig in self.signals.items():
+            yield sig.eq(state.get(name, sig.reset))
+        yield Settle()
+
+
+def write_checkpoint(fname, state):
+    with gzip.open(fname, "wt") as f:
+        json.dump({"version": CHECKPOINT_VERSION, "state": state}, f,
+                  separators=(",", ":"))
+
+
+def read_checkpoint(fname):
+    with gzip.open(fname, "rt") as f:
+        ckpt = json.load(f)
+    if ckpt.get("version") != CHECKPOINT_VERSION:
+        raise ValueError("%s: unsupported checkpoint version %s" %
+                         (fname, ckpt.get("version")))
+    return ckpt["state"]
@@ -17,9 +17,19 @@ the brain-dead part of this module is that even though there is no
 conflict of access, regfile read/write hazards are *not* analysed,
 and consequently it is safer to wait for the Function Unit to complete
 before allowing a new instruction to proceed.
+
+optionally (pspec.allow_overlap) a lightweight hazard tracker may be
+enabled instead: each Function Unit latches its own copy of the decoded
+instruction, and per-regfile write-pending and read-pending bitvectors
+are created from them.  an instruction is only accepted if its FU is free
+and it has no RAW, WAW or WAR hazard against any instruction in flight.
+only ALU, Logical, ShiftRot, CR, MUL and DIV may overlap: everything
+else (Branch, Trap, SPR, LD/ST, MMU, NOP, ATTN) waits for all Function
+Units to be idle, and is waited on as before.
 """
 
-from nmigen import Elaboratable, Module, Signal, ResetSignal, Cat, Mux
+from nmigen import (Elaboratable, Module, Signal, ResetSignal, Cat, Mux,
+                    Const, Record)
 from nmigen.cli import rtlil
 
 from openpower.decoder.power_decoder2 import PowerDecodeSubset
@@ -38,8 +48,9 @@ from openpower.decoder.power_decoder2 import get_rdflags
 from openpower.decoder.decode2execute1 import Data
 from soc.experiment.l0_cache import TstL0CacheBuffer  # test only
 from soc.config.test.test_loadstore import TestMemPspec
-from openpower.decoder.power_enums import MicrOp
+from openpower.decoder.power_enums import MicrOp, Function
 from soc.config.state import CoreState
+from soc.config.elabcache import cached_convert
 
 import operator
 
@@ -56,6 +67,30 @@ def ortreereduce_sig(tree):
     return treereduce(tree, operator.or_, lambda x: x)
 
 
+# Function Units that may be in flight at the same time as others
+# (everything else is serialised).  see NonProductionCore allow_overlap
+overlap_fns = (Function.ALU, Function.LOGICAL, Function.SHIFT_ROT,
+               Function.CR, Function.MUL, Function.DIV)
+
+
+# helper function converting a regspec register number to a unary mask
+# (some regfiles are already unary-addressed, some are binary)
+def regspec_mask(rfile, regnum):
+    if rfile.unary:
+        return regnum
+    return 1 << regnum
+
+
+# helper function returning the "ok" flag from a regspec_decode_write
+# (which is sometimes a Data record, sometimes a Signal, sometimes None)
+def regspec_wrok(wrflag):
+    if wrflag is None:
+        return Const(1, 1)
+    if isinstance(wrflag, Record):
+        return wrflag.ok
+    return wrflag
+
+
 # helper function to place full regs declarations first
 def sort_fuspecs(fuspecs):
     res = []
@@ -79,6 +114,10 @@ class NonProductionCore(Elaboratable):
         self.regreduce_en = (hasattr(pspec, "regreduce") and
                              (pspec.regreduce == True))
 
+        # test to see if hazard-tracked overlapping of FUs is enabled
+        self.allow_overlap = (hasattr(pspec, "allow_overlap") and
+                              (pspec.allow_overlap == True))
+
         # single LD/ST funnel for memory access
         self.l0 = l0 = TstL0CacheBuffer(pspec, n_units=1)
         pi = l0.l0.dports[0]
@@ -120,6 +159,20 @@ class NonProductionCore(Elaboratable):
         self.ivalid_i = Signal(reset_less=True) # instruction is valid
         self.issue_i = Signal(reset_less=True)
         self.busy_o = Signal(name="corebusy_o", reset_less=True)
+        self.issue_ready_o = Signal(reset_less=True) # no hazards, FU free
+        self.any_busy_o = Signal(reset_less=True) # any FU at all is busy
+        self.mem_flush_i = Signal() # drain the store buffer (l0.flushed_o)
+        self.mem_inval_i = Signal() # invalidate the L0 line buffer
+
+        # when overlapping, each Function Unit needs its own copy of the
+        # decoded instruction, latched at issue: the register numbers it
+        # reads and writes must not change when the next one comes along
+        self.fu_e = {}
+        if self.allow_overlap:
+            for funame in self.fus.fus.keys():
+                self.fu_e[funame] = Decode2ToExecute1Type("fu_%s" % funame,
+                                            opkls=IssuerDecode2ToOperand,
+                                            regreduce_en=self.regreduce_en)
 
         # start/stop and terminated signalling
         self.core_terminate_o = Signal(reset=0)  # indicates stopped
@@ -211,20 +264,72 @@ class NonProductionCore(Elaboratable):
         for i, funame in enumerate(fus.keys()):
             fu_bitdict[funame] = fu_enable[i]
 
-        # enable the required Function Unit based on the opcode decode
-        # note: this *only* works correctly for simple core when one and
-        # *only* one FU is allocated per instruction
+        # Functions which may overlap (everything else is serialised)
+        ofns = 0
+        for fn in overlap_fns:
+            ofns |= fn.value
+
+        # enable the required Function Unit based on the opcode decode.
+        # where there are several of the same Function (mul0, mul1, ...,
+        # for example Reservation Stations in front of one pipeline) only
+        # one of them is enabled: the first, unless overlapping, when it
+        # is the first free one (see pick_free_fu)
+        byfn = {}
         for funame, fu in fus.items():
-            fnunit = fu.fnunit.value
-            enable = Signal(name="en_%s" % funame, reset_less=True)
-            comb += enable.eq((self.e.do.fn_unit & fnunit).bool())
-            comb += fu_bitdict[funame].eq(enable)
+            byfn.setdefault(fu.fnunit.value, []).append(funame)
+        for fnunit, funames in byfn.items():
+            picked = [Const(1, 1)] + [Const(0, 1)] * (len(funames)-1)
+            if self.allow_overlap and len(funames) > 1 and (fnunit & ofns):
+                picked = self.pick_free_fu(m, funames)
+            for funame, pick in zip(funames, picked):
+                enable = Signal(name="en_%s" % funame, reset_less=True)
+                comb += enable.eq((self.e.do.fn_unit & fnunit).bool() & pick)
+                comb += fu_bitdict[funame].eq(enable)
+
+        # note if any FU at all is busy (needed to drain, when overlapping)
+        comb += self.any_busy_o.eq(Cat(*[fu.busy_o
+                                         for fu in fus.values()]).bool())
+
+        # work out whether the instruction may be issued (always, if not
+        # overlapping: the issuer waits for completion anyway)
+        serialise = Signal(reset_less=True)
+        if self.allow_overlap:
+            comb += serialise.eq(~(self.e.do.fn_unit & ofns).bool())
+            hazard = self.connect_hazards(m, fu_bitdict)
+            fu_busy = []
+            for funame, fu in fus.items():
+                fu_busy.append(fu_bitdict[funame] & fu.busy_o)
+            comb += self.issue_ready_o.eq(~hazard & ~Cat(*fu_busy).bool() &
+                                          ~(serialise & self.any_busy_o))
+            # each FU reads its registers according to its *own* latched
+            # instruction, not the one that is currently being decoded
+            for funame, fu in fus.items():
+                rdmask = get_rdflags(self.fu_e[funame], fu)
+                comb += fu.rdmaskn.eq(~rdmask)
+        else:
+            comb += self.issue_ready_o.eq(1)
 
-        # sigh - need a NOP counter
+        # sigh - need a NOP counter.  a NOP (which sync and eieio are,
+        # here) also drains the store buffer, staying busy until it is empty
         counter = Signal(2)
+        nop_flush = Signal()
+        comb += self.l0.flush_i.eq(nop_flush | self.mem_flush_i)
         with m.If(counter != 0):
             sync += counter.eq(counter - 1)
             comb += self.busy_o.eq(1)
+        with m.If(nop_flush):
+            comb += self.busy_o.eq(1)
+            with m.If(self.l0.flushed_o):
+                sync += nop_flush.eq(0)
+
+        # cache management (dcbf) and sync also invalidate the L0 line
+        # buffer, as does mem_inval_i (memory written by someone else)
+        cache_op = Signal(reset_less=True)
+        with m.If(self.ivalid_i):
+            with m.Switch(self.e.do.insn_type):
+                with m.Case(MicrOp.OP_NOP, MicrOp.OP_SYNC, MicrOp.OP_DCBF):
+                    comb += cache_op.eq(1)
+        comb += self.l0.inval_i.eq(cache_op | self.mem_inval_i)
 
         with m.If(self.ivalid_i): # run only when valid
             with m.Switch(self.e.do.insn_type):
@@ -234,6 +339,7 @@ class NonProductionCore(Elaboratable):
 
                 with m.Case(MicrOp.OP_NOP):
                     sync += counter.eq(2)
+                    sync += nop_flush.eq(1)
                     comb += self.busy_o.eq(1)
 
                 with m.Default():
@@ -249,14 +355,136 @@ class NonProductionCore(Elaboratable):
                             comb += fu.oper_i.eq_from(do)
                             #comb += fu.oper_i.eq_from_execute1(e)
                             comb += fu.issue_i.eq(self.issue_i)
-                            comb += self.busy_o.eq(fu.busy_o)
-                            # rdmask, which is for registers, needs to come
-                            # from the *main* decoder
-                            rdmask = get_rdflags(self.e, fu)
-                            comb += fu.rdmaskn.eq(~rdmask)
+                            if self.allow_overlap:
+                                # FU gets its own copy of the instruction
+                                with m.If(self.issue_i):
+                                    sync += self.fu_e[funame].eq(self.e)
+                                # overlapping FUs are "done" as far as the
+                                # issuer is concerned, as soon as issued
+                                comb += self.busy_o.eq(fu.busy_o & serialise)
+                            else:
+                                comb += self.busy_o.eq(fu.busy_o)
+                                # rdmask, which is for registers, needs to
+                                # come from the *main* decoder
+                                rdmask = get_rdflags(self.e, fu)
+                                comb += fu.rdmaskn.eq(~rdmask)
 
         return fu_bitdict
 
+    def pick_free_fu(self, m, funames):
+        """pick_free_fu - choose one of several overlapping Function Units
+        of the same Function: the first one that is not busy (the first, if
+        all are, in which case the instruction waits for it to be free).
+
+        once issued the chosen FU is busy, and the next one is picked, but
+        that is fine: an overlapping instruction is already "done" as far
+        as the issuer is concerned, and the FU has its own copy of it.
+
+        returns a list of pick signals, one per FU (in funames order)
+        """
+        comb = m.d.comb
+        fus = self.fus.fus
+        n = len(funames)
+        name = fus[funames[0]].fnunit.name.lower()
+
+        free = Signal(n, name="free_%s" % name, reset_less=True)
+        picked = Signal(n, name="picked_%s" % name, reset_less=True)
+        m.submodules["fupick_%s" % name] = fupick = PriorityPicker(n)
+
+        comb += free.eq(~Cat(*[fus[funame].busy_o for funame in funames]))
+        comb += fupick.i.eq(free)
+        comb += picked.eq(Mux(free.bool(), fupick.o, 1))
+        return [picked[i] for i in range(n)]
+
+    def get_fu_e(self, funame):
+        """returns the decoded instruction that a Function Unit is to use
+        for its register numbers: its own latched copy if overlapping,
+        otherwise the (one and only) instruction being executed.
+        """
+        if self.allow_overlap:
+            return self.fu_e[funame]
+        return self.e
+
+    def get_fu_active(self, fu_bitdict, funame, fu):
+        """returns the condition under which a Function Unit may take part
+        in regfile port arbitration.  when overlapping, any busy FU may.
+        """
+        if self.allow_overlap:
+            return fu.busy_o
+        return fu_bitdict[funame]
+
+    def connect_hazards(self, m, fu_bitdict):
+        """connect_hazards - lightweight per-register hazard detection
+
+        a write-pending and a read-pending bitvector is created for each
+        regfile, from the latched instructions of every busy Function Unit.
+        the instruction about to be issued (self.e) is then checked:
+
+        * RAW: a register it reads has a write outstanding
+        * WAW: a register it writes has a write outstanding
+        * WAR: a register it writes has not yet been read by an earlier FU
+
+        write-pending is held until the FU is no longer busy, which is
+        conservative but simple.  returns a signal indicating a hazard.
+        """
+        comb = m.d.comb
+        fus = self.fus.fus
+        regs = self.regs
+        e = self.e
+
+        # collate per-regfile lists of masks: in-flight and new instruction
+        rd_pend, wr_pend, new_rd, new_wr = {}, {}, {}, {}
+        for funame, fu in fus.items():
+            fu_e = self.fu_e[funame]
+            enable = fu_bitdict[funame]
+            for idx in range(fu.n_src):
+                (regfile, regname, _) = fu.get_in_spec(idx)
+                rfile = regs.rf[regfile.lower()]
+                # still waiting to read this register?
+                _, read = regspec_decode_read(fu_e, regfile, regname)
+                pend = Mux(fu.rd.rel_o[idx], regspec_mask(rfile, read), 0)
+                rd_pend.setdefault(regfile, []).append(pend)
+                # new instruction wants to read this register?
+                rdflag, read = regspec_decode_read(e, regfile, regname)
+                want = Mux(enable & rdflag, regspec_mask(rfile, read), 0)
+                new_rd.setdefault(regfile, []).append(want)
+            for idx in range(fu.n_dst):
+                (regfile, regname, _) = fu.get_out_spec(idx)
+                rfile = regs.rf[regfile.lower()]
+                # still going to write this register?
+                wrflag, write = regspec_decode_write(fu_e, regfile, regname)
+                pend = Mux(fu.busy_o & regspec_wrok(wrflag),
+                           regspec_mask(rfile, write), 0)
+                wr_pend.setdefault(regfile, []).append(pend)
+                # new instruction wants to write this register?
+                wrflag, write = regspec_decode_write(e, regfile, regname)
+                want = Mux(enable & regspec_wrok(wrflag),
+                           regspec_mask(rfile, write), 0)
+                new_wr.setdefault(regfile, []).append(want)
+
+        # now create the bitvectors and check them, per regfile
+        hazards = []
+        for regfile in set(rd_pend.keys()) | set(wr_pend.keys()):
+            depth = regs.rf[regfile.lower()].depth
+            vecs = {}
+            for (vname, d) in [("rd_pend", rd_pend), ("wr_pend", wr_pend),
+                               ("new_rd", new_rd), ("new_wr", new_wr)]:
+                name = "%s_%s" % (vname, regfile.lower())
+                vecs[vname] = vec = Signal(depth, name=name, reset_less=True)
+                if regfile in d:
+                    comb += vec.eq(ortreereduce_sig(d[regfile]))
+            raw = (vecs["new_rd"] & vecs["wr_pend"]).bool()
+            waw = (vecs["new_wr"] & vecs["wr_pend"]).bool()
+            war = (vecs["new_wr"] & vecs["rd_pend"]).bool()
+            hazard = Signal(name="hazard_%s" % regfile.lower(),
+                            reset_less=True)
+            comb += hazard.eq(raw | waw | war)
+            hazards.append(hazard)
+
+        hazard = Signal(reset_less=True)
+        comb += hazard.eq(Cat(*hazards).bool())
+        return hazard
+
     def connect_rdport(self, m, fu_bitdict, rdpickers, regfile, regname, fspec):
         comb, sync = m.d.comb, m.d.sync
         fus = self.fus.fus
@@ -305,8 +533,16 @@ class NonProductionCore(Elaboratable):
             for pi, (funame, fu, idx) in enumerate(fuspec):
                 pi += ppoffs[i]
 
+                # when overlapping, reg numbers come from the FU's own copy
+                rdflag, read = rdflags[i], reads[i]
+                if self.allow_overlap:
+                    fu_e = self.get_fu_e(funame)
+                    (_, fu_regname, _) = fu.get_in_spec(idx)
+                    rdflag, read = regspec_decode_read(fu_e, regfile,
+                                                       fu_regname)
+
                 # connect request-read to picker input, and output to go-rd
-                fu_active = fu_bitdict[funame]
+                fu_active = self.get_fu_active(fu_bitdict, funame, fu)
                 name = "%s_%s_%s_%i" % (regfile, rpidx, funame, pi)
                 addr_en = Signal.like(reads[i], name="addr_en_"+name)
                 pick = Signal(name="pick_"+name)     # picker input
@@ -314,7 +550,7 @@ class NonProductionCore(Elaboratable):
                 delay_pick = Signal(name="dp_"+name) # read-enable "underway"
 
                 # exclude any currently-enabled read-request (mask out active)
-                comb += pick.eq(fu.rd_rel_o[idx] & fu_active & rdflags[i] &
+                comb += pick.eq(fu.rd_rel_o[idx] & fu_active & rdflag &
                                 ~delay_pick)
                 comb += rdpick.i[pi].eq(pick)
                 comb += fu.go_rd_i[idx].eq(delay_pick) # pass in *delayed* pick
@@ -322,7 +558,7 @@ class NonProductionCore(Elaboratable):
                 # if picked, select read-port "reg select" number to port
                 comb += rp.eq(rdpick.o[pi] & rdpick.en_o)
                 sync += delay_pick.eq(rp) # delayed "pick"
-                comb += addr_en.eq(Mux(rp, reads[i], 0))
+                comb += addr_en.eq(Mux(rp, read, 0))
 
                 # the read-enable happens combinatorially (see mux-bus below)
                 # but it results in the data coming out on a one-cycle delay.
@@ -441,8 +677,14 @@ class NonProductionCore(Elaboratable):
                 wrflag = Signal(name=name, reset_less=True)
                 comb += wrflag.eq(dest.ok & fu.busy_o)
 
+                # when overlapping, reg numbers come from the FU's own copy
+                if self.allow_overlap:
+                    fu_e = self.get_fu_e(funame)
+                    (_, fu_regname, _) = fu.get_out_spec(idx)
+                    _, write = regspec_decode_write(fu_e, regfile, fu_regname)
+
                 # connect request-write to picker input, and output to go-wr
-                fu_active = fu_bitdict[funame]
+                fu_active = self.get_fu_active(fu_bitdict, funame, fu)
                 pick = fu.wr.rel_o[idx] & fu_active  # & wrflag
                 comb += wrpick.i[pi].eq(pick)
                 # create a single-pulse go write from the picker output
@@ -587,7 +829,6 @@ if __name__ == '__main__':
                          addr_wid=48,
                          mask_wid=8,
                          reg_wid=64)
-    dut = NonProductionCore(pspec)
-    vl = rtlil.convert(dut, ports=dut.ports())
+    vl = cached_convert(lambda: NonProductionCore(pspec), pspec)
     with open("test_core.il", "w") as f:
         f.write(vl)
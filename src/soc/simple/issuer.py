@@ -28,17 +28,20 @@ from openpower.decoder.power_decoder2 import PowerDecode2, SVP64PrefixDecoder
 from openpower.decoder.decode2execute1 import IssuerDecode2ToOperand
 from openpower.decoder.decode2execute1 import Data
 from openpower.decoder.power_enums import (MicrOp, SVP64PredInt, SVP64PredCR,
-                                     SVP64PredMode)
+                                     SVP64PredMode, Function)
 from openpower.state import CoreState
 from openpower.consts import (CR, SVP64CROffs)
 from soc.experiment.testmem import TestMemory # test only for instructions
 from soc.regfile.regfiles import StateRegs, FastRegs
 from soc.simple.core import NonProductionCore
+from soc.simple.bpred import BranchPredictor
+from soc.simple.pmu import PMU
 from soc.config.test.test_loadstore import TestMemPspec
 from soc.config.ifetch import ConfigFetchUnit
 from soc.debug.dmi import CoreDebug, DMIInterface
 from soc.debug.jtag import JTAG
 from soc.config.pinouts import get_pinspecs
+from soc.config.elabcache import cached_convert
 from soc.interrupts.xics import XICS_ICP, XICS_ICS
 from soc.bus.simple_gpio import SimpleGPIO
 from soc.bus.SPBlock512W64B8W import SPBlock512W64B8W
@@ -166,6 +169,27 @@ class TestIssuerInternal(Elaboratable):
         self.regreduce_en = (hasattr(pspec, "regreduce") and
                                             (pspec.regreduce == True))
 
+        # pipelined fetch: the next sequential instruction is prefetched
+        # whilst the current one is being decoded and executed
+        self.prefetch_en = (hasattr(pspec, "prefetch") and
+                                            (pspec.prefetch == True))
+
+        # branch prediction: picks the address to prefetch (so needs it)
+        self.bpred_en = (hasattr(pspec, "branch_predict") and
+                                            (pspec.branch_predict == True))
+        if self.bpred_en:
+            self.prefetch_en = True
+            bimodal = hasattr(pspec, "bpred_bimodal") and \
+                      pspec.bpred_bimodal == True
+            n_entries = 16
+            if isinstance(getattr(pspec, "btb_entries", None), int):
+                n_entries = pspec.btb_entries
+            self.bpred = BranchPredictor(n_entries=n_entries,
+                                         bimodal=bimodal)
+
+        # performance counters, readable over DMI (see soc.simple.pmu)
+        self.pmu_en = hasattr(pspec, "pmu") and pspec.pmu == True
+
         # JTAG interface.  add this right at the start because if it's
         # added it *modifies* the pspec, by adding enable/disable signals
         # for parts of the rest of the core
@@ -236,8 +260,14 @@ class TestIssuerInternal(Elaboratable):
         # Test Instruction memory
         self.imem = ConfigFetchUnit(pspec).fu
 
-        # DMI interface
-        self.dbg = CoreDebug()
+        # DMI interface, with optional instruction trace log (see trace_log)
+        # and memory window (a wishbone master, for fast firmware upload)
+        log_length = 0
+        if isinstance(getattr(pspec, "debug_log_length", None), int):
+            log_length = pspec.debug_log_length
+        dmi_mem = hasattr(pspec, "dmi_mem") and pspec.dmi_mem == True
+        self.dbg = CoreDebug(LOG_LENGTH=log_length,
+                             mem_spec=pspec if dmi_mem else None)
 
         # instruction go/monitor
         self.pc_o = Signal(64, reset_less=True)
@@ -246,6 +276,9 @@ class TestIssuerInternal(Elaboratable):
         self.core_bigendian_i = Signal() # TODO: set based on MSR.LE
         self.busy_o = Signal(reset_less=True)
         self.memerr_o = Signal(reset_less=True)
+        # memory written by another wishbone master (or reloaded by a
+        # test): invalidates the L0 line buffer
+        self.mem_inval_i = Signal()
 
         # STATE regfile read /write ports for PC, MSR, SVSTATE
         staterf = self.core.regs.rf['state']
@@ -288,6 +321,19 @@ class TestIssuerInternal(Elaboratable):
         this FSM performs fetch of raw instruction data, partial-decodes
         it 32-bit at a time to detect SVP64 prefixes, and will optionally
         read a 2nd 32-bit quantity if that occurs.
+
+        when prefetch is enabled, after handing over an instruction the FSM
+        immediately reads the one at NIA into a single-entry buffer, whilst
+        Issue and Execute get on with the current one.  the buffer is
+        only used if its address matches the PC when the next fetch is
+        requested: any redirect (branch, trap, DMI PC write) simply misses,
+        which is how the "flush" works.  an explicit flush also occurs
+        on the redirect itself, unless it is to the prefetched address,
+        and when the icache is reset (invalidated) via the debug unit.
+
+        with branch prediction, the address prefetched is the predicted
+        next PC rather than NIA.  a correctly-predicted taken branch then
+        redirects to exactly the instruction already in the buffer.
         """
         comb = m.d.comb
         sync = m.d.sync
@@ -297,6 +343,23 @@ class TestIssuerInternal(Elaboratable):
 
         msr_read = Signal(reset=1)
 
+        # single-entry prefetch buffer: holds the 32-bit word at prefetch_pc
+        prefetch_pc = Signal(64, reset_less=True)
+        prefetch_insn = Signal(32, reset_less=True)
+        prefetch_valid = Signal()
+        prefetch_hit = Signal() # fetch is being served from the buffer
+        use_prefetch = Signal() # buffer matches the PC about to be fetched
+        pred_nia = Signal(64, reset_less=True) # predicted next PC
+        if self.prefetch_en:
+            comb += use_prefetch.eq(prefetch_valid & (prefetch_pc == pc))
+            # redirect (branch/trap or debug writing the PC): flush
+            redirect = Signal()
+            nia_wen = Signal()
+            comb += nia_wen.eq((self.state_nia.wen & (1<<StateRegs.PC)).bool())
+            comb += redirect.eq((nia_wen &
+                                 (self.state_nia.i_data != prefetch_pc)) |
+                                self.pc_i.ok)
+
         with m.FSM(name='fetch_fsm'):
 
             # waiting (zzz)
@@ -307,9 +370,15 @@ class TestIssuerInternal(Elaboratable):
                     # capture the PC and also drop it into Insn Memory
                     # we have joined a pair of combinatorial memory
                     # lookups together.  this is Generally Bad.
-                    comb += self.imem.a_pc_i.eq(pc)
-                    comb += self.imem.a_i_valid.eq(1)
-                    comb += self.imem.f_i_valid.eq(1)
+                    # (not needed if it was already prefetched)
+                    with m.If(~use_prefetch):
+                        comb += self.imem.a_pc_i.eq(pc)
+                        comb += self.imem.a_i_valid.eq(1)
+                        comb += self.imem.f_i_valid.eq(1)
+                    if self.prefetch_en:
+                        # buffer is consumed (or stale): either way, empty it
+                        sync += prefetch_hit.eq(use_prefetch)
+                        sync += prefetch_valid.eq(0)
                     sync += cur_state.pc.eq(pc)
                     sync += cur_state.svstate.eq(svstate) # and svstate
 
@@ -325,13 +394,14 @@ class TestIssuerInternal(Elaboratable):
                 with m.If(~msr_read):
                     sync += msr_read.eq(1) # yeah don't read it again
                     sync += cur_state.msr.eq(self.state_r_msr.o_data)
-                with m.If(self.imem.f_busy_o): # zzz...
+                with m.If(self.imem.f_busy_o & ~prefetch_hit): # zzz...
                     # busy: stay in wait-read
                     comb += self.imem.a_i_valid.eq(1)
                     comb += self.imem.f_i_valid.eq(1)
                 with m.Else():
-                    # not busy: instruction fetched
-                    insn = get_insn(self.imem.f_instr_o, cur_state.pc)
+                    # not busy: instruction fetched (or already prefetched)
+                    insn = Mux(prefetch_hit, prefetch_insn,
+                               get_insn(self.imem.f_instr_o, cur_state.pc))
                     if self.svp64_en:
                         svp64 = self.svp64
                         # decode the SVP64 prefix, if any
@@ -359,9 +429,18 @@ class TestIssuerInternal(Elaboratable):
                             m.next = "INSN_READ2"
                     else:
                         # not SVP64 - 32-bit only
+                        insn_size = 4
                         sync += nia.eq(cur_state.pc + 4)
                         sync += dec_opcode_i.eq(insn)
                         m.next = "INSN_READY"
+                    if self.bpred_en:
+                        # predict the next PC, which is what gets prefetched
+                        bpred = self.bpred
+                        comb += bpred.pc_i.eq(cur_state.pc)
+                        comb += bpred.insn_i.eq(insn)
+                        comb += bpred.bigendian_i.eq(self.core_bigendian_i)
+                        sync += pred_nia.eq(Mux(bpred.taken_o, bpred.nia_o,
+                                                cur_state.pc + insn_size))
 
             with m.State("INSN_READ2"):
                 with m.If(self.imem.f_busy_o):  # zzz...
@@ -393,7 +472,39 @@ class TestIssuerInternal(Elaboratable):
                 # hand over the instruction, to be decoded
                 comb += fetch_insn_o_valid.eq(1)
                 with m.If(fetch_insn_i_ready):
-                    m.next = "IDLE"
+                    if self.prefetch_en:
+                        m.next = "PREFETCH"
+                    else:
+                        m.next = "IDLE"
+
+            if self.prefetch_en:
+                # start reading the next sequential instruction, overlapping
+                # with decode and execute of the current one
+                with m.State("PREFETCH"):
+                    next_pc = pred_nia if self.bpred_en else nia
+                    comb += self.imem.a_pc_i.eq(next_pc)
+                    comb += self.imem.a_i_valid.eq(1)
+                    comb += self.imem.f_i_valid.eq(1)
+                    sync += prefetch_pc.eq(next_pc)
+                    m.next = "PREFETCH_READ"
+
+                with m.State("PREFETCH_READ"):
+                    with m.If(self.imem.f_busy_o): # zzz...
+                        comb += self.imem.a_i_valid.eq(1)
+                        comb += self.imem.f_i_valid.eq(1)
+                    with m.Else():
+                        # store it, unless a redirect has already happened
+                        insn = get_insn(self.imem.f_instr_o, prefetch_pc)
+                        sync += prefetch_insn.eq(insn)
+                        sync += prefetch_valid.eq(~redirect)
+                        m.next = "IDLE"
+
+        # flush the prefetch buffer on redirect, core reset or icache
+        # reset (imem.inval_i).  this takes priority over anything the
+        # FSM did, above
+        if self.prefetch_en:
+            with m.If(redirect | self.core_rst | self.dbg.icache_rst_o):
+                sync += prefetch_valid.eq(0)
 
     def fetch_predicate_fsm(self, m,
                             pred_insn_i_valid, pred_insn_o_ready,
@@ -611,7 +722,7 @@ class TestIssuerInternal(Elaboratable):
         if len(el) > 0: # at least one exception
             comb += exc_happened.eq(Cat(*el).bool())
 
-        with m.FSM(name="issue_fsm"):
+        with m.FSM(name="issue_fsm") as fsm:
 
             # sync with the "fetch" phase which is reading the instruction
             # at this point, there is no instruction running, that
@@ -625,7 +736,12 @@ class TestIssuerInternal(Elaboratable):
                         m.next = "INSN_WAIT"
                 with m.Else():
                     # tell core it's stopped, and acknowledge debug handshake
-                    comb += dbg.core_stopped_i.eq(1)
+                    # (if overlapping, only once all FUs have drained)
+                    if core.allow_overlap:
+                        comb += dbg.core_stopped_i.eq(~core.any_busy_o &
+                                                      core.l0.flushed_o)
+                    else:
+                        comb += dbg.core_stopped_i.eq(core.l0.flushed_o)
                     # while stopped, allow updating the PC and SVSTATE
                     with m.If(self.pc_i.ok):
                         comb += self.state_w_pc.wen.eq(1 << StateRegs.PC)
@@ -826,7 +942,11 @@ class TestIssuerInternal(Elaboratable):
                             m.next = "PRED_SKIP"
 
                 with m.Else():
-                    comb += dbg.core_stopped_i.eq(1)
+                    if core.allow_overlap:
+                        comb += dbg.core_stopped_i.eq(~core.any_busy_o &
+                                                      core.l0.flushed_o)
+                    else:
+                        comb += dbg.core_stopped_i.eq(core.l0.flushed_o)
                     # while stopped, allow updating the PC and SVSTATE
                     with m.If(self.pc_i.ok):
                         comb += self.state_w_pc.wen.eq(1 << StateRegs.PC)
@@ -843,6 +963,8 @@ class TestIssuerInternal(Elaboratable):
             comb += self.state_w_sv.i_data.eq(new_svstate)
             sync += cur_state.svstate.eq(new_svstate) # for next clock
 
+        return fsm
+
     def execute_fsm(self, m, core, pc_changed, sv_changed,
                     exec_insn_i_valid, exec_insn_o_ready,
                     exec_pc_o_valid, exec_pc_i_ready):
@@ -862,14 +984,17 @@ class TestIssuerInternal(Elaboratable):
         core_busy_o = core.busy_o                 # core is busy
         core_ivalid_i = core.ivalid_i             # instruction is valid
         core_issue_i = core.issue_i               # instruction is issued
+        core_ready_o = core.issue_ready_o         # core can accept insn
         insn_type = core.e.do.insn_type           # instruction MicroOp type
+        bpred_update = Signal()                   # branch result available
 
         with m.FSM(name="exec_fsm"):
 
             # waiting for instruction bus (stays there until not busy)
+            # (when overlapping FUs, also until the core has no hazards)
             with m.State("INSN_START"):
-                comb += exec_insn_o_ready.eq(1)
-                with m.If(exec_insn_i_valid):
+                comb += exec_insn_o_ready.eq(core_ready_o)
+                with m.If(exec_insn_i_valid & core_ready_o):
                     comb += core_ivalid_i.eq(1)  # instruction is valid
                     comb += core_issue_i.eq(1)  # and issued
                     sync += sv_changed.eq(0)
@@ -889,8 +1014,28 @@ class TestIssuerInternal(Elaboratable):
                     comb += exec_pc_o_valid.eq(1)
                     with m.If(exec_pc_i_ready):
                         comb += self.insn_done.eq(1)
+                        if self.bpred_en:
+                            comb += bpred_update.eq(1)
                         m.next = "INSN_START"  # back to fetch
 
+        # update the branch predictor from the branch result.  taken if
+        # the Branch FU wrote the PC (now, or earlier in INSN_ACTIVE)
+        if self.bpred_en:
+            bpred = self.bpred
+            nia_wen = Signal()
+            br_target = Signal(64, reset_less=True)
+            is_branch = Signal()
+            comb += nia_wen.eq((self.state_nia.wen & (1<<StateRegs.PC)).bool())
+            comb += is_branch.eq((core.e.do.fn_unit &
+                                  Function.BRANCH.value).bool())
+            with m.If(nia_wen):
+                sync += br_target.eq(self.state_nia.i_data)
+            comb += bpred.upd_i.eq(bpred_update & is_branch)
+            comb += bpred.upd_pc_i.eq(self.cur_state.pc)
+            comb += bpred.upd_taken_i.eq(pc_changed | nia_wen)
+            comb += bpred.upd_nia_i.eq(Mux(nia_wen, self.state_nia.i_data,
+                                           br_target))
+
     def setup_peripherals(self, m):
         comb, sync = m.d.comb, m.d.sync
 
@@ -941,6 +1086,10 @@ class TestIssuerInternal(Elaboratable):
         if self.svp64_en:
             m.submodules.svp64 = svp64 = csd(self.svp64)
 
+        # branch predictor
+        if self.bpred_en:
+            m.submodules.bpred = csd(self.bpred)
+
         # convenience
         dmi, d_reg, d_cr, d_xer, = dbg.dmi, dbg.d_gpr, dbg.d_cr, dbg.d_xer
         intrf = self.core.regs.rf['int']
@@ -965,6 +1114,27 @@ class TestIssuerInternal(Elaboratable):
         comb += ti_rst.eq(delay != 0 | dbg.core_rst_o | ResetSignal())
         comb += core_rst.eq(ti_rst)
 
+        # DMI icache reset: invalidates the instruction cache (if there is one)
+        if hasattr(self.imem, "inval_i"):
+            comb += self.imem.inval_i.eq(dbg.icache_rst_o)
+
+        # the store buffer is drained when the core is stopped, and before
+        # a DMI memory window access (which is held off until it is empty)
+        mem_flush = dbg.core_stop_o
+        if dbg.mem_en:
+            mem_flush = mem_flush | dbg.mem_req_o
+            comb += dbg.mem_hold_i.eq(~core.l0.flushed_o)
+        comb += core.mem_flush_i.eq(mem_flush)
+        comb += self.memerr_o.eq(core.l0.memerr_o)
+
+        # the L0 line buffer is invalidated on core reset, and whenever
+        # memory may be written behind its back: DMI memory window
+        # accesses (until the last posted write is done), external writes
+        mem_inval = self.mem_inval_i | dbg.core_rst_o
+        if dbg.mem_en:
+            mem_inval = mem_inval | dbg.mem_req_o | dbg.wb.cyc
+        comb += core.mem_inval_i.eq(mem_inval)
+
         # debug clock is same as coresync, but reset is *main external*
         if self.dbg_domain != "sync":
             dbg_rst = ResetSignal(self.dbg_domain)
@@ -1075,14 +1245,14 @@ class TestIssuerInternal(Elaboratable):
                        fetch_pc_o_ready, fetch_pc_i_valid,
                        fetch_insn_o_valid, fetch_insn_i_ready)
 
-        self.issue_fsm(m, core, pc_changed, sv_changed, nia,
-                       dbg, core_rst, is_svp64_mode,
-                       fetch_pc_o_ready, fetch_pc_i_valid,
-                       fetch_insn_o_valid, fetch_insn_i_ready,
-                       pred_insn_i_valid, pred_insn_o_ready,
-                       pred_mask_o_valid, pred_mask_i_ready,
-                       exec_insn_i_valid, exec_insn_o_ready,
-                       exec_pc_o_valid, exec_pc_i_ready)
+        issue_fsm = self.issue_fsm(m, core, pc_changed, sv_changed, nia,
+                                   dbg, core_rst, is_svp64_mode,
+                                   fetch_pc_o_ready, fetch_pc_i_valid,
+                                   fetch_insn_o_valid, fetch_insn_i_ready,
+                                   pred_insn_i_valid, pred_insn_o_ready,
+                                   pred_mask_o_valid, pred_mask_i_ready,
+                                   exec_insn_i_valid, exec_insn_o_ready,
+                                   exec_pc_o_valid, exec_pc_i_ready)
 
         if self.svp64_en:
             self.fetch_predicate_fsm(m,
@@ -1101,6 +1271,16 @@ class TestIssuerInternal(Elaboratable):
         # regfiles on demand from DMI
         self.do_dmi(m, dbg)
 
+        # performance counters: Issue waiting on Fetch is a fetch stall
+        if self.pmu_en:
+            self.pmu_events(m, dbg, issue_fsm,
+                            fetch_insn_i_ready & ~fetch_insn_o_valid)
+
+        # instruction trace log, readable over DMI
+        if self.dbg.LOG_LENGTH:
+            self.trace_log(m, dbg, pc_changed, is_svp64_mode,
+                           fetch_insn_i_ready & ~fetch_insn_o_valid)
+
         # DEC and TB inc/dec FSM.  copy of DEC is put into CoreState,
         # (which uses that in PowerDecoder2 to raise 0x900 exception)
         self.tb_dec_fsm(m, cur_state.dec)
@@ -1153,6 +1333,109 @@ class TestIssuerInternal(Elaboratable):
             comb += d_xer.data.eq(self.xer_r.o_data)
             comb += d_xer.ack.eq(1)
 
+        # PMU counters are read combinatorially (zero if there is no PMU)
+        comb += dbg.d_pmu.ack.eq(dbg.d_pmu.req)
+
+    def pmu_events(self, m, dbg, issue_fsm, fetch_stall):
+        """connects up the performance counters, see soc.simple.pmu
+
+        counts cycles, instructions, fetch stalls and the cycles spent in
+        each state of the issue FSM, plus ICache, DCache, TLB and MMU
+        events if there is an ICache, DCache or MMU, and the narrow
+        datapath activity of any Function Unit that has one.
+        """
+        comb = m.d.comb
+        events = [("cycles", Const(1)),
+                  ("insn_done", self.insn_done),
+                  ("fetch_stall", fetch_stall)]
+        for state in issue_fsm.encoding:
+            events.append(("issue_" + state.lower(),
+                           issue_fsm.ongoing(state)))
+
+        icache = getattr(self.imem, "icache", None)
+        if icache is not None:
+            for name, ev in icache.events.fields.items():
+                events.append(("icache_" + name, ev))
+        lsi = getattr(self.core.l0.cmpi, "lsmem", None)
+        dcache = getattr(getattr(lsi, "lsi", None), "dcache", None)
+        if dcache is not None:
+            for name, ev in dcache.events.fields.items():
+                events.append(("dcache_" + name, ev))
+        mmu = self.core.fus.get_fu('mmu0')
+        if mmu is not None:
+            events.append(("mmu_busy", mmu.alu.mmu.busy_o))
+        # narrow datapath activity (ALU and Logical, see soc.fu.narrow)
+        for funame, fu in self.core.fus.fus.items():
+            fu_events = getattr(getattr(fu, "alu", None), "events", None)
+            if fu_events is not None:
+                for name, ev in fu_events.fields.items():
+                    events.append(("%s_%s" % (funame, name), ev))
+
+        ev_widths = {name: len(ev) for name, ev in events if len(ev) > 1}
+        m.submodules.pmu = pmu = DomainRenamer("coresync")(
+                                        PMU([name for name, ev in events],
+                                            ev_widths=ev_widths))
+        for name, ev in events:
+            comb += pmu.ev[name].eq(ev)
+        comb += pmu.idx_i.eq(dbg.d_pmu.addr)
+        comb += pmu.clear_i.eq(dbg.pmu_clear_o)
+        comb += pmu.freeze_i.eq(dbg.pmu_freeze_o)
+        comb += dbg.d_pmu.data.eq(pmu.data_o)
+
+    def trace_log(self, m, dbg, pc_changed, is_svp64_mode, fetch_stall):
+        """writes an entry into the CoreDebug log for every instruction
+
+        the log is read over DMI (DBGCore.LOG_ADDR and LOG_DATA), four
+        64-bit dwords per entry.  each 256-bit entry is:
+
+        * [0:64]    PC of the instruction
+        * [64:96]   instruction (for SVP64, the suffix)
+        * [96:128]  cycle counter, at completion
+        * [128:144] cycles since the previous entry (saturating)
+        * [144:160] fetch stall cycles since the previous entry (saturating)
+        * [160]     PC was changed (branch taken, or trap)
+        * [161]     an exception was raised by a Function Unit
+        * [162]     SVP64 mode
+        """
+        comb, sync = m.d.comb, m.d.sync
+        core = self.core
+
+        timestamp = Signal(32)
+        delta = Signal(16)
+        stalls = Signal(16)
+        exc_seen = Signal()
+        sync += timestamp.eq(timestamp + 1)
+
+        exc_happened = Signal()
+        el = [exc.happened for exc in core.fus.excs.values()]
+        if len(el) > 0:
+            comb += exc_happened.eq(Cat(*el).bool())
+
+        # the counts and exception flag start again after each entry
+        with m.If(self.insn_done):
+            sync += delta.eq(1)
+            sync += stalls.eq(fetch_stall)
+            sync += exc_seen.eq(0)
+        with m.Else():
+            with m.If(delta != 0xffff):
+                sync += delta.eq(delta + 1)
+            with m.If(fetch_stall & (stalls != 0xffff)):
+                sync += stalls.eq(stalls + 1)
+            with m.If(exc_happened):
+                sync += exc_seen.eq(1)
+
+        nia_wen = Signal()
+        comb += nia_wen.eq(self.state_nia.wen & (1<<StateRegs.PC))
+        comb += dbg.log_wen_i.eq(self.insn_done)
+        comb += dbg.log_data_i.eq(Cat(self.cur_state.pc,           # 0:64
+                                      core.raw_insn_i,             # 64:96
+                                      timestamp,                   # 96:128
+                                      delta,                       # 128:144
+                                      stalls,                      # 144:160
+                                      pc_changed | nia_wen,        # 160
+                                      exc_seen | exc_happened,     # 161
+                                      is_svp64_mode))              # 162
+
     def tb_dec_fsm(self, m, spr_dec):
         """tb_dec_fsm
 
@@ -1209,6 +1492,7 @@ class TestIssuerInternal(Elaboratable):
         yield from self.pc_i.ports()
         yield self.pc_o
         yield self.memerr_o
+        yield self.mem_inval_i
         yield from self.core.ports()
         yield from self.imem.ports()
         yield self.core_bigendian_i
@@ -1220,6 +1504,7 @@ class TestIssuerInternal(Elaboratable):
     def external_ports(self):
         ports = self.pc_i.ports()
         ports += [self.pc_o, self.memerr_o, self.core_bigendian_i, self.busy_o,
+                  self.mem_inval_i,
                 ]
 
         if self.jtag_en:
@@ -1230,6 +1515,8 @@ class TestIssuerInternal(Elaboratable):
 
         ports += list(self.imem.ibus.fields.values())
         ports += list(self.core.l0.cmpi.wb_bus().fields.values())
+        if self.dbg.mem_en:
+            ports += list(self.dbg.wb.fields.values())
 
         if self.sram4x4k:
             for sram in self.sram4k:
@@ -1356,6 +1643,7 @@ if __name__ == '__main__':
     vl = main(dut, ports=dut.ports(), name="test_issuer")
 
     if len(sys.argv) == 1:
-        vl = rtlil.convert(dut, ports=dut.external_ports(), name="test_issuer")
+        vl = cached_convert(lambda: dut, pspec, name="test_issuer",
+                            ports=lambda dut: dut.external_ports())
         with open("test_issuer.il", "w") as f:
             f.write(vl)
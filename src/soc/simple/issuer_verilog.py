@@ -2,10 +2,10 @@
 """
 
 import argparse
-from nmigen.cli import verilog
 
 from soc.config.test.test_loadstore import TestMemPspec
 from soc.simple.issuer import TestIssuer
+from soc.config.elabcache import cached_convert
 
 
 if __name__ == '__main__':
@@ -58,6 +58,108 @@ if __name__ == '__main__':
     parser.add_argument("--disable-svp64", dest='svp64', action="store_false",
                         help="disable SVP64",
                         default=False)
+    parser.add_argument("--enable-prefetch", dest='prefetch',
+                        action="store_true",
+                        help="Enable instruction prefetch (pipelined fetch)",
+                        default=False)
+    parser.add_argument("--disable-prefetch", dest='prefetch',
+                        action="store_false",
+                        help="disable instruction prefetch",
+                        default=False)
+    parser.add_argument("--enable-overlap", dest='allow_overlap',
+                        action="store_true",
+                        help="Enable hazard-tracked overlapping of FUs",
+                        default=False)
+    parser.add_argument("--disable-overlap", dest='allow_overlap',
+                        action="store_false",
+                        help="disable overlapping of FUs",
+                        default=False)
+    parser.add_argument("--enable-rs", dest='reservation_stations',
+                        action="store_true",
+                        help="Enable Reservation Stations in front of "
+                             "the MUL (and pipelined DIV) pipelines",
+                        default=False)
+    parser.add_argument("--disable-rs", dest='reservation_stations',
+                        action="store_false",
+                        help="disable Reservation Stations",
+                        default=False)
+    parser.add_argument("--mul-units", type=int, default=1,
+                        help="Number of MUL Function Units (Reservation "
+                             "Stations, with --enable-rs) [default 1]")
+    parser.add_argument("--dcache-line-size", type=int, default=None,
+                        help="DCache line size in bytes [default 64]")
+    parser.add_argument("--dcache-num-lines", type=int, default=None,
+                        help="DCache number of lines per set [default 16]")
+    parser.add_argument("--dcache-num-ways", type=int, default=None,
+                        help="DCache number of ways [default 4]")
+    parser.add_argument("--dcache-num-mshrs", type=int, default=None,
+                        help="DCache MSHRs, for non-blocking load misses "
+                             "[default 0]")
+    parser.add_argument("--store-buffer-depth", type=int, default=None,
+                        help="Store buffer entries, 0 or none to disable "
+                             "[default none]")
+    parser.add_argument("--l0-num-lines", type=int, default=None,
+                        help="L0 line buffer lines, 0 or none to disable "
+                             "[default none]")
+    parser.add_argument("--enable-divpipe", dest='div_pipe',
+                        action="store_true",
+                        help="Enable the pipelined divider (not the FSM)",
+                        default=False)
+    parser.add_argument("--disable-divpipe", dest='div_pipe',
+                        action="store_false",
+                        help="disable the pipelined divider (use the FSM)",
+                        default=False)
+    parser.add_argument("--div-log2-radix", type=int, default=None,
+                        help="Pipelined divider quotient bits per stage "
+                             "[default 1]")
+    parser.add_argument("--div-steps-per-stage", type=int, default=None,
+                        help="Pipelined divider calculate stages per "
+                             "pipeline register [default 4]")
+    parser.add_argument("--enable-narrow", dest='narrow_datapath',
+                        action="store_true",
+                        help="Enable the narrow (32-bit operand) ALU and "
+                             "Logical datapath",
+                        default=False)
+    parser.add_argument("--disable-narrow", dest='narrow_datapath',
+                        action="store_false",
+                        help="disable the narrow ALU and Logical datapath",
+                        default=False)
+    parser.add_argument("--enable-bpred", dest='branch_predict',
+                        action="store_true",
+                        help="Enable branch prediction (implies prefetch)",
+                        default=False)
+    parser.add_argument("--disable-bpred", dest='branch_predict',
+                        action="store_false",
+                        help="disable branch prediction",
+                        default=False)
+    parser.add_argument("--enable-icache", dest='icache',
+                        action="store_true",
+                        help="Enable instruction cache",
+                        default=False)
+    parser.add_argument("--disable-icache", dest='icache',
+                        action="store_false",
+                        help="disable instruction cache",
+                        default=False)
+    parser.add_argument("--enable-pmu", dest='pmu',
+                        action="store_true",
+                        help="Enable performance counters (over DMI)",
+                        default=False)
+    parser.add_argument("--disable-pmu", dest='pmu',
+                        action="store_false",
+                        help="disable performance counters",
+                        default=False)
+    parser.add_argument("--enable-dmi-mem", dest='dmi_mem',
+                        action="store_true",
+                        help="Enable DMI memory window (firmware upload)",
+                        default=False)
+    parser.add_argument("--disable-dmi-mem", dest='dmi_mem',
+                        action="store_false",
+                        help="disable DMI memory window",
+                        default=False)
+    parser.add_argument("--debug-log-length", type=int, default=None,
+                        help="Instruction trace log entries (over DMI), "
+                             "a power of 2, 0 or none to disable "
+                             "[default none]")
 
     args = parser.parse_args()
 
@@ -68,7 +170,7 @@ if __name__ == '__main__':
              'logical': 1,
              'spr': 1,
              'div': 1,
-             'mul': 1,
+             'mul': args.mul_units,
              'shiftrot': 1
             }
     if args.mmu:
@@ -79,7 +181,10 @@ if __name__ == '__main__':
         ldst_ifacetype = 'mmu_cache_wb'
     else:
         ldst_ifacetype = 'bare_wb'
-    imem_ifacetype = 'bare_wb'
+    if args.icache:
+        imem_ifacetype = 'cache_wb'
+    else:
+        imem_ifacetype = 'bare_wb'
 
     pspec = TestMemPspec(ldst_ifacetype=ldst_ifacetype,
                          imem_ifacetype=imem_ifacetype,
@@ -100,6 +205,27 @@ if __name__ == '__main__':
                          debug=args.debug,      # set to jtag or dmi
                          svp64=args.svp64,      # enable SVP64
                          mmu=args.mmu,          # enable MMU
+                         prefetch=args.prefetch, # pipelined fetch
+                         allow_overlap=args.allow_overlap, # FU overlap
+                         # MUL/DIV pipelines shared by several FUs
+                         reservation_stations=args.reservation_stations,
+                         branch_predict=args.branch_predict, # static+BTB
+                         pmu=args.pmu,          # performance counters
+                         debug_log_length=args.debug_log_length, # trace
+                         dmi_mem=args.dmi_mem,  # DMI wishbone master
+                         # DCache geometry (None: use defaults)
+                         dcache_line_size=args.dcache_line_size,
+                         dcache_num_lines=args.dcache_num_lines,
+                         dcache_num_ways=args.dcache_num_ways,
+                         dcache_num_mshrs=args.dcache_num_mshrs,
+                         store_buffer_depth=args.store_buffer_depth,
+                         l0_num_lines=args.l0_num_lines,
+                         # pipelined divider (None: use defaults)
+                         div_pipe=args.div_pipe,
+                         div_log2_radix=args.div_log2_radix,
+                         div_steps_per_stage=args.div_steps_per_stage,
+                         # gated upper half for narrow ALU/Logical ops
+                         narrow_datapath=args.narrow_datapath,
                          units=units)
 
     print("mmu", pspec.__dict__["mmu"])
@@ -111,9 +237,19 @@ if __name__ == '__main__':
     print("use_pll", pspec.__dict__["use_pll"])
     print("debug", pspec.__dict__["debug"])
     print("SVP64", pspec.__dict__["svp64"])
+    print("prefetch", pspec.__dict__["prefetch"])
+    print("allow_overlap", pspec.__dict__["allow_overlap"])
+    print("reservation_stations", pspec.__dict__["reservation_stations"])
+    print("branch_predict", pspec.__dict__["branch_predict"])
+    print("pmu", pspec.__dict__["pmu"])
+    print("debug_log_length", pspec.__dict__["debug_log_length"])
+    print("dmi_mem", pspec.__dict__["dmi_mem"])
+    print("div_pipe", pspec.__dict__["div_pipe"])
+    print("narrow_datapath", pspec.__dict__["narrow_datapath"])
+    print("imem_ifacetype", pspec.__dict__["imem_ifacetype"])
 
-    dut = TestIssuer(pspec)
-
-    vl = verilog.convert(dut, ports=dut.external_ports(), name="test_issuer")
+    vl = cached_convert(lambda: TestIssuer(pspec), pspec, name="test_issuer",
+                        kind="verilog",
+                        ports=lambda dut: dut.external_ports())
     with open(args.output_filename, "w") as f:
         f.write(vl)
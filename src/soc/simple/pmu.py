@@ -0,0 +1,83 @@
+"""Performance Monitor Unit: a bank of free-running event counters
+
+counts cycles, instructions, stalls and cache/TLB events in TestIssuer,
+so that IPC, miss rates and stall reasons can be measured on silicon
+(or in litex simulation) without a VCD dump.
+
+* each event is a single-bit Signal (ev[name]), counted every cycle
+  that it is set.  the list of events is decided by the parent, which
+  wires up whatever it has (the ICache, DCache and MMU are optional).
+* an event may instead be wider (ev_widths), e.g. a number of bits that
+  toggled: its value is added every cycle.
+* one counter is read at a time: idx_i selects it, data_o is the count
+  (combinatorial).  names[idx] gives the event of counter idx.
+* clear_i zeros all counters, freeze_i stops them counting.
+
+in TestIssuer this is accessed over DMI, see soc.debug.dmi DBGCore.PMU_IDX
+and DBGCore.PMU_DATA.
+"""
+
+from nmigen import Elaboratable, Module, Signal, Array
+from nmigen.cli import rtlil
+
+
+class PMU(Elaboratable):
+    """PMU
+
+    * :names: list of event names, in counter index order
+    * :width: width of the counters
+    * :ev_widths: optional dict of the widths of any multi-bit events
+    """
+    def __init__(self, names, width=64, ev_widths=None):
+        assert len(set(names)) == len(names), "duplicate PMU event"
+        self.names = list(names)
+        self.width = width
+        self.ev_widths = ev_widths or {}
+        self.ev = {}
+        for name in self.names:
+            self.ev[name] = Signal(self.ev_widths.get(name, 1),
+                                   name="ev_"+name)
+
+        self.idx_i = Signal(7)            # counter select (DbgReg.addr)
+        self.data_o = Signal(width)       # selected counter
+        self.clear_i = Signal()           # zero all counters
+        self.freeze_i = Signal()          # stop counting
+
+    def elaborate(self, platform):
+        m = Module()
+        comb, sync = m.d.comb, m.d.sync
+
+        counters = Array(Signal(self.width, name="pmc_"+name, reset_less=True)
+                         for name in self.names)
+        for i, name in enumerate(self.names):
+            with m.If(self.clear_i):
+                sync += counters[i].eq(0)
+            if len(self.ev[name]) > 1: # multi-bit: add the value
+                with m.Elif(~self.freeze_i):
+                    sync += counters[i].eq(counters[i] + self.ev[name])
+            else:
+                with m.Elif(self.ev[name] & ~self.freeze_i):
+                    sync += counters[i].eq(counters[i] + 1)
+
+        # out-of-range reads return zero
+        with m.If(self.idx_i < len(self.names)):
+            comb += self.data_o.eq(counters[self.idx_i])
+
+        return m
+
+    def __iter__(self):
+        yield from self.ev.values()
+        yield self.idx_i
+        yield self.data_o
+        yield self.clear_i
+        yield self.freeze_i
+
+    def ports(self):
+        return list(self)
+
+
+if __name__ == '__main__':
+    dut = PMU(["cycles", "insn_done"])
+    vl = rtlil.convert(dut, ports=dut.ports())
+    with open("test_pmu.il", "w") as f:
+        f.write(vl)
@@ -0,0 +1,132 @@
+"""test of the static branch predictor and BTB
+"""
+
+import unittest
+from nmigen import Module
+from nmigen.back.pysim import Simulator, Settle
+from soc.config.waves import write_vcd
+
+from soc.simple.bpred import BranchPredictor
+
+
+def b_insn(offs, aa=0, lk=0):
+    return (18 << 26) | (offs & 0x3fffffc) | (aa << 1) | lk
+
+
+def bc_insn(bo, bi, offs, aa=0, lk=0):
+    return (16 << 26) | (bo << 21) | (bi << 16) | (offs & 0xfffc) | \
+           (aa << 1) | lk
+
+
+def bclr_insn(bo, bi, lk=0):
+    return (19 << 26) | (bo << 21) | (bi << 16) | (16 << 1) | lk
+
+
+def predict(dut, pc, insn):
+    yield dut.pc_i.eq(pc)
+    yield dut.insn_i.eq(insn)
+    yield Settle()
+    taken = yield dut.taken_o
+    nia = yield dut.nia_o
+    return taken, nia
+
+
+def update(dut, pc, taken, nia):
+    yield dut.upd_pc_i.eq(pc)
+    yield dut.upd_taken_i.eq(taken)
+    yield dut.upd_nia_i.eq(nia)
+    yield dut.upd_i.eq(1)
+    yield
+    yield dut.upd_i.eq(0)
+    yield
+
+
+class TestBranchPredictor(unittest.TestCase):
+
+    def run_tst(self, dut, process, name):
+        m = Module()
+        m.submodules.dut = dut
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(process)
+        with write_vcd(sim, "%s.vcd" % name):
+            sim.run()
+
+    def test_static(self):
+        dut = BranchPredictor(n_entries=4)
+
+        def process():
+            # b is always taken, relative and absolute
+            taken, nia = yield from predict(dut, 0x100, b_insn(0x20))
+            self.assertEqual((taken, nia), (1, 0x120))
+            taken, nia = yield from predict(dut, 0x100, b_insn(-0x20))
+            self.assertEqual((taken, nia), (1, 0xe0))
+            taken, nia = yield from predict(dut, 0x100, b_insn(0x40, aa=1))
+            self.assertEqual((taken, nia), (1, 0x40))
+            # bdnz: backward taken, forward not taken
+            taken, nia = yield from predict(dut, 0x200, bc_insn(16, 0, -8))
+            self.assertEqual((taken, nia), (1, 0x1f8))
+            taken, nia = yield from predict(dut, 0x200, bc_insn(16, 0, 8))
+            self.assertEqual(taken, 0)
+            # bc "branch always" forward is taken
+            taken, nia = yield from predict(dut, 0x200, bc_insn(20, 0, 8))
+            self.assertEqual((taken, nia), (1, 0x208))
+            # "at" hint: forward but "likely taken" (001at, at=0b11)
+            taken, nia = yield from predict(dut, 0x200,
+                                            bc_insn(0b00111, 2, 8))
+            self.assertEqual(taken, 1)
+            # "at" hint: backward but "unlikely" (011at, at=0b10)
+            taken, nia = yield from predict(dut, 0x200,
+                                            bc_insn(0b01110, 2, -8))
+            self.assertEqual(taken, 0)
+            # not a branch (addi)
+            taken, nia = yield from predict(dut, 0x200, 0x38210001)
+            self.assertEqual(taken, 0)
+
+        self.run_tst(dut, process, "test_bpred_static")
+
+    def test_btb(self):
+        dut = BranchPredictor(n_entries=4)
+
+        def process():
+            # blr: no BTB entry, no prediction
+            taken, nia = yield from predict(dut, 0x300, bclr_insn(20, 0))
+            self.assertEqual(taken, 0)
+            # branch unit reports it taken: BTB now has the target
+            yield from update(dut, 0x300, 1, 0x1234)
+            taken, nia = yield from predict(dut, 0x300, bclr_insn(20, 0))
+            self.assertEqual((taken, nia), (1, 0x1234))
+            # different PC with the same index does not alias
+            taken, nia = yield from predict(dut, 0x310, bclr_insn(20, 0))
+            self.assertEqual(taken, 0)
+            # not taken: entry dropped
+            yield from update(dut, 0x300, 0, 0)
+            taken, nia = yield from predict(dut, 0x300, bclr_insn(20, 0))
+            self.assertEqual(taken, 0)
+
+        self.run_tst(dut, process, "test_bpred_btb")
+
+    def test_bimodal(self):
+        dut = BranchPredictor(n_entries=4, bimodal=True)
+
+        def process():
+            insn = bc_insn(16, 0, -8) # bdnz backwards
+            taken, nia = yield from predict(dut, 0x400, insn)
+            self.assertEqual(taken, 1) # static
+            yield from update(dut, 0x400, 1, 0x3f8) # weakly taken
+            taken, nia = yield from predict(dut, 0x400, insn)
+            self.assertEqual((taken, nia), (1, 0x3f8))
+            yield from update(dut, 0x400, 0, 0) # weakly not-taken
+            taken, nia = yield from predict(dut, 0x400, insn)
+            self.assertEqual(taken, 0)
+            yield from update(dut, 0x400, 1, 0x3f8)
+            yield from update(dut, 0x400, 1, 0x3f8) # strongly taken
+            yield from update(dut, 0x400, 0, 0)
+            taken, nia = yield from predict(dut, 0x400, insn)
+            self.assertEqual(taken, 1)
+
+        self.run_tst(dut, process, "test_bpred_bimodal")
+
+
+if __name__ == '__main__':
+    unittest.main()
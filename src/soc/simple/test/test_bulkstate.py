@@ -0,0 +1,62 @@
+"""test of bulk state reads: the same values as a yield per signal, both
+with direct engine access and with the fallback, and the dirty tracking
+"""
+
+import unittest
+
+from nmigen import Module, Memory
+from nmutil.sim_tmp_alternative import Simulator, Settle
+from nmutil.util import wrap
+
+from soc.regfile.regfiles import IntRegs, CRRegs
+from soc.simple.bulkstate import BulkState
+
+
+class TestBulkState(unittest.TestCase):
+
+    def run_sim(self, process):
+        m = Module()
+        m.submodules.intregs = intregs = IntRegs()
+        m.submodules.cr = cr = CRRegs()
+        mem = Memory(width=64, depth=16)
+        m.submodules.wr = wr = mem.write_port()
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(wrap(process(sim, intregs, cr, mem)))
+        sim.run()
+
+    def test_read(self):
+        def process(sim, intregs, cr, mem):
+            yield
+            for i in range(32):
+                yield intregs.memory._array[i].eq(i * 0x1001)
+            for i in range(8):
+                yield cr.regs[i].reg.eq(i ^ 5)
+            for i in range(16):
+                yield mem._array[i].eq(0xf00 + i)
+            yield Settle()
+            expected = []
+            for i in range(32):
+                expected.append((yield intregs.memory._array[i]))
+            for bulk in (BulkState(sim), BulkState()):
+                self.assertEqual((yield from bulk.read_regfile(intregs)),
+                                 expected)
+                self.assertEqual((yield from bulk.read_regfile(cr)),
+                                 [i ^ 5 for i in range(8)])
+                self.assertEqual((yield from bulk.read_memory(mem, 4, 3)),
+                                 [0xf04, 0xf05, 0xf06])
+            self.assertIsNotNone(BulkState(sim).state)
+        self.run_sim(process)
+
+    def test_dirty(self):
+        bulk = BulkState()
+        self.assertEqual(bulk.dirty("r", [1, 2, 3], [1, 2, 3]), [0, 1, 2])
+        self.assertEqual(bulk.dirty("r", [1, 2, 3], [1, 2, 3]), [])
+        # a change on either side is checked
+        self.assertEqual(bulk.dirty("r", [1, 5, 3], [1, 2, 4]), [1, 2])
+        bulk.forget()
+        self.assertEqual(bulk.dirty("r", [1, 5, 3], [1, 2, 4]), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""test of simulation checkpoints: save part-way through one simulation,
+restore into a freshly elaborated one, and check that both carry on the
+same.
+"""
+
+import os
+import tempfile
+import unittest
+
+from nmigen import Elaboratable, Module, Signal, Memory, Fragment
+from nmutil.sim_tmp_alternative import Simulator, Settle
+from soc.config.waves import write_vcd
+from nmutil.util import wrap
+
+from soc.experiment.cache_ram import CacheRam
+from soc.regfile.regfiles import StateRegs, IntRegs
+from soc.simple.checkpoint import (SimCheckpoint, write_checkpoint,
+                                   read_checkpoint)
+
+
+class Toy(Elaboratable):
+    """a counter, an FSM, a Memory, a CacheRam and two regfiles"""
+    def __init__(self):
+        self.mem = Memory(width=16, depth=8)
+        self.state = StateRegs()
+        self.intregs = IntRegs()
+        self.o = Signal(16)
+        self.fsm_o = Signal(2)
+
+    def elaborate(self, platform):
+        m = Module()
+        comb, sync = m.d.comb, m.d.sync
+        m.submodules.state = self.state
+        m.submodules.intregs = self.intregs
+        m.submodules.wr = wr = self.mem.write_port()
+        m.submodules.rd = rd = self.mem.read_port()
+        m.submodules.cram = cram = CacheRam(ROW_BITS=3, WIDTH=16,
+                                            TRACE=False)
+
+        count = Signal(16)
+        sync += count.eq(count + 3)
+        comb += rd.addr.eq(count[1:4])
+        comb += cram.rd_en.eq(1)
+        comb += cram.rd_addr.eq(count[2:5])
+
+        with m.FSM():
+            with m.State("A"):
+                comb += self.fsm_o.eq(0)
+                with m.If(count[0]):
+                    m.next = "B"
+            with m.State("B"):
+                comb += self.fsm_o.eq(1)
+                comb += wr.addr.eq(count[0:3])
+                comb += wr.data.eq(count * 5)
+                comb += wr.en.eq(1)
+                m.next = "C"
+            with m.State("C"):
+                comb += self.fsm_o.eq(2)
+                comb += cram.wr_addr.eq(count[0:3])
+                comb += cram.wr_data.eq(count ^ 0x5a5a)
+                comb += cram.wr_sel.eq(0b11)
+                with m.If(count[2]):
+                    m.next = "A"
+
+        comb += self.o.eq(rd.data ^ cram.rd_data_o ^ count)
+        return m
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def run_sim(self, process, name):
+        dut = Toy()
+        frag = Fragment.get(dut, None)
+        ckpt = SimCheckpoint(frag)
+        sim = Simulator(frag)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(wrap(process(dut, ckpt)))
+        with write_vcd(sim, "test_checkpoint_%s.vcd" % name):
+            sim.run()
+
+    def trace(self, dut, n):
+        res = []
+        for i in range(n):
+            yield Settle()
+            res.append(((yield dut.o), (yield dut.fsm_o)))
+            yield
+        return res
+
+    def test_save_restore(self):
+        fd, fname = tempfile.mkstemp(suffix=".ckpt")
+        os.close(fd)
+        results = {}
+
+        def first(dut, ckpt):
+            for i in range(13):
+                yield
+            # "direct" regfile writes, as setup_regs does
+            yield dut.state.regs[StateRegs.MSR].reg.eq(0x8000000000000001)
+            yield dut.intregs.memory._array[5].eq(0x1234)
+            state = yield from ckpt.save()
+            write_checkpoint(fname, state)
+            results['first'] = yield from self.trace(dut, 40)
+
+        def second(dut, ckpt):
+            yield from ckpt.restore(read_checkpoint(fname))
+            msr = yield dut.state.regs[StateRegs.MSR].reg
+            self.assertEqual(msr, 0x8000000000000001)
+            self.assertEqual((yield dut.intregs.memory._array[5]), 0x1234)
+            results['second'] = yield from self.trace(dut, 40)
+
+        try:
+            self.run_sim(first, "save")
+            self.run_sim(second, "restore")
+        finally:
+            os.unlink(fname)
+
+        self.assertEqual(results['first'], results['second'])
+        # and the checkpoint did matter: from reset it runs differently
+        def from_reset(dut, ckpt):
+            results['reset'] = yield from self.trace(dut, 40)
+        self.run_sim(from_reset, "reset")
+        self.assertNotEqual(results['first'], results['reset'])
+
+    def test_mismatch(self):
+        def process(dut, ckpt):
+            with self.assertRaises(KeyError):
+                yield from ckpt.restore({"top.nonexistent": 1})
+        self.run_sim(process, "mismatch")
+
+
+if __name__ == '__main__':
+    unittest.main()
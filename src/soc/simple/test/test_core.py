@@ -6,8 +6,10 @@ related bugs:
 """
 from nmigen import Module, Signal, Cat
 from nmigen.back.pysim import Simulator, Delay, Settle
+from soc.config.waves import write_vcd, parse_vcd_args
 from nmutil.formaltest import FHDLTestCase
 from nmigen.cli import rtlil
+import logging
 import unittest
 from openpower.decoder.isa.caller import special_sprs
 from openpower.decoder.power_decoder import create_pdecode
@@ -23,6 +25,7 @@ from soc.config.test.test_loadstore import TestMemPspec
 from openpower.endian import bigendian
 
 from soc.simple.core import NonProductionCore
+from soc.simple.bulkstate import BulkState
 from soc.experiment.compalu_multi import find_ok  # hack
 
 from soc.fu.compunits.test.test_compunit import (setup_tst_memory,
@@ -36,6 +39,9 @@ from soc.fu.cr.test.test_pipe_caller import CRTestCase
 from soc.fu.branch.test.test_pipe_caller import BranchTestCase
 from soc.fu.ldst.test.test_pipe_caller import LDSTTestCase
 from openpower.util import spr_to_fast_reg
+from soc.config.simlog import get_logger
+
+log = get_logger("test_core")
 
 # list of SPRs that are controlled and managed by the MMU
 mmu_sprs = ["PRTBL", "DSISR", "DAR", "PIDR"]
@@ -47,7 +53,7 @@ def set_mmu_spr(name, i, val, core): #important keep pep8 formatting
         yield fsm.mmu.l_in.rs.eq(val)
         yield
         yield fsm.mmu.l_in.mtspr.eq(0)
-        print("mmu_spr was updated")
+        log.debug("mmu_spr was updated")
 
 def setup_regs(pdecode2, core, test):
 
@@ -64,18 +70,18 @@ def setup_regs(pdecode2, core, test):
     cr = test.cr
     crregs = core.regs.cr
     #cr = int('{:32b}'.format(cr)[::-1], 2)
-    print("setup cr reg", hex(cr))
+    log.debug("setup cr reg %s", hex(cr))
     for i in range(8):
         #j = 7-i
         cri = (cr >> (i*4)) & 0xf
         #cri = int('{:04b}'.format(cri)[::-1], 2)
-        print("setup cr reg", hex(cri), i,
-              crregs.regs[i].reg.shape())
+        log.debug("setup cr reg %s %s %s", hex(cri), i,
+                  crregs.regs[i].reg.shape())
         yield crregs.regs[i].reg.eq(cri)
 
     # set up XER.  "direct" write (bypass rd/write ports)
     xregs = core.regs.xer
-    print("setup sprs", test.sprs)
+    log.debug("setup sprs %s", test.sprs)
     xer = None
     if 'XER' in test.sprs:
         xer = test.sprs['XER']
@@ -92,8 +98,8 @@ def setup_regs(pdecode2, core, test):
         ovbit = xer[XER_bits['OV']].value
         ov32bit = xer[XER_bits['OV32']].value
         yield xregs.regs[xregs.OV].reg.eq(Cat(ovbit, ov32bit))
-        print("setting XER so %d ca %d ca32 %d ov %d ov32 %d" %
-              (sobit, cabit, ca32bit, ovbit, ov32bit))
+        log.debug("setting XER so %d ca %d ca32 %d ov %d ov32 %d", sobit,
+                  cabit, ca32bit, ovbit, ov32bit)
     else:
         yield xregs.regs[xregs.SO].reg.eq(0)
         yield xregs.regs[xregs.OV].reg.eq(0)
@@ -115,15 +121,14 @@ def setup_regs(pdecode2, core, test):
             # match behaviour of SPRMap in power_decoder2.py
             for i, x in enumerate(SPR):
                 if sprname == x.name:
-                    print("setting slow SPR %d (%s) to %x" %
-                          (i, sprname, val))
+                    log.debug("setting slow SPR %d (%s) to %x", i, sprname,
+                              val)
                     if not sprname in mmu_sprs:
                         yield sregs.memory._array[i].eq(val)
                     else:
                         yield from set_mmu_spr(sprname, i, val, core)
         else:
-            print("setting fast reg %d (%s) to %x" %
-                  (fast, sprname, val))
+            log.debug("setting fast reg %d (%s) to %x", fast, sprname, val)
             if fregs.unary:
                 rval = fregs.int.regs[fast].reg
             else:
@@ -140,47 +145,47 @@ def setup_regs(pdecode2, core, test):
     oe = yield pdecode2.e.do.oe.oe
     oe_ok = yield pdecode2.e.do.oe.oe_ok
 
-    print("before: so/ov-32/ca-32", so, bin(ov), bin(ca))
-    print("oe:", oe, oe_ok)
+    log.debug("before: so/ov-32/ca-32 %s %s %s", so, bin(ov), bin(ca))
+    log.debug("oe: %s %s", oe, oe_ok)
+
 
+def check_regs(dut, sim, core, test, code, bulk=None):
+    """compares the regfiles and PC against ISACaller (sim).  with a
+    BulkState (bulk) the regfiles are read in one go, and only int regs
+    changed since the last check are compared.
+    """
+    if bulk is None:
+        bulk = BulkState()
 
-def check_regs(dut, sim, core, test, code):
     # int regs
-    intregs = []
-    for i in range(32):
-        if core.regs.int.unary:
-            rval = yield core.regs.int.regs[i].reg
-        else:
-            rval = yield core.regs.int.memory._array[i]
-        intregs.append(rval)
-    print("int regs", list(map(hex, intregs)))
-    for i in range(32):
-        simregval = sim.gpr[i].asint()
-        dut.assertEqual(simregval, intregs[i],
+    intregs = yield from bulk.read_regfile(core.regs.int)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("int regs %s", list(map(hex, intregs)))
+    simregs = [sim.gpr[i].asint() for i in range(32)]
+    for i in bulk.dirty("int", intregs, simregs):
+        dut.assertEqual(simregs[i], intregs[i],
                         "int reg %d not equal %s. got %x expected %x" % \
-                            (i, repr(code), simregval, intregs[i]))
+                            (i, repr(code), simregs[i], intregs[i]))
 
     # CRs
-    crregs = []
-    for i in range(8):
-        rval = yield core.regs.cr.regs[i].reg
-        crregs.append(rval)
-    print("cr regs", list(map(hex, crregs)))
+    crregs = yield from bulk.read_regfile(core.regs.cr)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("cr regs %s", list(map(hex, crregs)))
     for i in range(8):
         rval = crregs[i]
         cri = sim.crl[7-i].get_range().value
-        print("cr reg", i, hex(cri), i, hex(rval))
+        log.debug("cr reg %s %s %s %s", i, hex(cri), i, hex(rval))
         # XXX https://bugs.libre-soc.org/show_bug.cgi?id=363
         dut.assertEqual(cri, rval,
                         "cr reg %d not equal %s" % (i, repr(code)))
 
     # XER
     xregs = core.regs.xer
-    so = yield xregs.regs[xregs.SO].reg
-    ov = yield xregs.regs[xregs.OV].reg
-    ca = yield xregs.regs[xregs.CA].reg
+    so, ov, ca = yield from bulk.read([xregs.regs[xregs.SO].reg,
+                                       xregs.regs[xregs.OV].reg,
+                                       xregs.regs[xregs.CA].reg])
 
-    print("sim SO", sim.spr['XER'][XER_bits['SO']])
+    log.debug("sim SO %s", sim.spr['XER'][XER_bits['SO']])
     e_so = sim.spr['XER'][XER_bits['SO']].value
     e_ov = sim.spr['XER'][XER_bits['OV']].value
     e_ov32 = sim.spr['XER'][XER_bits['OV32']].value
@@ -190,7 +195,7 @@ def check_regs(dut, sim, core, test, code):
     e_ov = e_ov | (e_ov32 << 1)
     e_ca = e_ca | (e_ca32 << 1)
 
-    print("after: so/ov-32/ca-32", so, bin(ov), bin(ca))
+    log.debug("after: so/ov-32/ca-32 %s %s %s", so, bin(ov), bin(ca))
     dut.assertEqual(e_so, so, "so mismatch %s" % (repr(code)))
     dut.assertEqual(e_ov, ov, "ov mismatch %s" % (repr(code)))
     dut.assertEqual(e_ca, ca, "ca mismatch %s" % (repr(code)))
@@ -207,9 +212,9 @@ def wait_for_busy_hi(cu):
         busy_o = yield cu.busy_o
         terminate_o = yield cu.core_terminate_o
         if busy_o:
-            print("busy/terminate:", busy_o, terminate_o)
+            log.debug("busy/terminate: %s %s", busy_o, terminate_o)
             break
-        print("!busy", busy_o, terminate_o)
+        log.debug("!busy %s %s", busy_o, terminate_o)
         yield
 
 
@@ -225,9 +230,9 @@ def wait_for_busy_clear(cu):
         busy_o = yield cu.busy_o
         terminate_o = yield cu.core_terminate_o
         if not busy_o:
-            print("busy/terminate:", busy_o, terminate_o)
+            log.debug("busy/terminate: %s %s", busy_o, terminate_o)
             break
-        print("busy",)
+        log.debug("busy")
         yield
 
 
@@ -263,13 +268,14 @@ class TestRunner(FHDLTestCase):
         # nmigen Simulation
         sim = Simulator(m)
         sim.add_clock(1e-6)
+        bulk = BulkState(sim)
 
         def process():
             yield core.issue_i.eq(0)
             yield
 
             for test in self.test_data:
-                print(test.name)
+                log.info("%s", test.name)
                 program = test.program
                 self.subTest(test.name)
                 sim = ISA(pdecode2, test.regs, test.sprs, test.cr, test.mem,
@@ -285,8 +291,8 @@ class TestRunner(FHDLTestCase):
                 while index < len(instructions):
                     ins, code = instructions[index]
 
-                    print("instruction: 0x{:X}".format(ins & 0xffffffff))
-                    print(code)
+                    log.debug("instruction: 0x%X", ins & 0xffffffff)
+                    log.debug("%s", code)
 
                     # ask the decoder to decode this binary data (endian'd)
                     yield core.bigendian_i.eq(bigendian)  # little / big?
@@ -305,25 +311,26 @@ class TestRunner(FHDLTestCase):
                     yield ivalid_i.eq(0)
                     yield
 
-                    print("sim", code)
+                    log.debug("sim %s", code)
                     # call simulated operation
                     opname = code.split(' ')[0]
                     yield from sim.call(opname)
                     index = sim.pc.CIA.value//4
 
                     # register check
-                    yield from check_regs(self, sim, core, test, code)
+                    yield from check_regs(self, sim, core, test, code, bulk)
 
                     # Memory check
-                    yield from check_sim_memory(self, l0, sim, code)
+                    yield from check_sim_memory(self, l0, sim, code, bulk)
 
         sim.add_sync_process(process)
-        with sim.write_vcd("core_simulator.vcd", "core_simulator.gtkw",
-                           traces=[]):
+        with write_vcd(sim, "core_simulator.vcd", "core_simulator.gtkw",
+                            traces=[]):
             sim.run()
 
 
 if __name__ == "__main__":
+    parse_vcd_args()
     unittest.main(exit=False)
     suite = unittest.TestSuite()
     suite.addTest(TestRunner(LDSTTestCase().test_data))
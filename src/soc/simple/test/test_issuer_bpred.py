@@ -0,0 +1,38 @@
+"""simple core test with branch prediction enabled
+
+branch prediction steers the prefetch (pipelined fetch) address, so the
+branch tests are the important ones here: a misprediction must simply
+discard the prefetched instruction.  the remaining suites check that
+straight-line code is unaffected.
+
+related bugs:
+
+ * https://bugs.libre-soc.org/show_bug.cgi?id=363
+"""
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+
+import unittest
+
+from soc.simple.test.test_runner import TestRunner
+
+from openpower.test.alu.alu_cases import ALUTestCase
+from openpower.test.branch.branch_cases import BranchTestCase
+from openpower.simulator.test_sim import GeneralTestCases
+
+
+if __name__ == "__main__":
+    svp64 = False
+
+    unittest.main(exit=False)
+    suite = unittest.TestSuite()
+    suite.addTest(TestRunner(BranchTestCase().test_data, svp64=svp64,
+                             branch_predict=True))
+    suite.addTest(TestRunner(GeneralTestCases.test_data, svp64=svp64,
+                             branch_predict=True))
+    suite.addTest(TestRunner(ALUTestCase().test_data, svp64=svp64,
+                             branch_predict=True))
+
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
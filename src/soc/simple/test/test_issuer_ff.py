@@ -0,0 +1,41 @@
+"""simple core test with fast-forward: the first instructions of each test
+are run in ISACaller only, its state is then put into TestIssuer, and
+lock-step comparison starts from there.
+
+the load/store tests check that memory is carried over, the branch and
+general tests that the PC (and loops part-way through) are.
+
+related bugs:
+
+ * https://bugs.libre-soc.org/show_bug.cgi?id=363
+"""
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+
+import unittest
+
+from soc.simple.test.test_runner import TestRunner
+
+from openpower.test.alu.alu_cases import ALUTestCase
+from openpower.test.branch.branch_cases import BranchTestCase
+from openpower.test.ldst.ldst_cases import LDSTTestCase
+from openpower.simulator.test_sim import GeneralTestCases
+
+
+if __name__ == "__main__":
+    svp64 = False
+
+    unittest.main(exit=False)
+    suite = unittest.TestSuite()
+    suite.addTest(TestRunner(GeneralTestCases.test_data, svp64=svp64,
+                             fast_forward=2))
+    suite.addTest(TestRunner(BranchTestCase().test_data, svp64=svp64,
+                             fast_forward=1))
+    suite.addTest(TestRunner(LDSTTestCase().test_data, svp64=svp64,
+                             fast_forward=2))
+    suite.addTest(TestRunner(ALUTestCase().test_data, svp64=svp64,
+                             fast_forward=1))
+
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
@@ -0,0 +1,41 @@
+"""simple core test with instructions fetched through the ICache
+
+the same instruction sequences as test_issuer.py are run, with the
+microwatt-derived ICache (imem_ifacetype 'test_cache_wb') in front of
+the instruction SRAM instead of the uncached wishbone fetch unit.
+loops (branch tests) exercise hits; every test starts cold, because the
+DMI core reset between tests also clears the cache valid bits.
+"""
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+
+import unittest
+
+from soc.simple.test.test_runner import TestRunner
+
+from openpower.test.alu.alu_cases import ALUTestCase
+from openpower.test.branch.branch_cases import BranchTestCase
+from openpower.test.ldst.ldst_cases import LDSTTestCase
+from openpower.simulator.test_sim import GeneralTestCases
+
+
+if __name__ == "__main__":
+    svp64 = False
+
+    unittest.main(exit=False)
+    suite = unittest.TestSuite()
+    suite.addTest(TestRunner(GeneralTestCases.test_data, svp64=svp64,
+                             icache=True))
+    suite.addTest(TestRunner(BranchTestCase().test_data, svp64=svp64,
+                             icache=True))
+    suite.addTest(TestRunner(ALUTestCase().test_data, svp64=svp64,
+                             icache=True))
+    suite.addTest(TestRunner(LDSTTestCase().test_data, svp64=svp64,
+                             icache=True))
+    # prefetch (and branch prediction) on top of the ICache
+    suite.addTest(TestRunner(BranchTestCase().test_data, svp64=svp64,
+                             icache=True, branch_predict=True))
+
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
@@ -0,0 +1,55 @@
+"""simple core test with hazard-tracked overlapping of Function Units
+
+independent ALU, Logical, ShiftRot, MUL and DIV instructions are allowed
+to be in flight at the same time.  results are therefore only compared
+against the simulator once all instructions of each test have completed.
+
+related bugs:
+
+ * https://bugs.libre-soc.org/show_bug.cgi?id=363
+"""
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+
+import unittest
+
+from soc.simple.test.test_runner import TestRunner
+
+from openpower.test.alu.alu_cases import ALUTestCase
+from openpower.test.div.div_cases import DivTestCases
+from openpower.test.logical.logical_cases import LogicalTestCase
+from openpower.test.shift_rot.shift_rot_cases import ShiftRotTestCase
+from openpower.test.cr.cr_cases import CRTestCase
+from openpower.test.branch.branch_cases import BranchTestCase
+from openpower.test.mul.mul_cases import MulTestCases2Arg
+from openpower.simulator.test_sim import GeneralTestCases
+from openpower.simulator.test_mul_sim import MulTestCases
+
+
+if __name__ == "__main__":
+    svp64 = False
+
+    unittest.main(exit=False)
+    suite = unittest.TestSuite()
+    suite.addTest(TestRunner(GeneralTestCases.test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(ALUTestCase().test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(LogicalTestCase().test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(ShiftRotTestCase().test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(CRTestCase().test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(MulTestCases().test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(MulTestCases2Arg().test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(DivTestCases().test_data, svp64=svp64,
+                             allow_overlap=True))
+    suite.addTest(TestRunner(BranchTestCase().test_data, svp64=svp64,
+                             allow_overlap=True))
+
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
@@ -0,0 +1,43 @@
+"""simple core test with pipelined fetch (prefetch) enabled
+
+the same instruction sequences as test_issuer.py are run with the fetch
+of the next sequential instruction overlapping decode and execute of the
+current one.  branch tests are included to exercise the flush on redirect.
+
+related bugs:
+
+ * https://bugs.libre-soc.org/show_bug.cgi?id=363
+"""
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+
+import unittest
+
+from soc.simple.test.test_runner import TestRunner
+
+from openpower.test.alu.alu_cases import ALUTestCase
+from openpower.test.logical.logical_cases import LogicalTestCase
+from openpower.test.branch.branch_cases import BranchTestCase
+from openpower.test.ldst.ldst_cases import LDSTTestCase
+from openpower.simulator.test_sim import GeneralTestCases
+
+
+if __name__ == "__main__":
+    svp64 = False
+
+    unittest.main(exit=False)
+    suite = unittest.TestSuite()
+    suite.addTest(TestRunner(GeneralTestCases.test_data, svp64=svp64,
+                             prefetch=True))
+    suite.addTest(TestRunner(BranchTestCase().test_data, svp64=svp64,
+                             prefetch=True))
+    suite.addTest(TestRunner(ALUTestCase().test_data, svp64=svp64,
+                             prefetch=True))
+    suite.addTest(TestRunner(LogicalTestCase().test_data, svp64=svp64,
+                             prefetch=True))
+    suite.addTest(TestRunner(LDSTTestCase().test_data, svp64=svp64,
+                             prefetch=True))
+
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
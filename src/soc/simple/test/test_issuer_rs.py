@@ -0,0 +1,68 @@
+"""simple core test with Reservation Stations in front of the MUL pipeline
+
+three MUL Function Units (mul0, mul1, mul2) share the one pipeline.  with
+overlapping, back-to-back independent mullds each go to the first free
+MUL Function Unit, so several of them are in the pipeline at once: the
+test checks that at least two were busy at the same time, as well as the
+results (against the simulator, as usual).
+
+related bugs:
+
+ * https://bugs.libre-soc.org/show_bug.cgi?id=363
+"""
+
+# NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
+# Also, check out the cxxsim nmigen branch, and latest yosys from git
+
+import unittest
+
+from soc.simple.test.test_runner import TestRunner
+
+from openpower.simulator.program import Program
+from openpower.endian import bigendian
+from openpower.test.common import TestAccumulatorBase
+
+
+class MulRSTestCase(TestAccumulatorBase):
+
+    def case_0_mulld_independent(self):
+        lst = ["mulld 3, 1, 2",
+               "mulld 4, 5, 6",
+               "mulld 7, 8, 9"]
+        initial_regs = [0] * 32
+        initial_regs[1] = 0x1234
+        initial_regs[2] = 0x5678
+        initial_regs[5] = 0xffffffffffffffff
+        initial_regs[6] = 0x7
+        initial_regs[8] = 0x123456789
+        initial_regs[9] = 0x987654321
+        self.add_case(Program(lst, bigendian), initial_regs)
+
+    def case_1_mulld_then_dependent(self):
+        # two independent, then one needing both results
+        lst = ["mulld 3, 1, 2",
+               "mulld 4, 1, 1",
+               "mulld 5, 3, 4"]
+        initial_regs = [0] * 32
+        initial_regs[1] = 0x3
+        initial_regs[2] = 0xfedcba98
+        self.add_case(Program(lst, bigendian), initial_regs)
+
+
+RS_UNITS = {'alu': 1, 'cr': 1, 'branch': 1, 'trap': 1, 'spr': 1,
+            'logical': 1, 'mul': 3, 'div': 1, 'shiftrot': 1}
+
+
+class TestIssuerRS(unittest.TestCase):
+
+    def test_mulld_overlap(self):
+        runner = TestRunner(MulRSTestCase().test_data, svp64=False,
+                            allow_overlap=True, reservation_stations=True,
+                            units=RS_UNITS, nprocs=1)
+        runner.run_all()
+        self.assertGreaterEqual(runner.peak_busy.get('MUL', 0), 2,
+                                "independent mullds did not overlap")
+
+
+if __name__ == "__main__":
+    unittest.main()
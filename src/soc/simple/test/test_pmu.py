@@ -0,0 +1,131 @@
+"""test of the performance counters, and of reading them over DMI
+"""
+
+import unittest
+from nmigen import Module, Signal
+from nmigen.back.pysim import Simulator, Settle
+from soc.config.waves import write_vcd
+
+from soc.simple.pmu import PMU
+from soc.debug.dmi import CoreDebug, DBGCore, DBGPMU
+from soc.simple.test.test_runner import set_dmi, get_dmi
+
+
+class TestPMU(unittest.TestCase):
+
+    def run_tst(self, m, process, name):
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_sync_process(process)
+        with write_vcd(sim, "%s.vcd" % name):
+            sim.run()
+
+    def test_count(self):
+        m = Module()
+        m.submodules.pmu = pmu = PMU(["cycles", "odd", "never"])
+        ev = Signal()
+        m.d.sync += ev.eq(~ev)
+        m.d.comb += pmu.ev["cycles"].eq(1)
+        m.d.comb += pmu.ev["odd"].eq(ev)
+
+        def read(idx):
+            yield pmu.idx_i.eq(idx)
+            yield Settle()
+            return (yield pmu.data_o)
+
+        def process():
+            cycles = yield from read(0)
+            odd = yield from read(1)
+            for i in range(10):
+                yield
+            self.assertEqual((yield from read(0)), cycles + 10)
+            self.assertEqual((yield from read(1)), odd + 5)
+            self.assertEqual((yield from read(2)), 0)
+            self.assertEqual((yield from read(3)), 0) # out of range
+            # frozen: nothing counts
+            yield pmu.freeze_i.eq(1)
+            yield
+            cycles = yield from read(0)
+            for i in range(4):
+                yield
+            self.assertEqual((yield from read(0)), cycles)
+            yield pmu.freeze_i.eq(0)
+            # clear
+            yield pmu.clear_i.eq(1)
+            yield
+            yield pmu.clear_i.eq(0)
+            self.assertEqual((yield from read(0)), 0)
+            yield
+            self.assertEqual((yield from read(0)), 1)
+
+        self.run_tst(m, process, "test_pmu_count")
+
+    def test_multibit(self):
+        m = Module()
+        m.submodules.pmu = pmu = PMU(["cycles", "toggles"],
+                                     ev_widths={"toggles": 7})
+        m.d.comb += pmu.ev["cycles"].eq(1)
+
+        def read(idx):
+            yield pmu.idx_i.eq(idx)
+            yield Settle()
+            return (yield pmu.data_o)
+
+        def process():
+            self.assertEqual(len(pmu.ev["toggles"]), 7)
+            for val in (3, 0, 64, 5):
+                yield pmu.ev["toggles"].eq(val)
+                yield
+            yield pmu.ev["toggles"].eq(0)
+            self.assertEqual((yield from read(1)), 72)
+            # frozen: the value is not added
+            yield pmu.freeze_i.eq(1)
+            yield pmu.ev["toggles"].eq(9)
+            yield
+            self.assertEqual((yield from read(1)), 72)
+
+        self.run_tst(m, process, "test_pmu_multibit")
+
+    def test_dmi(self):
+        m = Module()
+        m.submodules.pmu = pmu = PMU(["cycles", "insn_done"])
+        m.submodules.dbg = dbg = CoreDebug()
+        insn_done = Signal()
+        m.d.comb += pmu.ev["cycles"].eq(1)
+        m.d.comb += pmu.ev["insn_done"].eq(insn_done)
+        # as in TestIssuerInternal
+        m.d.comb += pmu.idx_i.eq(dbg.d_pmu.addr)
+        m.d.comb += pmu.clear_i.eq(dbg.pmu_clear_o)
+        m.d.comb += pmu.freeze_i.eq(dbg.pmu_freeze_o)
+        m.d.comb += dbg.d_pmu.data.eq(pmu.data_o)
+        m.d.comb += dbg.d_pmu.ack.eq(dbg.d_pmu.req)
+
+        def process():
+            dmi = dbg.dmi
+            for i in range(3):
+                yield insn_done.eq(1)
+                yield
+                yield insn_done.eq(0)
+                yield
+            yield from set_dmi(dmi, DBGCore.PMU_DATA, 1<<DBGPMU.FREEZE)
+            yield from set_dmi(dmi, DBGCore.PMU_IDX, 1)
+            insns = yield from get_dmi(dmi, DBGCore.PMU_DATA)
+            self.assertEqual(insns, 3)
+            yield from set_dmi(dmi, DBGCore.PMU_IDX, 0)
+            cycles = yield from get_dmi(dmi, DBGCore.PMU_DATA)
+            # frozen: a second read gives the same count
+            self.assertEqual((yield from get_dmi(dmi, DBGCore.PMU_DATA)),
+                             cycles)
+            self.assertTrue(cycles > 6)
+            # unfreeze and clear
+            yield from set_dmi(dmi, DBGCore.PMU_DATA, 1<<DBGPMU.CLEAR)
+            cycles2 = yield from get_dmi(dmi, DBGCore.PMU_DATA)
+            self.assertTrue(cycles2 < cycles)
+            yield from set_dmi(dmi, DBGCore.PMU_IDX, 1)
+            self.assertEqual((yield from get_dmi(dmi, DBGCore.PMU_DATA)), 0)
+
+        self.run_tst(m, process, "test_pmu_dmi")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,33 @@
 """TestRunner class, runs TestIssuer instructions
 
+the tests may be sharded across processes (nprocs, or the environment
+variable SOC_TEST_NPROCS): shard N runs tests N, N+nprocs, ... in one
+simulation of its own TestIssuer.  failures are reported back, per
+test, as subTests of run_all.  each test gets a seed of its own (from
+its name) whichever shard it runs in, and a timing summary is printed.
+
 related bugs:
 
  * https://bugs.libre-soc.org/show_bug.cgi?id=363
 """
+import os
+import sys
+import time
+import random
+import traceback
+import multiprocessing
+from contextlib import contextmanager
+from zlib import crc32
+
 from nmigen import Module, Signal, Cat, ClockSignal
 from nmigen.hdl.xfrm import ResetInserter
 
 # NOTE: to use cxxsim, export NMIGEN_SIM_MODE=cxxsim from the shell
 # Also, check out the cxxsim nmigen branch, and latest yosys from git
-from nmutil.sim_tmp_alternative import Simulator, Settle
+from nmutil.sim_tmp_alternative import Simulator, Settle, Passive
 
 from nmutil.formaltest import FHDLTestCase
-from nmutil.gtkw import write_gtkw
+from soc.config.waves import write_vcd, write_gtkw, vcd_enabled
 from nmigen.cli import rtlil
 from openpower.decoder.isa.caller import special_sprs, SVP64State
 from openpower.decoder.isa.all import ISA
@@ -23,6 +38,7 @@ from openpower.decoder.power_decoder2 import PowerDecode2
 from soc.regfile.regfiles import StateRegs
 
 from soc.simple.issuer import TestIssuerInternal
+from soc.simple.bulkstate import BulkState
 
 from soc.config.test.test_loadstore import TestMemPspec
 from soc.simple.test.test_core import (setup_regs, check_regs,
@@ -33,12 +49,15 @@ from soc.fu.compunits.test.test_compunit import (setup_tst_memory,
 from soc.debug.dmi import DBGCore, DBGCtrl, DBGStat
 from nmutil.util import wrap
 from soc.experiment.test.test_mmu_dcache import wb_get
+from soc.config.simlog import get_logger
+
+log = get_logger("test_runner")
 
 
 def setup_i_memory(imem, startaddr, instructions):
     mem = imem
-    print("insn before, init mem", mem.depth, mem.width, mem,
-          len(instructions))
+    log.debug("insn before, init mem %s %s %s %s", mem.depth, mem.width, mem,
+              len(instructions))
     for i in range(mem.depth):
         yield mem._array[i].eq(0)
     yield Settle()
@@ -54,7 +73,7 @@ def setup_i_memory(imem, startaddr, instructions):
             yield mem._array[startaddr].eq(insn)
             yield Settle()
             if insn != 0:
-                print("instr: %06x 0x%x %s" % (4*startaddr, insn, code))
+                log.debug("instr: %06x 0x%x %s", 4*startaddr, insn, code)
             startaddr += 1
             startaddr = startaddr & mask
         return
@@ -70,16 +89,17 @@ def setup_i_memory(imem, startaddr, instructions):
         msbs = (startaddr >> 1) & mask
         val = yield mem._array[msbs]
         if insn != 0:
-            print("before set", hex(4*startaddr),
-                  hex(msbs), hex(val), hex(insn))
+            log.debug("before set %s %s %s %s", hex(4*startaddr), hex(msbs),
+                      hex(val), hex(insn))
         lsb = 1 if (startaddr & 1) else 0
         val = (val | (insn << (lsb*32)))
         val = val & mask
         yield mem._array[msbs].eq(val)
         yield Settle()
         if insn != 0:
-            print("after  set", hex(4*startaddr), hex(msbs), hex(val))
-            print("instr: %06x 0x%x %s %08x" % (4*startaddr, insn, code, val))
+            log.debug("after  set %s %s %s", hex(4*startaddr), hex(msbs),
+                      hex(val))
+            log.debug("instr: %06x 0x%x %s %08x", 4*startaddr, insn, code, val)
         startaddr += 1
         startaddr = startaddr & mask
 
@@ -121,16 +141,218 @@ def get_dmi(dmi, addr):
     return data
 
 
+def set_dmi_mem(dmi, addr, data):
+    """writes a list of 64-bit words to memory, through the DMI memory
+    window (CoreDebug mem_spec).  the address is sent once, after which
+    the words are streamed to MEM_DATA back-to-back: req_i is dropped
+    for only the one cycle that the DMI protocol requires.
+    """
+    yield from set_dmi(dmi, DBGCore.MEM_ADDR, addr)
+    yield dmi.addr_i.eq(DBGCore.MEM_DATA)
+    yield dmi.we_i.eq(1)
+    for word in data:
+        yield dmi.din.eq(word)
+        yield dmi.req_i.eq(1)
+        yield Settle()
+        while not (yield dmi.ack_o):
+            yield
+            yield Settle()
+        yield
+        yield dmi.req_i.eq(0)
+        yield
+    yield dmi.addr_i.eq(0)
+    yield dmi.din.eq(0)
+    yield dmi.we_i.eq(0)
+
+
+def get_dmi_mem(dmi, addr, n_words):
+    """reads n_words 64-bit words from memory, through the DMI memory
+    window, streamed as in set_dmi_mem
+    """
+    res = []
+    yield from set_dmi(dmi, DBGCore.MEM_ADDR, addr)
+    yield dmi.addr_i.eq(DBGCore.MEM_DATA)
+    yield dmi.we_i.eq(0)
+    for i in range(n_words):
+        yield dmi.req_i.eq(1)
+        yield Settle()
+        while not (yield dmi.ack_o):
+            yield
+            yield Settle()
+        res.append((yield dmi.dout))
+        yield
+        yield dmi.req_i.eq(0)
+        yield
+    yield dmi.addr_i.eq(0)
+    return res
+
+
+class ISACheckpoint:
+    """the architectural state of an ISA simulator, with the same
+    attributes as a TestCase (regs, cr, sprs, msr, svstate) so that it
+    can be given to setup_regs.  pc is where to carry on from.
+    """
+    def __init__(self, sim):
+        self.regs = [sim.gpr[i].value for i in range(32)]
+        self.cr = sim.cr.value & 0xffffffff
+        self.sprs = dict(sim.spr)
+        self.msr = sim.msr.value
+        self.svstate = sim.svstate.value
+        self.pc = sim.pc.CIA.value
+
+
+def fast_forward(sim, n_insns, instructions, stop_pc=None):
+    """runs the ISA simulator on its own (no HDL clock cycles), for
+    n_insns instructions (None for no limit), until it reaches stop_pc,
+    or until it runs out of instructions.  returns the number run.
+    """
+    count = 0
+    while sim.pc.CIA.value//4 < len(instructions):
+        if n_insns is not None and count >= n_insns:
+            break
+        if stop_pc is not None and sim.pc.CIA.value == stop_pc:
+            break
+        try:
+            yield from sim.setup_one()
+        except KeyError:  # instruction not in imem: stop
+            break
+        yield Settle()
+        yield from sim.execute_one()
+        yield Settle()
+        count += 1
+    return count
+
+
+def wait_fus_done(issuer, core):
+    """when overlapping: waits for all Function Units to finish, so
+    that the regfiles hold the results of every instruction issued so
+    far.  returns False (at once) if another instruction is issued
+    first: the outstanding results are then checked along with it.
+    """
+    while (yield core.any_busy_o):
+        yield
+        if (yield issuer.insn_done):
+            return False
+    return True
+
+
+def tst_seed(test):
+    """per-test seed: stable across runs, and whichever shard runs it"""
+    return crc32(test.name.encode("utf-8"))
+
+
+# the TestRunner being sharded, inherited by the (forked) workers
+_shard_runner = None
+
+
+def _run_shard(shard):
+    runner, nprocs = _shard_runner
+    indices = list(range(shard, len(runner.test_data), nprocs))
+    return runner.run_tests(indices, shard)
+
+
 class TestRunner(FHDLTestCase):
+    """runs each test in both TestIssuer and ISACaller, in lock-step
+
+    fast-forward: if fast_forward (a number of instructions) or
+    fast_forward_pc (a PC to stop at) is given, each test is first run
+    in ISACaller only.  its register, SPR, MSR and memory state is then
+    put into TestIssuer (setup_regs, setup_tst_memory), which starts at
+    that PC, and lock-step comparison starts from there.  a test may
+    override these with its own fast_forward/fast_forward_pc attributes.
+
+    units (a dict, see AllFunctionUnits) and reservation_stations pick
+    the Function Units.  when overlapping, peak_busy records (by Function
+    name) the most Function Units of each Function that were ever busy
+    at the same time: in one process only (nprocs=1).
+    """
     def __init__(self, tst_data, microwatt_mmu=False, rom=None,
-                        svp64=True):
+                        svp64=True, prefetch=False, allow_overlap=False,
+                        branch_predict=False, icache=False, nprocs=None,
+                        fast_forward=None, fast_forward_pc=None,
+                        reservation_stations=False, units=None):
         super().__init__("run_all")
         self.test_data = tst_data
         self.microwatt_mmu = microwatt_mmu
         self.rom = rom
         self.svp64 = svp64
+        self.prefetch = prefetch
+        self.allow_overlap = allow_overlap
+        self.branch_predict = branch_predict
+        self.icache = icache
+        if nprocs is None:
+            nprocs = int(os.environ.get("SOC_TEST_NPROCS", "1"))
+        self.nprocs = nprocs
+        self.fast_forward = fast_forward
+        self.fast_forward_pc = fast_forward_pc
+        self.reservation_stations = reservation_stations
+        self.units = units
+        self.peak_busy = {}
 
     def run_all(self):
+        start = time.time()
+        nprocs = min(self.nprocs, len(self.test_data))
+        if nprocs <= 1:
+            results = self.run_tests(range(len(self.test_data)))
+        else:
+            global _shard_runner
+            _shard_runner = (self, nprocs)
+            ctx = multiprocessing.get_context("fork")
+            with ctx.Pool(nprocs) as pool:
+                shards = pool.map(_run_shard, range(nprocs))
+            _shard_runner = None
+            # back into the original order, failures as subTests
+            results = sorted(r for shard in shards for r in shard)
+            for (idx, name, shard, secs, err) in results:
+                with self.subTest(name):
+                    if err is not None:
+                        self.fail("shard %d:\n%s" % (shard, err))
+        self.timing_summary(results, time.time() - start, nprocs)
+
+    def timing_summary(self, results, wall, nprocs):
+        total = sum(secs for (idx, name, shard, secs, err) in results)
+        failed = [name for (idx, name, shard, secs, err) in results
+                  if err is not None]
+        print("timing summary: %d tests (%d failed), %d process(es), "
+              "wall %.1fs, test time %.1fs, %.0f tests/hour" %
+              (len(results), len(failed), nprocs, wall, total,
+               len(results) * 3600.0 / max(wall, 1e-6)))
+        for (idx, name, shard, secs, err) in sorted(results,
+                                                    key=lambda r: -r[3]):
+            print("  %8.1fs  shard %-4s %s%s" %
+                  (secs, "-" if shard is None else shard, name,
+                   "" if err is None else "  FAILED"))
+
+    @contextmanager
+    def tst_context(self, idx, test, shard, results):
+        """one test: a subTest, or (in a shard) recorded for run_all"""
+        random.seed(tst_seed(test))
+        start = time.time()
+        err = None
+        if shard is None:
+            try:
+                with self.subTest(test.name):
+                    try:
+                        yield
+                    except BaseException:
+                        err = traceback.format_exc()
+                        raise
+            finally:
+                results.append((idx, test.name, shard,
+                                time.time() - start, err))
+            return
+        try:
+            yield
+        except Exception:
+            err = traceback.format_exc()
+            print(err, file=sys.stderr)
+        results.append((idx, test.name, shard, time.time() - start, err))
+
+    def run_tests(self, indices, shard=None):
+        """run the tests (by index into test_data) in one simulation.
+        returns (index, name, shard, seconds, traceback-or-None) per test
+        """
+        results = []
         m = Module()
         comb = m.d.comb
         pc_i = Signal(32)
@@ -140,7 +362,10 @@ class TestRunner(FHDLTestCase):
             ldst_ifacetype = 'test_mmu_cache_wb'
         else:
             ldst_ifacetype = 'test_bare_wb'
-        imem_ifacetype = 'test_bare_wb'
+        if self.icache:
+            imem_ifacetype = 'test_cache_wb'
+        else:
+            imem_ifacetype = 'test_bare_wb'
 
         pspec = TestMemPspec(ldst_ifacetype=ldst_ifacetype,
                              imem_ifacetype=imem_ifacetype,
@@ -155,6 +380,11 @@ class TestRunner(FHDLTestCase):
                              regreduce=True,
                              svp64=self.svp64,
                              mmu=self.microwatt_mmu,
+                             prefetch=self.prefetch,
+                             allow_overlap=self.allow_overlap,
+                             branch_predict=self.branch_predict,
+                             reservation_stations=self.reservation_stations,
+                             units=self.units,
                              reg_wid=64)
         #hard_reset = Signal(reset_less=True)
         issuer = TestIssuerInternal(pspec)
@@ -183,6 +413,7 @@ class TestRunner(FHDLTestCase):
         # nmigen Simulation
         sim = Simulator(m)
         sim.add_clock(1e-6)
+        bulk = BulkState(sim)
 
         def process():
 
@@ -192,7 +423,8 @@ class TestRunner(FHDLTestCase):
 
             # get each test, completely reset the core, and run it
 
-            for test in self.test_data:
+            for idx in indices:
+                test = self.test_data[idx]
 
                 # set up bigendian (TODO: don't do this, use MSR)
                 yield issuer.core_bigendian_i.eq(bigendian)
@@ -203,15 +435,15 @@ class TestRunner(FHDLTestCase):
                 yield
                 yield
 
-                print(test.name)
+                log.info("%s", test.name)
                 program = test.program
-                with self.subTest(test.name):
-                    print("regs", test.regs)
-                    print("sprs", test.sprs)
-                    print("cr", test.cr)
-                    print("mem", test.mem)
-                    print("msr", test.msr)
-                    print("assem", program.assembly)
+                with self.tst_context(idx, test, shard, results):
+                    log.debug("regs %s", test.regs)
+                    log.debug("sprs %s", test.sprs)
+                    log.debug("cr %s", test.cr)
+                    log.debug("mem %s", test.mem)
+                    log.debug("msr %s", test.msr)
+                    log.debug("assem %s", program.assembly)
                     gen = list(program.generate_instructions())
                     insncode = program.assembly.splitlines()
                     instructions = list(zip(gen, insncode))
@@ -224,6 +456,20 @@ class TestRunner(FHDLTestCase):
                               bigendian=bigendian,
                               initial_svstate=test.svstate)
 
+                    # fast-forward: run ahead in the ISA simulator only
+                    ff_insns = getattr(test, "fast_forward",
+                                       self.fast_forward)
+                    ff_pc = getattr(test, "fast_forward_pc",
+                                    self.fast_forward_pc)
+                    state = test
+                    if ff_insns is not None or ff_pc is not None:
+                        ff_count = yield from fast_forward(sim, ff_insns,
+                                                           instructions,
+                                                           ff_pc)
+                        state = ISACheckpoint(sim)
+                        log.info("fast-forward %d instructions to pc %x",
+                                 ff_count, state.pc)
+
                     # establish the TestIssuer context (mem, regs etc)
 
                     pc = 0  # start address
@@ -231,28 +477,36 @@ class TestRunner(FHDLTestCase):
 
                     yield from setup_i_memory(imem, pc, instructions)
                     yield from setup_tst_memory(l0, sim)
-                    yield from setup_regs(pdecode2, core, test)
+                    # memory was reloaded directly: drop any L0 lines
+                    yield issuer.mem_inval_i.eq(1)
+                    yield from setup_regs(pdecode2, core, state)
+                    if state is not test:
+                        # MSR is otherwise left as it is from reset
+                        msr = core.regs.state.regs[StateRegs.MSR].reg
+                        yield msr.eq(state.msr)
+                        pc = state.pc
 
                     # set PC and SVSTATE
                     yield pc_i.eq(pc)
                     yield issuer.pc_i.ok.eq(1)
 
-                    initial_svstate = test.svstate
+                    initial_svstate = state.svstate
                     if isinstance(initial_svstate, int):
                         initial_svstate = SVP64State(initial_svstate)
                     yield svstate_i.eq(initial_svstate.value)
                     yield issuer.svstate_i.ok.eq(1)
                     yield
+                    yield issuer.mem_inval_i.eq(0)
 
-                    print("instructions", instructions)
+                    log.debug("instructions %s", instructions)
 
                     # run the loop of the instructions on the current test
                     index = sim.pc.CIA.value//4
                     while index < len(instructions):
                         ins, code = instructions[index]
 
-                        print("instruction: 0x{:X}".format(ins & 0xffffffff))
-                        print(index, code)
+                        log.debug("instruction: 0x%X", ins & 0xffffffff)
+                        log.debug("%s %s", index, code)
 
                         if counter == 0:
                             # start the core
@@ -278,33 +532,52 @@ class TestRunner(FHDLTestCase):
                         yield Settle()
 
                         # call simulated operation
-                        print("sim", code)
+                        log.debug("sim %s", code)
                         yield from sim.execute_one()
                         yield Settle()
                         index = sim.pc.CIA.value//4
 
                         terminated = yield issuer.dbg.terminated_o
-                        print("terminated", terminated)
+                        log.debug("terminated %s", terminated)
 
                         if index >= len(instructions):
-                            print ("index over, send dmi stop")
+                            log.debug("index over, send dmi stop")
                             # stop at end
                             yield from set_dmi(dmi, DBGCore.CTRL,
                                                1<<DBGCtrl.STOP)
                             yield
                             yield
 
-                        # register check
-                        yield from check_regs(self, sim, core, test, code)
-
-                        # Memory check
-                        yield from check_sim_memory(self, l0, sim, code)
+                        # when FUs overlap, the results of an instruction
+                        # may not yet be written: wait for them, unless
+                        # the next instruction is issued in the meantime
+                        done = True
+                        if self.allow_overlap:
+                            done = yield from wait_fus_done(issuer, core)
+                        if done:
+                            # register check
+                            yield from check_regs(self, sim, core, test,
+                                                  code, bulk)
+
+                            # Memory check
+                            yield from check_sim_memory(self, l0, sim,
+                                                        code, bulk)
 
                         terminated = yield issuer.dbg.terminated_o
-                        print("terminated(2)", terminated)
+                        log.debug("terminated(2) %s", terminated)
                         if terminated:
                             break
 
+                    if self.allow_overlap:
+                        # stop, wait for all Function Units to drain, check
+                        yield from set_dmi(dmi, DBGCore.CTRL,
+                                           1<<DBGCtrl.STOP)
+                        while (yield core.any_busy_o):
+                            yield
+                        yield from check_regs(self, sim, core, test, code,
+                                              bulk)
+                        yield from check_sim_memory(self, l0, sim, code, bulk)
+
                 # stop at end
                 yield from set_dmi(dmi, DBGCore.CTRL, 1<<DBGCtrl.STOP)
                 yield
@@ -312,24 +585,67 @@ class TestRunner(FHDLTestCase):
 
                 # get CR
                 cr = yield from get_dmi(dmi, DBGCore.CR)
-                print("after test %s cr value %x" % (test.name, cr))
+                log.debug("after test %s cr value %x", test.name, cr)
 
                 # get XER
                 xer = yield from get_dmi(dmi, DBGCore.XER)
-                print("after test %s XER value %x" % (test.name, xer))
+                log.debug("after test %s XER value %x", test.name, xer)
 
                 # test of dmi reg get
                 for int_reg in range(32):
                     yield from set_dmi(dmi, DBGCore.GSPR_IDX, int_reg)
                     value = yield from get_dmi(dmi, DBGCore.GSPR_DATA)
 
-                    print("after test %s reg %2d value %x" %
-                          (test.name, int_reg, value))
+                    log.debug("after test %s reg %2d value %x", test.name,
+                              int_reg, value)
 
                 # pull a reset
                 yield from set_dmi(dmi, DBGCore.CTRL, 1<<DBGCtrl.RESET)
                 yield
 
+        if shard is None:
+            vcd_name = "issuer_simulator"
+        else:
+            vcd_name = "issuer_simulator_shard%d" % shard
+        if vcd_enabled(): # the trace list is only needed for waveforms
+            traces, styles = self.issuer_traces()
+            write_gtkw(vcd_name+".gtkw", vcd_name+".vcd",
+                       traces, styles, module='top.issuer')
+
+        def busy_monitor():
+            # most FUs of each Function busy at once (overlap, RS)
+            yield Passive()
+            byfn = {}
+            for fu in core.fus.fus.values():
+                byfn.setdefault(fu.fnunit.name, []).append(fu)
+            while True:
+                for name, fus in byfn.items():
+                    busy = 0
+                    for fu in fus:
+                        busy += yield fu.busy_o
+                    if busy > self.peak_busy.get(name, 0):
+                        self.peak_busy[name] = busy
+                yield
+
+        # add run of instructions
+        sim.add_sync_process(process)
+        if self.allow_overlap:
+            sim.add_sync_process(busy_monitor)
+
+        # optionally, if a wishbone-based ROM is passed in, run that as an
+        # extra emulated process
+        if self.rom is not None:
+            dcache = core.fus.fus["mmu0"].alu.dcache
+            default_mem = self.rom
+            sim.add_sync_process(wrap(wb_get(dcache, default_mem, "DCACHE")))
+
+        with write_vcd(sim, vcd_name+".vcd"):
+            sim.run()
+
+        return results
+
+    def issuer_traces(self):
+        """the GTKW trace list (and styles) for the issuer waveforms"""
         styles = {
             'dec': {'base': 'dec'},
             'bin': {'base': 'bin'},
@@ -454,19 +770,4 @@ class TestRunner(FHDLTestCase):
                 'core.fus.mmu0.alu_mmu0.dcache.stall,'
             ]
 
-        write_gtkw("issuer_simulator.gtkw",
-                   "issuer_simulator.vcd",
-                   traces, styles, module='top.issuer')
-
-        # add run of instructions
-        sim.add_sync_process(process)
-
-        # optionally, if a wishbone-based ROM is passed in, run that as an
-        # extra emulated process
-        if self.rom is not None:
-            dcache = core.fus.fus["mmu0"].alu.dcache
-            default_mem = self.rom
-            sim.add_sync_process(wrap(wb_get(dcache, default_mem, "DCACHE")))
-
-        with sim.write_vcd("issuer_simulator.vcd"):
-            sim.run()
+        return traces, styles